@@ -0,0 +1,54 @@
+"""Compare the vectorized day conversions with per-element conversions
+
+Converts synthetic day columns, with missing days, to months and years
+with `days_to` and with the per-element `applymap` the runners used, and
+reports the seconds taken by each. The outputs must be identical.
+
+    python benchmarks/bench_dates.py --rows 200000 --columns 20
+"""
+import argparse
+import math
+import time
+
+import numpy as np
+import pandas as pd
+
+from geniesp.dates import DAYS_PER_UNIT, days_to
+
+
+def make_days(rows: int, columns: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic day columns with 10% missing days"""
+    rng = np.random.default_rng(seed)
+    days = rng.integers(-2000, 30000, (rows, columns)).astype(float)
+    days[rng.random((rows, columns)) < 0.1] = np.nan
+    return pd.DataFrame(days, columns=[f"DATE_{i}_INT" for i in range(columns)])
+
+
+def per_element(days: pd.DataFrame, unit: str) -> pd.DataFrame:
+    """Conversion of each value, as `change_days_to_months` did"""
+    days_per_unit = DAYS_PER_UNIT[unit]
+    return days.applymap(
+        lambda value: float("nan")
+        if math.isnan(value)
+        else math.floor(value / days_per_unit)
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--columns", type=int, default=10)
+    args = parser.parse_args()
+    days = make_days(args.rows, args.columns)
+    for unit in DAYS_PER_UNIT:
+        results = {}
+        for name, convert in [("applymap", per_element), ("days_to", days_to)]:
+            start = time.perf_counter()
+            results[name] = convert(days, unit)
+            print(f"{unit} {name}: {time.perf_counter() - start:.3f}s")
+        if not results["applymap"].equals(results["days_to"]):
+            raise SystemExit(f"{unit} outputs differ")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+"""Time each stage of a BPC export on synthetic inputs
+
+Generates the synthetic inputs of benchmarks/synthetic.py for each number of
+patients and runs the cohort's export on them offline, without cBioPortal
+validation, reporting the seconds of every export stage. The first run of a
+scale is cold, with empty dataset and index caches; the warm seconds are the
+median of the later runs, which reuse the caches. Results can be saved as a
+baseline and later runs compared with it.
+
+    PYTHONPATH=. python benchmarks/bench_export.py --patients 1000 10000 --runs 3
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+from geniesp.__main__ import BPC_COHORTS, BPC_MAPPING
+import synthetic
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baselines", "bench_export.json")
+# Stage differences below this many seconds are noise
+NOISE_SECONDS = 0.05
+
+
+def make_runner_class(cohort: str) -> type:
+    """Runner of a cohort that skips the cBioPortal validation"""
+
+    class BenchRunner(BPC_MAPPING[cohort]):
+        def validate(self) -> None:
+            pass
+
+    return BenchRunner
+
+
+def run_export(data_dir: str, work_dir: str, cohort: str, jobs: int = 1) -> Dict:
+    """Run an export of the synthetic inputs in a work directory
+
+    Args:
+        data_dir (str): directory of the synthetic inputs
+        work_dir (str): directory of the export files and caches
+        cohort (str): BPC cohort
+        jobs (int, optional): stages run in parallel. Defaults to 1.
+
+    Returns:
+        Dict: "total" seconds and "stages" seconds per stage
+    """
+    runner_class = make_runner_class(cohort)
+    cache_dir = os.path.join(work_dir, "cache")
+    snapshot = f"{runner_class._ONCOTREE_VERSION}.json"
+    os.makedirs(os.path.join(cache_dir, "oncotree"), exist_ok=True)
+    shutil.copy(
+        os.path.join(data_dir, "oncotree", snapshot),
+        os.path.join(cache_dir, "oncotree", snapshot),
+    )
+    synthetic.clear_process_caches()
+    cwd = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        start = time.perf_counter()
+        runner = runner_class(
+            synthetic.SyntheticSynapse(data_dir),
+            work_dir,
+            release="synthetic",
+            cache_dir=cache_dir,
+            jobs=jobs,
+            oncotree_offline=True,
+        )
+        runner.run()
+        total = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+    return {
+        "total": total,
+        "stages": {
+            stage: values["wall_seconds"]
+            for stage, values in runner.metrics.stages().items()
+            if "wall_seconds" in values
+        },
+    }
+
+
+def bench_scale(
+    patients: int, cohort: str, runs: int, jobs: int, seed: int, data_root: str
+) -> Dict:
+    """Cold and warm seconds of the export of a number of patients"""
+    data_dir = os.path.join(data_root, f"{cohort}-{patients}-{seed}")
+    if not os.path.exists(os.path.join(data_dir, synthetic.CATALOG)):
+        start = time.perf_counter()
+        synthetic.write_synthetic(data_dir, patients, cohort=cohort, seed=seed)
+        print(f"generated {patients} patients in {time.perf_counter() - start:.1f}s")
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = [run_export(data_dir, work_dir, cohort, jobs) for _ in range(runs)]
+    cold, warm = results[0], results[1:] or results
+    return {
+        "cold": {
+            "total": round(cold["total"], 3),
+            "stages": {
+                stage: round(seconds, 3) for stage, seconds in cold["stages"].items()
+            },
+        },
+        "warm": {
+            "total": round(statistics.median(run["total"] for run in warm), 3),
+            "stages": {
+                stage: round(statistics.median(run["stages"][stage] for run in warm), 3)
+                for stage in cold["stages"]
+            },
+        },
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> list:
+    """Stages of each scale that are slower than in the baseline
+
+    Args:
+        results (Dict): scale to its cold and warm seconds
+        baseline (Dict): saved results
+        tolerance (float): allowed fraction of slowdown
+
+    Returns:
+        list: (scale, run, stage, baseline seconds, seconds) of the slower stages
+    """
+    slower = []
+    for scale, result in results.items():
+        if scale not in baseline["scales"]:
+            continue
+        for run in ["cold", "warm"]:
+            base = baseline["scales"][scale][run]
+            seconds = {"total": result[run]["total"], **result[run]["stages"]}
+            base_seconds = {"total": base["total"], **base["stages"]}
+            for stage, value in seconds.items():
+                before = base_seconds.get(stage)
+                if before is None:
+                    continue
+                if value > before * (1 + tolerance) and value - before > NOISE_SECONDS:
+                    slower.append((scale, run, stage, before, value))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, nargs="+", default=[1000])
+    parser.add_argument("--cohort", default="CRC", choices=BPC_COHORTS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--data", help="directory of the generated inputs, kept between runs"
+    )
+    parser.add_argument("--baseline", default=BASELINE)
+    parser.add_argument(
+        "--save-baseline", action="store_true", help="save the results as baseline"
+    )
+    parser.add_argument(
+        "--check", action="store_true", help="exit 1 if stages got slower"
+    )
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="allowed fraction of slowdown"
+    )
+    args = parser.parse_args()
+
+    data_root = args.data or tempfile.mkdtemp(prefix="bench_export-")
+    results = {}
+    try:
+        for patients in args.patients:
+            result = bench_scale(
+                patients, args.cohort, args.runs, args.jobs, args.seed, data_root
+            )
+            results[str(patients)] = result
+            print(
+                f"{patients} patients: cold {result['cold']['total']:.2f}s, "
+                f"warm {result['warm']['total']:.2f}s"
+            )
+            warm = result["warm"]["stages"]
+            for stage, seconds in result["cold"]["stages"].items():
+                print(f"  {stage:30} {seconds:8.3f}s {warm[stage]:8.3f}s")
+    finally:
+        if args.data is None:
+            shutil.rmtree(data_root, ignore_errors=True)
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as baseline_f:
+            json.dump(
+                {
+                    "cohort": args.cohort,
+                    "runs": args.runs,
+                    "jobs": args.jobs,
+                    "seed": args.seed,
+                    "environment": {
+                        "python": platform.python_version(),
+                        "pandas": pd.__version__,
+                        "numpy": np.__version__,
+                        "cpus": os.cpu_count(),
+                    },
+                    "scales": results,
+                },
+                baseline_f,
+                indent=2,
+            )
+            baseline_f.write("\n")
+        print(f"saved baseline to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_f:
+            baseline = json.load(baseline_f)
+        slower = compare(results, baseline, args.tolerance)
+        for scale, run, stage, before, seconds in slower:
+            print(f"slower: {scale} {run} {stage} {before:.3f}s -> {seconds:.3f}s")
+        if not slower:
+            print(f"no stage is slower than in {args.baseline}")
+        if slower and args.check:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
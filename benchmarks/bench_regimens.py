@@ -0,0 +1,92 @@
+"""Time create_regimens as the number of regimens grows
+
+Builds a synthetic regimen dataset with one row per patient and regimen
+and reports the seconds taken to create the regimen survival columns for
+each number of top regimens.
+
+    python benchmarks/bench_regimens.py --patients 5000 --regimens 20 100 400
+"""
+import argparse
+import time
+from typing import Dict, Tuple
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from geniesp.bpc_redcap_export_mapping import create_regimens
+
+
+def make_regimens(
+    patients: int, drugs: int, seed: int = 0
+) -> Tuple[pd.DataFrame, Dict[str, str]]:
+    """Synthetic regimen dataset with up to 5 regimens of 1 or 2 drugs
+    per patient, and the drug mapping of its drugs"""
+    rng = np.random.default_rng(seed)
+    names = [f"Drug{i}" for i in range(drugs)]
+    rows = rng.integers(1, 6, patients)
+    record_ids = np.repeat([f"GENIE-XXX-{i:05d}" for i in range(patients)], rows)
+    first = rng.integers(0, drugs, len(record_ids))
+    second = rng.integers(0, drugs, len(record_ids))
+    regimen_drugs = [
+        names[i] if i == j else f"{names[min(i, j)]}, {names[max(i, j)]}"
+        for i, j in zip(first, second)
+    ]
+    return pd.DataFrame(
+        {
+            "record_id": record_ids,
+            "redcap_ca_index": "Yes",
+            "regimen_drugs": regimen_drugs,
+            "regimen_number": rng.integers(1, 9, len(record_ids)),
+            "os_g_status": rng.integers(0, 2, len(record_ids)),
+            "tt_os_g_mos": rng.integers(0, 100, len(record_ids)) / 2,
+            "pfs_i_g_status": rng.integers(0, 2, len(record_ids)),
+            "tt_pfs_i_g_mos": rng.integers(0, 100, len(record_ids)) / 2,
+        }
+    ), {name: f"C{i}" for i, name in enumerate(names)}
+
+
+def regimen_info() -> pd.DataFrame:
+    codes = ["os_g_status", "tt_os_g_mos", "pfs_i_g_status", "tt_pfs_i_g_mos"]
+    infodf = pd.DataFrame(
+        {
+            "code": codes,
+            "id": "synREG",
+            "cbio": [f"{code.upper()}_{{regimen_abbr}}" for code in codes],
+            "labels": [f"{code} {{regimen}}" for code in codes],
+            "description": [f"{code} of {{regimen}}" for code in codes],
+            "priority": "0",
+        }
+    )
+    infodf.index = infodf["code"]
+    return infodf
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=5000)
+    parser.add_argument("--drugs", type=int, default=40)
+    parser.add_argument("--regimens", type=int, nargs="+", default=[20, 100, 400])
+    args = parser.parse_args()
+    regimendf, mapping = make_regimens(args.patients, args.drugs)
+    infodf = regimen_info()
+    for top_x_regimens in args.regimens:
+        dataset_cache = mock.Mock()
+        dataset_cache.get.return_value = (regimendf.copy(), None)
+        start = time.perf_counter()
+        regimens = create_regimens(
+            None,
+            infodf,
+            mapping=mapping,
+            top_x_regimens=top_x_regimens,
+            dataset_cache=dataset_cache,
+        )
+        seconds = time.perf_counter() - start
+        print(
+            f"{top_x_regimens} regimens: {seconds:.3f}s, "
+            f"{regimens['df'].shape[1]} columns"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""Compare the reshape of the timeline treatment drugs with per-code melts
+
+Builds a synthetic regimen table covering several cohorts, then reshapes
+its numbered drug columns and shortens the agents with
+`stack_drug_columns` and `clean_agents`, and with the per-code melts and
+agent loop they replaced. The results must be identical.
+
+    python benchmarks/bench_timeline_treatment.py --regimens 200000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from geniesp.bpc_redcap_export_mapping import clean_agents, stack_drug_columns
+
+ID_VARS = ["record_id", "regimen_drugs", "regimen_number"]
+AGENTS = [
+    "Carboplatin",
+    "Pemetrexed Disodium",
+    "Nivolumab (Opdivo)",
+    "Cisplatin, Etoposide",
+    "Investigational Drug (trial), Other",
+    None,
+]
+COHORTS = ["NSCLC", "CRC", "BrCa", "PANC", "Prostate", "BLADDER"]
+
+
+def make_regimens(regimens: int, drugs: int = 5, seed: int = 0) -> pd.DataFrame:
+    """Synthetic regimen table of all cohorts with `drugs` numbered
+    columns per drug variable"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "record_id": [
+            f"GENIE-{COHORTS[i % len(COHORTS)]}-{i // 3:06d}" for i in range(regimens)
+        ],
+        "regimen_drugs": rng.choice(["A", "A, B", "C"], regimens),
+        "regimen_number": rng.integers(1, 9, regimens),
+    }
+    for number in range(1, drugs + 1):
+        start = rng.integers(0, 3000, regimens).astype(float)
+        start[rng.random(regimens) < 0.4] = np.nan
+        data[f"drugs_drug_{number}"] = rng.choice(AGENTS, regimens)
+        data[f"drugs_startdt_int_{number}"] = start
+        data[f"drugs_enddt_int_{number}"] = start + rng.integers(0, 200, regimens)
+        data[f"drugs_ongoing_{number}"] = rng.choice(["Yes", "No"], regimens)
+    return pd.DataFrame(data)
+
+
+def wildcard_info() -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "code": [
+                "drugs_drug_*",
+                "drugs_startdt_int_*",
+                "drugs_enddt_int_*",
+                "drugs_ongoing_*",
+            ],
+            "cbio": ["AGENT", "START_DATE", "STOP_DATE", "ONGOING"],
+        }
+    )
+
+
+def melt_drug_columns(df: pd.DataFrame, wildcard_infodf: pd.DataFrame):
+    """The per-code melts and agent loop of make_timeline_treatmentdf
+    before `stack_drug_columns` and `clean_agents`"""
+    final_timelinedf = pd.DataFrame()
+    for _, row in wildcard_infodf.iterrows():
+        cols = df.columns.str.contains(row["code"].replace("*", "[\\d]"))
+        wanted_cols = df.columns[cols].tolist() + ID_VARS
+        melted_df = pd.melt(df[wanted_cols], id_vars=ID_VARS, value_name=row["cbio"])
+        del melted_df["variable"]
+        if final_timelinedf.empty:
+            final_timelinedf = pd.concat([final_timelinedf, melted_df])
+        else:
+            final_timelinedf[row["cbio"]] = melted_df[row["cbio"]]
+    final_timelinedf = final_timelinedf[~final_timelinedf["AGENT"].isnull()]
+    agents = []
+    for agent in final_timelinedf["AGENT"]:
+        if "(" in agent:
+            agents.append(agent.split("(")[0].strip())
+        else:
+            agents.append(agent.split(",")[0].strip())
+    final_timelinedf["AGENT"] = agents
+    return final_timelinedf.reset_index(drop=True)
+
+
+def stack_and_clean(df: pd.DataFrame, wildcard_infodf: pd.DataFrame):
+    stacked = stack_drug_columns(df, wildcard_infodf, id_vars=ID_VARS)
+    stacked = stacked[~stacked["AGENT"].isnull()]
+    stacked["AGENT"] = clean_agents(stacked["AGENT"])
+    return stacked.reset_index(drop=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--regimens", type=int, default=200000)
+    parser.add_argument("--drugs", type=int, default=5)
+    args = parser.parse_args()
+    df = make_regimens(args.regimens, args.drugs)
+    infodf = wildcard_info()
+    results = {}
+    for name, reshape in [("melt", melt_drug_columns), ("stack", stack_and_clean)]:
+        start = time.perf_counter()
+        results[name] = reshape(df, infodf)
+        print(f"{name}: {time.perf_counter() - start:.2f}s")
+    pd.testing.assert_frame_equal(results["melt"], results["stack"])
+
+
+if __name__ == "__main__":
+    main()
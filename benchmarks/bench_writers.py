@@ -0,0 +1,80 @@
+"""Compare the streaming TSV writer with `removePandasDfFloat`
+
+Writes a synthetic timeline shaped like the labtest timeline, the largest
+BPC export, with both paths and reports the time and peak traced memory of
+each. The outputs must be identical.
+
+    python benchmarks/bench_writers.py --rows 2000000
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from genie import process_functions
+import numpy as np
+import pandas as pd
+
+from geniesp.hashing import HashingWriter, md5_file
+from geniesp.writers import write_tsv
+
+
+def make_timeline(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Synthetic labtest timeline: integer days stored as floats with
+    missing values, text columns and a few fractional results"""
+    rng = np.random.default_rng(seed)
+    start = rng.integers(-500, 5000, rows).astype(float)
+    start[rng.random(rows) < 0.05] = np.nan
+    result = np.round(rng.normal(10, 5, rows), 1)
+    return pd.DataFrame(
+        {
+            "PATIENT_ID": [f"GENIE-XXX-{i % 5000:05d}" for i in range(rows)],
+            "START_DATE": start,
+            "STOP_DATE": start + rng.integers(0, 30, rows),
+            "EVENT_TYPE": "LAB_TEST",
+            "TEST": rng.choice(["CEA", "PSA", "CA19-9"], rows),
+            "RESULT": result,
+            "UNIT": rng.choice(["ng/mL", "U/mL", None], rows),
+        }
+    )
+
+
+def measure(write, df: pd.DataFrame, path: str):
+    """Seconds, peak traced memory and md5 of a write to a file. Memory is
+    traced in a separate run because tracing slows the writes down."""
+    with HashingWriter(path) as file_f:
+        start = time.perf_counter()
+        write(df, file_f)
+        seconds = time.perf_counter() - start
+    tracemalloc.start()
+    with HashingWriter(path) as file_f:
+        write(df, file_f)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return seconds, peak, md5_file(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=500000)
+    args = parser.parse_args()
+    df = make_timeline(args.rows)
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "data_timeline_labtest.txt")
+        results = {
+            "removePandasDfFloat": measure(
+                lambda df, out: out.write(process_functions.removePandasDfFloat(df)),
+                df,
+                path,
+            ),
+            "write_tsv": measure(write_tsv, df, path),
+        }
+    for name, (seconds, peak, md5) in results.items():
+        print(f"{name}: {seconds:.2f}s, peak {peak / 1024**2:.0f} MiB, md5 {md5}")
+    if len({md5 for _, _, md5 in results.values()}) != 1:
+        raise SystemExit("outputs differ")
+
+
+if __name__ == "__main__":
+    main()
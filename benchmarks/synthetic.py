@@ -0,0 +1,1136 @@
+"""Synthetic BPC and main GENIE inputs of an export
+
+Generates, for a number of patients, the inputs that a BPC export reads from
+Synapse: the derived variable datasets referenced by the cBio mapping table,
+the mapping table, the table of dataset labels, a main GENIE release folder
+(clinical sample, MAF, CNA, seg, SV and genomic information files), the
+retraction tables, the assay information table, the drug dictionary and an
+oncotree snapshot. The inputs are written to a directory with a catalog of
+their Synapse IDs, which are those of the cohort's runner, and
+`SyntheticSynapse` serves them in place of a Synapse connection so that
+exports run offline. The same seed generates the same inputs.
+
+    PYTHONPATH=. python benchmarks/synthetic.py --patients 10000 --out synthetic
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from types import SimpleNamespace
+from typing import Dict, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from geniesp import folder_index, genomic, oncotree, retraction, shared
+from geniesp.__main__ import BPC_COHORTS, BPC_MAPPING
+
+# Catalog of the Synapse entities and tables of the generated inputs
+CATALOG = "synapse.json"
+
+PT = "Patient-level dataset"
+CA = "Cancer-level dataset"
+CA_INDEX = "Cancer-level index dataset"
+CPT = "Cancer panel test level dataset"
+PATH = "Pathology-report level dataset"
+REGIMEN = "Cancer-Directed Regimen dataset"
+RT = "Cancer-Directed Radiation Therapy dataset"
+IMAGE = "Imaging-level dataset"
+MD = "Med Onc Note level dataset"
+TM = "PRISSMM Tumor Marker level dataset"
+# Dataset label -> Synapse ID and file name of the derived variable dataset.
+# The cancer-level dataset has the Synapse ID get_timeline_sequence hard codes
+DATASETS = {
+    PT: ("syn90000001", "pt_derived.csv"),
+    CA: ("syn22296816", "ca_dx_derived.csv"),
+    CA_INDEX: ("syn90000002", "ca_dx_derived_index.csv"),
+    CPT: ("syn90000003", "cpt_derived.csv"),
+    PATH: ("syn90000004", "path_derived.csv"),
+    REGIMEN: ("syn90000005", "ca_drugs_derived.csv"),
+    RT: ("syn90000006", "ca_radtx_derived.csv"),
+    IMAGE: ("syn90000007", "prissmm_image_derived.csv"),
+    MD: ("syn90000008", "prissmm_md_derived.csv"),
+    TM: ("syn90000009", "prissmm_tm_derived.csv"),
+}
+# Main GENIE release file -> Synapse ID
+RELEASE_FILES = {
+    "data_clinical_sample.txt": "syn91000001",
+    "data_mutations_extended.txt": "syn91000002",
+    "data_CNA.txt": "syn91000003",
+    "data_cna_hg19.seg": "syn91000004",
+    "data_sv.txt": "syn91000005",
+    "genomic_information.txt": "syn91000006",
+}
+# PRISSMM documentation folder of the cohort and its data dictionary
+PRISSMM_FOLDER_SYNID = "syn92000001"
+DATA_DICTIONARY_SYNID = "syn92000002"
+
+# sampleType, dataset, code, cbio and colType of the cBio mapping table rows.
+# Portal values have no dataset, their code is the EVENT_TYPE of the timeline
+MAPPING = [
+    ("PATIENT", PT, "record_id", "PATIENT_ID", "STRING"),
+    ("PATIENT", PT, "naaccr_sex_code", "SEX", "STRING"),
+    ("PATIENT", PT, "naaccr_race_code_primary", "PRIMARY_RACE", "STRING"),
+    ("PATIENT", PT, "naaccr_ethnicity_code", "ETHNICITY", "STRING"),
+    ("PATIENT", PT, "birth_year", "BIRTH_YEAR", "NUMBER"),
+    ("PATIENT", PT, "hybrid_death_ind", "DEATH_IND", "STRING"),
+    ("PATIENT", CA, "naaccr_laterality_cd", "NAACCR_LATERALITY_CD", "STRING"),
+    ("PATIENT", CA, "ca_stage", "STAGE_INDEX", "STRING"),
+    ("SAMPLE", CPT, "record_id", "PATIENT_ID", "STRING"),
+    ("SAMPLE", CPT, "cpt_genie_sample_id", "SAMPLE_ID", "STRING"),
+    ("SAMPLE", CPT, "cpt_oncotree_code", "ONCOTREE_CODE", "STRING"),
+    ("SAMPLE", CPT, "cpt_seq_assay_id", "SEQ_ASSAY_ID", "STRING"),
+    ("SAMPLE", CPT, "cpt_sample_type", "SAMPLE_TYPE", "STRING"),
+    ("SAMPLE", CPT, "cpt_seq_date", "CPT_SEQ_DATE", "NUMBER"),
+    ("SAMPLE", CPT, "age_at_seq", "AGE_AT_SEQUENCING", "NUMBER"),
+    ("SAMPLE", CPT, "dob_cpt_report_days", "AGE_AT_SEQ_REPORT_YEARS", "NUMBER"),
+    ("SAMPLE", CPT, "cpt_order_int", "CPT_ORDER_INT", "NUMBER"),
+    ("SAMPLE", CPT, "cpt_report_int", "CPT_REPORT_INT", "NUMBER"),
+    ("SAMPLE", PATH, "pdl1_positive_any", "PDL1_POSITIVE_ANY", "STRING"),
+    ("SURVIVAL", CA_INDEX, "record_id", "PATIENT_ID", "STRING"),
+    ("SURVIVAL", CA_INDEX, "os_dx_status", "OS_DX_STATUS", "STRING"),
+    ("SURVIVAL", CA_INDEX, "tt_os_dx_mos", "OS_DX_MONTHS", "NUMBER"),
+    ("SURVIVAL", CA_INDEX, "pfs_i_adv_status", "PFS_I_ADV_STATUS", "STRING"),
+    ("SURVIVAL", CA_INDEX, "tt_pfs_i_adv_mos", "PFS_I_ADV_MONTHS", "NUMBER"),
+    ("REGIMEN", REGIMEN, "os_g_status", "OS_{regimen_abbr}_STATUS", "STRING"),
+    ("REGIMEN", REGIMEN, "tt_os_g_mos", "OS_{regimen_abbr}_MONTHS", "NUMBER"),
+    ("REGIMEN", REGIMEN, "pfs_i_g_status", "PFS_I_{regimen_abbr}_STATUS", "STRING"),
+    ("REGIMEN", REGIMEN, "tt_pfs_i_g_mos", "PFS_I_{regimen_abbr}_MONTHS", "NUMBER"),
+    ("TIMELINE-TREATMENT", REGIMEN, "drugs_drug_*", "AGENT", "STRING"),
+    ("TIMELINE-TREATMENT", REGIMEN, "drugs_startdt_int_*", "START_DATE", "NUMBER"),
+    ("TIMELINE-TREATMENT", REGIMEN, "drugs_enddt_int_*", "STOP_DATE", "NUMBER"),
+    ("TIMELINE-TREATMENT", REGIMEN, "regimen_drugs", "REGIMEN_DRUGS", "STRING"),
+    ("TIMELINE-TREATMENT", REGIMEN, "regimen_number", "REGIMEN_NUMBER", "NUMBER"),
+    ("TIMELINE-TREATMENT", REGIMEN, "drugs_ct_yn", "CLINICAL_TRIAL", "STRING"),
+    ("TIMELINE-TREATMENT-RT", None, "TREATMENT", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-TREATMENT-RT", RT, "rt_start_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-TREATMENT-RT", RT, "redcap_ca_index", "INDEX_CANCER", "STRING"),
+    ("TIMELINE-TREATMENT-RT", RT, "rt_total_dose", "RT_TOTAL_DOSE", "NUMBER"),
+    ("TIMELINE-TREATMENT-RT", RT, "rt_site", "RT_SITE", "STRING"),
+    ("TIMELINE-DX", None, "DIAGNOSIS", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-DX", CA, "ca_dx_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-DX", CA, "redcap_ca_index", "INDEX_CANCER", "STRING"),
+    ("TIMELINE-DX", CA, "ca_d_site", "SITE", "STRING"),
+    ("TIMELINE-DX", CA, "ca_stage", "STAGE", "STRING"),
+    ("TIMELINE-PATHOLOGY", None, "PATHOLOGY", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-PATHOLOGY", PATH, "path_proc_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-PATHOLOGY", PATH, "path_site", "PATH_SITE", "STRING"),
+    ("TIMELINE-PATHOLOGY", PATH, "path_histology", "HISTOLOGY", "STRING"),
+    ("TIMELINE-SAMPLE", None, "SPECIMEN", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-SAMPLE", CPT, "cpt_genie_sample_id", "SAMPLE_ID", "STRING"),
+    ("TIMELINE-SAMPLE", CPT, "dx_path_proc_cpt_days", "START_DATE", "NUMBER"),
+    ("TIMELINE-SAMPLE", CPT, "cpt_sample_type", "SAMPLE_TYPE", "STRING"),
+    ("TIMELINE-MEDONC", None, "MED_ONC", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-MEDONC", MD, "md_onc_visit_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-MEDONC", MD, "md_ca_status", "DISEASE_STATUS", "STRING"),
+    ("TIMELINE-IMAGING", None, "IMAGING", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-IMAGING", IMAGE, "image_scan_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-IMAGING", IMAGE, "image_scan_type", "IMAGE_SCAN_TYPE", "STRING"),
+    ("TIMELINE-IMAGING", IMAGE, "image_ca", "IMAGE_CA_STATUS", "STRING"),
+    ("TIMELINE-SEQUENCE", None, "SEQUENCING", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-SEQUENCE", CPT, "cpt_genie_sample_id", "SAMPLE_ID", "STRING"),
+    ("TIMELINE-SEQUENCE", CPT, "dx_cpt_rep_days", "START_DATE", "NUMBER"),
+    ("TIMELINE-SEQUENCE", CPT, "cpt_seq_assay_id", "SEQ_ASSAY_ID", "STRING"),
+    ("TIMELINE-LAB", None, "LAB_TEST", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-LAB", TM, "tm_spec_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-LAB", TM, "tm_type", "TEST", "STRING"),
+    ("TIMELINE-LAB", TM, "tm_result", "RESULT", "NUMBER"),
+    ("TIMELINE-PERFORMANCE", None, "PERFORMANCE_STATUS", "EVENT_TYPE", "STRING"),
+    ("TIMELINE-PERFORMANCE", MD, "md_onc_visit_int", "START_DATE", "NUMBER"),
+    ("TIMELINE-PERFORMANCE", MD, "md_karnof", "MD_KARNOF", "STRING"),
+    ("TIMELINE-PERFORMANCE", MD, "md_ecog", "MD_ECOG", "STRING"),
+]
+# Labels of the regimen variables, one per regimen
+REGIMEN_LABELS = {
+    "os_g_status": "Overall survival status from {regimen}",
+    "tt_os_g_mos": "Overall survival months from {regimen}",
+    "pfs_i_g_status": "Progression-free survival status from {regimen}",
+    "tt_pfs_i_g_mos": "Progression-free survival months from {regimen}",
+}
+
+# Oncotree code -> CANCER_TYPE, CANCER_TYPE_DETAILED, ONCOTREE_PRIMARY_NODE
+# and ONCOTREE_SECONDARY_NODE
+ONCOTREE = {
+    "COADREAD": ("Colorectal Cancer", "Colorectal Adenocarcinoma", "BOWEL", ""),
+    "COAD": ("Colorectal Cancer", "Colon Adenocarcinoma", "BOWEL", "COADREAD"),
+    "READ": ("Colorectal Cancer", "Rectal Adenocarcinoma", "BOWEL", "COADREAD"),
+    "LUAD": ("Non-Small Cell Lung Cancer", "Lung Adenocarcinoma", "LUNG", "NSCLC"),
+    "LUSC": (
+        "Non-Small Cell Lung Cancer",
+        "Lung Squamous Cell Carcinoma",
+        "LUNG",
+        "NSCLC",
+    ),
+    "IDC": ("Breast Cancer", "Breast Invasive Ductal Carcinoma", "BREAST", "BRCA"),
+    "ILC": ("Breast Cancer", "Breast Invasive Lobular Carcinoma", "BREAST", "BRCA"),
+    "PAAD": ("Pancreatic Cancer", "Pancreatic Adenocarcinoma", "PANCREAS", ""),
+    "PRAD": ("Prostate Cancer", "Prostate Adenocarcinoma", "PROSTATE", ""),
+    "BLCA": ("Bladder Cancer", "Bladder Urothelial Carcinoma", "BLADDER", ""),
+}
+# Sequencing assay -> genes on the panel and alteration types
+ASSAYS = {
+    "DFCI-ONCOPANEL-1": (275, "snv;small_indels;cna;structural_variants"),
+    "DFCI-ONCOPANEL-3": (447, "snv;small_indels;cna;structural_variants"),
+    "MSK-IMPACT341": (341, "snv;small_indels;cna;structural_variants"),
+    "MSK-IMPACT410": (410, "snv;small_indels;cna;structural_variants"),
+    "MSK-IMPACT468": (468, "snv;small_indels;cna;structural_variants"),
+    "VICC-01-T7": (200, "snv;small_indels"),
+}
+CENTERS = ["DFCI", "MSK", "VICC", "UHN"]
+GENES = (
+    "TP53 KRAS APC PIK3CA EGFR BRAF SMAD4 FBXW7 PTEN ERBB2 KEAP1 STK11 NRAS "
+    "ARID1A CDKN2A RB1 MET ALK ROS1 RET ATM BRCA1 BRCA2 CTNNB1 NF1 MYC CCND1 "
+    "CDK4 MDM2 SOX9 TCF7L2 AMER1 ACVR2A RNF43 GNAS AKT1 FGFR1 FGFR2 FGFR3 "
+    "FGFR4 IDH1 IDH2 KIT NOTCH1"
+).split() + [f"GENE{i}" for i in range(1, 457)]
+# Drug -> synonyms in the drug dictionary and the derived variables
+DRUGS = {
+    "Carboplatin": "Paraplatin",
+    "Cisplatin": "Platinol",
+    "Oxaliplatin": "Eloxatin",
+    "Fluorouracil": "5-FU",
+    "Leucovorin Calcium": "Folinic Acid",
+    "Capecitabine": "Xeloda",
+    "Irinotecan Hydrochloride": "Camptosar",
+    "Bevacizumab": "Avastin",
+    "Cetuximab": "Erbitux",
+    "Panitumumab": "Vectibix",
+    "Pemetrexed Disodium": "Alimta",
+    "Paclitaxel": "Taxol",
+    "Docetaxel": "Taxotere",
+    "Gemcitabine Hydrochloride": "Gemzar",
+    "Etoposide": "VP-16",
+    "Nivolumab": "Opdivo",
+    "Pembrolizumab": "Keytruda",
+    "Osimertinib": "Tagrisso",
+    "Erlotinib Hydrochloride": "Tarceva",
+    "Trastuzumab": "Herceptin",
+}
+# Regimens that the survival files leave out
+EXCLUDED_REGIMENS = ["Investigational Drug", "Other"]
+
+
+def _per_patient(
+    patient_ids: np.ndarray, counts: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Patient of each row and the number of the row within its patient,
+    from 1, for `counts` rows per patient"""
+    rows = np.repeat(patient_ids, counts)
+    starts = np.repeat(np.cumsum(counts) - counts, counts)
+    return rows, np.arange(len(rows)) - starts + 1
+
+
+def _days(rng, size: int, low: int, high: int, missing: float = 0.0) -> np.ndarray:
+    """Random days with a fraction of missing days"""
+    days = rng.integers(low, high, size).astype(float)
+    days[rng.random(size) < missing] = np.nan
+    return days
+
+
+def _choice(rng, values: list, size: int, missing: float = 0.0) -> np.ndarray:
+    """Random values with a fraction of missing values"""
+    chosen = rng.choice(np.array(values, dtype=object), size)
+    chosen[rng.random(size) < missing] = None
+    return chosen
+
+
+def make_regimen_pool(rng, regimens: int = 60) -> list:
+    """Regimens of one to three drugs, in the order of how common they are,
+    and a few regimens the survival files leave out"""
+    names = sorted(DRUGS)
+    pool = []
+    while len(pool) < regimens:
+        drugs = sorted(rng.choice(names, rng.integers(1, 4), replace=False))
+        if drugs not in pool:
+            pool.append(drugs)
+    pool.insert(5, ["Investigational Drug"])
+    pool.insert(12, ["Other", names[0]])
+    return pool
+
+
+def make_derived_datasets(
+    patients: int, cohort: str, seed: int = 0
+) -> Dict[str, pd.DataFrame]:
+    """Synthetic derived variable datasets of a cohort
+
+    Args:
+        patients (int): number of patients
+        cohort (str): sponsored project, the cohort_internal of every row
+        seed (int, optional): random seed. Defaults to 0.
+
+    Returns:
+        Dict[str, pd.DataFrame]: dataset label to derived variables
+    """
+    rng = np.random.default_rng(seed)
+    patient_ids = np.array(
+        [f"GENIE-{CENTERS[i % len(CENTERS)]}-{i:06d}" for i in range(1, patients + 1)],
+        dtype=object,
+    )
+    datasets = {}
+    datasets[PT] = pd.DataFrame(
+        {
+            "record_id": patient_ids,
+            "naaccr_sex_code": _choice(rng, ["Male", "Female"], patients),
+            "naaccr_race_code_primary": _choice(
+                rng, ["White", "Black", "Asian", "Other", "Unknown"], patients
+            ),
+            "naaccr_ethnicity_code": _choice(
+                rng, ["Non-Spanish; non-Hispanic", "Spanish/Hispanic"], patients
+            ),
+            "birth_year": rng.integers(1930, 1990, patients),
+            "hybrid_death_ind": _choice(rng, ["Yes", "No"], patients),
+        }
+    )
+
+    # An index cancer per patient and, for some, an earlier cancer
+    cancers = 1 + (rng.random(patients) < 0.3)
+    record_ids, cancer_numbers = _per_patient(patient_ids, cancers)
+    is_index = cancer_numbers == 1
+    dob_ca_dx_days = rng.integers(15000, 30000, len(record_ids))
+    datasets[CA] = pd.DataFrame(
+        {
+            "record_id": record_ids,
+            "ca_seq": cancer_numbers - 1,
+            "redcap_ca_index": np.where(is_index, "Yes", "No"),
+            "dob_ca_dx_days": dob_ca_dx_days,
+            "ca_dx_int": _days(rng, len(record_ids), -3000, 0, missing=0.05),
+            "ca_d_site": _choice(
+                rng, ["Colon", "Rectum", "Lung", "Breast"], len(record_ids)
+            ),
+            "ca_stage": _choice(rng, ["I", "II", "III", "IV"], len(record_ids)),
+            "naaccr_laterality_cd": _choice(
+                rng, ["0", "1", "2", "9", "Not paired"], len(record_ids)
+            ),
+        }
+    )
+    index_dx_days = dob_ca_dx_days[is_index]
+
+    datasets[CA_INDEX] = pd.DataFrame(
+        {
+            "record_id": patient_ids,
+            # Only patients without a later index cancer are in the survival file
+            "first_index_ca_days": _days(rng, patients, 0, 5000, missing=0.95),
+            "os_dx_status": rng.integers(0, 2, patients),
+            "tt_os_dx_mos": rng.integers(0, 2000, patients) / 10,
+            "pfs_i_adv_status": rng.integers(0, 2, patients),
+            "tt_pfs_i_adv_mos": rng.integers(0, 1500, patients) / 10,
+        }
+    )
+
+    # Samples of the cancer panel tests, each with a pathology report
+    samples = rng.choice([1, 2, 3], patients, p=[0.7, 0.25, 0.05])
+    sample_patients, sample_numbers = _per_patient(patient_ids, samples)
+    n_samples = len(sample_patients)
+    sample_ids = np.array(
+        [
+            f"{patient}-T{number}"
+            for patient, number in zip(sample_patients, sample_numbers)
+        ],
+        dtype=object,
+    )
+    report_days = np.repeat(index_dx_days, samples) + rng.integers(0, 2000, n_samples)
+    datasets[CPT] = pd.DataFrame(
+        {
+            "record_id": sample_patients,
+            "cpt_genie_sample_id": sample_ids,
+            "path_proc_number": sample_numbers,
+            "path_rep_number": 1,
+            "cpt_oncotree_code": _choice(rng, list(ONCOTREE), n_samples),
+            "cpt_seq_assay_id": _choice(rng, list(ASSAYS), n_samples),
+            "cpt_sample_type": _choice(
+                rng,
+                ["Primary tumor", "Metastatic recurrence", "Local recurrence"],
+                n_samples,
+            ),
+            "cpt_seq_date": rng.integers(2014, 2022, n_samples),
+            "age_at_seq": rng.integers(4000, 9000, n_samples) / 100,
+            "dob_cpt_report_days": report_days,
+            "cpt_order_int": _days(rng, n_samples, 0, 1500),
+            "cpt_report_int": _days(rng, n_samples, 0, 1600),
+            "dx_cpt_rep_days": _days(rng, n_samples, 0, 2000),
+            "dx_path_proc_cpt_days": _days(rng, n_samples, 0, 1800, missing=0.03),
+        }
+    )
+
+    # The pathology reports of the samples and other reports
+    reports = samples + rng.integers(0, 3, patients)
+    report_patients, report_numbers = _per_patient(patient_ids, reports)
+    n_reports = len(report_patients)
+    datasets[PATH] = pd.DataFrame(
+        {
+            "record_id": report_patients,
+            "path_proc_number": report_numbers,
+            "path_rep_number": 1,
+            "path_proc_int": _days(rng, n_reports, -100, 2500, missing=0.05),
+            "path_site": _choice(rng, ["Colon", "Lymph node", "Liver"], n_reports),
+            "path_histology": _choice(
+                rng, ["Adenocarcinoma", "Mucinous adenocarcinoma"], n_reports
+            ),
+            "pdl1_positive_any": _choice(rng, ["Yes", "No"], n_reports, missing=0.4),
+        }
+    )
+
+    # Regimens, mostly of the index cancer, with a column per drug
+    pool = make_regimen_pool(rng)
+    weights = 1 / np.arange(1, len(pool) + 1)
+    regimens = np.minimum(rng.poisson(1.5, patients), 6)
+    regimen_patients, regimen_numbers = _per_patient(patient_ids, regimens)
+    n_regimens = len(regimen_patients)
+    regimen_index = rng.choice(len(pool), n_regimens, p=weights / weights.sum())
+    regimen = {
+        "record_id": regimen_patients,
+        "redcap_ca_index": _choice(rng, ["Yes"] * 9 + ["No"], n_regimens),
+        "regimen_number": regimen_numbers,
+        "regimen_drugs": np.array([", ".join(drugs) for drugs in pool], dtype=object)[
+            regimen_index
+        ],
+        "drugs_ct_yn": _choice(rng, ["Yes", "No"], n_regimens),
+    }
+    start = rng.integers(0, 3000, n_regimens)
+    for number in range(1, 6):
+        pool_agents = [
+            (
+                f"{drugs[number - 1]}({DRUGS.get(drugs[number - 1], 'Other')})"
+                if number <= len(drugs)
+                else None
+            )
+            for drugs in pool
+        ]
+        agents = pd.Series(pool_agents, dtype=object)[regimen_index].values
+        startdt = np.where(
+            pd.notna(agents), start + rng.integers(0, 30, n_regimens), np.nan
+        )
+        startdt[rng.random(n_regimens) < 0.03] = np.nan
+        regimen[f"drugs_drug_{number}"] = agents
+        regimen[f"drugs_startdt_int_{number}"] = startdt
+        regimen[f"drugs_enddt_int_{number}"] = startdt + rng.integers(
+            0, 300, n_regimens
+        )
+    regimen["os_g_status"] = rng.integers(0, 2, n_regimens)
+    regimen["tt_os_g_mos"] = rng.integers(0, 1500, n_regimens) / 10
+    regimen["pfs_i_g_status"] = rng.integers(0, 2, n_regimens)
+    regimen["tt_pfs_i_g_mos"] = rng.integers(0, 1000, n_regimens) / 10
+    datasets[REGIMEN] = pd.DataFrame(regimen)
+
+    radiations = rng.choice([0, 1, 2], patients, p=[0.6, 0.3, 0.1])
+    rt_patients, _ = _per_patient(patient_ids, radiations)
+    n_rt = len(rt_patients)
+    datasets[RT] = pd.DataFrame(
+        {
+            "record_id": rt_patients,
+            "redcap_ca_index": _choice(rng, ["Yes"] * 9 + ["No"], n_rt),
+            "rt_start_int": _days(rng, n_rt, 0, 2500, missing=0.05),
+            "rt_rt_int": rng.integers(1, 60, n_rt),
+            "rt_total_dose": rng.integers(20, 80, n_rt) * 100,
+            "rt_site": _choice(rng, ["Pelvis", "Brain", "Lung"], n_rt),
+        }
+    )
+
+    scans = rng.poisson(6, patients)
+    image_patients, _ = _per_patient(patient_ids, scans)
+    n_scans = len(image_patients)
+    datasets[IMAGE] = pd.DataFrame(
+        {
+            "record_id": image_patients,
+            "image_scan_int": _days(rng, n_scans, -60, 3000, missing=0.05),
+            "image_scan_type": _choice(rng, ["CT", "MRI", "PET-CT"], n_scans),
+            "image_ca": _choice(
+                rng, ["Yes, the cancer is progressing", "No", "Mixed"], n_scans
+            ),
+        }
+    )
+
+    notes = rng.poisson(8, patients)
+    note_patients, _ = _per_patient(patient_ids, notes)
+    n_notes = len(note_patients)
+    datasets[MD] = pd.DataFrame(
+        {
+            "record_id": note_patients,
+            "md_onc_visit_int": _days(rng, n_notes, 0, 3000, missing=0.05),
+            "md_ca_status": _choice(
+                rng, ["Improving", "Stable", "Progressing"], n_notes
+            ),
+            "md_karnof": _choice(
+                rng,
+                [
+                    "90: Able to carry on normal activity",
+                    "70: Cares for self",
+                    "Not documented in this note",
+                ],
+                n_notes,
+                missing=0.5,
+            ),
+            "md_ecog": _choice(
+                rng,
+                [
+                    "0: Fully active",
+                    "1: Restricted in physically strenuous activity",
+                    "Not documented in this note",
+                ],
+                n_notes,
+                missing=0.5,
+            ),
+        }
+    )
+
+    markers = rng.poisson(2, patients)
+    marker_patients, _ = _per_patient(patient_ids, markers)
+    n_markers = len(marker_patients)
+    datasets[TM] = pd.DataFrame(
+        {
+            "record_id": marker_patients,
+            "tm_spec_int": _days(rng, n_markers, 0, 3000, missing=0.05),
+            "tm_type": _choice(rng, ["CEA", "CA19-9"], n_markers),
+            "tm_result": rng.integers(0, 5000, n_markers) / 10,
+        }
+    )
+    for df in datasets.values():
+        df.insert(1, "cohort_internal", cohort)
+    return datasets
+
+
+def make_mapping(cohort: str, cohorts: list) -> pd.DataFrame:
+    """cBio mapping table with every row released for the cohort
+
+    Args:
+        cohort (str): sponsored project
+        cohorts (list): sponsored projects with a release column
+
+    Returns:
+        pd.DataFrame: mapping table
+    """
+    rows = []
+    for sample_type, dataset, code, cbio, col_type in MAPPING:
+        if dataset is None:
+            data_type = "portal_value"
+        else:
+            data_type = "curated" if sample_type in ["PATIENT", "SAMPLE"] else "derived"
+        label = REGIMEN_LABELS.get(code, cbio.replace("_", " ").title())
+        rows.append(
+            {
+                "code": code,
+                "sampleType": sample_type,
+                "dataset": dataset,
+                "data_type": data_type,
+                "cbio": cbio,
+                "labels": label,
+                "description": f"{label} ({code})",
+                "colType": col_type,
+                "priority": int(sample_type in ["PATIENT", "SAMPLE"]),
+            }
+        )
+    mappingdf = pd.DataFrame(rows)
+    for release_cohort in cohorts:
+        mappingdf[release_cohort] = release_cohort == cohort
+    return mappingdf
+
+
+def make_drug_dictionary() -> pd.DataFrame:
+    """Data dictionary with the drug choices of the regimen drug columns"""
+    choices = " | ".join(
+        f"{index}, {drug}({synonym})"
+        for index, (drug, synonym) in enumerate(sorted(DRUGS.items()), start=1)
+    )
+    rows = [
+        {
+            "Variable / Field Name": "record_id",
+            "Form Name": "curation_initiation_eligibility",
+            "Field Type": "text",
+            "Choices, Calculations, OR Slider Labels": None,
+        }
+    ]
+    for number in range(1, 6):
+        for name in [f"drugs_drug_{number}", f"drugs_drug_oth{number}"]:
+            rows.append(
+                {
+                    "Variable / Field Name": name,
+                    "Form Name": "cancer_directed_drugs",
+                    "Field Type": "dropdown",
+                    "Choices, Calculations, OR Slider Labels": choices,
+                }
+            )
+    return pd.DataFrame(rows)
+
+
+def make_clinical_sample(
+    cptdf: pd.DataFrame, rng, extra: float = 1.0, missing: float = 0.01
+) -> pd.DataFrame:
+    """Main GENIE clinical samples: the cohort's samples, except a few that
+    aren't in the release, and samples of other patients
+
+    Args:
+        cptdf (pd.DataFrame): cancer panel test dataset of the cohort
+        rng: random generator
+        extra (float, optional): other samples per cohort sample. Defaults to 1.0.
+        missing (float, optional): fraction of the cohort's samples that aren't
+            in the release. Defaults to 0.01.
+
+    Returns:
+        pd.DataFrame: clinical samples
+    """
+    cohort = cptdf[rng.random(len(cptdf)) >= missing]
+    n_extra = int(len(cptdf) * extra)
+    first = len(cptdf) + 1
+    other_patients = [
+        f"GENIE-{CENTERS[i % len(CENTERS)]}-{i:06d}"
+        for i in range(first, first + n_extra)
+    ]
+    samples = pd.DataFrame(
+        {
+            "PATIENT_ID": np.concatenate([cohort["record_id"], other_patients]),
+            "SAMPLE_ID": np.concatenate(
+                [
+                    cohort["cpt_genie_sample_id"],
+                    [f"{patient}-T1" for patient in other_patients],
+                ]
+            ),
+            "ONCOTREE_CODE": np.concatenate(
+                [cohort["cpt_oncotree_code"], _choice(rng, list(ONCOTREE), n_extra)]
+            ),
+            "SEQ_ASSAY_ID": np.concatenate(
+                [cohort["cpt_seq_assay_id"], _choice(rng, list(ASSAYS), n_extra)]
+            ),
+        }
+    )
+    n_samples = len(samples)
+    samples["AGE_AT_SEQ_REPORT"] = rng.integers(18, 90, n_samples)
+    samples["SAMPLE_TYPE"] = _choice(rng, ["Primary", "Metastasis"], n_samples)
+    samples["SEQ_YEAR"] = rng.integers(2014, 2022, n_samples)
+    samples["SAMPLE_CLASS"] = _choice(rng, ["Tumor"] * 49 + ["cfDNA"], n_samples)
+    return samples
+
+
+def make_maf(sample_ids: np.ndarray, rng, variants: float = 5.0) -> pd.DataFrame:
+    """Mutations of the samples, with the rows of a sample together
+
+    Args:
+        sample_ids (np.ndarray): samples in the release order
+        rng: random generator
+        variants (float, optional): mean variants per sample. Defaults to 5.0.
+
+    Returns:
+        pd.DataFrame: MAF
+    """
+    barcodes, _ = _per_patient(sample_ids, rng.poisson(variants, len(sample_ids)))
+    n_rows = len(barcodes)
+    start = rng.integers(1, 200000000, n_rows)
+    t_depth = rng.integers(20, 1000, n_rows).astype(float)
+    t_depth[rng.random(n_rows) < 0.05] = np.nan
+    t_alt_count = np.floor(t_depth * rng.random(n_rows) / 2)
+    n_depth = rng.integers(20, 500, n_rows).astype(object)
+    n_depth[rng.random(n_rows) < 0.3] = "."
+    return pd.DataFrame(
+        {
+            "Hugo_Symbol": _choice(rng, GENES[:100], n_rows),
+            "Entrez_Gene_Id": rng.integers(1, 100000, n_rows),
+            "Center": _choice(rng, CENTERS, n_rows),
+            "NCBI_Build": "GRCh37",
+            "Chromosome": rng.integers(1, 23, n_rows),
+            "Start_Position": start,
+            "End_Position": start + rng.integers(0, 3, n_rows),
+            "Variant_Classification": _choice(
+                rng,
+                ["Missense_Mutation", "Nonsense_Mutation", "Silent", "Frame_Shift_Del"],
+                n_rows,
+            ),
+            "Variant_Type": _choice(rng, ["SNP", "DEL", "INS"], n_rows),
+            "Reference_Allele": _choice(rng, list("ACGT"), n_rows),
+            "Tumor_Seq_Allele2": _choice(rng, list("ACGT"), n_rows),
+            "Tumor_Sample_Barcode": barcodes,
+            "HGVSp_Short": [f"p.X{position % 1000}Y" for position in start],
+            "t_depth": t_depth,
+            "t_ref_count": t_depth - t_alt_count,
+            "t_alt_count": t_alt_count,
+            "n_depth": n_depth,
+            "Validation_Status": _choice(rng, ["Untested", "Valid"], n_rows),
+        }
+    )
+
+
+def write_cna(
+    path: str, sample_ids: np.ndarray, rng, genes: int = 100, chunk_genes: int = 10
+) -> None:
+    """Write a CNA matrix of the genes and samples, with missing values
+
+    Args:
+        path (str): CNA path
+        sample_ids (np.ndarray): samples with CNA data
+        rng: random generator
+        genes (int, optional): number of genes. Defaults to 100.
+        chunk_genes (int, optional): genes generated at a time. Defaults to 10.
+    """
+    values = np.array(["-2.0", "-1.0", "0.0", "1.0", "2.0", ""], dtype=object)
+    weights = np.array([0.02, 0.08, 0.79, 0.08, 0.02, 0.01])
+    with open(path, "w") as cna_f:
+        cna_f.write("\t".join(["Hugo_Symbol", *sample_ids]) + "\n")
+        for first in range(0, genes, chunk_genes):
+            chunk = GENES[first : min(first + chunk_genes, genes)]
+            codes = rng.choice(len(values), (len(chunk), len(sample_ids)), p=weights)
+            for gene, gene_codes in zip(chunk, codes):
+                cna_f.write("\t".join([gene, *values[gene_codes]]) + "\n")
+
+
+def make_seg(sample_ids: np.ndarray, rng, segments: float = 15.0) -> pd.DataFrame:
+    """Copy number segments of the samples
+
+    Args:
+        sample_ids (np.ndarray): samples in the release order
+        rng: random generator
+        segments (float, optional): mean segments per sample. Defaults to 15.0.
+
+    Returns:
+        pd.DataFrame: seg file
+    """
+    ids, _ = _per_patient(sample_ids, 1 + rng.poisson(segments - 1, len(sample_ids)))
+    n_rows = len(ids)
+    start = rng.integers(1, 200000000, n_rows)
+    return pd.DataFrame(
+        {
+            "ID": ids,
+            "chrom": rng.integers(1, 23, n_rows),
+            "loc.start": start,
+            "loc.end": start + rng.integers(1000, 10000000, n_rows),
+            "num.mark": rng.integers(1, 5000, n_rows),
+            "seg.mean": np.round(rng.normal(0, 0.5, n_rows), 4),
+        }
+    )
+
+
+def make_sv(sample_ids: np.ndarray, rng, fraction: float = 0.25) -> pd.DataFrame:
+    """Structural variants of a fraction of the samples
+
+    Args:
+        sample_ids (np.ndarray): samples in the release order
+        rng: random generator
+        fraction (float, optional): fraction of samples with structural
+            variants. Defaults to 0.25.
+
+    Returns:
+        pd.DataFrame: SV file
+    """
+    counts = np.where(
+        rng.random(len(sample_ids)) < fraction, rng.integers(1, 3, len(sample_ids)), 0
+    )
+    ids, _ = _per_patient(sample_ids, counts)
+    n_rows = len(ids)
+    site1 = _choice(rng, GENES[:40], n_rows)
+    site2 = _choice(rng, GENES[:40], n_rows)
+    return pd.DataFrame(
+        {
+            "Sample_Id": ids,
+            "SV_Status": "SOMATIC",
+            "Site1_Hugo_Symbol": site1,
+            "Site1_Chromosome": rng.integers(1, 23, n_rows),
+            "Site1_Position": rng.integers(1, 200000000, n_rows),
+            "Site2_Hugo_Symbol": site2,
+            "Site2_Chromosome": rng.integers(1, 23, n_rows),
+            "Site2_Position": rng.integers(1, 200000000, n_rows),
+            "Class": _choice(rng, ["TRANSLOCATION", "DELETION", "INVERSION"], n_rows),
+            "Event_Info": [
+                f"{first}-{second} fusion" for first, second in zip(site1, site2)
+            ],
+            "NCBI_Build": "GRCh37",
+        }
+    )
+
+
+def make_genomic_information(rng) -> pd.DataFrame:
+    """Exons and introns of the genes on the panel of each assay"""
+    rows = []
+    for seq_assay_id, (genes, _) in ASSAYS.items():
+        for gene in GENES[:genes]:
+            chromosome = int(rng.integers(1, 23))
+            position = int(rng.integers(1, 200000000))
+            for _ in range(int(rng.integers(2, 9))):
+                rows.append(
+                    (
+                        chromosome,
+                        position,
+                        position + 150,
+                        gene,
+                        True,
+                        seq_assay_id,
+                        "exon",
+                    )
+                )
+                position += 1000
+            rows.append(
+                (
+                    chromosome,
+                    position,
+                    position + 500,
+                    None,
+                    False,
+                    seq_assay_id,
+                    "intron",
+                )
+            )
+    info = pd.DataFrame(
+        rows,
+        columns=[
+            "Chromosome",
+            "Start_Position",
+            "End_Position",
+            "Hugo_Symbol",
+            "includeInPanel",
+            "SEQ_ASSAY_ID",
+            "Feature_Type",
+        ],
+    )
+    info.insert(4, "ID", info["Hugo_Symbol"])
+    info["clinicalReported"] = info["includeInPanel"]
+    return info
+
+
+def make_assay_information() -> pd.DataFrame:
+    """Sequencing assays with their alteration types"""
+    return pd.DataFrame(
+        {
+            "SEQ_ASSAY_ID": list(ASSAYS),
+            "alteration_types": [types for _, types in ASSAYS.values()],
+            "is_paired_end": True,
+        }
+    )
+
+
+def make_retractions(
+    cptdf: pd.DataFrame, cohort: str, cohorts: list, rng, fraction: float = 0.005
+) -> Dict[str, pd.DataFrame]:
+    """Sample, patient and at release retractions of a fraction of the
+    cohort's samples and patients
+
+    Args:
+        cptdf (pd.DataFrame): cancer panel test dataset of the cohort
+        cohort (str): sponsored project
+        cohorts (list): sponsored projects with a retraction column
+        rng: random generator
+        fraction (float, optional): fraction retracted by each table.
+            Defaults to 0.005.
+
+    Returns:
+        Dict[str, pd.DataFrame]: "sample", "patient" and "release" tables
+    """
+    patients = cptdf["record_id"].unique()
+    retracted_samples = cptdf["cpt_genie_sample_id"][rng.random(len(cptdf)) < fraction]
+    retracted_patients = patients[rng.random(len(patients)) < fraction]
+    at_release = patients[rng.random(len(patients)) < fraction]
+    sampledf = pd.DataFrame({"SAMPLE_ID": retracted_samples.values})
+    patientdf = pd.DataFrame({"record_id": retracted_patients})
+    for retraction_cohort in cohorts:
+        sampledf[retraction_cohort] = retraction_cohort == cohort
+        patientdf[retraction_cohort] = retraction_cohort == cohort
+    releasedf = pd.DataFrame({"patient_id": at_release, "cohort": f"{cohort} 2.0"})
+    return {"sample": sampledf, "patient": patientdf, "release": releasedf}
+
+
+def _md5(path: str) -> str:
+    md5 = hashlib.md5()
+    with open(path, "rb") as file_f:
+        for block in iter(lambda: file_f.read(1 << 20), b""):
+            md5.update(block)
+    return md5.hexdigest()
+
+
+def write_synthetic(
+    out_dir: str,
+    patients: int,
+    cohort: str = "CRC",
+    seed: int = 0,
+    variants: float = 5.0,
+    cna_genes: int = 100,
+    mg_extra: float = 1.0,
+) -> Dict[str, int]:
+    """Write the synthetic inputs of an export of a cohort and their catalog
+
+    Args:
+        out_dir (str): directory of the inputs
+        patients (int): number of patients in the cohort
+        cohort (str, optional): BPC cohort, see BPC_COHORTS. Defaults to "CRC".
+        seed (int, optional): random seed. Defaults to 0.
+        variants (float, optional): mean variants per sample. Defaults to 5.0.
+        cna_genes (int, optional): genes of the CNA file. Defaults to 100.
+        mg_extra (float, optional): main GENIE samples of other patients per
+            cohort sample. Defaults to 1.0.
+
+    Returns:
+        Dict[str, int]: file name to number of rows
+    """
+    runner_class = BPC_MAPPING[cohort]
+    project = runner_class._SPONSORED_PROJECT
+    projects = sorted({BPC_MAPPING[name]._SPONSORED_PROJECT for name in BPC_COHORTS})
+    rng = np.random.default_rng(seed)
+    for folder in ["derived", "release", "tables", "oncotree"]:
+        os.makedirs(os.path.join(out_dir, folder), exist_ok=True)
+    rows = {}
+    entities = {}
+    tables = {}
+
+    def add_entity(synid: str, relative_path: str, parent: str = None):
+        path = os.path.join(out_dir, relative_path)
+        md5 = _md5(path)
+        entities[synid] = {
+            "name": os.path.basename(relative_path),
+            "path": relative_path,
+            "versionNumber": 1,
+            "md5": md5,
+            "etag": md5,
+            "parentId": parent,
+        }
+
+    def add_table(synid: str, df: pd.DataFrame, name: str):
+        relative_path = os.path.join("tables", f"{synid}.tsv")
+        df.to_csv(os.path.join(out_dir, relative_path), sep="\t", index=False)
+        tables[synid] = {"name": name, "path": relative_path}
+        rows[relative_path] = len(df)
+
+    datasets = make_derived_datasets(patients, project, seed=seed)
+    for label, df in datasets.items():
+        synid, file_name = DATASETS[label]
+        relative_path = os.path.join("derived", file_name)
+        df.to_csv(os.path.join(out_dir, relative_path), index=False)
+        add_entity(synid, relative_path)
+        rows[relative_path] = len(df)
+
+    mapping_synid = runner_class._REDCAP_TO_CBIOMAPPING_SYNID.split(".")[0]
+    add_table(mapping_synid, make_mapping(project, projects), "cBio mapping")
+    add_table(
+        runner_class._DATA_TABLE_IDS,
+        pd.DataFrame(
+            {
+                "id": [synid for synid, _ in DATASETS.values()],
+                "dataset": list(DATASETS),
+            }
+        ),
+        "Data tables",
+    )
+    add_table(runner_class._ASSAY_SYNID, make_assay_information(), "Assay information")
+    add_table(
+        runner_class._PRISSMM_SYNID,
+        pd.DataFrame(
+            {
+                "id": [PRISSMM_FOLDER_SYNID],
+                "name": [f"{project} PRISSMM documentation"],
+                "cohort": [project],
+            }
+        ),
+        "PRISSMM documentation",
+    )
+    retractions = make_retractions(datasets[CPT], project, projects, rng)
+    add_table(runner_class._sample_retraction_synid, retractions["sample"], "Samples")
+    add_table(
+        runner_class._patient_retraction_synid, retractions["patient"], "Patients"
+    )
+    add_table(
+        runner_class._retraction_at_release_synid,
+        retractions["release"],
+        "Retracted at release",
+    )
+
+    dictionary_path = os.path.join("tables", "data_dictionary.csv")
+    make_drug_dictionary().to_csv(os.path.join(out_dir, dictionary_path), index=False)
+    add_entity(DATA_DICTIONARY_SYNID, dictionary_path, parent=PRISSMM_FOLDER_SYNID)
+    entities[DATA_DICTIONARY_SYNID]["name"] = "Data Dictionary non-PHI"
+    entities[runner_class._GRS_SYNID] = {
+        **entities[DATA_DICTIONARY_SYNID],
+        "parentId": None,
+    }
+
+    # Main GENIE release of the cohort's samples and of other patients
+    release_dir = os.path.join(out_dir, "release")
+    samples = make_clinical_sample(datasets[CPT], rng, extra=mg_extra)
+    sample_ids = samples["SAMPLE_ID"].values
+    sample_path = os.path.join(release_dir, "data_clinical_sample.txt")
+    with open(sample_path, "w") as sample_f:
+        sample_f.write("#" + "\t".join(samples.columns) + "\n")
+        sample_f.write("#" + "\t".join(["STRING"] * len(samples.columns)) + "\n")
+        samples.to_csv(sample_f, sep="\t", index=False)
+    rows["release/data_clinical_sample.txt"] = len(samples)
+    genomic_files = {
+        "data_mutations_extended.txt": make_maf(sample_ids, rng, variants=variants),
+        "data_cna_hg19.seg": make_seg(sample_ids, rng),
+        "data_sv.txt": make_sv(sample_ids, rng),
+        "genomic_information.txt": make_genomic_information(rng),
+    }
+    for file_name, df in genomic_files.items():
+        df.to_csv(os.path.join(release_dir, file_name), sep="\t", index=False)
+        rows[f"release/{file_name}"] = len(df)
+    cna_assays = [
+        seq_assay_id for seq_assay_id, (_, types) in ASSAYS.items() if "cna" in types
+    ]
+    write_cna(
+        os.path.join(release_dir, "data_CNA.txt"),
+        sample_ids[samples["SEQ_ASSAY_ID"].isin(cna_assays).values],
+        rng,
+        genes=cna_genes,
+    )
+    rows["release/data_CNA.txt"] = cna_genes
+    release_synid = runner_class._MG_RELEASE_SYNID
+    for file_name, synid in RELEASE_FILES.items():
+        add_entity(synid, os.path.join("release", file_name), parent=release_synid)
+    release_etag = hashlib.md5(
+        "".join(entities[synid]["md5"] for synid in RELEASE_FILES.values()).encode()
+    ).hexdigest()
+    entities[release_synid] = {
+        "name": "synthetic-consortium",
+        "path": "release",
+        "versionNumber": 1,
+        "md5": None,
+        "etag": release_etag,
+        "parentId": None,
+    }
+    entities[PRISSMM_FOLDER_SYNID] = {
+        "name": f"{project} PRISSMM documentation",
+        "path": "tables",
+        "versionNumber": 1,
+        "md5": None,
+        "etag": "1",
+        "parentId": None,
+    }
+
+    snapshot = {
+        code: dict(
+            zip(
+                [
+                    "CANCER_TYPE",
+                    "CANCER_TYPE_DETAILED",
+                    "ONCOTREE_PRIMARY_NODE",
+                    "ONCOTREE_SECONDARY_NODE",
+                ],
+                values,
+            )
+        )
+        for code, values in ONCOTREE.items()
+    }
+    snapshot_path = os.path.join(
+        out_dir, "oncotree", f"{runner_class._ONCOTREE_VERSION}.json"
+    )
+    with open(snapshot_path, "w") as snapshot_f:
+        json.dump(snapshot, snapshot_f, indent=2, sort_keys=True)
+
+    with open(os.path.join(out_dir, CATALOG), "w") as catalog_f:
+        json.dump(
+            {
+                "cohort": cohort,
+                "patients": patients,
+                "seed": seed,
+                "entities": entities,
+                "tables": tables,
+            },
+            catalog_f,
+            indent=2,
+            sort_keys=True,
+        )
+    return rows
+
+
+def clear_process_caches() -> None:
+    """Forget the inputs that exports share within the process, which are
+    keyed by Synapse ID, so that the next export reads its inputs again"""
+    shared.clear()
+    for registry in [folder_index._registry, retraction._registry, oncotree._registry]:
+        registry.clear()
+    genomic._indexes.clear()
+
+
+class _TableQueryResult:
+    def __init__(self, path: str, etag: str):
+        self.filepath = path
+        self.etag = etag
+
+    def asDataFrame(self) -> pd.DataFrame:
+        return pd.read_csv(self.filepath, sep="\t")
+
+
+class SyntheticSynapse:
+    """Synapse client that serves the inputs written by `write_synthetic`.
+    Table queries return every row of the queried table.
+
+    Args:
+        data_dir (str): directory of the inputs
+    """
+
+    _TABLE_PATTERN = re.compile(r"\bfrom\s+(syn\d+)", re.IGNORECASE)
+
+    def __init__(self, data_dir: str):
+        self.data_dir = data_dir
+        with open(os.path.join(data_dir, CATALOG)) as catalog_f:
+            catalog = json.load(catalog_f)
+        self.entities = catalog["entities"]
+        self.tables = catalog["tables"]
+
+    def _entity(self, synid: str) -> SimpleNamespace:
+        synid = synid.split(".")[0]
+        if synid in self.tables:
+            table = self.tables[synid]
+            path = os.path.join(self.data_dir, table["path"])
+            return SimpleNamespace(
+                id=synid, name=table["name"], versionNumber=1, etag=_md5(path)
+            )
+        try:
+            entity = self.entities[synid]
+        except KeyError:
+            raise ValueError(f"{synid} isn't in the synthetic inputs")
+        return SimpleNamespace(
+            id=synid,
+            path=os.path.join(self.data_dir, entity["path"]),
+            **{key: value for key, value in entity.items() if key != "path"},
+        )
+
+    def get(self, synid: str, downloadFile: bool = True, **kwargs) -> SimpleNamespace:
+        return self._entity(synid)
+
+    def getChildren(self, parent: str, **kwargs) -> Iterator[dict]:
+        for synid, entity in self.entities.items():
+            if entity["parentId"] == parent:
+                yield {
+                    "name": entity["name"],
+                    "id": synid,
+                    "versionNumber": entity["versionNumber"],
+                }
+
+    def tableQuery(self, query: str, **kwargs) -> _TableQueryResult:
+        match = self._TABLE_PATTERN.search(query)
+        if match is None or match.group(1) not in self.tables:
+            raise ValueError(f"no synthetic table for query: {query}")
+        path = os.path.join(self.data_dir, self.tables[match.group(1)]["path"])
+        return _TableQueryResult(path, _md5(path))
+
+    def store(self, obj, **kwargs):
+        raise NotImplementedError("synthetic inputs can't be uploaded to")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--cohort", default="CRC", choices=BPC_COHORTS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--variants", type=float, default=5.0)
+    parser.add_argument("--cna-genes", type=int, default=100)
+    parser.add_argument(
+        "--mg-extra",
+        type=float,
+        default=1.0,
+        help="main GENIE samples of other patients per cohort sample",
+    )
+    parser.add_argument("--out", required=True)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    rows = write_synthetic(
+        args.out,
+        args.patients,
+        cohort=args.cohort,
+        seed=args.seed,
+        variants=args.variants,
+        cna_genes=args.cna_genes,
+        mg_extra=args.mg_extra,
+    )
+    for path, count in sorted(rows.items()):
+        print(f"{path:45} {count:>10} rows")
+    print(f"wrote {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
 """GENIE SP/BPC cBioPortal exporter CLI"""
 
 import argparse
+import inspect
 import logging
+import sys
+from typing import Any, Dict, List
 
 import synapseclient
 
@@ -17,6 +20,8 @@ from .bpc_config import (
     Melanoma,
     Esophago,
 )
+from .batch import run_cohorts
+from .bpc_redcap_export_mapping import BpcProjectRunner
 from .sp_config import Akt1, Erbb2, Fgfr4
 
 BPC_MAPPING = {
@@ -34,6 +39,49 @@ BPC_MAPPING = {
     "MELANOMA": Melanoma,
     "ESOPHAGO": Esophago,
 }
+# Cohorts exported by `geniesp ALL`
+BPC_COHORTS = [
+    "BLADDER",
+    "BrCa",
+    "CRC",
+    "ESOPHAGO",
+    "MELANOMA",
+    "NSCLC",
+    "OVARIAN",
+    "PANC",
+    "Prostate",
+    "RENAL",
+]
+
+
+def parse_cohorts(value: str) -> List[str]:
+    """Parse the cohort argument: a cohort, a comma separated list of
+    cohorts or ALL for all BPC cohorts"""
+    if value == "ALL":
+        return list(BPC_COHORTS)
+    cohorts = [cohort.strip() for cohort in value.split(",") if cohort.strip()]
+    invalid = [cohort for cohort in cohorts if cohort not in BPC_MAPPING]
+    if not cohorts or invalid:
+        raise argparse.ArgumentTypeError(
+            f"invalid cohort: {', '.join(invalid) or value!r} "
+            f"(choose from {', '.join(BPC_MAPPING)}, or ALL)"
+        )
+    return cohorts
+
+
+def runner_kwargs(runner_class: type, options: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep the options that the constructor of a runner class accepts. The
+    legacy sponsored project runners only take staging, export and profile.
+
+    Args:
+        runner_class (type): BPC or sponsored project runner class
+        options (Dict[str, Any]): constructor options of all runner classes
+
+    Returns:
+        Dict[str, Any]: options of the runner class
+    """
+    parameters = inspect.signature(runner_class.__init__).parameters
+    return {name: value for name, value in options.items() if name in parameters}
 
 
 def main():
@@ -41,9 +89,9 @@ def main():
     parser = argparse.ArgumentParser(description="Run GENIE sponsored projects")
     parser.add_argument(
         "sp",
-        type=str,
-        help="Specify sponsored project to run",
-        choices=BPC_MAPPING.keys(),
+        type=parse_cohorts,
+        help="Specify sponsored project to run, a comma separated list of "
+        f"them or ALL for all BPC cohorts. Choices: {', '.join(BPC_MAPPING)}",
     )
 
     parser.add_argument("release", type=str, help="Specify bpc release")
@@ -75,8 +123,90 @@ def main():
         action="store_true",
         help="Whether to use grs or use dd as primary mapping.",
     )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        help="Directory of the local columnar cache of derived variable "
+        "tables. Defaults to $GENIESP_CACHE_DIR, caching is disabled if unset.",
+    )
+    parser.add_argument(
+        "--cache-max-gb",
+        type=float,
+        help="Evict least recently used cached tables above this size. "
+        "Default: no limit.",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        help="Number of export stages to run in parallel. Default: 1.",
+    )
+    parser.add_argument(
+        "--resume",
+        "--incremental",
+        action="store_true",
+        help="Keep files of the last export and only rebuild the files whose "
+        "inputs changed, according to the export manifest. Default: false.",
+    )
+    parser.add_argument(
+        "--upload-workers",
+        type=int,
+        default=4,
+        help="Number of threads that upload files to Synapse while the "
+        "export runs. Default: 4.",
+    )
+    parser.add_argument(
+        "--force-upload",
+        action="store_true",
+        help="Upload files even if they are identical to the files already in "
+        "the release folder. Default: false.",
+    )
+    parser.add_argument(
+        "--maf-workers",
+        type=int,
+        default=1,
+        help="Number of processes that subset the main GENIE MAF. Default: 1.",
+    )
+    parser.add_argument(
+        "--maf-chunk-mb",
+        type=float,
+        default=64,
+        help="Size of the MAF byte ranges subset by each process, which each "
+        "hold one range in memory. Default: 64.",
+    )
+    parser.add_argument(
+        "--cohort-jobs",
+        type=int,
+        default=1,
+        help="Number of cohorts exported in parallel when exporting several "
+        "cohorts. Default: 1.",
+    )
+    parser.add_argument(
+        "--oncotree-offline",
+        action="store_true",
+        help="Read the oncotree from its snapshot in the cache directory "
+        "instead of downloading it. Default: false.",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Profile the CPU time and memory of each export stage and write "
+        "<cohort>_profile.json and <cohort>_profile.collapsed. Default: false.",
+    )
     args = parser.parse_args()
 
+    legacy = [
+        cohort
+        for cohort in args.sp
+        if not issubclass(BPC_MAPPING[cohort], BpcProjectRunner)
+    ]
+    if len(args.sp) > 1 and legacy:
+        parser.error(
+            f"{', '.join(legacy)} can't be exported with other cohorts, "
+            "only BPC cohorts are exported in batches"
+        )
+
     numeric_level = getattr(logging, args.log.upper(), None)
     if not isinstance(numeric_level, int):
         raise ValueError("Invalid log level: %s" % args.log)
@@ -89,14 +219,38 @@ def main():
     else:
         cbiopath = args.cbioportal
 
-    BPC_MAPPING[args.sp](
-        syn,
-        cbiopath,
+    options = dict(
         release=args.release,
         upload=args.upload,
         production=args.production,
         use_grs=args.use_grs,
-    ).run()
+        cache_dir=args.cache_dir,
+        cache_max_bytes=None
+        if args.cache_max_gb is None
+        else int(args.cache_max_gb * 1024**3),
+        jobs=args.jobs,
+        resume=args.resume,
+        upload_workers=args.upload_workers,
+        force_upload=args.force_upload,
+        maf_workers=args.maf_workers,
+        maf_chunk_bytes=int(args.maf_chunk_mb * 1024**2),
+        oncotree_offline=args.oncotree_offline,
+        profile=args.profile,
+        # Legacy sponsored project runners store their files unless staging
+        staging=not args.upload,
+    )
+    runners = [
+        BPC_MAPPING[cohort](
+            syn, cbiopath, **runner_kwargs(BPC_MAPPING[cohort], options)
+        )
+        for cohort in args.sp
+    ]
+    if len(runners) == 1:
+        runners[0].run()
+    else:
+        summary = run_cohorts(runners, cohort_jobs=args.cohort_jobs)
+        if any(result["status"] == "failed" for result in summary.values()):
+            sys.exit(1)
 
 
 if __name__ == "__main__":
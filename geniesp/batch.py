@@ -0,0 +1,144 @@
+"""Export of several BPC cohorts in one process
+
+Cohorts share the inputs that are the same for all of them: the main GENIE
+release files and folder listing, the retraction tables, the mapping
+table, the assay information and the oncotree mappings. The genomic files
+of all cohorts are subset with one read of each main GENIE release file.
+A cohort that fails doesn't stop the others.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+from typing import Dict, List
+
+from .bpc_redcap_export_mapping import BpcProjectRunner, fan_out_genomic_files
+
+
+class CohortExport:
+    """State of the export of one cohort in a batch
+
+    Args:
+        runner (BpcProjectRunner): cohort runner
+    """
+
+    def __init__(self, runner: BpcProjectRunner):
+        self.runner = runner
+        self.cohort = runner._SPONSORED_PROJECT
+        self.scheduler = None
+        # stage name -> output of the stages that ran
+        self.results = {}
+        self.error = None
+        self.seconds = 0.0
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def run_stages(self, targets: List[str] = None) -> None:
+        """Run export stages, recording the error of a failed stage
+
+        Args:
+            targets (List[str], optional): stages to run with the stages they
+                depend on. Defaults to None, which runs the remaining stages.
+        """
+        if self.failed:
+            return
+        start = time.perf_counter()
+        try:
+            if self.scheduler is None:
+                self.scheduler = self.runner.start_export()
+            self.results = self.scheduler.run(targets=targets, done=self.results)
+        except Exception as err:
+            logging.exception(f"{self.cohort} export failed")
+            self.error = err
+        finally:
+            self.seconds += time.perf_counter() - start
+
+    def finish(self) -> None:
+        if self.scheduler is None:
+            return
+        try:
+            self.runner.finish_export(self.scheduler)
+        except Exception as err:
+            logging.exception(f"{self.cohort} export failed")
+            if self.error is None:
+                self.error = err
+
+
+def _fan_out(exports: List[CohortExport]) -> None:
+    """Subset the genomic files of the cohorts that share a main GENIE
+    release with one read of each release file. The cohorts subset their
+    own files if this fails."""
+    by_release = {}
+    for export in exports:
+        if not export.failed:
+            by_release.setdefault(export.runner._MG_RELEASE_SYNID, []).append(export)
+    for release_exports in by_release.values():
+        if len(release_exports) < 2:
+            continue
+        try:
+            fan_out_genomic_files(
+                [export.runner for export in release_exports],
+                {
+                    export.cohort: export.results["sample_ids"]
+                    for export in release_exports
+                },
+            )
+        except Exception:
+            logging.exception(
+                "unable to subset genomic files for all cohorts at once, "
+                "each cohort will subset its own"
+            )
+
+
+def run_cohorts(
+    runners: List[BpcProjectRunner], cohort_jobs: int = 1
+) -> Dict[str, Dict]:
+    """Export several cohorts. The clinical sample lists of all cohorts
+    are created first, then the genomic files of all cohorts are subset
+    together and the remaining stages of each cohort run.
+
+    Args:
+        runners (List[BpcProjectRunner]): cohort runners
+        cohort_jobs (int, optional): number of cohorts exported in parallel.
+            Defaults to 1.
+
+    Returns:
+        Dict[str, Dict]: cohort to "status" (succeeded or failed), "seconds"
+        and "error"
+    """
+    exports = [CohortExport(runner) for runner in runners]
+    with ThreadPoolExecutor(max_workers=max(cohort_jobs, 1)) as executor:
+        list(executor.map(lambda export: export.run_stages(["sample_ids"]), exports))
+        _fan_out(exports)
+        list(executor.map(lambda export: export.run_stages(), exports))
+    for export in exports:
+        export.finish()
+    summary = {
+        export.cohort: {
+            "status": "failed" if export.failed else "succeeded",
+            "seconds": round(export.seconds, 3),
+            "error": None if export.error is None else repr(export.error),
+        }
+        for export in exports
+    }
+    log_summary(summary)
+    return summary
+
+
+def log_summary(summary: Dict[str, Dict]) -> None:
+    """Log the status of each cohort of a batch
+
+    Args:
+        summary (Dict[str, Dict]): see `run_cohorts`
+    """
+    for cohort, result in summary.items():
+        message = f"{cohort}: {result['status']} in {result['seconds']:.1f}s"
+        if result["error"] is not None:
+            message += f" ({result['error']})"
+        logging.info(message)
+    failed = [cohort for cohort, result in summary.items() if result["error"]]
+    logging.info(
+        f"{len(summary) - len(failed)} of {len(summary)} cohorts succeeded"
+        + (f", failed: {', '.join(failed)}" if failed else "")
+    )
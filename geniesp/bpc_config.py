@@ -7,6 +7,7 @@ class Brca(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "BrCa"
+    _skip_stages = ["timeline_treatment_rt", "timeline_performance"]
     _exclude_files = ["data_timeline_performance_status.txt"]
 
 
@@ -23,6 +24,7 @@ class Nsclc(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "NSCLC"
+    _skip_stages = ["timeline_labtest"]
     _exclude_files = ["data_timeline_labtest.txt"]
 
 
@@ -39,6 +41,7 @@ class Panc(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "PANC"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = ["data_timeline_performance_status.txt"]
 
 
@@ -47,6 +50,7 @@ class Prostate(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "Prostate"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = ["data_timeline_performance_status.txt"]
 
 
@@ -55,6 +59,7 @@ class Bladder(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "BLADDER"
+    _skip_stages = ["timeline_labtest"]
     _exclude_files = ["data_timeline_labtest.txt"]
     
     
@@ -63,6 +68,7 @@ class Renal(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "RENAL"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = []
     
 
@@ -71,6 +77,7 @@ class Ovarian(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "OVARIAN"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = []
     
 
@@ -79,6 +86,7 @@ class Melanoma(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "MELANOMA"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = []
     
     
@@ -87,4 +95,5 @@ class Esophago(BpcProjectRunner):
 
     # Sponsored project name
     _SPONSORED_PROJECT = "ESOPHAGO"
+    _skip_stages = ["timeline_performance"]
     _exclude_files = []
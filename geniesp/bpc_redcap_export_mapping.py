@@ -9,19 +9,50 @@
 """
 from abc import ABCMeta
 from datetime import date
-from functools import cached_property
-import math
+from functools import cached_property, partial
 import os
+import re
 import subprocess
 import logging
-from typing import Dict, List
+import threading
+from typing import Any, Callable, Dict, List, Optional
 
-from genie import create_case_lists, process_functions
+from genie import create_case_lists
 import numpy as np
 import pandas as pd
 from synapseclient import File, Folder, Synapse
 
-from . import metafiles
+from . import metafiles, metrics
+from .dataset_cache import ColumnProjection, DerivedDatasetCache, plan_dataset_columns
+from .dates import convert_days, day_units
+from .folder_index import get_folder_index
+from .genomic import (
+    SampleRangeIndex,
+    count_file_rows,
+    fan_out_cna,
+    fan_out_maf,
+    fan_out_rows,
+    get_sample_index,
+    subset_cna,
+    subset_maf,
+    subset_rows,
+)
+from .manifest import ExportManifest, hash_value
+from .oncotree import get_oncotree
+from .profiling import StageProfiler, profile_paths
+from .retraction import RetractionTables, get_retraction_tables
+from .shared import get_shared
+from .stages import Stage, StageScheduler
+from .table_cache import ColumnarTableCache, get_cache_dir
+from .upload import UploadQueue
+from .writers import write_tsv_file
+
+# Columns of a REDCap global response set or data dictionary used to map
+# drug names to NCIT codes
+DRUG_DICTIONARY_COLUMNS = [
+    "Variable / Field Name",
+    "Choices, Calculations, OR Slider Labels",
+]
 
 # All cbioportal file formats written in BPC
 CBIO_FILEFORMATS_ALL = [
@@ -47,7 +78,11 @@ CBIO_FILEFORMATS_ALL = [
 ]
 
 def get_file_data(
-    syn: Synapse, mappingdf: pd.DataFrame, sampletype: str, cohort: str = "NSCLC"
+    syn: Synapse,
+    mappingdf: pd.DataFrame,
+    sampletype: str,
+    cohort: str = "NSCLC",
+    dataset_cache: DerivedDatasetCache = None,
 ) -> dict:
     """Extracts the sample, patient and timeline data frame
 
@@ -56,6 +91,8 @@ def get_file_data(
         mappingdf (pd.DataFrame): Mapping dataframe
         sampletype (str): sample type label
         cohort (str, optional): cohort label. Defaults to "NSCLC".
+        dataset_cache (DerivedDatasetCache, optional): cache of parsed derived
+            variable datasets. Defaults to None, which parses every dataset.
 
     Returns:
         dict: dictionary with two keys ('df' and 'used') corresponding to data frame
@@ -67,12 +104,12 @@ def get_file_data(
     datasets = mappingdf.groupby("dataset")
     finaldf = pd.DataFrame()
     used_entities = []
+    if dataset_cache is None:
+        dataset_cache = DerivedDatasetCache(syn, cohort)
 
     for _, df in datasets:
         # Get synapse id
         synid = df["id"].unique()[0]
-        table = syn.get(synid)
-        used_entities.append(f"{synid}.{table.versionNumber}")
         # obtain columns to subset df
         cols = df["code"][df["sampleType"] == sampletype]
         cols = cols.tolist()
@@ -85,8 +122,10 @@ def get_file_data(
         if sampletype == "SAMPLE":
             cols.append("path_proc_number")
         # Only get specific cohort and subset cols
-        tabledf = pd.read_csv(table.path, low_memory=False)
-        tabledf = tabledf[tabledf["cohort_internal"] == cohort]
+        tabledf, used_entity = dataset_cache.get(
+            synid, columns=ColumnProjection(cols)
+        )
+        used_entities.append(used_entity)
         tabledf = tabledf[cols]
         # Append to final dataframe if empty
         if finaldf.empty:
@@ -156,45 +195,19 @@ def fill_cancer_dx_start_date(finaldf: pd.DataFrame) -> pd.DataFrame:
     return finaldf
 
 
-def configure_mafdf(mafdf: pd.DataFrame, keep_samples: list) -> pd.DataFrame:
-    """Configures a maf dataframe
+def drop_null_start_dates(df: pd.DataFrame) -> pd.DataFrame:
+    """Remove timeline events without a START_DATE, counting them in the
+    rows_dropped_null_start metric
 
     Args:
-        mafdf (pd.DataFrame): Chunk of maf dataframe
-        keep_samples (list):  Samples to keep in the maf file
+        df (pd.DataFrame): timeline
 
     Returns:
-        pd.DataFrame: Configured maf dataframe
+        pd.DataFrame: timeline events with a START_DATE
     """
-    keep_mafdf = mafdf[mafdf["Tumor_Sample_Barcode"].isin(keep_samples.tolist())]
-    if not keep_mafdf.empty:
-        fillnas = [
-            "t_depth",
-            "t_ref_count",
-            "t_alt_count",
-            "n_depth",
-            "n_ref_count",
-            "n_alt_count",
-        ]
-        for col in fillnas:
-            keep_mafdf[col].loc[keep_mafdf[col] == "."] = ""
-        keep_mafdf["Validation_Status"] = ""
-    return keep_mafdf
-
-
-def change_days_to_years(days: int) -> float:
-    """Convert days into years.
-
-    Args:
-        days (int): number of days
-
-    Returns:
-        int: number of years or nan, if applicable
-    """
-    if math.isnan(days):
-        return float("nan")
-    else:
-        return math.floor(days / 365.25)
+    null_start = df["START_DATE"].isnull()
+    metrics.add("rows_dropped_null_start", int(null_start.sum()))
+    return df[~null_start]
 
 
 def _get_synid_dd(syn: Synapse, cohort: str, synid_table_prissmm: str) -> str:
@@ -222,14 +235,35 @@ def _get_synid_dd(syn: Synapse, cohort: str, synid_table_prissmm: str) -> str:
     return None
 
 
+def read_drug_dictionary(path: str) -> pd.DataFrame:
+    """Reads the drug variables of a REDCap global response set (grs) or
+    data dictionary (dd). Only the variable name and choices columns are
+    parsed and only the drugs_drug_* rows are kept.
+
+    Args:
+        path (str): path to the grs or dd file
+
+    Returns:
+        pd.DataFrame: drug variables and their choices
+    """
+    mapping = pd.read_csv(
+        path,
+        encoding="unicode_escape",
+        low_memory=False,
+        usecols=DRUG_DICTIONARY_COLUMNS,
+    )
+    is_drug = mapping["Variable / Field Name"].str.startswith("drugs_drug_", na=False)
+    return mapping[is_drug]
+
+
 def get_mapping_data(
     syn : Synapse, 
     synid_file_grs: str, 
     synid_file_dd: str, 
     use_grs : bool
     ) -> pd.DataFrame:
-    """Reads in the global response set (grs) or data dictionary (dd) depending
-    on if we are using GRS or not
+    """Reads in the drug variables of the global response set (grs) or data
+    dictionary (dd) depending on if we are using GRS or not
 
     Args:
         syn (Synapse): synapse client connection
@@ -238,16 +272,12 @@ def get_mapping_data(
         use_grs (bool): Whether to use GRS or not
 
     Returns:
-        pd.DataFrame: retrieved grs or dd data
+        pd.DataFrame: retrieved grs or dd drug variables
     """
     if use_grs:
-        mapping = pd.read_csv(
-            syn.get(synid_file_grs).path, encoding="unicode_escape", low_memory=False
-        )
+        mapping = read_drug_dictionary(syn.get(synid_file_grs).path)
     else:
-        mapping = pd.read_csv(
-            syn.get(synid_file_dd).path, encoding="unicode_escape", low_memory=False
-            )
+        mapping = read_drug_dictionary(syn.get(synid_file_dd).path)
     return mapping
 
 
@@ -354,6 +384,70 @@ def get_regimen_abbr(regimen: str, mapping: dict) -> str:
     return abbr
 
 
+def stack_drug_columns(
+    df: pd.DataFrame, wildcard_infodf: pd.DataFrame, id_vars: List[str]
+) -> pd.DataFrame:
+    """Reshape the numbered drug columns of a regimen dataset into one row
+    per regimen and drug number. The columns of a wildcard code, such as
+    drugs_startdt_int_1 to drugs_startdt_int_5 for drugs_startdt_int_*, are
+    matched on their drug number, so drugs missing a column get a missing
+    value.
+
+    Args:
+        df (pd.DataFrame): regimen dataset
+        wildcard_infodf (pd.DataFrame): cBio mapping info of the wildcard
+            codes, with code and cbio columns
+        id_vars (List[str]): regimen columns repeated for each drug
+
+    Returns:
+        pd.DataFrame: id_vars and a column per wildcard code named by its
+        cbio column, ordered by drug number and regimen
+    """
+    df = df.reset_index(drop=True)
+    # (cbio column, drug number) -> dataset column
+    drug_columns = {}
+    for code, cbio in zip(wildcard_infodf["code"], wildcard_infodf["cbio"]):
+        pattern = re.compile(re.escape(code).replace(r"\*", r"(\d+)"))
+        for column in df.columns:
+            match = pattern.fullmatch(column)
+            if match:
+                drug_columns[(cbio, int(match.group(1)))] = column
+    wide = df[list(drug_columns.values())]
+    wide.columns = pd.MultiIndex.from_tuples(
+        list(drug_columns), names=["cbio", "drug_number"]
+    )
+    stacked = wide.stack("drug_number", dropna=False)
+    rows = stacked.index.get_level_values(0)
+    # stack orders rows by regimen, then drug number
+    order = np.lexsort((rows, stacked.index.get_level_values("drug_number")))
+    stacked = stacked.iloc[order]
+    rows = rows[order]
+    stackeddf = df.loc[rows, id_vars].reset_index(drop=True)
+    for cbio in dict.fromkeys(wildcard_infodf["cbio"]):
+        stackeddf[cbio] = stacked[cbio].to_numpy()
+    return stackeddf
+
+
+def clean_agents(agents: pd.Series) -> pd.Series:
+    """Shorten treatment agents to the text before the first parenthesis
+    or, without parenthesis, before the first comma. Timelines repeat few
+    agents, so each distinct agent is only shortened once.
+
+    Args:
+        agents (pd.Series): agents, without missing values
+
+    Returns:
+        pd.Series: shortened agents
+    """
+    codes, uniques = pd.factorize(agents)
+    uniques = pd.Series(uniques, dtype=object)
+    has_parenthesis = uniques.str.contains("(", regex=False)
+    before_parenthesis = uniques.str.split("(", n=1).str[0]
+    before_comma = uniques.str.split(",", n=1).str[0]
+    shortened = before_parenthesis.where(has_parenthesis, before_comma).str.strip()
+    return pd.Series(shortened.to_numpy()[codes], index=agents.index)
+
+
 def get_git_sha() -> str:
     """get git sha digest"""
     text = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True)
@@ -366,6 +460,7 @@ def create_regimens(
     mapping: dict,
     top_x_regimens: int = 5,
     cohort: str = "NSCLC",
+    dataset_cache: DerivedDatasetCache = None,
 ) -> dict:
     """Create regimens to merge into the patient file.
 
@@ -376,17 +471,27 @@ def create_regimens(
                 corresponding NCIT drug code
         top_x_regimens (int, optional): number of regimens to catalog. Defaults to 5.
         cohort (str, optional): cohort label. Defaults to "NSCLC".
+        dataset_cache (DerivedDatasetCache, optional): cache of parsed derived
+            variable datasets. Defaults to None, which parses the regimen dataset.
 
     Returns:
-        dict: dictionary with three keys ('df', 'used', 'info')
+        dict: dictionary with four keys ('df', 'used', 'info' and
+        'used_entities', the versioned Synapse IDs that were read)
     """
 
     regimen_synid = regimen_infodf["id"].unique()[0]
     regimens_to_exclude = ["Investigational Drug"]
-    regimen_ent = syn.get(regimen_synid)
-    regimendf = pd.read_csv(regimen_ent.path, low_memory=False)
+    if dataset_cache is None:
+        dataset_cache = DerivedDatasetCache(syn, cohort)
     # Get only NSCLC cohort
-    regimendf = regimendf[regimendf["cohort_internal"] == cohort]
+    regimendf, used_entity = dataset_cache.get(
+        regimen_synid,
+        columns=ColumnProjection.from_codes(regimen_infodf["code"]).union(
+            ColumnProjection(
+                ["record_id", "redcap_ca_index", "regimen_drugs", "regimen_number"]
+            )
+        ),
+    )
     # Use redcap_ca_index == Yes
     regimendf = regimendf[regimendf["redcap_ca_index"] == "Yes"]
     # Exclude regimens
@@ -406,41 +511,73 @@ def create_regimens(
     to_include_regimens = count_of_regimens[:top_x_regimens].index.tolist()
 
     subset_regimendf = regimendf[regimendf["regimen_drugs"].isin(to_include_regimens)]
-    regimen_groups = subset_regimendf.groupby("regimen_drugs")
-    new_regimen_info = pd.DataFrame()
-    # Create regimen clinical headers
-    final_regimendf = pd.DataFrame()
-    for regimen, df in regimen_groups:
-        regimen_drug_info = regimen_infodf.copy()
-        # Create regimen drug abbreviations
-        regimen_abbr = get_regimen_abbr(regimen, mapping)
-
-        # Create correct column mappings for the clinical patient file
-        regimen_drug_info["cbio"] = [
-            value.format(regimen_abbr=regimen_abbr) for value in regimen_infodf["cbio"]
-        ]
-        regimen_drug_info["labels"] = [
-            value.format(regimen=regimen) for value in regimen_infodf["labels"]
-        ]
-        regimen_drug_info["description"] = [
-            value.format(regimen=regimen) for value in regimen_infodf["description"]
-        ]
-        regimen_drug_info["priority"] = [
-            int(value) for value in regimen_infodf["priority"]
+    if subset_regimendf.empty:
+        return {
+            "df": pd.DataFrame(),
+            "info": pd.DataFrame(),
+            "used": regimen_synid,
+            "used_entities": [used_entity],
+        }
+    regimens = sorted(to_include_regimens)
+    regimen_abbrs = [get_regimen_abbr(regimen, mapping) for regimen in regimens]
+    # cBioPortal column template of each regimen variable
+    code_to_cbio = dict(zip(regimen_infodf.index, regimen_infodf["cbio"]))
+    codes = list(code_to_cbio)
+
+    # Create regimen clinical headers, one block of regimen variables
+    # per regimen
+    new_regimen_info = regimen_infodf.iloc[
+        np.tile(np.arange(len(regimen_infodf)), len(regimens))
+    ].copy()
+    block_regimens = np.repeat(regimens, len(regimen_infodf))
+    block_abbrs = np.repeat(regimen_abbrs, len(regimen_infodf))
+    new_regimen_info["cbio"] = [
+        value.format(regimen_abbr=regimen_abbr)
+        for value, regimen_abbr in zip(new_regimen_info["cbio"], block_abbrs)
+    ]
+    for column in ["labels", "description"]:
+        new_regimen_info[column] = [
+            value.format(regimen=regimen)
+            for value, regimen in zip(new_regimen_info[column], block_regimens)
         ]
-        new_regimen_info = pd.concat([new_regimen_info, regimen_drug_info])
-
-        col_map = regimen_drug_info["cbio"].to_dict()
-        col_map["record_id"] = "PATIENT_ID"
-        regimen_patientdf = df[list(col_map.keys())].rename(columns=col_map)
-        # Merge final regimen dataframe
-        if final_regimendf.empty:
-            final_regimendf = regimen_patientdf
-        else:
-            final_regimendf = final_regimendf.merge(
-                regimen_patientdf, on="PATIENT_ID", how="outer"
-            )
-    return {"df": final_regimendf, "info": new_regimen_info, "used": regimen_synid}
+    new_regimen_info["priority"] = new_regimen_info["priority"].astype(int)
+
+    # One row per patient with the regimen variables of each regimen.
+    # Each patient has at most one row per regimen after removing duplicates
+    final_regimendf = (
+        subset_regimendf.set_index(["record_id", "regimen_drugs"])[codes]
+        .unstack("regimen_drugs")
+        .reindex(
+            columns=[(code, regimen) for regimen in regimens for code in codes]
+        )
+    )
+    # unstack upcasts whole blocks, so the columns of regimens that all
+    # patients had get their dtype back
+    complete = final_regimendf.notna().all()
+    final_regimendf = final_regimendf.astype(
+        {
+            (code, regimen): subset_regimendf[code].dtype
+            for code, regimen in complete.index[complete]
+        }
+    )
+    final_regimendf.columns = [
+        code_to_cbio[code].format(regimen_abbr=regimen_abbr)
+        for regimen_abbr in regimen_abbrs
+        for code in codes
+    ]
+    # Patients in order of their first row, by regimen
+    patient_order = subset_regimendf.sort_values(
+        "regimen_drugs", kind="mergesort"
+    )["record_id"].unique()
+    final_regimendf = final_regimendf.loc[patient_order]
+    final_regimendf.index.name = "PATIENT_ID"
+    final_regimendf = final_regimendf.reset_index()
+    return {
+        "df": final_regimendf,
+        "info": new_regimen_info,
+        "used": regimen_synid,
+        "used_entities": [used_entity],
+    }
 
 
 def get_bpc_to_cbio_mapping_df(
@@ -448,6 +585,7 @@ def get_bpc_to_cbio_mapping_df(
 ) -> pd.DataFrame:
     """Extract relevant portions of the mapping table for the sponsored project
     variables and cBioPortal variable mappings and return as a data frame.
+    The mapping table is queried once for all cohorts.
 
     Args:
         syn (Synapse): Synapse connection
@@ -458,12 +596,15 @@ def get_bpc_to_cbio_mapping_df(
         pd.DataFrame: data frame of all mapping columns for released variables
     """
     # cohort = cohort.replace("2", "")
-    redcap_to_cbiomapping = syn.tableQuery(
-        f"SELECT * FROM {synid_table_cbio} where "
-        f"{cohort} is true AND sampleType <> 'TIMELINE-STATUS'"
+    redcap_to_cbiomappingdf = get_shared(
+        ("mapping_table", synid_table_cbio),
+        lambda: syn.tableQuery(
+            f"SELECT * FROM {synid_table_cbio} where "
+            "sampleType <> 'TIMELINE-STATUS'"
+        ).asDataFrame(),
     )
-    redcap_to_cbiomappingdf = redcap_to_cbiomapping.asDataFrame()
-    return redcap_to_cbiomappingdf
+    released = redcap_to_cbiomappingdf[cohort].fillna(False).astype(bool)
+    return redcap_to_cbiomappingdf[released].copy()
 
 
 def get_data_file_synapse_id_df(syn: Synapse, synid_table_files: str) -> pd.DataFrame:
@@ -476,20 +617,26 @@ def get_data_file_synapse_id_df(syn: Synapse, synid_table_files: str) -> pd.Data
     Returns:
         pd.DataFrame: data frame with two columns representing the Synapse ID and dataset label
     """
-    data_tables = syn.tableQuery(f"SELECT id, dataset FROM {synid_table_files} ")
-    data_tablesdf = data_tables.asDataFrame()
-    return data_tablesdf
+    data_tablesdf = get_shared(
+        ("data_tables", synid_table_files),
+        lambda: syn.tableQuery(
+            f"SELECT id, dataset FROM {synid_table_files} "
+        ).asDataFrame(),
+    )
+    return data_tablesdf.copy()
 
 
-def create_release_folders(cohort: str) -> None:
+def create_release_folders(cohort: str, clean: bool = True) -> None:
     """Create local folders for release folders.
 
     Args:
         cohort (str): sponsored project label
+        clean (bool, optional): Whether to remove files of earlier exports.
+            Defaults to True.
     """
     if not os.path.exists(cohort):
         os.mkdir(cohort)
-    else:
+    elif clean:
         filelists = os.listdir(cohort)
         for each_file in filelists:
             if each_file != "case_lists":
@@ -620,6 +767,26 @@ class BpcProjectRunner(metaclass=ABCMeta):
     # _temporary_patient_retraction_synid = "syn29266682"
     # main GENIE assay information table
     _ASSAY_SYNID = "syn17009222"
+    # oncotree version of the cancer types of the samples
+    # TODO: need to update oncotree version for 11.0 public
+    _ONCOTREE_VERSION = "oncotree_2018_06_01"
+    # Unit of the day columns of the sample file, by pattern of the cbio name
+    _SAMPLE_DAY_UNITS = {
+        "AGE_AT_SEQ_REPORT_YEARS": "years",
+        "CPT_ORDER_INT": "years",
+        "CPT_REPORT_INT": "years",
+    }
+    # Derived variables read by the export that are not in the
+    # cBio mapping table, by dataset label
+    _DATASET_EXTRA_COLUMNS = {
+        "Cancer-level dataset": ["redcap_ca_index", "dob_ca_dx_days"],
+        "Cancer panel test level dataset": ["dob_cpt_report_days"],
+        "Cancer-Directed Radiation Therapy dataset": ["rt_rt_int"],
+        "Cancer-level index dataset": ["first_index_ca_days"],
+    }
+    # Export stages that aren't part of the cohort's release,
+    # see BpcProjectRunner.get_stages
+    _skip_stages = []
     # exclude files to be created for cbioportal
     # TODO: need to support this feature in rest of code, for now
     # This is added for metadata files
@@ -629,19 +796,60 @@ class BpcProjectRunner(metaclass=ABCMeta):
     # cohort-generic link to documentation for cBio files
     _url_cbio = "https://docs.google.com/document/d/1IBVF-FLecUG8Od6mSEhYfWH3wATLNMnZcBw2_G0jSAo/edit"
 
-    def __init__(self, syn, cbiopath, release, upload=False, production=False, use_grs=False):
+    def __init__(
+        self,
+        syn,
+        cbiopath,
+        release,
+        upload=False,
+        production=False,
+        use_grs=False,
+        cache_dir=None,
+        cache_max_bytes=None,
+        jobs=1,
+        resume=False,
+        upload_workers=4,
+        force_upload=False,
+        maf_workers=1,
+        maf_chunk_bytes=64 * 1024**2,
+        oncotree_offline=False,
+        profile=False,
+    ):
         if not os.path.exists(cbiopath):
             raise ValueError("cbiopath doesn't exist")
         if self._SPONSORED_PROJECT == "":
             raise ValueError("Must configure _SPONSORED_PROJECT")
-        self.syn = syn
+        # Synapse calls are counted in the metrics of the stage making them
+        self.syn = metrics.CountedSynapse(syn)
         self.cbiopath = cbiopath
         self.upload = upload
         self.release = release
-        self._GITHUB_REPO = f"https://github.com/Sage-Bionetworks/GENIE-Sponsored-Projects/tree/{get_git_sha()}"
+        self.git_sha = get_git_sha()
+        self._GITHUB_REPO = f"https://github.com/Sage-Bionetworks/GENIE-Sponsored-Projects/tree/{self.git_sha}"
         self.production = production
         self.environment = "production" if self.production else "staging"
         self.use_grs = use_grs
+        self.cache_dir = get_cache_dir(cache_dir)
+        self.cache_max_bytes = cache_max_bytes
+        self.jobs = jobs
+        self.resume = resume
+        self.upload_workers = upload_workers
+        self.force_upload = force_upload
+        self.maf_workers = maf_workers
+        self.maf_chunk_bytes = maf_chunk_bytes
+        self.oncotree_offline = oncotree_offline
+        self.profiler = StageProfiler() if profile else None
+        self.metrics = metrics.MetricsRegistry(
+            labels={"cohort": self._SPONSORED_PROJECT, "release": release}
+        )
+        # release file name -> (kept samples, result) of genomic files
+        # written by fan_out_genomic_files
+        self._fanned_out = {}
+        # content hash of the regimen mapping info -> create_regimens result
+        self._regimens = {}
+        self._regimens_lock = threading.Lock()
+        # content hash of the regimen mapping info -> lock
+        self._regimen_key_locks = {}
 
     @cached_property
     def genie_clinicaldf(self) -> pd.DataFrame:
@@ -674,50 +882,104 @@ class BpcProjectRunner(metaclass=ABCMeta):
         genie_clinicaldf = genie_clinicaldf[
             genie_clinicaldf['SAMPLE_CLASS'] != "cfDNA"
         ]
-        # BPC retraction database
-        # HACK These don't query the phase 2 cohorts
-        bpc_sample_retraction_db = self.syn.tableQuery(
-            f"select SAMPLE_ID from {self._sample_retraction_synid} where "
-            f"{self._SPONSORED_PROJECT} is true"
-        )
-        bpc_sample_retractiondf = bpc_sample_retraction_db.asDataFrame()
-        # HACK These don't query the phase 2 cohorts
-        bpc_patient_retraction_db = self.syn.tableQuery(
-            f"select record_id from {self._patient_retraction_synid} where "
-            f"{self._SPONSORED_PROJECT} is true"
-        )
-        bpc_patient_retraction_df = bpc_patient_retraction_db.asDataFrame()
-
-        # bpc_temp_patient_retraction_db = self.syn.tableQuery(
-        #     f"select patient_id from {self._temporary_patient_retraction_synid} where "
-        #     f"cohort like '{self._SPONSORED_PROJECT}%'"
-        # )
-        # bpc_temp_patient_retraction_df = bpc_temp_patient_retraction_db.asDataFrame()
+        return self.retractions.apply(genie_clinicaldf, self._SPONSORED_PROJECT)
 
-        retraction_at_release = self.syn.tableQuery(
-            f"select patient_id from {self._retraction_at_release_synid} where "
-            f"cohort like '{self._SPONSORED_PROJECT}%'"
+    @cached_property
+    def retractions(self) -> RetractionTables:
+        """BPC retraction tables, shared by all cohorts in the process"""
+        # HACK The retraction tables don't flag the phase 2 cohorts
+        return get_retraction_tables(
+            self.syn,
+            self._sample_retraction_synid,
+            self._patient_retraction_synid,
+            self._retraction_at_release_synid,
+        )
+
+    @cached_property
+    def genie_clinical_hash(self) -> str:
+        """Content hash of the main GENIE clinical samples, so that
+        retractions invalidate resumed outputs"""
+        return hash_value(self.genie_clinicaldf)
+
+    @cached_property
+    def table_cache(self) -> ColumnarTableCache:
+        """On-disk columnar cache of derived variable tables, if configured"""
+        if self.cache_dir is None:
+            return None
+        return ColumnarTableCache(self.cache_dir, max_bytes=self.cache_max_bytes)
+
+    @cached_property
+    def dataset_cache(self) -> DerivedDatasetCache:
+        """Run-scoped cache of derived variable datasets for the cohort"""
+        return DerivedDatasetCache(
+            self.syn, self._SPONSORED_PROJECT, table_cache=self.table_cache
+        )
+
+    @cached_property
+    def drug_dictionary(self) -> File:
+        """Global response set or cohort data dictionary that maps drug
+        names to NCIT codes"""
+        if self.use_grs:
+            synid = self._GRS_SYNID
+        else:
+            synid = _get_synid_dd(
+                self.syn, self._SPONSORED_PROJECT, self._PRISSMM_SYNID
+            )
+        return self.syn.get(synid)
+
+    def get_drug_mapping(self) -> Dict[str, str]:
+        """Map of BPC drug short names to NCIT codes. It's parsed once per
+        version of the drug dictionary and shared by the survival files and
+        by the cohorts that use the same dictionary.
+
+        Returns:
+            Dict[str, str]: drug short name to NCIT drug code
+        """
+        entity = self.drug_dictionary
+        return get_shared(
+            ("drug_mapping", entity.id, entity.versionNumber),
+            lambda: parse_drug_mappings(
+                mapping=read_drug_dictionary(entity.path),
+                var_names=get_drug_variable_names(),
+            ),
+        )
+
+    def get_regimens(self, regimen_infodf: pd.DataFrame) -> dict:
+        """Create the top 20 regimens. The survival and survival treatment
+        files use the same regimens, so they are only created once, also
+        when the survival stages run in parallel. The regimen dataset is
+        recorded as used by every stage that gets the regimens.
+
+        Args:
+            regimen_infodf (pd.DataFrame): cBio mapping info of the regimen
+                columns, merged with data file Synapse IDs
+
+        Returns:
+            dict: see `create_regimens`, which must not be modified
+        """
+        key = hash_value(regimen_infodf)
+        with self._regimens_lock:
+            key_lock = self._regimen_key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            if key not in self._regimens:
+                self._regimens[key] = create_regimens(
+                    self.syn,
+                    regimen_infodf,
+                    mapping=self.get_drug_mapping(),
+                    top_x_regimens=20,
+                    cohort=self._SPONSORED_PROJECT,
+                    dataset_cache=self.dataset_cache,
+                )
+            else:
+                self.dataset_cache.record_used(self._regimens[key]["used_entities"])
+            return self._regimens[key]
+
+    @cached_property
+    def upload_queue(self) -> UploadQueue:
+        """Background queue of files to store in Synapse"""
+        return UploadQueue(
+            self.syn, workers=self.upload_workers, force=self.force_upload
         )
-        retraction_at_release_df = retraction_at_release.asDataFrame()
-        # Retract samples from sample retraction db
-        keep_clinicaldf = genie_clinicaldf[
-            ~genie_clinicaldf["SAMPLE_ID"].isin(bpc_sample_retractiondf["SAMPLE_ID"])
-        ]
-        # Retract patients from patient retraction db
-        keep_clinicaldf = keep_clinicaldf[
-            ~keep_clinicaldf["PATIENT_ID"].isin(bpc_patient_retraction_df["record_id"])
-        ]
-        # Retract patients for at release retraction table
-        keep_clinicaldf = keep_clinicaldf[
-            ~keep_clinicaldf["PATIENT_ID"].isin(retraction_at_release_df["patient_id"])
-        ]
-        # # Retract patients from temporary patient retraction db
-        # keep_clinicaldf = keep_clinicaldf[
-        #     ~keep_clinicaldf["PATIENT_ID"].isin(
-        #         bpc_temp_patient_retraction_df["patient_id"]
-        #     )
-        # ]
-        return keep_clinicaldf
 
     @cached_property
     def cbioportal_folders(self) -> dict:
@@ -813,10 +1075,12 @@ class BpcProjectRunner(metaclass=ABCMeta):
         )
         data_gene_panel.to_csv(gene_matrix_filepath, sep="\t", index=False)
         if self.upload:
-            file_ent = File(
-                gene_matrix_filepath, parent=self.cbioportal_folders["release"]
+            self.upload_queue.submit(
+                gene_matrix_filepath,
+                parent=self.cbioportal_folders["release"],
+                used=used_ent,
+                executed=self._GITHUB_REPO,
             )
-            self.syn.store(file_ent, used=used_ent, executed=self._GITHUB_REPO)
 
     def configure_clinicaldf(
         self, clinicaldf: pd.DataFrame, redcap_to_cbiomappingdf: pd.DataFrame
@@ -899,8 +1163,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
                 "sample type must be patient, sample, supp_survival or "
                 "supp_survival_treatment"
             )
-        # Must have this for the dict mappings after
-        redcap_to_cbiomappingdf.index = redcap_to_cbiomappingdf["cbio"]
+        # Must have this for the dict mappings after. The mapping is shared
+        # between stages, so it isn't modified in place
+        redcap_to_cbiomappingdf = redcap_to_cbiomappingdf.set_index(
+            "cbio", drop=False
+        )
         label_map = redcap_to_cbiomappingdf["labels"].to_dict()
         description_map = redcap_to_cbiomappingdf["description"].to_dict()
         coltype_map = redcap_to_cbiomappingdf["colType"].to_dict()
@@ -918,21 +1185,13 @@ class BpcProjectRunner(metaclass=ABCMeta):
             self._SPONSORED_PROJECT, f"data_clinical_{filetype}.txt"
         )
 
-        with open(clin_path, "w+") as clin_file:
-            clin_file.write("#{}\n".format("\t".join(labels)))
-            clin_file.write("#{}\n".format("\t".join(descriptions)))
-            clin_file.write("#{}\n".format("\t".join(coltype)))
-            # attributes in the supp file are PATIENT, so must
-            # specify that.
-            if filetype.startswith("supp_survival"):
-                clin_file.write("#{}\n".format("\t".join(["PATIENT"] * len(labels))))
-            clin_file.write("#{}\n".format("\t".join(priority)))
-
-            clin_file.write(
-                process_functions.removeStringFloat(
-                    clinicaldf.to_csv(index=False, sep="\t")
-                )
-            )
+        comments = [labels, descriptions, coltype]
+        # attributes in the supp file are PATIENT, so must
+        # specify that.
+        if filetype.startswith("supp_survival"):
+            comments.append(["PATIENT"] * len(labels))
+        comments.append(priority)
+        write_tsv_file(clinicaldf, clin_path, comments=comments)
         return clin_path
 
     def make_timeline_treatmentdf(self, infodf: pd.DataFrame, sample_type: str) -> dict:
@@ -952,37 +1211,27 @@ class BpcProjectRunner(metaclass=ABCMeta):
             ~subset_infodf["data_type"].isin(["portal_value", "heme"])
         ]
         synid = subset_infodf["id"].unique()[0]
-        ent = self.syn.get(synid)
-        used_entity = f"{synid}.{ent.versionNumber}"
-        timelinedf = pd.read_csv(ent.path, low_memory=False)
         # Only take lung cohort
-        timelinedf = timelinedf[timelinedf["cohort_internal"] == self._SPONSORED_PROJECT]
+        timelinedf, used_entity = self.dataset_cache.get(
+            synid,
+            columns=ColumnProjection.from_codes(subset_infodf["code"]).union(
+                ColumnProjection(
+                    ["record_id", "redcap_ca_index", "regimen_drugs", "regimen_number"]
+                )
+            ),
+        )
         # Only take samples where redcap_ca_index is Yes
         timelinedf = timelinedf[timelinedf["redcap_ca_index"] == "Yes"]
         # Flatten multiple columns values into multiple rows
         multiple_cols_idx = subset_infodf["code"].str.contains("[*]")
-        final_timelinedf = pd.DataFrame()
-        for _, row in subset_infodf[multiple_cols_idx].iterrows():
-            code = row["code"]
-            # Make sure to use regex to get colname + integer
-            new_code = code.replace("*", "[\d]")
-            cols = timelinedf.columns.str.contains(new_code)
-            wanted_cols = timelinedf.columns[cols].tolist()
-            wanted_cols.extend(["record_id", "regimen_drugs", "regimen_number"])
-            # melt function creates multiple rows from multiple columns
-            melted_df = pd.melt(
-                timelinedf[wanted_cols],
-                id_vars=["record_id", "regimen_drugs", "regimen_number"],
-                value_name=row["cbio"],
-            )
-            del melted_df["variable"]
-            if final_timelinedf.empty:
-                final_timelinedf = pd.concat([final_timelinedf, melted_df])
-            else:
-                final_timelinedf[row["cbio"]] = melted_df[row["cbio"]]
+        final_timelinedf = stack_drug_columns(
+            timelinedf,
+            subset_infodf[multiple_cols_idx],
+            id_vars=["record_id", "regimen_drugs", "regimen_number"],
+        )
         final_timelinedf["TREATMENT_TYPE"] = "Systemic Therapy"
         # Remove all START_DATE is NULL
-        final_timelinedf = final_timelinedf[~final_timelinedf["START_DATE"].isnull()]
+        final_timelinedf = drop_null_start_dates(final_timelinedf)
         non_multi_cols = subset_infodf[~multiple_cols_idx]["code"].tolist()
         non_multi_cols.append("record_id")
 
@@ -996,15 +1245,8 @@ class BpcProjectRunner(metaclass=ABCMeta):
         final_timelinedf["EVENT_TYPE"] = "TREATMENT"
 
         # Make sure AGENT is not null and doesn't have parenthesis
-        agents = []
         final_timelinedf = final_timelinedf[~final_timelinedf["AGENT"].isnull()]
-        for index, agent in enumerate(final_timelinedf["AGENT"]):
-            if "(" in agent:
-                agents.append(agent.split("(")[0].strip())
-            else:
-                agents.append(agent.split(",")[0].strip())
-
-        final_timelinedf["AGENT"] = agents
+        final_timelinedf["AGENT"] = clean_agents(final_timelinedf["AGENT"])
         # Map timeline treatment columns
         mapping = subset_infodf["cbio"].to_dict()
         # Must add in PATIENT_ID
@@ -1039,6 +1281,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
             pd.DataFrame: GENIE data with retracted patients or samples removed.
         """
 
+        rows = len(df)
         if df.get("SAMPLE_ID") is not None:
             to_keep_samples_idx = df["SAMPLE_ID"].isin(
                 self.genie_clinicaldf["SAMPLE_ID"]
@@ -1049,6 +1292,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
                 self.genie_clinicaldf["PATIENT_ID"]
             )
             df = df[to_keep_patient_idx]
+        metrics.add("rows_dropped_filter", rows - len(df))
         return df
 
     def write_and_storedf(
@@ -1062,15 +1306,17 @@ class BpcProjectRunner(metaclass=ABCMeta):
             used_entities (list, optional): Synapse IDs used to generate the file. Defaults to [].
         """
 
-        df_text = process_functions.removePandasDfFloat(df)
-        with open(filepath, "w") as file_f:
-            file_f.write(df_text)
+        write_tsv_file(df, filepath)
 
         if self.upload:
             # Add the mapping file to the release file provenance
             used_entities.append(self._REDCAP_TO_CBIOMAPPING_SYNID)
-            ent = File(filepath, parent=self.cbioportal_folders["release"])
-            self.syn.store(ent, executed=self._GITHUB_REPO, used=used_entities)
+            self.upload_queue.submit(
+                filepath,
+                parent=self.cbioportal_folders["release"],
+                used=list(used_entities),
+                executed=self._GITHUB_REPO,
+            )
 
     def create_fixed_timeline_files(
         self,
@@ -1100,7 +1346,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
         #    portal_value = ""
         subset_infodf = subset_infodf[subset_infodf["data_type"] != "portal_value"]
         timeline_data = get_file_data(
-            self.syn, subset_infodf, timeline_type, cohort=self._SPONSORED_PROJECT
+            self.syn,
+            subset_infodf,
+            timeline_type,
+            cohort=self._SPONSORED_PROJECT,
+            dataset_cache=self.dataset_cache,
         )
         timelinedf = timeline_data["df"]
         used_entities = timeline_data["used"]
@@ -1117,7 +1367,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
         timelinedf = self.filter_df(timelinedf)
         # Remove all null START_DATE rows if requested
         if filter_start:
-            timelinedf = timelinedf[~timelinedf["START_DATE"].isnull()]
+            timelinedf = drop_null_start_dates(timelinedf)
         return {
             "df": timelinedf[cols_to_order].drop_duplicates(),
             "used": used_entities,
@@ -1131,13 +1381,69 @@ class BpcProjectRunner(metaclass=ABCMeta):
             file_name (str): File name for which to retrieve Synapse ID
 
         Returns:
-            str: Synapse ID if file found; otherwise, None
+            str: Synapse ID of the file
+
+        Raises:
+            ValueError: file isn't in the release folder
+        """
+        index = get_folder_index(self.syn, synid_folder, cache_dir=self.cache_dir)
+        return index.synid(file_name)
+
+    def get_mg_file_version(self, file_name: str) -> Dict[str, str]:
+        """Get the versioned Synapse ID of a main GENIE release file, used
+        to fingerprint the genomic stages.
+
+        Args:
+            file_name (str): File name in the main GENIE release folder
+
+        Returns:
+            Dict[str, str]: file name to synid.version, None if not found
+        """
+        index = get_folder_index(
+            self.syn, self._MG_RELEASE_SYNID, cache_dir=self.cache_dir
+        )
+        return {file_name: index.version(file_name)}
+
+    def get_sample_index(
+        self, entity: File, sample_column: str
+    ) -> Optional[SampleRangeIndex]:
+        """Get the sample byte range index of a main GENIE release file,
+        stored in the cache directory
+
+        Args:
+            entity (File): downloaded release file
+            sample_column (str): column with the sample ID of a row
+
+        Returns:
+            Optional[SampleRangeIndex]: index or None if there's no cache directory
+        """
+        if self.cache_dir is None:
+            return None
+        return get_sample_index(
+            entity.path,
+            sample_column,
+            key=f"{entity.id}.{entity.versionNumber}.{entity.md5}",
+            cache_dir=self.cache_dir,
+        )
+
+    def get_fanned_out(self, file_name: str, keep_samples: list) -> Optional[tuple]:
+        """Get the result of a genomic file that `fan_out_genomic_files`
+        already wrote for the samples
+
+        Args:
+            file_name (str): main GENIE release file name
+            keep_samples (list): samples the file must be subset to
+
+        Returns:
+            Optional[tuple]: kept samples and result, None if the file
+            wasn't written for these samples
         """
-        synid_children = self.syn.getChildren(synid_folder)
-        for synid_child in synid_children:
-            if synid_child["name"] == file_name:
-                return synid_child["id"]
-        raise ValueError(f"file '{file_name}' not found in {synid_folder}")
+        fanned_out = self._fanned_out.get(file_name)
+        if fanned_out is None or fanned_out[0] != frozenset(
+            str(sample) for sample in keep_samples
+        ):
+            return None
+        return fanned_out
 
     def create_and_write_maf(self, keep_samples: list) -> str:
         """Create maf file from release maf
@@ -1151,28 +1457,30 @@ class BpcProjectRunner(metaclass=ABCMeta):
         file_name = "data_mutations_extended.txt"
         mafpath = os.path.join(self._SPONSORED_PROJECT, file_name)
         maf_synid = self.get_mg_synid(self._MG_RELEASE_SYNID, file_name)
-        maf_ent = self.syn.get(maf_synid, followLink=True)
-        maf_chunks = pd.read_table(maf_ent.path, chunksize=50000, low_memory=False)
-        index = 0
-        for maf_chunk in maf_chunks:
-            mafdf = configure_mafdf(maf_chunk, keep_samples)
-            # Skip to next chunk if empty
-            if mafdf.empty:
-                continue
-            # If maf file has not been created
-            if index == 0:
-                maf_text = process_functions.removePandasDfFloat(mafdf)
-                with open(mafpath, "w") as maf_f:
-                    maf_f.write(maf_text)
-            else:
-                maf_text = mafdf.to_csv(sep="\t", header=None, index=False)
-                maf_text = process_functions.removeStringFloat(maf_text)
-                with open(mafpath, "a") as maf_f:
-                    maf_f.write(maf_text)
-            index += 1
-        if self.upload:
-            file_ent = File(mafpath, parent=self.cbioportal_folders["release"])
-            self.syn.store(file_ent, used=[maf_synid], executed=self._GITHUB_REPO)
+        fanned_out = self.get_fanned_out(file_name, keep_samples)
+        if fanned_out is None:
+            maf_ent = self.syn.get(maf_synid, followLink=True)
+            rows = subset_maf(
+                maf_ent.path,
+                mafpath,
+                keep_samples,
+                workers=self.maf_workers,
+                chunk_bytes=self.maf_chunk_bytes,
+                index=self.get_sample_index(maf_ent, "Tumor_Sample_Barcode"),
+            )
+        else:
+            rows = fanned_out[1]
+        metrics.add("rows_written", rows)
+        # The MAF isn't written if none of its rows are kept
+        if os.path.exists(mafpath):
+            metrics.add("bytes_written", os.path.getsize(mafpath))
+            if self.upload:
+                self.upload_queue.submit(
+                    mafpath,
+                    parent=self.cbioportal_folders["release"],
+                    used=[maf_synid],
+                    executed=self._GITHUB_REPO,
+                )
 
         return mafpath
 
@@ -1189,27 +1497,35 @@ class BpcProjectRunner(metaclass=ABCMeta):
         file_name = "data_CNA.txt"
         cna_synid = self.get_mg_synid(self._MG_RELEASE_SYNID, file_name)
         cna_path = os.path.join(self._SPONSORED_PROJECT, file_name)
-        cna_ent = self.syn.get(cna_synid, followLink=True)
-        cnadf = pd.read_table(cna_ent.path, low_memory=False)
-        keep_cols = ["Hugo_Symbol"]
-        keep_cols.extend(cnadf.columns[cnadf.columns.isin(keep_samples)].tolist())
-        cnadf = cnadf[keep_cols]
-        cna_text = process_functions.removePandasDfFloat(cnadf)
-        # Must do this replace twice because \t\t\t ->
-        # \tNA\t\t -> \tNA\tNA\t
-        cna_text = (
-            cna_text.replace("\t\t", "\tNA\t")
-            .replace("\t\t", "\tNA\t")
-            .replace("\t\n", "\tNA\n")
-        )
-
-        with open(cna_path, "w") as cna_file:
-            cna_file.write(cna_text)
-
+        fanned_out = self.get_fanned_out(file_name, keep_samples)
+        if fanned_out is None:
+            cna_ent = self.syn.get(cna_synid, followLink=True)
+            cna_samples = subset_cna(cna_ent.path, cna_path, keep_samples)
+        else:
+            cna_samples = fanned_out[1]
+        # Every gene row of the release CNA is written, the subset only
+        # returns the columns
+        metrics.add("rows_written", count_file_rows(cna_path))
+        metrics.add("bytes_written", os.path.getsize(cna_path))
         if self.upload:
-            file_ent = File(cna_path, parent=self.cbioportal_folders["release"])
-            self.syn.store(file_ent, used=[cna_synid], executed=self._GITHUB_REPO)
-        return {"filepath": cna_file, "cna_samples": cnadf.columns.tolist()}
+            self.upload_queue.submit(
+                cna_path,
+                parent=self.cbioportal_folders["release"],
+                used=[cna_synid],
+                executed=self._GITHUB_REPO,
+            )
+        return {"filepath": cna_path, "cna_samples": cna_samples}
+
+    def read_written_cna(self) -> dict:
+        """Get the CNA sample IDs of a CNA file written by an earlier export
+
+        Returns:
+            dict: "filepath" with path to written file
+                    "cna_sample" list of CNA sample IDs
+        """
+        cna_path = os.path.join(self._SPONSORED_PROJECT, "data_CNA.txt")
+        cna_samples = pd.read_table(cna_path, nrows=0).columns.tolist()
+        return {"filepath": cna_path, "cna_samples": cna_samples}
 
     def create_and_write_fusion(self, keep_samples: list) -> str:
         """Create fusion file
@@ -1243,11 +1559,28 @@ class BpcProjectRunner(metaclass=ABCMeta):
         # TODO: the seg filename will change 13.X release.
         file_name = "data_cna_hg19.seg"
         seg_synid = self.get_mg_synid(self._MG_RELEASE_SYNID, file_name)
-        seg_ent = self.syn.get(seg_synid, followLink=True)
-        segdf = pd.read_table(seg_ent.path, low_memory=False)
-        segdf = segdf[segdf["ID"].isin(keep_samples)]
         seg_path = os.path.join(self._SPONSORED_PROJECT, "data_cna_hg19.seg")
-        self.write_and_storedf(segdf, seg_path, used_entities=[seg_synid])
+        fanned_out = self.get_fanned_out(file_name, keep_samples)
+        if fanned_out is None:
+            seg_ent = self.syn.get(seg_synid, followLink=True)
+            rows = subset_rows(
+                seg_ent.path,
+                seg_path,
+                "ID",
+                keep_samples,
+                index=self.get_sample_index(seg_ent, "ID"),
+            )
+        else:
+            rows = fanned_out[1]
+        metrics.add("rows_written", rows)
+        metrics.add("bytes_written", os.path.getsize(seg_path))
+        if self.upload:
+            self.upload_queue.submit(
+                seg_path,
+                parent=self.cbioportal_folders["release"],
+                used=[seg_synid, self._REDCAP_TO_CBIOMAPPING_SYNID],
+                executed=self._GITHUB_REPO,
+            )
         return seg_path
 
     def create_and_write_sv(self, keep_samples):
@@ -1266,11 +1599,22 @@ class BpcProjectRunner(metaclass=ABCMeta):
                 f"data_sv.txt doesn't exist in main genie release: {self._MG_RELEASE_SYNID}"
             )
         if sv_synid is not None:
-            sv_ent = self.syn.get(sv_synid, followLink=True)
-            svdf = pd.read_table(sv_ent.path, low_memory=False)
-            svdf = svdf[svdf["Sample_Id"].isin(keep_samples)]
             sv_path = os.path.join(self._SPONSORED_PROJECT, "data_sv.txt")
-            self.write_and_storedf(svdf, sv_path, used_entities=[sv_synid])
+            fanned_out = self.get_fanned_out(file_name, keep_samples)
+            if fanned_out is None:
+                sv_ent = self.syn.get(sv_synid, followLink=True)
+                rows = subset_rows(sv_ent.path, sv_path, "Sample_Id", keep_samples)
+            else:
+                rows = fanned_out[1]
+            metrics.add("rows_written", rows)
+            metrics.add("bytes_written", os.path.getsize(sv_path))
+            if self.upload:
+                self.upload_queue.submit(
+                    sv_path,
+                    parent=self.cbioportal_folders["release"],
+                    used=[sv_synid, self._REDCAP_TO_CBIOMAPPING_SYNID],
+                    executed=self._GITHUB_REPO,
+                )
 
     def create_and_write_gene_panels(self, keep_seq_assay_ids: list) -> List:
         """Create gene panels and genomic information
@@ -1324,11 +1668,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
             with open(gene_panel_path, "w+") as f:
                 f.write(gene_panel_text)
             if self.upload:
-                fileEnt = File(
-                    gene_panel_path, parent=self.cbioportal_folders["release"]
-                )
-                self.syn.store(
-                    fileEnt, used=[genomic_info_synid], executed=self._GITHUB_REPO
+                self.upload_queue.submit(
+                    gene_panel_path,
+                    parent=self.cbioportal_folders["release"],
+                    used=[genomic_info_synid],
+                    executed=self._GITHUB_REPO,
                 )
         return gene_panel_paths, genomic_path
 
@@ -1355,6 +1699,26 @@ class BpcProjectRunner(metaclass=ABCMeta):
 
         return treatment_data
 
+    def get_timeline_treatments(
+        self, df_map: pd.DataFrame, df_file: pd.DataFrame, rad_df: pd.DataFrame = None
+    ) -> dict:
+        """Get TIMELINE-TREATMENT file data, including radiation therapy
+        for cohorts that collect it.
+
+        Args:
+            df_map (pd.DataFrame): variable to cBioPortal mapping info
+            df_file (pd.DataFrame): data file to Synapse ID mapping
+            rad_df (pd.DataFrame, optional): TIMELINE-TREATMENT-RT data.
+                Defaults to None.
+
+        Returns:
+            dict: TIMELINE-TREATMENT and TIMELINE-TREATMENT-RT data
+        """
+        treatment_data = self.get_timeline_treatment(df_map=df_map, df_file=df_file)
+        if rad_df is not None:
+            treatment_data["df"] = pd.concat([treatment_data["df"], rad_df])
+        return treatment_data
+
     def get_timeline_performance(
         self, df_map: pd.DataFrame, df_file: pd.DataFrame
     ) -> dict:
@@ -1455,9 +1819,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
             timeline_infodf, "TIMELINE-DX", filter_start=False
         )
         cancerdx_data["df"] = fill_cancer_dx_start_date(cancerdx_data["df"])
-        cancerdx_data["df"] = cancerdx_data["df"][
-            ~cancerdx_data["df"]["START_DATE"].isnull()
-        ]
+        cancerdx_data["df"] = drop_null_start_dates(cancerdx_data["df"])
         return cancerdx_data
 
     def get_timeline_pathology(
@@ -1516,7 +1878,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
                     ", ".join(acquisition_data["df"]["SAMPLE_ID"][null_dates_idx])
                 )
             )
-            acquisition_data["df"] = acquisition_data["df"][~null_dates_idx]
+            acquisition_data["df"] = drop_null_start_dates(acquisition_data["df"])
         return acquisition_data
 
     def get_timeline_medonc(self, df_map: pd.DataFrame, df_file: pd.DataFrame) -> dict:
@@ -1658,6 +2020,36 @@ class BpcProjectRunner(metaclass=ABCMeta):
         dict_data = self.create_fixed_timeline_files(timeline_infodf, "TIMELINE-LAB")
         return dict_data
 
+    def create_and_write_timeline(
+        self,
+        label: str,
+        get_timeline: Callable[..., dict],
+        filename: str,
+        df_map: pd.DataFrame,
+        df_file: pd.DataFrame,
+    ) -> str:
+        """Create, write and, if applicable, store a timeline file.
+
+        Args:
+            label (str): timeline label
+            get_timeline (Callable[..., dict]): get_timeline_* method
+            filename (str): cBioPortal file name
+            df_map (pd.DataFrame): variable to cBioPortal mapping info
+            df_file (pd.DataFrame): data file to Synapse ID mapping
+
+        Returns:
+            str: file path to written data
+        """
+        logging.info(f"writing {label}...")
+        timeline_data = get_timeline(df_map=df_map, df_file=df_file)
+        timeline_path = os.path.join(self._SPONSORED_PROJECT, filename)
+        self.write_and_storedf(
+            df=timeline_data["df"],
+            filepath=timeline_path,
+            used_entities=timeline_data["used"],
+        )
+        return timeline_path
+
     def get_survival(self, df_map: pd.DataFrame, df_file: pd.DataFrame) -> dict:
         """Get SURVIVAL file data.
 
@@ -1690,7 +2082,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
 
         df_info_survial = df_info[df_info["sampleType"] == "SURVIVAL"]
         dict_data_survial = get_file_data(
-            self.syn, df_info_survial, "SURVIVAL", cohort=self._SPONSORED_PROJECT
+            self.syn,
+            df_info_survial,
+            "SURVIVAL",
+            cohort=self._SPONSORED_PROJECT,
+            dataset_cache=self.dataset_cache,
         )
         df_raw_survival = dict_data_survial["df"]
         df_final_survival = self.configure_clinicaldf(df_raw_survival, df_info_survial)
@@ -1725,20 +2121,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
         regimen_infodf.index = regimen_infodf["code"]
 
         # Create regimens data for patient file
-        drug_mapping = get_drug_mapping(
-            syn=self.syn,
-            cohort=self._SPONSORED_PROJECT,
-            synid_file_grs=self._GRS_SYNID,
-            synid_table_prissmm=self._PRISSMM_SYNID,
-            use_grs=self.use_grs,
-        )
-        regimens_data = create_regimens(
-            self.syn,
-            regimen_infodf,
-            mapping=drug_mapping,
-            top_x_regimens=20,
-            cohort=self._SPONSORED_PROJECT,
-        )
+        regimens_data = self.get_regimens(regimen_infodf)
 
         survival_info = pd.concat([infodf, regimens_data["info"]])
         # Only patients and samples that exist in the
@@ -1772,20 +2155,7 @@ class BpcProjectRunner(metaclass=ABCMeta):
         )
         regimen_infodf.index = regimen_infodf["code"]
 
-        drug_mapping = get_drug_mapping(
-            syn=self.syn,
-            cohort=self._SPONSORED_PROJECT,
-            synid_file_grs=self._GRS_SYNID,
-            synid_table_prissmm=self._PRISSMM_SYNID,
-            use_grs=self.use_grs,
-        )
-        regimens_data = create_regimens(
-            self.syn,
-            regimen_infodf,
-            mapping=drug_mapping,
-            top_x_regimens=20,
-            cohort=self._SPONSORED_PROJECT,
-        )
+        regimens_data = self.get_regimens(regimen_infodf)
 
         df_survival_treatment = regimens_data["df"]
         df_survival_treatment = remap_os_values(df=df_survival_treatment)
@@ -1833,7 +2203,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
         df_info_patient.index = df_info_patient["code"]
 
         dict_patient = get_file_data(
-            self.syn, df_info_patient, "PATIENT", cohort=self._SPONSORED_PROJECT
+            self.syn,
+            df_info_patient,
+            "PATIENT",
+            cohort=self._SPONSORED_PROJECT,
+            dataset_cache=self.dataset_cache,
         )
 
         df_patient = dict_patient["df"]
@@ -1881,7 +2255,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
         )
         df_info_sample.index = df_info_sample["code"]
         dict_sample = get_file_data(
-            self.syn, df_info_sample, "SAMPLE", cohort=self._SPONSORED_PROJECT
+            self.syn,
+            df_info_sample,
+            "SAMPLE",
+            cohort=self._SPONSORED_PROJECT,
+            dataset_cache=self.dataset_cache,
         )
 
         df_sample = dict_sample["df"]
@@ -1892,16 +2270,11 @@ class BpcProjectRunner(metaclass=ABCMeta):
             df_sample_final["SAMPLE_ID"].isin(self.genie_clinicaldf["SAMPLE_ID"])
         ]
         del df_sample_subset["SP"]
-        days_to_years_col = [
-            "AGE_AT_SEQ_REPORT_YEARS",
-            "CPT_ORDER_INT",
-            "CPT_REPORT_INT",
-        ]
-        for col in days_to_years_col:
-            # not all columns could exist, so check if column exists
-            if col in df_sample_subset:
-                years = df_sample_subset[col].apply(change_days_to_years)
-                df_sample_subset[col] = years
+        # not all columns could exist, convert_days skips missing columns
+        df_sample_subset = convert_days(
+            df_sample_subset,
+            day_units(df_info_sample["cbio"], self._SAMPLE_DAY_UNITS),
+        )
         # Use np.floor because np handles NaN values
         df_sample_subset["AGE_AT_SEQUENCING"] = df_sample_subset[
             "AGE_AT_SEQUENCING"
@@ -1954,42 +2327,22 @@ class BpcProjectRunner(metaclass=ABCMeta):
             ]
             if not not_found_samples.empty:
                 logging.info(not_found_samples[~not_found_samples.isnull()])
-                not_found_samples.to_csv("notfoundsamples.csv")
+                not_found_path = f"{self._SPONSORED_PROJECT}_notfoundsamples.csv"
+                not_found_samples.to_csv(not_found_path)
                 if self.upload:
-                    self.syn.store(
-                        File(
-                            "notfoundsamples.csv",
-                            parent=self._SP_REDCAP_EXPORTS_SYNID[self.environment]
-                        )
+                    self.upload_queue.submit(
+                        not_found_path,
+                        parent=self._SP_REDCAP_EXPORTS_SYNID[self.environment],
                     )
-        # Hard coded most up to date oncotree version
-        oncotreelink = self.syn.get("syn13890902").externalURL
-        # Use the old oncotree link for now
-        # TODO: need to update oncotree link for 11.0 public
-        oncotreelink = (
-            "http://oncotree.mskcc.org/api/tumorTypes/tree?version=oncotree_2018_06_01"
-        )
-        oncotree_dict = process_functions.get_oncotree_code_mappings(oncotreelink)
-        check_oncotree_codes(df = merged_clinicaldf, oncotree_dict = oncotree_dict)
-        
+        oncotree = get_oncotree(
+            self._ONCOTREE_VERSION,
+            cache_dir=self.cache_dir,
+            offline=self.oncotree_offline,
+        )
+        check_oncotree_codes(df=merged_clinicaldf, oncotree_dict=oncotree.mappings)
         # Map cancer type and cancer type detailed
-        # This is to create case list files
-        merged_clinicaldf["CANCER_TYPE"] = [
-            oncotree_dict[code.upper()].get("CANCER_TYPE", float("nan"))
-            for code in merged_clinicaldf["ONCOTREE_CODE"]
-        ]
-        merged_clinicaldf["CANCER_TYPE_DETAILED"] = [
-            oncotree_dict[code.upper()].get("CANCER_TYPE_DETAILED", float("nan"))
-            for code in merged_clinicaldf["ONCOTREE_CODE"]
-        ]
-        merged_clinicaldf["ONCOTREE_PRIMARY_NODE"] = [
-            oncotree_dict[code.upper()].get("ONCOTREE_PRIMARY_NODE", float("nan"))
-            for code in merged_clinicaldf["ONCOTREE_CODE"]
-        ]
-        merged_clinicaldf["ONCOTREE_SECONDARY_NODE"] = [
-            oncotree_dict[code.upper()].get("ONCOTREE_SECONDARY_NODE", float("nan"))
-            for code in merged_clinicaldf["ONCOTREE_CODE"]
-        ]
+        # This is to create case lists files
+        merged_clinicaldf = oncotree.enrich(merged_clinicaldf)
         # Remove duplicated sample ids (there shouldn't be any)
         merged_clinicaldf = merged_clinicaldf.drop_duplicates("SAMPLE_ID")
         merged_clinicaldf.to_csv(
@@ -2010,14 +2363,17 @@ class BpcProjectRunner(metaclass=ABCMeta):
 
         # Write out cases sequenced so people can tell
         # which samples were sequenced
-        assay_info = self.syn.tableQuery(
-            f"select * from {self._ASSAY_SYNID}",
-            includeRowIdAndRowVersion=False,
-            separator="\t",
+        assay_info_path = get_shared(
+            ("assay_info", self._ASSAY_SYNID),
+            lambda: self.syn.tableQuery(
+                f"select * from {self._ASSAY_SYNID}",
+                includeRowIdAndRowVersion=False,
+                separator="\t",
+            ).filepath,
         )
         create_case_lists.main(
             os.path.join(self._SPONSORED_PROJECT, "data_clinical.txt"),
-            assay_info.filepath,
+            assay_info_path,
             case_list_path,
             f"{self._SPONSORED_PROJECT.lower()}_genie_bpc",
         )
@@ -2026,259 +2382,123 @@ class BpcProjectRunner(metaclass=ABCMeta):
         for casepath in case_list_files:
             casepath = os.path.join(case_list_path, casepath)
             if self.upload:
-                file_ent = File(casepath, parent=self.cbioportal_folders["case_lists"])
-                self.syn.store(
-                    file_ent,
+                self.upload_queue.submit(
+                    casepath,
+                    parent=self.cbioportal_folders["case_lists"],
                     used=used,
                     executed=self._GITHUB_REPO,
                 )
 
-    def run(self):
-        """Runs the redcap export to export all files"""
-
-        logging.info("creating release folders...")
-        create_release_folders(cohort=self._SPONSORED_PROJECT)
-
-        logging.info("reading variable to cBio mapping...")
-        redcap_to_cbiomappingdf = get_bpc_to_cbio_mapping_df(
-            self.syn,
-            cohort=self._SPONSORED_PROJECT,
-            synid_table_cbio=self._REDCAP_TO_CBIOMAPPING_SYNID,
-        )
-
-        logging.info("reading and dataset label mappings...")
-        data_tablesdf = get_data_file_synapse_id_df(
-            syn=self.syn, synid_table_files=self._DATA_TABLE_IDS
-        )
-
-        logging.info("writing TIMELINE-TREATMENT...")
-        treatment_data = self.get_timeline_treatment(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        if self._SPONSORED_PROJECT not in ["BrCa"]:
-            logging.info("writing TIMELINE-TREATMENT-RT...")
-            rad_df = self.get_timeline_treatment_rad(
-                df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-            )
-            treatment_data["df"] = pd.concat([treatment_data["df"], rad_df])
-        else:
-            logging.info("skipping TIMELINE-TREATMENT-RT")
-        self.write_and_storedf(
-            treatment_data["df"],
-            os.path.join(self._SPONSORED_PROJECT, "data_timeline_treatment.txt"),
-            used_entities=treatment_data["used"],
-        )
-
-        logging.info("writing TIMELINE-DX...")
-        cancerdx_data = self.get_timeline_dx(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            cancerdx_data["df"],
-            os.path.join(self._SPONSORED_PROJECT, "data_timeline_cancer_diagnosis.txt"),
-            used_entities=cancerdx_data["used"],
-        )
-
-        logging.info("writing TIMELINE-PATHOLOGY...")
-        pathology_data = self.get_timeline_pathology(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            pathology_data["df"],
-            os.path.join(self._SPONSORED_PROJECT, "data_timeline_pathology.txt"),
-            used_entities=pathology_data["used"],
-        )
-
-        logging.info("writing TIMELINE-SAMPLE-ACQUISITION...")
-        acquisition_data = self.get_timeline_sample(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            acquisition_data["df"],
-            os.path.join(
-                self._SPONSORED_PROJECT, "data_timeline_sample_acquisition.txt"
-            ),
-            used_entities=acquisition_data["used"],
-        )
-
-        logging.info("writing TIMELINE-MEDONC...")
-        medonc_data = self.get_timeline_medonc(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            medonc_data["df"],
-            os.path.join(self._SPONSORED_PROJECT, "data_timeline_medonc.txt"),
-            used_entities=medonc_data["used"],
-        )
-
-        logging.info("writing TIMELINE-IMAGING...")
-        imaging_data = self.get_timeline_imaging(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            imaging_data["df"],
-            os.path.join(self._SPONSORED_PROJECT, "data_timeline_imaging.txt"),
-            used_entities=imaging_data["used"],
-        )
+    def write_and_store_clinical_file(
+        self,
+        clinicaldf: pd.DataFrame,
+        clinical_info: pd.DataFrame,
+        filetype: str,
+        df_map: pd.DataFrame,
+        df_file: pd.DataFrame,
+        sampletype: list,
+    ) -> str:
+        """Write and, if applicable, store a clinical file.
 
-        logging.info("writing TIMELINE-SEQUENCE...")
-        sequence_data = self.get_timeline_sequence(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        self.write_and_storedf(
-            df=sequence_data["df"],
-            filepath=os.path.join(
-                self._SPONSORED_PROJECT, "data_timeline_sequencing.txt"
-            ),
-            used_entities=sequence_data["used"],
-        )
+        Args:
+            clinicaldf (pd.DataFrame): clinical information
+            clinical_info (pd.DataFrame): cBio mapping info of the clinical columns
+            filetype (str): file type label
+            df_map (pd.DataFrame): variable to cBioPortal mapping info
+            df_file (pd.DataFrame): data file to Synapse ID mapping
+            sampletype (list): sample type labels used to create the file
 
-        if self._SPONSORED_PROJECT not in ["NSCLC", "BLADDER"]:
-            logging.info("writing TIMELINE-LABTEST...")
-            lab_data = self.get_timeline_lab(
-                df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
+        Returns:
+            str: file path to clinical info
+        """
+        logging.info(f"writing CLINICAL-{filetype.upper()}...")
+        clinical_path = self.write_clinical_file(clinicaldf, clinical_info, filetype)
+        if self.upload:
+            used = get_synid_data(
+                df_map=df_map,
+                df_file=df_file,
+                sampletype=sampletype,
+                cohort=self._SPONSORED_PROJECT,
             )
-            self.write_and_storedf(
-                df=lab_data["df"],
-                filepath=os.path.join(
-                    self._SPONSORED_PROJECT, "data_timeline_labtest.txt"
-                ),
-                used_entities=lab_data["used"],
+            self.upload_queue.submit(
+                clinical_path,
+                parent=self.cbioportal_folders["release"],
+                used=used,
+                executed=self._GITHUB_REPO,
             )
-        else:
-            logging.info("skipping TIMELINE-LABTEST...")
+        return clinical_path
 
-        logging.info("writing TIMELINE-PERFORMANCE...")
-        if self._SPONSORED_PROJECT in ["BLADDER", "NSCLC", "CRC"]:
-            performance_data = self.get_timeline_performance(
-                df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-            )
-            self.write_and_storedf(
-                df=performance_data["df"],
-                filepath=os.path.join(
-                    self._SPONSORED_PROJECT, "data_timeline_performance_status.txt"
-                ),
-                used_entities=performance_data["used"],
-            )
-        else:
-            logging.info("skipping TIMELINE-PERFORMANCE...")
+    def create_and_write_survival(
+        self, df_map: pd.DataFrame, df_file: pd.DataFrame
+    ) -> pd.DataFrame:
+        """Create, write and, if applicable, store the survival file.
 
-        logging.info("writing CLINICAL-SURVIVAL...")
-        final_survival_data = self.get_survival(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        survival_path = self.write_clinical_file(
-            final_survival_data["df"],
-            final_survival_data["survival_info"],
+        Args:
+            df_map (pd.DataFrame): variable to cBioPortal mapping info
+            df_file (pd.DataFrame): data file to Synapse ID mapping
+
+        Returns:
+            pd.DataFrame: cBio mapping info of all clinical columns
+        """
+        survival_data = self.get_survival(df_map=df_map, df_file=df_file)
+        self.write_and_store_clinical_file(
+            survival_data["df"],
+            survival_data["survival_info"],
             "supp_survival",
-        )
-        survival_used = get_synid_data(
-            df_map=redcap_to_cbiomappingdf,
-            df_file=data_tablesdf,
+            df_map=df_map,
+            df_file=df_file,
             sampletype=["SURVIVAL", "REGIMEN"],
-            cohort=self._SPONSORED_PROJECT,
         )
-        if self.upload:
-            survival_fileent = File(
-                survival_path, parent=self.cbioportal_folders["release"]
-            )
-            survival_ent = self.syn.store(
-                survival_fileent, used=survival_used, executed=self._GITHUB_REPO
-            )
+        return survival_data["survival_info"]
 
-        logging.info("writing CLINICAL-SURVIVAL-TREATMENT...")
+    def create_and_write_survival_treatment(
+        self, df_map: pd.DataFrame, df_file: pd.DataFrame, survival_info: pd.DataFrame
+    ) -> str:
+        """Create, write and, if applicable, store the survival treatment file.
+
+        Args:
+            df_map (pd.DataFrame): variable to cBioPortal mapping info
+            df_file (pd.DataFrame): data file to Synapse ID mapping
+            survival_info (pd.DataFrame): cBio mapping info of all clinical columns
+
+        Returns:
+            str: file path to survival treatment data
+        """
         df_survival_treatment = self.get_survival_treatment(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf,
+            df_map=df_map, df_file=df_file
         )
-        surv_treatment_path = self.write_clinical_file(
+        return self.write_and_store_clinical_file(
             df_survival_treatment,
-            final_survival_data["survival_info"],
+            survival_info,
             "supp_survival_treatment",
+            df_map=df_map,
+            df_file=df_file,
+            sampletype=["SURVIVAL", "REGIMEN"],
         )
-        if self.upload:
-            survival_treatment_fileent = File(
-                surv_treatment_path, parent=self.cbioportal_folders["release"]
-            )
-            survival_treatment_fileent = self.syn.store(
-                survival_treatment_fileent,
-                used=survival_used,
-                executed=self._GITHUB_REPO,
-            )
-
-        logging.info("writing CLINICAL-SAMPLE...")
-        df_sample_final = self.get_sample(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        sample_path = self.write_clinical_file(
-            df_sample_final, final_survival_data["survival_info"], "sample"
-        )
-        if self.upload:
-            sample_fileent = File(
-                sample_path, parent=self.cbioportal_folders["release"]
-            )
-            sample_used = get_synid_data(
-                df_map=redcap_to_cbiomappingdf,
-                df_file=data_tablesdf,
-                sampletype=["SAMPLE"],
-                cohort=self._SPONSORED_PROJECT,
-            )
-            sample_ent = self.syn.store(
-                sample_fileent, used=sample_used, executed=self._GITHUB_REPO
-            )
-
-        logging.info("writing CLINICAL-PATIENT...")
-        df_patient_final = self.get_patient(
-            df_map=redcap_to_cbiomappingdf, df_file=data_tablesdf
-        )
-        patient_path = self.write_clinical_file(
-            df_patient_final, final_survival_data["survival_info"], "patient"
-        )
-        if self.upload:
-            logging.info("uploading clinical data files to Synapse...")
-            patient_fileent = File(
-                patient_path, parent=self.cbioportal_folders["release"]
-            )
-            patient_used = get_synid_data(
-                df_map=redcap_to_cbiomappingdf,
-                df_file=data_tablesdf,
-                sampletype=["PATIENT"],
-                cohort=self._SPONSORED_PROJECT,
-            )
-            patient_ent = self.syn.store(
-                patient_fileent, used=patient_used, executed=self._GITHUB_REPO
-            )
 
-        logging.info("writing genomic data files...")
-        self.create_and_write_maf(df_sample_final["SAMPLE_ID"])
-        dict_cna = self.create_and_write_cna(df_sample_final["SAMPLE_ID"])
-        self.create_and_write_genematrix(df_sample_final, dict_cna["cna_samples"])
-        # self.create_and_write_fusion(df_sample_final["SAMPLE_ID"])
-        self.create_and_write_seg(df_sample_final["SAMPLE_ID"])
-        self.create_and_write_sv(df_sample_final["SAMPLE_ID"])
-
-        ids = get_synid_data(
-            df_map=redcap_to_cbiomappingdf,
-            df_file=data_tablesdf,
-            sampletype=["PATIENT", "SAMPLE"],
-            cohort=self._SPONSORED_PROJECT,
-        )
-        self.create_and_write_case_lists(
-            subset_sampledf=df_sample_final, subset_patientdf=df_patient_final, used=ids
-        )
-        self.create_and_write_gene_panels(df_sample_final["SEQ_ASSAY_ID"].unique())
+    def create_and_write_metafiles(self) -> List[str]:
+        """Create, write and, if applicable, store the metadata files.
 
+        Returns:
+            List[str]: file paths to metadata files
+        """
         logging.info("writing metadata files...")
         metadata_files = self.create_bpc_cbio_metafiles()
         if self.upload:
             for metadata_file in metadata_files:
-                file_ent = File(
-                    metadata_file, parent=self.cbioportal_folders["release"]
-                )
-                self.syn.store(
-                    file_ent,
+                self.upload_queue.submit(
+                    metadata_file,
+                    parent=self.cbioportal_folders["release"],
                     executed=self._GITHUB_REPO,
                 )
+        return metadata_files
 
+    def validate(self) -> None:
+        """Run the cBioPortal validator on the exported files, once
+        all files are uploaded"""
+        if self.upload:
+            logging.info("waiting for uploads...")
+            self.upload_queue.barrier()
         logging.info("cBioPortal validation")
         cmd = [
             "python",
@@ -2290,3 +2510,443 @@ class BpcProjectRunner(metaclass=ABCMeta):
             "-n",
         ]
         subprocess.run(cmd)
+
+    def get_stages(self) -> List[Stage]:
+        """Get the stages of the export. Stages listed in `_skip_stages`
+        are left out.
+
+        Returns:
+            List[Stage]: export stages
+        """
+        clinical_inputs = {"df_map": "mapping", "df_file": "dataset_labels"}
+        clinical_after = ["column_plan", "genie_clinical", "release_folders"]
+
+        def output(filename: str) -> str:
+            return os.path.join(self._SPONSORED_PROJECT, filename)
+
+        def clinical_fingerprint() -> dict:
+            return {"genie_clinical": self.genie_clinical_hash}
+
+        def plan_columns(df_map: pd.DataFrame, df_file: pd.DataFrame) -> None:
+            logging.info("planning derived variable columns...")
+            self.dataset_cache.set_projections(
+                plan_dataset_columns(
+                    mappingdf=df_map,
+                    data_tablesdf=df_file,
+                    extra_columns=self._DATASET_EXTRA_COLUMNS,
+                )
+            )
+
+        def create_and_write_case_lists(
+            df_map: pd.DataFrame,
+            df_file: pd.DataFrame,
+            sample: pd.DataFrame,
+            patient: pd.DataFrame,
+        ) -> None:
+            ids = get_synid_data(
+                df_map=df_map,
+                df_file=df_file,
+                sampletype=["PATIENT", "SAMPLE"],
+                cohort=self._SPONSORED_PROJECT,
+            )
+            self.create_and_write_case_lists(
+                subset_sampledf=sample, subset_patientdf=patient, used=ids
+            )
+
+        timelines = [
+            (
+                "timeline_dx",
+                "TIMELINE-DX",
+                self.get_timeline_dx,
+                "data_timeline_cancer_diagnosis.txt",
+            ),
+            (
+                "timeline_pathology",
+                "TIMELINE-PATHOLOGY",
+                self.get_timeline_pathology,
+                "data_timeline_pathology.txt",
+            ),
+            (
+                "timeline_sample",
+                "TIMELINE-SAMPLE-ACQUISITION",
+                self.get_timeline_sample,
+                "data_timeline_sample_acquisition.txt",
+            ),
+            (
+                "timeline_medonc",
+                "TIMELINE-MEDONC",
+                self.get_timeline_medonc,
+                "data_timeline_medonc.txt",
+            ),
+            (
+                "timeline_imaging",
+                "TIMELINE-IMAGING",
+                self.get_timeline_imaging,
+                "data_timeline_imaging.txt",
+            ),
+            (
+                "timeline_sequence",
+                "TIMELINE-SEQUENCE",
+                self.get_timeline_sequence,
+                "data_timeline_sequencing.txt",
+            ),
+            (
+                "timeline_labtest",
+                "TIMELINE-LABTEST",
+                self.get_timeline_lab,
+                "data_timeline_labtest.txt",
+            ),
+            (
+                "timeline_performance",
+                "TIMELINE-PERFORMANCE",
+                self.get_timeline_performance,
+                "data_timeline_performance_status.txt",
+            ),
+        ]
+
+        stages = [
+            Stage(
+                "mapping",
+                lambda: get_bpc_to_cbio_mapping_df(
+                    self.syn,
+                    cohort=self._SPONSORED_PROJECT,
+                    synid_table_cbio=self._REDCAP_TO_CBIOMAPPING_SYNID,
+                ),
+            ),
+            Stage(
+                "dataset_labels",
+                lambda: get_data_file_synapse_id_df(
+                    syn=self.syn, synid_table_files=self._DATA_TABLE_IDS
+                ),
+            ),
+            Stage("column_plan", plan_columns, inputs=clinical_inputs),
+            # Shared state is initialized once before the stages that use it
+            Stage("genie_clinical", lambda: self.genie_clinicaldf),
+            Stage("release_folders", lambda: self.cbioportal_folders),
+            Stage(
+                "timeline_treatment_rt",
+                self.get_timeline_treatment_rad,
+                inputs=clinical_inputs,
+                after=clinical_after,
+            ),
+            Stage(
+                "timeline_treatment",
+                lambda df_map, df_file, rad_df: self.create_and_write_timeline(
+                    "TIMELINE-TREATMENT",
+                    partial(self.get_timeline_treatments, rad_df=rad_df),
+                    "data_timeline_treatment.txt",
+                    df_map=df_map,
+                    df_file=df_file,
+                ),
+                inputs=clinical_inputs,
+                optional_inputs={"rad_df": "timeline_treatment_rt"},
+                after=clinical_after,
+                outputs=[output("data_timeline_treatment.txt")],
+                fingerprint=clinical_fingerprint,
+            ),
+        ]
+        for name, label, get_timeline, filename in timelines:
+            stages.append(
+                Stage(
+                    name,
+                    partial(
+                        self.create_and_write_timeline, label, get_timeline, filename
+                    ),
+                    inputs=clinical_inputs,
+                    after=clinical_after,
+                    outputs=[output(filename)],
+                    fingerprint=clinical_fingerprint,
+                )
+            )
+        stages += [
+            Stage(
+                "survival",
+                self.create_and_write_survival,
+                inputs=clinical_inputs,
+                after=clinical_after,
+            ),
+            Stage(
+                "survival_treatment",
+                self.create_and_write_survival_treatment,
+                inputs={**clinical_inputs, "survival_info": "survival"},
+                after=clinical_after,
+                outputs=[output("data_clinical_supp_survival_treatment.txt")],
+                fingerprint=clinical_fingerprint,
+            ),
+            Stage(
+                "sample", self.get_sample, inputs=clinical_inputs, after=clinical_after
+            ),
+            Stage(
+                "clinical_sample",
+                partial(
+                    self.write_and_store_clinical_file,
+                    filetype="sample",
+                    sampletype=["SAMPLE"],
+                ),
+                inputs={
+                    **clinical_inputs,
+                    "clinicaldf": "sample",
+                    "clinical_info": "survival",
+                },
+                after=["release_folders"],
+                outputs=[output("data_clinical_sample.txt")],
+            ),
+            Stage(
+                "patient",
+                self.get_patient,
+                inputs=clinical_inputs,
+                after=clinical_after,
+            ),
+            Stage(
+                "clinical_patient",
+                partial(
+                    self.write_and_store_clinical_file,
+                    filetype="patient",
+                    sampletype=["PATIENT"],
+                ),
+                inputs={
+                    **clinical_inputs,
+                    "clinicaldf": "patient",
+                    "clinical_info": "survival",
+                },
+                after=["release_folders"],
+                outputs=[output("data_clinical_patient.txt")],
+            ),
+            Stage("sample_ids", lambda sample: sample["SAMPLE_ID"], inputs=["sample"]),
+            Stage(
+                "seq_assay_ids",
+                lambda sample: sample["SEQ_ASSAY_ID"].unique(),
+                inputs=["sample"],
+            ),
+            # Genomic files only depend on the sample list, so they are
+            # subset while the remaining clinical files are created
+            Stage(
+                "maf",
+                self.create_and_write_maf,
+                inputs={"keep_samples": "sample_ids"},
+                after=["release_folders"],
+                outputs=[output("data_mutations_extended.txt")],
+                fingerprint=partial(
+                    self.get_mg_file_version, "data_mutations_extended.txt"
+                ),
+            ),
+            Stage(
+                "cna",
+                self.create_and_write_cna,
+                inputs={"keep_samples": "sample_ids"},
+                after=["release_folders"],
+                outputs=[output("data_CNA.txt")],
+                fingerprint=partial(self.get_mg_file_version, "data_CNA.txt"),
+                restore=lambda keep_samples: self.read_written_cna(),
+            ),
+            Stage(
+                "gene_matrix",
+                lambda sample, cna: self.create_and_write_genematrix(
+                    sample, cna["cna_samples"]
+                ),
+                inputs=["sample", "cna"],
+                after=["release_folders"],
+                outputs=[output("data_gene_matrix.txt")],
+            ),
+            # Stage(
+            #     "fusion",
+            #     self.create_and_write_fusion,
+            #     inputs={"keep_samples": "sample_ids"},
+            #     after=["release_folders"],
+            #     outputs=[output("data_fusions.txt")],
+            #     fingerprint=partial(self.get_mg_file_version, "data_fusions.txt"),
+            # ),
+            Stage(
+                "seg",
+                self.create_and_write_seg,
+                inputs={"keep_samples": "sample_ids"},
+                after=["release_folders"],
+                outputs=[output("data_cna_hg19.seg")],
+                fingerprint=partial(self.get_mg_file_version, "data_cna_hg19.seg"),
+            ),
+            Stage(
+                "sv",
+                self.create_and_write_sv,
+                inputs={"keep_samples": "sample_ids"},
+                after=["release_folders"],
+                outputs=[output("data_sv.txt")],
+                fingerprint=partial(self.get_mg_file_version, "data_sv.txt"),
+            ),
+            Stage(
+                "case_lists",
+                create_and_write_case_lists,
+                inputs={**clinical_inputs, "sample": "sample", "patient": "patient"},
+                after=["genie_clinical", "release_folders"],
+            ),
+            Stage(
+                "gene_panels",
+                self.create_and_write_gene_panels,
+                inputs={"keep_seq_assay_ids": "seq_assay_ids"},
+                after=["release_folders"],
+                outputs=[
+                    output("genomic_information.txt"),
+                    output("data_gene_panel_*.txt"),
+                ],
+                fingerprint=partial(
+                    self.get_mg_file_version, "genomic_information.txt"
+                ),
+            ),
+            Stage(
+                "metafiles", self.create_and_write_metafiles, after=["release_folders"]
+            ),
+        ]
+        stages = [stage for stage in stages if stage.name not in self._skip_stages]
+        # Validation runs once every file is written
+        stages.append(
+            Stage("validation", self.validate, after=[stage.name for stage in stages])
+        )
+        return stages
+
+    def get_manifest(self) -> ExportManifest:
+        """Get the export manifest. Entries of an earlier export are only
+        kept when resuming.
+
+        Returns:
+            ExportManifest: export manifest
+        """
+        return ExportManifest(
+            f"{self._SPONSORED_PROJECT}_export_manifest.json",
+            context={
+                "git_sha": self.git_sha,
+                "mapping_table": self._REDCAP_TO_CBIOMAPPING_SYNID,
+                "mg_release": self._MG_RELEASE_SYNID,
+                "release": self.release,
+                "environment": self.environment,
+                "upload": self.upload,
+                "use_grs": self.use_grs,
+            },
+            resume=self.resume,
+            get_version=self.dataset_cache.get_version,
+            get_used=self.dataset_cache.used_entities,
+        )
+
+    def start_export(self) -> StageScheduler:
+        """Create the release folders and the stage scheduler of an export
+
+        Returns:
+            StageScheduler: scheduler of the export stages, with the manifest
+        """
+        logging.info("creating release folders...")
+        create_release_folders(cohort=self._SPONSORED_PROJECT, clean=not self.resume)
+
+        for name in self._skip_stages:
+            logging.info(f"skipping {name}...")
+        if self.profiler is not None:
+            self.profiler.start()
+        return StageScheduler(
+            self.get_stages(),
+            jobs=self.jobs,
+            manifest=self.get_manifest(),
+            profiler=self.profiler,
+            metrics=self.metrics,
+        )
+
+    def finish_export(self, scheduler: StageScheduler) -> None:
+        """Wait for the uploads of an export, log its statistics and write
+        its metrics, and its profile when profiling
+
+        Args:
+            scheduler (StageScheduler): scheduler of the export stages
+        """
+        if self.upload:
+            self.upload_queue.close()
+            # Files that weren't uploaded must be rebuilt when resuming
+            scheduler.manifest.discard_outputs(self.upload_queue.failed)
+        scheduler.log_timings()
+        if scheduler.skipped:
+            logging.info(f"up to date stages: {', '.join(scheduler.skipped)}")
+        self.dataset_cache.log_stats()
+        self.metrics.write(
+            f"{self._SPONSORED_PROJECT}_metrics.json",
+            f"{self._SPONSORED_PROJECT}_metrics.prom",
+        )
+        if self.profiler is not None:
+            self.profiler.stop()
+            self.profiler.write(**profile_paths(self._SPONSORED_PROJECT))
+
+    def run(self):
+        """Runs the redcap export to export all files. When resuming, files
+        whose inputs didn't change since the last export are kept."""
+        scheduler = self.start_export()
+        try:
+            scheduler.run()
+        finally:
+            self.finish_export(scheduler)
+
+
+def fan_out_genomic_files(
+    runners: List[BpcProjectRunner], keep_samples: Dict[str, list]
+) -> Dict[str, Dict[str, Any]]:
+    """Subset the main GENIE MAF, CNA, SEG and SV files for several cohorts
+    with one read of each file. The genomic stages of each runner then use
+    the written files instead of reading the release files again, and count
+    their rows and bytes written in the runner's metrics.
+
+    Args:
+        runners (List[BpcProjectRunner]): cohort runners with the same
+            main GENIE release
+        keep_samples (Dict[str, list]): cohort to the samples to keep
+
+    Returns:
+        Dict[str, Dict[str, Any]]: release file name to cohort to the
+        number of rows or the CNA columns written
+    """
+    mg_releases = {runner._MG_RELEASE_SYNID for runner in runners}
+    if len(mg_releases) != 1:
+        raise ValueError(f"cohorts use different main GENIE releases: {mg_releases}")
+    lead = runners[0]
+
+    def download(file_name: str) -> Optional[File]:
+        try:
+            synid = lead.get_mg_synid(lead._MG_RELEASE_SYNID, file_name)
+        except ValueError:
+            logging.warning(f"{file_name} doesn't exist in main genie release")
+            return None
+        return lead.syn.get(synid, followLink=True)
+
+    cohort_samples = {
+        runner._SPONSORED_PROJECT: keep_samples[runner._SPONSORED_PROJECT]
+        for runner in runners
+    }
+
+    def out_paths(file_name: str) -> Dict[str, str]:
+        return {
+            cohort: os.path.join(cohort, file_name) for cohort in cohort_samples
+        }
+
+    stats = {}
+    maf_ent = download("data_mutations_extended.txt")
+    stats["data_mutations_extended.txt"] = fan_out_maf(
+        maf_ent.path,
+        cohort_samples,
+        out_paths("data_mutations_extended.txt"),
+        index=lead.get_sample_index(maf_ent, "Tumor_Sample_Barcode"),
+    )
+    cna_ent = download("data_CNA.txt")
+    stats["data_CNA.txt"] = fan_out_cna(
+        cna_ent.path, cohort_samples, out_paths("data_CNA.txt")
+    )
+    seg_ent = download("data_cna_hg19.seg")
+    stats["data_cna_hg19.seg"] = fan_out_rows(
+        seg_ent.path,
+        "ID",
+        cohort_samples,
+        out_paths("data_cna_hg19.seg"),
+        index=lead.get_sample_index(seg_ent, "ID"),
+    )
+    sv_ent = download("data_sv.txt")
+    if sv_ent is not None:
+        stats["data_sv.txt"] = fan_out_rows(
+            sv_ent.path, "Sample_Id", cohort_samples, out_paths("data_sv.txt")
+        )
+    for runner in runners:
+        cohort = runner._SPONSORED_PROJECT
+        samples = frozenset(str(sample) for sample in cohort_samples[cohort])
+        for file_name, cohort_stats in stats.items():
+            runner._fanned_out[file_name] = (samples, cohort_stats[cohort])
+    return stats
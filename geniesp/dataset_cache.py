@@ -0,0 +1,291 @@
+"""Run-scoped cache of BPC derived variable datasets"""
+import logging
+import re
+import threading
+from typing import Dict, Iterable, List, Tuple
+
+import pandas as pd
+from synapseclient import Synapse
+
+from . import metrics
+from .stages import current_stage
+from .table_cache import ColumnarTableCache
+
+# Columns that the export reads from derived variable datasets
+# regardless of the cBio mapping
+_ALWAYS_READ_COLUMNS = [
+    "cohort_internal",
+    "record_id",
+    "path_rep_number",
+    "path_proc_number",
+    "redcap_ca_index",
+    "regimen_drugs",
+    "regimen_number",
+]
+
+
+class ColumnProjection:
+    """Columns to read from a derived variable dataset. Wildcard codes
+    such as `drugs_drug_*` are kept as regular expressions and matched the
+    same way as `make_timeline_treatmentdf` expands them.
+    An instance can be passed as `usecols` to `pd.read_csv`.
+    """
+
+    def __init__(self, names: Iterable[str] = (), patterns: Iterable[str] = ()):
+        self.names = frozenset(names)
+        self.patterns = frozenset(patterns)
+        self._regexes = [re.compile(pattern) for pattern in self.patterns]
+
+    @classmethod
+    def from_codes(cls, codes: Iterable[str]) -> "ColumnProjection":
+        """Create a projection from mapping table codes
+
+        Args:
+            codes (Iterable[str]): variable codes, can contain wildcards
+
+        Returns:
+            ColumnProjection: projection of the codes
+        """
+        names = []
+        patterns = []
+        for code in codes:
+            if pd.isna(code):
+                continue
+            if "*" in code:
+                patterns.append(code.replace("*", r"[\d]"))
+            else:
+                names.append(code)
+        return cls(names, patterns)
+
+    def __call__(self, column: str) -> bool:
+        return column in self.names or any(
+            regex.search(column) for regex in self._regexes
+        )
+
+    def covers(self, other: "ColumnProjection") -> bool:
+        """Whether this projection reads every column of another projection"""
+        return other.names <= self.names and other.patterns <= self.patterns
+
+    def union(self, other: "ColumnProjection") -> "ColumnProjection":
+        """Projection that reads the columns of both projections"""
+        return ColumnProjection(
+            self.names | other.names, self.patterns | other.patterns
+        )
+
+
+def plan_dataset_columns(
+    mappingdf: pd.DataFrame,
+    data_tablesdf: pd.DataFrame,
+    extra_columns: Dict[str, List[str]] = None,
+) -> Dict[str, ColumnProjection]:
+    """Compute the columns each derived variable dataset needs across all
+    sample types of the cBio mapping.
+
+    Args:
+        mappingdf (pd.DataFrame): variable to cBioPortal mapping info
+        data_tablesdf (pd.DataFrame): data file to Synapse ID mapping
+        extra_columns (Dict[str, List[str]], optional): dataset label to codes
+            that are read by the export but are not in the mapping.
+            Defaults to None.
+
+    Returns:
+        Dict[str, ColumnProjection]: Synapse ID to columns to read
+    """
+    codesdf = mappingdf[["dataset", "code"]]
+    if extra_columns:
+        codesdf = pd.concat(
+            [
+                codesdf,
+                pd.DataFrame(
+                    [
+                        {"dataset": dataset, "code": code}
+                        for dataset, codes in extra_columns.items()
+                        for code in codes
+                    ]
+                ),
+            ]
+        )
+    codesdf = codesdf.merge(data_tablesdf, on="dataset", how="inner")
+    projections = {}
+    for synid, df in codesdf.groupby("id"):
+        projections[synid] = ColumnProjection.from_codes(df["code"]).union(
+            ColumnProjection(_ALWAYS_READ_COLUMNS)
+        )
+    return projections
+
+
+class DerivedDatasetCache:
+    """Parses each derived variable dataset once per run and serves
+    every later request for the same Synapse ID and version from memory.
+    Cached data frames are pre-filtered to a single cohort and are shared
+    between callers, so callers must not modify them in place.
+    The cache is thread-safe and parses a dataset once even when several
+    threads request it at the same time.
+    """
+
+    def __init__(
+        self, syn: Synapse, cohort: str, table_cache: ColumnarTableCache = None
+    ):
+        self.syn = syn
+        self.cohort = cohort
+        self.table_cache = table_cache
+        self.hits = 0
+        self.misses = 0
+        # Synapse ID -> Synapse entity
+        self._entities = {}
+        # Synapse ID -> current version, of datasets that weren't downloaded
+        self._versions = {}
+        # Synapse ID -> planned columns to read
+        self._projections = {}
+        # synid.version -> (cohort subset of the dataset, columns read)
+        self._tables = {}
+        self._lock = threading.Lock()
+        # Synapse ID or synid.version -> lock
+        self._key_locks = {}
+        # export stage -> synid.version read by the stage
+        self._used = {}
+
+    def _key_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._key_locks.setdefault(key, threading.Lock())
+
+    def set_projections(self, projections: Dict[str, ColumnProjection]) -> None:
+        """Only read the planned columns of derived variable datasets.
+        Datasets without a plan are read in full.
+
+        Args:
+            projections (Dict[str, ColumnProjection]): Synapse ID to
+                columns to read
+        """
+        self._projections.update(projections)
+
+    def get_entity(self, synid: str):
+        """Get the Synapse entity of a derived variable dataset. Entities
+        are only retrieved once per Synapse ID.
+
+        Args:
+            synid (str): Synapse ID of derived variable dataset
+
+        Returns:
+            synapseclient.File: Synapse entity
+        """
+        with self._key_lock(synid):
+            if synid not in self._entities:
+                self._entities[synid] = self.syn.get(synid)
+            return self._entities[synid]
+
+    def get_version(self, synid: str) -> int:
+        """Get the current version of a derived variable dataset without
+        downloading it, unless it was already downloaded
+
+        Args:
+            synid (str): Synapse ID of derived variable dataset
+
+        Returns:
+            int: version number
+        """
+        with self._key_lock(synid):
+            if synid in self._entities:
+                return self._entities[synid].versionNumber
+            if synid not in self._versions:
+                entity = self.syn.get(synid, downloadFile=False)
+                self._versions[synid] = entity.versionNumber
+            return self._versions[synid]
+
+    def get(
+        self, synid: str, columns: ColumnProjection = None
+    ) -> Tuple[pd.DataFrame, str]:
+        """Get the cohort subset of a derived variable dataset.
+
+        Args:
+            synid (str): Synapse ID of derived variable dataset
+            columns (ColumnProjection, optional): columns the caller needs.
+                If these weren't planned, the dataset is read again with
+                the missing columns. Defaults to None.
+
+        Returns:
+            Tuple[pd.DataFrame, str]: cohort data and the versioned
+            Synapse ID (synid.version) that was used
+        """
+        entity = self.get_entity(synid)
+        used_entity = f"{synid}.{entity.versionNumber}"
+        stage = current_stage()
+        if stage is not None:
+            with self._lock:
+                self._used.setdefault(stage, set()).add(used_entity)
+        with self._key_lock(used_entity):
+            tabledf = self._get(synid, entity, used_entity, columns)
+        metrics.add("rows_read", len(tabledf))
+        return tabledf, used_entity
+
+    def _get(
+        self, synid: str, entity, used_entity: str, columns: ColumnProjection
+    ) -> pd.DataFrame:
+        cached = self._tables.get(used_entity)
+        if cached is not None and (
+            cached[1] is None or columns is None or cached[1].covers(columns)
+        ):
+            with self._lock:
+                self.hits += 1
+            metrics.add("cache_hits")
+            return cached[0]
+
+        projection = self._projections.get(synid)
+        if cached is not None:
+            logging.warning(
+                f"{synid}: columns not in the column plan were requested, "
+                "re-reading dataset"
+            )
+            projection = None if columns is None else cached[1].union(columns)
+        elif projection is not None and columns is not None:
+            projection = projection.union(columns)
+        if projection is not None:
+            projection = projection.union(ColumnProjection(["cohort_internal"]))
+        with self._lock:
+            self.misses += 1
+        metrics.add("cache_misses")
+        if self.table_cache is None:
+            tabledf = pd.read_csv(entity.path, low_memory=False, usecols=projection)
+        else:
+            tabledf = self.table_cache.read_csv(
+                synid, entity.versionNumber, entity.path, usecols=projection
+            )
+        tabledf = tabledf[tabledf["cohort_internal"] == self.cohort]
+        self._tables[used_entity] = (tabledf, projection)
+        return tabledf
+
+    def record_used(self, entities: Iterable[str]) -> None:
+        """Record datasets as read by the current export stage, for results
+        that were built from them by an earlier stage and are reused
+
+        Args:
+            entities (Iterable[str]): versioned Synapse IDs (synid.version)
+        """
+        stage = current_stage()
+        if stage is not None:
+            with self._lock:
+                self._used.setdefault(stage, set()).update(entities)
+
+    def used_entities(self, stage: str) -> List[str]:
+        """Get the datasets read by an export stage
+
+        Args:
+            stage (str): stage name
+
+        Returns:
+            List[str]: versioned Synapse IDs (synid.version)
+        """
+        with self._lock:
+            return sorted(self._used.get(stage, set()))
+
+    @property
+    def stats(self) -> Dict[str, int]:
+        """Cache hit and miss counters"""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def log_stats(self) -> None:
+        """Log cache hit and miss counters"""
+        logging.info(
+            f"derived dataset cache: {self.hits} hits, {self.misses} misses, "
+            f"{len(self._tables)} datasets parsed"
+        )
@@ -0,0 +1,103 @@
+"""Day conversions of date columns
+
+Dates are exported as integer days, from birth or from a reference date, and
+some columns are released in months (days / 30.4) or years (days / 365.25),
+rounded down. Each runner declares the unit of its day columns as patterns of
+column names, which are resolved against the columns of its cBio mapping
+table, and the columns of a unit are converted at once. Missing days stay
+missing.
+"""
+import re
+from typing import Dict, Iterable
+
+import numpy as np
+import pandas as pd
+
+# Days in each unit a day column can be converted to
+DAYS_PER_UNIT = {"months": 30.4, "years": 365.25}
+
+
+def day_units(columns: Iterable[str], patterns: Dict[str, str]) -> Dict[str, str]:
+    """Get the unit of the columns that match a pattern
+
+    Args:
+        columns (Iterable[str]): column names, for example the cbio column of
+            a mapping table
+        patterns (Dict[str, str]): regular expression that a column name must
+            fully match to the unit of the column. The first match wins.
+
+    Raises:
+        ValueError: a pattern has an unknown unit
+
+    Returns:
+        Dict[str, str]: column to unit, in the order of the columns
+    """
+    unknown = set(patterns.values()) - set(DAYS_PER_UNIT)
+    if unknown:
+        raise ValueError(f"units must be in {list(DAYS_PER_UNIT)}: {sorted(unknown)}")
+    compiled = [(re.compile(pattern), unit) for pattern, unit in patterns.items()]
+    units = {}
+    for column in dict.fromkeys(columns):
+        for pattern, unit in compiled:
+            if pattern.fullmatch(column):
+                units[column] = unit
+                break
+    return units
+
+
+def days_to(days: pd.DataFrame, unit: str) -> pd.DataFrame:
+    """Convert day columns to a unit, rounded down. Columns without missing
+    days are integers, like the per-element conversions used to return.
+
+    Args:
+        days (pd.DataFrame): numeric day columns
+        unit (str): "months" or "years"
+
+    Returns:
+        pd.DataFrame: converted columns
+    """
+    converted = np.floor(days.astype(float) / DAYS_PER_UNIT[unit])
+    complete = converted.columns[converted.notna().all().to_numpy()]
+    if len(converted) and len(complete):
+        converted[complete] = converted[complete].astype(np.int64)
+    return converted
+
+
+def convert_days(df: pd.DataFrame, units: Dict[str, str]) -> pd.DataFrame:
+    """Convert the day columns of a data frame, see `days_to`. Columns that
+    aren't in the data frame are skipped.
+
+    Args:
+        df (pd.DataFrame): data
+        units (Dict[str, str]): column to unit, see `day_units`
+
+    Returns:
+        pd.DataFrame: data with converted columns
+    """
+    df = df.copy()
+    for unit in DAYS_PER_UNIT:
+        columns = [
+            column
+            for column, column_unit in units.items()
+            if column_unit == unit and column in df
+        ]
+        if columns:
+            df[columns] = days_to(df[columns], unit)
+    return df
+
+
+def days_since(days: pd.DataFrame, origin: pd.Series) -> pd.DataFrame:
+    """Whole days between each day column and the origin day of each row.
+    Days are truncated to integers first; missing days or origins give
+    missing intervals.
+
+    Args:
+        days (pd.DataFrame): numeric day columns
+        origin (pd.Series): origin day of each row
+
+    Returns:
+        pd.DataFrame: days since the origin
+    """
+    return np.trunc(days.astype(float)).sub(
+        np.trunc(origin.astype(float)), axis="index"
+    )
@@ -0,0 +1,177 @@
+"""Indexed listings of Synapse folders
+
+Listing a folder with `getChildren` is paginated and lookups by name walk
+the whole listing. A FolderIndex lists a folder once and maps file names
+to Synapse IDs, versions and, on first use, MD5s. Indexes are shared by all
+lookups in a process and can be persisted to disk per folder etag.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict, Optional
+
+from synapseclient import Synapse
+
+# folder ID -> FolderIndex shared by all lookups in the process
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class FolderIndex:
+    """Name to Synapse ID, version and MD5 index of a Synapse folder
+
+    Args:
+        syn (Synapse): Synapse connection
+        folder_id (str): Synapse ID of the folder
+        cache_dir (str, optional): directory to persist the index in.
+            Defaults to None, which doesn't persist it.
+    """
+
+    def __init__(self, syn: Synapse, folder_id: str, cache_dir: str = None):
+        self.syn = syn
+        self.folder_id = folder_id
+        self._lock = threading.Lock()
+        self._path = None
+        self.entries = None
+        if cache_dir is not None:
+            etag = syn.get(folder_id, downloadFile=False).etag
+            folder_dir = os.path.join(cache_dir, "folders")
+            os.makedirs(folder_dir, exist_ok=True)
+            self._path = os.path.join(folder_dir, f"{folder_id}.{etag}.json")
+            if os.path.exists(self._path):
+                with open(self._path) as index_f:
+                    self.entries = json.load(index_f)
+        if self.entries is None:
+            self.refresh()
+
+    def refresh(self) -> None:
+        """List the folder again"""
+        logging.info(f"listing {self.folder_id}...")
+        entries = {
+            child["name"]: {
+                "id": child["id"],
+                "versionNumber": child.get("versionNumber"),
+                "md5": None,
+            }
+            for child in self.syn.getChildren(self.folder_id)
+        }
+        with self._lock:
+            self.entries = entries
+            self._save()
+
+    def _save(self) -> None:
+        if self._path is None:
+            return
+        fd, temp_path = tempfile.mkstemp(
+            dir=os.path.dirname(self._path), suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "w") as index_f:
+                json.dump(self.entries, index_f, sort_keys=True)
+            os.replace(temp_path, self._path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def get(self, name: str) -> Optional[Dict]:
+        """Get the entry of a file
+
+        Args:
+            name (str): file name
+
+        Returns:
+            Optional[Dict]: "id", "versionNumber" and "md5" (None if not
+            looked up yet) of the file or None if it isn't in the folder
+        """
+        with self._lock:
+            return self.entries.get(name)
+
+    def synid(self, name: str) -> str:
+        """Get the Synapse ID of a file
+
+        Args:
+            name (str): file name
+
+        Raises:
+            ValueError: file isn't in the folder
+
+        Returns:
+            str: Synapse ID
+        """
+        entry = self.get(name)
+        if entry is None:
+            raise ValueError(f"file '{name}' not found in {self.folder_id}")
+        return entry["id"]
+
+    def version(self, name: str) -> Optional[str]:
+        """Get the versioned Synapse ID of a file
+
+        Args:
+            name (str): file name
+
+        Returns:
+            Optional[str]: synid.version or None if the file isn't in the folder
+        """
+        entry = self.get(name)
+        if entry is None:
+            return None
+        return f"{entry['id']}.{entry['versionNumber']}"
+
+    def md5(self, name: str) -> Optional[str]:
+        """Get the MD5 of a file. It is retrieved from Synapse the first
+        time it's requested.
+
+        Args:
+            name (str): file name
+
+        Returns:
+            Optional[str]: MD5 or None if the file isn't in the folder
+        """
+        entry = self.get(name)
+        if entry is None:
+            return None
+        if entry["md5"] is None:
+            entity = self.syn.get(entry["id"], downloadFile=False, followLink=True)
+            with self._lock:
+                entry["md5"] = entity.md5
+                self._save()
+        return entry["md5"]
+
+    def update(self, name: str, entity) -> None:
+        """Record a file that was stored in the folder
+
+        Args:
+            name (str): file name
+            entity (synapseclient.File): stored entity
+        """
+        with self._lock:
+            self.entries[name] = {
+                "id": entity.id,
+                "versionNumber": entity.versionNumber,
+                "md5": entity.md5,
+            }
+            self._save()
+
+
+def get_folder_index(
+    syn: Synapse, folder_id: str, cache_dir: str = None
+) -> FolderIndex:
+    """Get the index of a folder, shared by all lookups in the process
+
+    Args:
+        syn (Synapse): Synapse connection
+        folder_id (str): Synapse ID of the folder
+        cache_dir (str, optional): directory to persist the index in.
+            Defaults to None.
+
+    Returns:
+        FolderIndex: folder index
+    """
+    with _registry_lock:
+        index = _registry.get(folder_id)
+        if index is None:
+            index = FolderIndex(syn, folder_id, cache_dir=cache_dir)
+            _registry[folder_id] = index
+        return index
@@ -0,0 +1,829 @@
+"""Streaming subsets of main GENIE genomic release files
+
+The subsets are built from the raw lines of the release files and rewrite
+each field the way the old `pd.read_table` and `removePandasDfFloat` path
+did: quoted fields are unquoted and written back with minimal quoting, NA
+values are emptied (NA in CNA files), decimal and exponent floats are
+written in Python's float format (1.50 becomes 1.5, 1E-5 becomes 1e-05)
+and a trailing ".0" is stripped.
+
+pandas types whole columns, while the subsets only see one field at a
+time, so the output still differs from the pandas path for:
+
+- floats with more than 15 significant digits, which pandas' float parser
+  rounds off (0.0006369616873214543 becomes 0.0006369616873214) while the
+  subsets write the nearest float (0.0006369616873214543)
+- columns of only TRUE/FALSE values, which pandas writes as True/False
+- floats in columns that also have text, which pandas keeps as written,
+  and integers with leading zeros or a "+" in integer columns, which
+  pandas rewrites
+- quoted fields with line breaks, which span several lines
+
+Release files don't change once published, so the byte ranges of each
+sample's rows can be indexed once per file and reused by every cohort.
+"""
+from concurrent.futures import ProcessPoolExecutor
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import tempfile
+import threading
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .hashing import HashingWriter
+
+# Fields read as NaN by pandas and written as empty fields
+PANDAS_NA_VALUES = frozenset(
+    value.encode()
+    for value in [
+        "",
+        "#N/A",
+        "#N/A N/A",
+        "#NA",
+        "-1.#IND",
+        "-1.#QNAN",
+        "-NaN",
+        "-nan",
+        "1.#IND",
+        "1.#QNAN",
+        "<NA>",
+        "N/A",
+        "NA",
+        "NULL",
+        "NaN",
+        "None",
+        "n/a",
+        "nan",
+        "null",
+    ]
+)
+# Read depths and allele counts, where "." means missing
+MAF_COUNT_COLUMNS = [
+    "t_depth",
+    "t_ref_count",
+    "t_alt_count",
+    "n_depth",
+    "n_ref_count",
+    "n_alt_count",
+]
+# Lines are written in batches of about this many bytes
+WRITE_BATCH_BYTES = 1024 * 1024
+# Fields that pandas reads as floats and writes in Python's float format.
+# Integers are left out, pandas writes them as they are.
+_FLOAT_RE = re.compile(
+    rb"[+-]?(?:\d+\.\d*|\.\d+)(?:[eE][+-]?\d+)?|[+-]?\d+[eE][+-]?\d+"
+)
+# Characters of fields that pandas writes quoted
+_QUOTED_CHARACTERS = (b'"', b"\t", b"\n", b"\r")
+
+
+def remove_bytes_float(line: bytes) -> bytes:
+    """`removeStringFloat` of an encoded line"""
+    return line.replace(b".0\t", b"\t").replace(b".0\n", b"\n")
+
+
+def split_fields(line: bytes) -> List[bytes]:
+    """Split a line into its fields, unquoting quoted fields the way
+    `pd.read_table` does
+
+    Args:
+        line (bytes): line of a tab separated file
+
+    Returns:
+        List[bytes]: fields
+    """
+    line = line.rstrip(b"\r\n")
+    if b'"' not in line:
+        return line.split(b"\t")
+    return [
+        field.encode("latin-1")
+        for field in next(csv.reader([line.decode("latin-1")], delimiter="\t"))
+    ]
+
+
+def pandas_float(field: bytes) -> bytes:
+    """Write a float field the way pandas writes a float column"""
+    if _FLOAT_RE.fullmatch(field):
+        return repr(float(field)).encode()
+    return field
+
+
+def join_fields(fields: List[bytes], quoted: bool) -> bytes:
+    """Join fields into a line, quoting the fields that `to_csv` quotes
+
+    Args:
+        fields (List[bytes]): fields
+        quoted (bool): whether fields can need quotes, which is only the
+            case if the line they were split from had quotes
+
+    Returns:
+        bytes: line
+    """
+    if quoted:
+        fields = [
+            b'"' + field.replace(b'"', b'""') + b'"'
+            if any(character in field for character in _QUOTED_CHARACTERS)
+            else field
+            for field in fields
+        ]
+    return b"\t".join(fields) + b"\n"
+
+
+class RowSubsetter:
+    """Selects the rows of a release file that belong to a set of samples
+    and rewrites their fields, see the module documentation
+
+    Args:
+        header (bytes): column header line
+        sample_column (str): column with the sample ID of a row
+        keep_samples (Iterable[str]): sample IDs to keep
+
+    Raises:
+        ValueError: file has no sample column
+    """
+
+    def __init__(self, header: bytes, sample_column: str, keep_samples: Iterable[str]):
+        columns = split_fields(header)
+        if sample_column.encode() not in columns:
+            raise ValueError(f"file has no {sample_column} column")
+        self.n_columns = len(columns)
+        self.sample_index = columns.index(sample_column.encode())
+        self.columns = self.configure_columns(columns)
+        self.header = remove_bytes_float(join_fields(self.columns, quoted=True))
+        self.keep_samples = frozenset(
+            str(sample).encode() for sample in keep_samples
+        )
+
+    def configure_columns(self, columns: List[bytes]) -> List[bytes]:
+        """Columns of the output"""
+        return columns
+
+    def configure_fields(self, fields: List[bytes]) -> List[bytes]:
+        """Fields of an output row, after NA values were emptied"""
+        return fields
+
+    def sample_of(self, line: bytes) -> bytes:
+        """Sample ID of a line"""
+        if b'"' in line:
+            fields = split_fields(line)
+        else:
+            fields = line.split(b"\t", self.sample_index + 1)
+        if len(fields) <= self.sample_index:
+            return b""
+        return fields[self.sample_index].rstrip(b"\r\n")
+
+    def configure(self, line: bytes) -> bytes:
+        """Rewrite a kept line, see the module documentation"""
+        fields = [
+            b"" if field in PANDAS_NA_VALUES else pandas_float(field)
+            for field in split_fields(line)
+        ]
+        if len(fields) < self.n_columns:
+            fields.extend([b""] * (self.n_columns - len(fields)))
+        return remove_bytes_float(
+            join_fields(self.configure_fields(fields), quoted=b'"' in line)
+        )
+
+    def subset(self, lines: Iterable[bytes]) -> Iterator[bytes]:
+        """Configured lines of the kept samples
+
+        Args:
+            lines (Iterable[bytes]): lines without the header
+
+        Yields:
+            bytes: configured line
+        """
+        keep_samples = self.keep_samples
+        sample_of = self.sample_of
+        for line in lines:
+            if sample_of(line) in keep_samples:
+                yield self.configure(line)
+
+
+class MafSubsetter(RowSubsetter):
+    """Selects the rows of a MAF that belong to a set of samples and
+    configures them for cBioPortal: missing read counts and the
+    Validation_Status column are emptied.
+
+    Args:
+        header (bytes): column header line of the MAF
+        keep_samples (Iterable[str]): Tumor_Sample_Barcode values to keep
+
+    Raises:
+        ValueError: MAF has no Tumor_Sample_Barcode column
+    """
+
+    def __init__(self, header: bytes, keep_samples: Iterable[str]):
+        super().__init__(header, "Tumor_Sample_Barcode", keep_samples)
+
+    def configure_columns(self, columns: List[bytes]) -> List[bytes]:
+        self.count_indices = [
+            columns.index(column.encode())
+            for column in MAF_COUNT_COLUMNS
+            if column.encode() in columns
+        ]
+        # Validation_Status is appended if the MAF doesn't have it
+        self.add_validation_status = b"Validation_Status" not in columns
+        if self.add_validation_status:
+            columns = columns + [b"Validation_Status"]
+        self.validation_index = columns.index(b"Validation_Status")
+        return columns
+
+    def configure_fields(self, fields: List[bytes]) -> List[bytes]:
+        if self.add_validation_status:
+            fields.append(b"")
+        for index in self.count_indices:
+            if fields[index] == b".":
+                fields[index] = b""
+        fields[self.validation_index] = b""
+        return fields
+
+
+class BatchedWriter:
+    """Writes encoded lines to a file in large batches
+
+    Args:
+        path (str): output file path
+        header (bytes, optional): written first. Defaults to None.
+    """
+
+    def __init__(self, path: str, header: Optional[bytes] = None):
+        self._file = HashingWriter(path)
+        self._batch = [] if header is None else [header]
+        self._batch_bytes = 0
+        self.n_lines = 0
+
+    def write(self, line: bytes) -> None:
+        self._batch.append(line)
+        self._batch_bytes += len(line)
+        self.n_lines += 1
+        if self._batch_bytes >= WRITE_BATCH_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._batch:
+            self._file.write_bytes(b"".join(self._batch))
+            self._batch = []
+            self._batch_bytes = 0
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+class SampleRangeIndex:
+    """Byte ranges of the rows of each sample in a release file, so that
+    the rows of a set of samples can be copied without scanning the file
+
+    Args:
+        ranges (Dict[str, List[List[int]]]): sample ID to start and end
+            offsets of its consecutive rows
+    """
+
+    def __init__(self, ranges: Dict[str, List[List[int]]]):
+        self.ranges = ranges
+
+    @classmethod
+    def build(cls, path: str, sample_column: str) -> "SampleRangeIndex":
+        """Index a file by scanning it once
+
+        Args:
+            path (str): release file path
+            sample_column (str): column with the sample ID of a row
+
+        Returns:
+            SampleRangeIndex: index of the file
+        """
+        start = time.perf_counter()
+        ranges = {}
+        with open(path, "rb") as file_f:
+            header = file_f.readline()
+            sample_of = RowSubsetter(header, sample_column, []).sample_of
+            offset = len(header)
+            current = None
+            for line in file_f:
+                sample = sample_of(line).decode()
+                if current is not None and current[0] == sample:
+                    current[1][1] += len(line)
+                else:
+                    current = (sample, [offset, offset + len(line)])
+                    ranges.setdefault(sample, []).append(current[1])
+                offset += len(line)
+        logging.info(
+            f"indexed {len(ranges)} samples of {path} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return cls(ranges)
+
+    @classmethod
+    def load(cls, path: str) -> "SampleRangeIndex":
+        with open(path) as index_f:
+            index = json.load(index_f)
+        return cls(index["ranges"])
+
+    def save(self, path: str) -> None:
+        """Atomically write the index"""
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as index_f:
+                json.dump({"ranges": self.ranges}, index_f)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def ranges_of(self, samples: Iterable[bytes]) -> List[Tuple[int, int]]:
+        """Byte ranges of the rows of a set of samples, in file order with
+        adjacent ranges merged
+
+        Args:
+            samples (Iterable[bytes]): encoded sample IDs
+
+        Returns:
+            List[Tuple[int, int]]: start and end offsets
+        """
+        ranges = sorted(
+            (start, end)
+            for sample in samples
+            for start, end in self.ranges.get(sample.decode(), [])
+        )
+        merged = []
+        for start, end in ranges:
+            if merged and merged[-1][1] == start:
+                merged[-1] = (merged[-1][0], end)
+            else:
+                merged.append((start, end))
+        return merged
+
+    def read_lines(self, path: str, samples: Iterable[bytes]) -> Iterator[bytes]:
+        """Lines of a set of samples, in file order
+
+        Args:
+            path (str): indexed file path
+            samples (Iterable[bytes]): encoded sample IDs
+
+        Yields:
+            bytes: line
+        """
+        with open(path, "rb") as file_f:
+            for start, end in self.ranges_of(samples):
+                file_f.seek(start)
+                yield from io.BytesIO(file_f.read(end - start))
+
+
+# index file path -> SampleRangeIndex loaded in the process
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_sample_index(
+    path: str, sample_column: str, key: str, cache_dir: str
+) -> SampleRangeIndex:
+    """Get the index of a release file, building it the first time
+
+    Args:
+        path (str): release file path
+        sample_column (str): column with the sample ID of a row
+        key (str): identifies the content of the file, such as
+            synid.version.md5
+        cache_dir (str): directory the index is stored in
+
+    Returns:
+        SampleRangeIndex: index of the file
+    """
+    index_dir = os.path.join(cache_dir, "genomic")
+    os.makedirs(index_dir, exist_ok=True)
+    index_path = os.path.join(index_dir, f"{key}.{sample_column}.json")
+    with _indexes_lock:
+        index = _indexes.get(index_path)
+        if index is None:
+            if os.path.exists(index_path):
+                index = SampleRangeIndex.load(index_path)
+            else:
+                index = SampleRangeIndex.build(path, sample_column)
+                index.save(index_path)
+            _indexes[index_path] = index
+        return index
+
+
+def line_ranges(path: str, start: int, chunk_bytes: int) -> List[Tuple[int, int]]:
+    """Split a file into byte ranges of about `chunk_bytes` that start and
+    end at line boundaries
+
+    Args:
+        path (str): file path
+        start (int): offset of the first line to include
+        chunk_bytes (int): target range size
+
+    Returns:
+        List[Tuple[int, int]]: start and end offset of each range
+    """
+    size = os.path.getsize(path)
+    ranges = []
+    with open(path, "rb") as file_f:
+        while start < size:
+            file_f.seek(min(start + max(chunk_bytes, 1), size))
+            if file_f.tell() < size:
+                # Move to the start of the next line
+                file_f.readline()
+            end = file_f.tell()
+            ranges.append((start, end))
+            start = end
+    return ranges
+
+
+# MafSubsetter of a worker process
+_worker_subsetter = None
+
+
+def _init_maf_worker(subsetter: MafSubsetter) -> None:
+    global _worker_subsetter
+    _worker_subsetter = subsetter
+
+
+def _subset_maf_range(
+    path: str, start: int, end: int
+) -> Tuple[bytes, int, int, float]:
+    """Subset a byte range of a MAF in a worker process
+
+    Returns:
+        Tuple[bytes, int, int, float]: configured lines, number of lines,
+        worker process ID and seconds spent
+    """
+    range_start = time.perf_counter()
+    with open(path, "rb") as maf_f:
+        maf_f.seek(start)
+        data = maf_f.read(end - start)
+    lines = list(_worker_subsetter.subset(io.BytesIO(data)))
+    seconds = time.perf_counter() - range_start
+    return b"".join(lines), len(lines), os.getpid(), seconds
+
+
+def _subset_maf_parallel(
+    maf_path: str,
+    out_path: str,
+    subsetter: MafSubsetter,
+    data_start: int,
+    workers: int,
+    chunk_bytes: int,
+) -> int:
+    ranges = line_ranges(maf_path, data_start, chunk_bytes)
+    # worker process ID -> [bytes scanned, seconds]
+    throughput = {}
+    n_rows = 0
+    out_f = None
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_maf_worker,
+        initargs=(subsetter,),
+    ) as executor:
+        try:
+            # map returns the results in the order of the ranges
+            results = executor.map(
+                _subset_maf_range,
+                [maf_path] * len(ranges),
+                [start for start, _ in ranges],
+                [end for _, end in ranges],
+            )
+            for (start, end), (data, n_lines, pid, seconds) in zip(ranges, results):
+                worker = throughput.setdefault(pid, [0, 0.0])
+                worker[0] += end - start
+                worker[1] += seconds
+                if not n_lines:
+                    continue
+                if out_f is None:
+                    out_f = HashingWriter(out_path)
+                    out_f.write_bytes(subsetter.header)
+                out_f.write_bytes(data)
+                n_rows += n_lines
+        finally:
+            if out_f is not None:
+                out_f.close()
+    for pid, (n_bytes, seconds) in sorted(throughput.items()):
+        logging.info(
+            f"MAF worker {pid}: {n_bytes / 1024**2:.1f} MiB in {seconds:.1f}s "
+            f"({n_bytes / 1024**2 / max(seconds, 1e-9):.1f} MiB/s)"
+        )
+    return n_rows
+
+
+def _cohorts_by_sample(
+    cohort_samples: Dict[str, Iterable[str]]
+) -> Dict[bytes, List[str]]:
+    cohorts_of = {}
+    for cohort, samples in cohort_samples.items():
+        for sample in samples:
+            cohorts_of.setdefault(str(sample).encode(), []).append(cohort)
+    return cohorts_of
+
+
+def _fan_out_rows(
+    path: str,
+    subsetter: RowSubsetter,
+    lines: Iterable[bytes],
+    cohort_samples: Dict[str, Iterable[str]],
+    out_paths: Dict[str, str],
+    write_empty: bool,
+) -> Dict[str, int]:
+    start = time.perf_counter()
+    cohorts_of = _cohorts_by_sample(cohort_samples)
+    sample_of = subsetter.sample_of
+    writers = {}
+    try:
+        if write_empty:
+            for cohort in cohort_samples:
+                writers[cohort] = BatchedWriter(
+                    out_paths[cohort], header=subsetter.header
+                )
+        for line in lines:
+            cohorts = cohorts_of.get(sample_of(line))
+            if cohorts is None:
+                continue
+            configured = subsetter.configure(line)
+            for cohort in cohorts:
+                writer = writers.get(cohort)
+                if writer is None:
+                    writer = BatchedWriter(out_paths[cohort], header=subsetter.header)
+                    writers[cohort] = writer
+                writer.write(configured)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    n_rows = {
+        cohort: writers[cohort].n_lines if cohort in writers else 0
+        for cohort in cohort_samples
+    }
+    logging.info(
+        f"subset {path} for {len(cohort_samples)} cohorts in "
+        f"{time.perf_counter() - start:.1f}s: "
+        + ", ".join(f"{cohort} {rows} rows" for cohort, rows in n_rows.items())
+    )
+    return n_rows
+
+
+def fan_out_maf(
+    maf_path: str,
+    cohort_samples: Dict[str, Iterable[str]],
+    out_paths: Dict[str, str],
+    index: Optional[SampleRangeIndex] = None,
+) -> Dict[str, int]:
+    """Subset a MAF for several cohorts with one read of the MAF. The
+    output file of a cohort isn't created if none of its rows are kept.
+
+    Args:
+        maf_path (str): release MAF path
+        cohort_samples (Dict[str, Iterable[str]]): cohort to the
+            Tumor_Sample_Barcode values to keep
+        out_paths (Dict[str, str]): cohort to output MAF path
+        index (SampleRangeIndex, optional): index of the MAF. If given, only
+            the rows of the kept samples are read. Defaults to None.
+
+    Returns:
+        Dict[str, int]: cohort to number of rows written
+    """
+    with open(maf_path, "rb") as maf_f:
+        subsetter = MafSubsetter(
+            maf_f.readline(),
+            [sample.decode() for sample in _cohorts_by_sample(cohort_samples)],
+        )
+        lines = (
+            maf_f
+            if index is None
+            else index.read_lines(maf_path, subsetter.keep_samples)
+        )
+        return _fan_out_rows(
+            maf_path, subsetter, lines, cohort_samples, out_paths, write_empty=False
+        )
+
+
+def fan_out_rows(
+    path: str,
+    sample_column: str,
+    cohort_samples: Dict[str, Iterable[str]],
+    out_paths: Dict[str, str],
+    index: Optional[SampleRangeIndex] = None,
+) -> Dict[str, int]:
+    """Subset a release file with a sample column, such as the SEG or SV
+    file, for several cohorts with one read of the file. The header is
+    written even if no rows of a cohort are kept.
+
+    Args:
+        path (str): release file path
+        sample_column (str): column with the sample ID of a row
+        cohort_samples (Dict[str, Iterable[str]]): cohort to sample IDs to keep
+        out_paths (Dict[str, str]): cohort to output path
+        index (SampleRangeIndex, optional): index of the file. If given, only
+            the rows of the kept samples are read. Defaults to None.
+
+    Returns:
+        Dict[str, int]: cohort to number of rows written
+    """
+    with open(path, "rb") as file_f:
+        subsetter = RowSubsetter(
+            file_f.readline(),
+            sample_column,
+            [sample.decode() for sample in _cohorts_by_sample(cohort_samples)],
+        )
+        lines = (
+            file_f if index is None else index.read_lines(path, subsetter.keep_samples)
+        )
+        return _fan_out_rows(
+            path, subsetter, lines, cohort_samples, out_paths, write_empty=True
+        )
+
+
+def subset_maf(
+    maf_path: str,
+    out_path: str,
+    keep_samples: Iterable[str],
+    workers: int = 1,
+    chunk_bytes: int = 64 * 1024**2,
+    index: Optional[SampleRangeIndex] = None,
+) -> int:
+    """Write the rows of a MAF that belong to a set of samples. The output
+    file isn't created if no rows are kept.
+
+    Args:
+        maf_path (str): release MAF path
+        out_path (str): output MAF path
+        keep_samples (Iterable[str]): Tumor_Sample_Barcode values to keep
+        workers (int, optional): number of processes that subset byte ranges
+            of the MAF. Defaults to 1, which streams the MAF in this process.
+        chunk_bytes (int, optional): size of the byte ranges, each worker
+            holds about one range in memory. Defaults to 64 MiB.
+        index (SampleRangeIndex, optional): index of the MAF. If given, only
+            the rows of the kept samples are read. Defaults to None.
+
+    Returns:
+        int: number of rows written
+    """
+    if index is not None or workers <= 1:
+        return fan_out_maf(
+            maf_path, {out_path: keep_samples}, {out_path: out_path}, index=index
+        )[out_path]
+    start = time.perf_counter()
+    with open(maf_path, "rb") as maf_f:
+        subsetter = MafSubsetter(maf_f.readline(), keep_samples)
+        data_start = maf_f.tell()
+    n_rows = _subset_maf_parallel(
+        maf_path, out_path, subsetter, data_start, workers, chunk_bytes
+    )
+    logging.info(
+        f"subset {maf_path} to {n_rows} rows in {time.perf_counter() - start:.1f}s"
+    )
+    return n_rows
+
+
+def subset_rows(
+    path: str,
+    out_path: str,
+    sample_column: str,
+    keep_samples: Iterable[str],
+    index: Optional[SampleRangeIndex] = None,
+) -> int:
+    """Write the rows of a release file that belong to a set of samples.
+    The header is written even if no rows are kept.
+
+    Args:
+        path (str): release file path
+        out_path (str): output path
+        sample_column (str): column with the sample ID of a row
+        keep_samples (Iterable[str]): sample IDs to keep
+        index (SampleRangeIndex, optional): index of the file. If given, only
+            the rows of the kept samples are read. Defaults to None.
+
+    Returns:
+        int: number of rows written
+    """
+    return fan_out_rows(
+        path, sample_column, {out_path: keep_samples}, {out_path: out_path}, index
+    )[out_path]
+
+
+def _cna_field(field: bytes) -> bytes:
+    """Write a CNA value in pandas' float format without ".0" and write NA
+    for missing values, as the export's NA replacement does"""
+    field = pandas_float(field)
+    if field.endswith(b".0"):
+        field = field[:-2]
+    if field in PANDAS_NA_VALUES:
+        return b"NA"
+    return field
+
+
+def fan_out_cna(
+    cna_path: str,
+    cohort_samples: Dict[str, Iterable[str]],
+    out_paths: Dict[str, str],
+) -> Dict[str, List[str]]:
+    """Write the Hugo_Symbol column and the columns of each cohort's samples
+    of a CNA matrix, with one read of the matrix. Rows are streamed and
+    only the kept columns are rewritten, empty values are written as NA.
+
+    Args:
+        cna_path (str): release CNA path
+        cohort_samples (Dict[str, Iterable[str]]): cohort to sample IDs to keep
+        out_paths (Dict[str, str]): cohort to output path
+
+    Returns:
+        Dict[str, List[str]]: cohort to the columns written, Hugo_Symbol and
+        the kept sample IDs
+    """
+    start = time.perf_counter()
+    with open(cna_path, "rb") as cna_f:
+        columns = split_fields(cna_f.readline())
+        if b"Hugo_Symbol" not in columns:
+            raise ValueError("CNA file has no Hugo_Symbol column")
+        hugo_index = columns.index(b"Hugo_Symbol")
+        n_columns = len(columns)
+        # cohort -> indices of the kept sample columns
+        sample_indices = {}
+        kept_columns = {}
+        for cohort, samples in cohort_samples.items():
+            keep = frozenset(str(sample).encode() for sample in samples)
+            sample_indices[cohort] = [
+                index for index, column in enumerate(columns) if column in keep
+            ]
+            kept_columns[cohort] = [columns[hugo_index]] + [
+                columns[index] for index in sample_indices[cohort]
+            ]
+        writers = {}
+        try:
+            for cohort in cohort_samples:
+                writers[cohort] = BatchedWriter(
+                    out_paths[cohort],
+                    header=remove_bytes_float(
+                        join_fields(kept_columns[cohort], quoted=True)
+                    ),
+                )
+            for line in cna_f:
+                fields = split_fields(line)
+                quoted = b'"' in line
+                if len(fields) < n_columns:
+                    fields.extend([b""] * (n_columns - len(fields)))
+                hugo = fields[hugo_index]
+                if hugo.endswith(b".0"):
+                    hugo = hugo[:-2]
+                if hugo in PANDAS_NA_VALUES:
+                    hugo = b""
+                for cohort, indices in sample_indices.items():
+                    values = [_cna_field(fields[index]) for index in indices]
+                    # pandas quotes rows that would otherwise be blank lines
+                    row_hugo = hugo if indices or hugo else b'""'
+                    writers[cohort].write(
+                        join_fields([row_hugo] + values, quoted=quoted)
+                    )
+        finally:
+            for writer in writers.values():
+                writer.close()
+    logging.info(
+        f"subset {cna_path} for {len(cohort_samples)} cohorts in "
+        f"{time.perf_counter() - start:.1f}s: "
+        + ", ".join(
+            f"{cohort} {len(indices)} samples"
+            for cohort, indices in sample_indices.items()
+        )
+    )
+    return {
+        cohort: [column.decode() for column in kept]
+        for cohort, kept in kept_columns.items()
+    }
+
+
+def subset_cna(cna_path: str, out_path: str, keep_samples: Iterable[str]) -> List[str]:
+    """Write the Hugo_Symbol column and the columns of a set of samples of
+    a CNA matrix, see `fan_out_cna`.
+
+    Args:
+        cna_path (str): release CNA path
+        out_path (str): output CNA path
+        keep_samples (Iterable[str]): sample IDs to keep
+
+    Returns:
+        List[str]: columns written, Hugo_Symbol and the kept sample IDs
+    """
+    return fan_out_cna(cna_path, {out_path: keep_samples}, {out_path: out_path})[
+        out_path
+    ]
+
+
+def count_file_rows(path: str) -> int:
+    """Count the rows of a written file, without its header line
+
+    Args:
+        path (str): file path
+
+    Returns:
+        int: number of rows
+    """
+    lines = 0
+    with open(path, "rb") as file_f:
+        for block in iter(lambda: file_f.read(WRITE_BATCH_BYTES), b""):
+            lines += block.count(b"\n")
+    return max(lines - 1, 0)
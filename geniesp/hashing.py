@@ -0,0 +1,89 @@
+"""Content hashes of export files, computed while the files are written"""
+import hashlib
+import os
+import threading
+from typing import Tuple
+
+# absolute path -> (size, mtime in ns, md5) of files written by HashingWriter
+_written = {}
+_written_lock = threading.Lock()
+
+
+def _stat_key(path: str) -> Tuple[int, int]:
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class HashingWriter:
+    """Writes text to a file and computes the file's MD5 on the way, so the
+    file doesn't have to be read again to hash it. Text is encoded as UTF-8
+    and newlines are written as is.
+
+    Args:
+        path (str): file path
+        mode (str, optional): "w" to truncate or "a" to append. Appending
+            hashes the existing content first. Defaults to "w".
+    """
+
+    def __init__(self, path: str, mode: str = "w"):
+        if mode not in ["w", "a"]:
+            raise ValueError("mode must be 'w' or 'a'")
+        self.path = path
+        self._md5 = hashlib.md5()
+        if mode == "a" and os.path.exists(path):
+            with open(path, "rb") as file_f:
+                for chunk in iter(lambda: file_f.read(1024 * 1024), b""):
+                    self._md5.update(chunk)
+        self._file = open(path, f"{mode}b")
+
+    def write(self, text: str) -> int:
+        self.write_bytes(text.encode("utf-8"))
+        return len(text)
+
+    def write_bytes(self, data: bytes) -> int:
+        """Write encoded text as is"""
+        self._md5.update(data)
+        return self._file.write(data)
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self._file.close()
+        with _written_lock:
+            _written[os.path.abspath(self.path)] = (
+                *_stat_key(self.path),
+                self._md5.hexdigest(),
+            )
+
+    @property
+    def md5(self) -> str:
+        """MD5 hex digest of the content written so far"""
+        return self._md5.hexdigest()
+
+    def __enter__(self) -> "HashingWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def md5_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Content hash of a file. Files written by HashingWriter aren't read
+    again unless they were modified since.
+
+    Args:
+        path (str): file path
+        chunk_size (int, optional): read size in bytes. Defaults to 1 MiB.
+
+    Returns:
+        str: md5 hex digest
+    """
+    with _written_lock:
+        written = _written.get(os.path.abspath(path))
+    if written is not None and written[:2] == _stat_key(path):
+        return written[2]
+    md5 = hashlib.md5()
+    with open(path, "rb") as file_f:
+        for chunk in iter(lambda: file_f.read(chunk_size), b""):
+            md5.update(chunk)
+    return md5.hexdigest()
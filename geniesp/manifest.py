@@ -0,0 +1,196 @@
+"""Manifest of export outputs and the inputs they were built from
+
+The manifest records, for each stage that writes files, a fingerprint of
+the stage inputs, the versioned Synapse IDs it read and a content hash of
+each output file. A resumed export skips the stages whose entry is still
+current.
+"""
+import glob
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Any, Callable, Dict, List, Sequence
+
+import pandas as pd
+
+from .hashing import md5_file
+
+MANIFEST_VERSION = 1
+
+
+def hash_value(value: Any) -> str:
+    """Content hash of a stage input
+
+    Args:
+        value (Any): data frame, series or JSON serializable value
+
+    Returns:
+        str: md5 hex digest
+    """
+    md5 = hashlib.md5()
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        if isinstance(value, pd.DataFrame):
+            md5.update(json.dumps([str(col) for col in value.columns]).encode())
+            md5.update(json.dumps([str(dtype) for dtype in value.dtypes]).encode())
+        else:
+            md5.update(str(value.dtype).encode())
+        md5.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    else:
+        md5.update(json.dumps(value, sort_keys=True, default=str).encode())
+    return md5.hexdigest()
+
+
+class ExportManifest:
+    """Manifest of the outputs of an export. Entries are saved as soon as
+    a stage finishes, so the manifest survives failed exports.
+
+    Args:
+        path (str): manifest file path
+        context (Dict[str, Any], optional): fingerprint shared by all
+            stages, such as the git SHA and mapping table version.
+            Defaults to None.
+        resume (bool, optional): Whether to keep the entries of the existing
+            manifest so that up to date stages can be skipped. Defaults to False.
+        get_version (Callable[[str], int], optional): returns the current
+            version of a Synapse ID. Defaults to None.
+        get_used (Callable[[str], List[str]], optional): returns the versioned
+            Synapse IDs read by a stage. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        context: Dict[str, Any] = None,
+        resume: bool = False,
+        get_version: Callable[[str], int] = None,
+        get_used: Callable[[str], List[str]] = None,
+    ):
+        self.path = path
+        self.context = context or {}
+        self.get_version = get_version
+        self.get_used = get_used
+        self._previous = {}
+        self.stages = {}
+        self._lock = threading.Lock()
+        if resume and os.path.exists(path):
+            with open(path) as manifest_f:
+                manifest = json.load(manifest_f)
+            if manifest.get("version") == MANIFEST_VERSION:
+                self._previous = manifest["stages"]
+            else:
+                logging.warning(f"ignoring manifest with unknown version: {path}")
+
+    def fingerprint(
+        self, inputs: Dict[str, Any], extra: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """Fingerprint a stage run
+
+        Args:
+            inputs (Dict[str, Any]): argument name to stage input
+            extra (Dict[str, Any], optional): external inputs of the stage,
+                for example versions of files it downloads. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: JSON serializable fingerprint
+        """
+        return json.loads(
+            json.dumps(
+                {
+                    **self.context,
+                    **(extra or {}),
+                    "inputs": {
+                        name: hash_value(value) for name, value in inputs.items()
+                    },
+                },
+                sort_keys=True,
+                default=str,
+            )
+        )
+
+    def is_current(self, stage_name: str, fingerprint: Dict[str, Any]) -> bool:
+        """Whether the outputs of a stage from the existing manifest
+        can be reused.
+
+        Args:
+            stage_name (str): stage name
+            fingerprint (Dict[str, Any]): fingerprint of the stage run
+
+        Returns:
+            bool: True if the stage doesn't need to run
+        """
+        previous = self._previous.get(stage_name)
+        if previous is None or previous["fingerprint"] != fingerprint:
+            return False
+        for used in previous["used"]:
+            synid, version = used.rsplit(".", 1)
+            if self.get_version is None or str(self.get_version(synid)) != version:
+                logging.info(f"{stage_name}: {synid} has a new version")
+                return False
+        for path, md5 in previous["outputs"].items():
+            if not os.path.exists(path) or md5_file(path) != md5:
+                logging.info(f"{stage_name}: {path} is missing or was modified")
+                return False
+        with self._lock:
+            self.stages[stage_name] = previous
+            self.save()
+        return True
+
+    def record(
+        self, stage_name: str, fingerprint: Dict[str, Any], outputs: Sequence[str]
+    ) -> None:
+        """Record a finished stage
+
+        Args:
+            stage_name (str): stage name
+            fingerprint (Dict[str, Any]): fingerprint of the stage run
+            outputs (Sequence[str]): glob patterns of files written by the stage
+        """
+        paths = sorted(
+            {path for pattern in outputs for path in glob.glob(pattern)}
+        )
+        entry = {
+            "fingerprint": fingerprint,
+            "used": sorted(self.get_used(stage_name)) if self.get_used else [],
+            "outputs": {path: md5_file(path) for path in paths},
+        }
+        with self._lock:
+            self.stages[stage_name] = entry
+            self.save()
+
+    def discard_outputs(self, paths: Sequence[str]) -> None:
+        """Remove the entries of stages that wrote any of the files, so that
+        they run again when resuming
+
+        Args:
+            paths (Sequence[str]): output file paths
+        """
+        paths = set(paths)
+        if not paths:
+            return
+        with self._lock:
+            self.stages = {
+                name: entry
+                for name, entry in self.stages.items()
+                if not paths & set(entry["outputs"])
+            }
+            self.save()
+
+    def save(self) -> None:
+        """Atomically write the manifest"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as manifest_f:
+                json.dump(
+                    {"version": MANIFEST_VERSION, "stages": self.stages},
+                    manifest_f,
+                    indent=2,
+                    sort_keys=True,
+                )
+            os.replace(temp_path, self.path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
@@ -0,0 +1,185 @@
+"""Run metrics of an export
+
+Each export has a metrics registry that counts, for every stage, the rows it
+reads and drops, the rows and bytes it writes, its Synapse calls and its
+derived dataset cache hits. The stage scheduler activates the registry in
+the thread of each stage and records the stage's wall time, so the code
+that counts calls `add`, which adds to the active registry under the
+current stage. Nothing is counted in threads without an active registry.
+
+At the end of the export the metrics are written as JSON and in the
+Prometheus textfile format, with one gauge per metric labelled by stage.
+"""
+from contextlib import contextmanager
+import functools
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterator
+
+from .stages import current_stage
+
+# Metric name -> description
+METRICS = {
+    "wall_seconds": "Wall time of the stage in seconds",
+    "rows_read": "Rows of derived variable datasets read",
+    "rows_dropped_filter": "Rows dropped because their patient or sample "
+    "isn't in the main GENIE clinical samples",
+    "rows_dropped_null_start": "Rows dropped because their START_DATE is null",
+    "rows_written": "Rows written to export files",
+    "bytes_written": "Bytes written to export files",
+    "synapse_calls": "Synapse client calls",
+    "cache_hits": "Derived variable datasets served from the run cache",
+    "cache_misses": "Derived variable datasets parsed",
+}
+# Stage name of metrics counted outside of stages
+NO_STAGE = "none"
+PROMETHEUS_PREFIX = "geniesp_stage_"
+
+_local = threading.local()
+
+
+def add(metric: str, value: float = 1) -> None:
+    """Add to a metric of the current stage in the active registry
+
+    Args:
+        metric (str): metric name, one of METRICS
+        value (float, optional): amount to add. Defaults to 1.
+    """
+    registry = getattr(_local, "registry", None)
+    if registry is not None:
+        registry.add(metric, value)
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Metrics of the stages of an export
+
+    Args:
+        labels (Dict[str, str], optional): labels of all metrics, for
+            example the cohort and release. Defaults to None.
+    """
+
+    def __init__(self, labels: Dict[str, str] = None):
+        self.labels = dict(labels or {})
+        # stage -> metric -> value
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def add(self, metric: str, value: float = 1, stage: str = None) -> None:
+        """Add to a metric of a stage
+
+        Args:
+            metric (str): metric name, one of METRICS
+            value (float, optional): amount to add. Defaults to 1.
+            stage (str, optional): stage name. Defaults to None, which is the
+                stage running in the current thread.
+
+        Raises:
+            ValueError: Unknown metric
+        """
+        if metric not in METRICS:
+            raise ValueError(f"unknown metric: {metric}")
+        stage = stage or current_stage() or NO_STAGE
+        with self._lock:
+            stage_values = self._values.setdefault(stage, {})
+            stage_values[metric] = stage_values.get(metric, 0) + value
+
+    @contextmanager
+    def activate(self) -> Iterator["MetricsRegistry"]:
+        """Make this the registry that `add` counts to in the current thread"""
+        previous = getattr(_local, "registry", None)
+        _local.registry = self
+        try:
+            yield self
+        finally:
+            _local.registry = previous
+
+    def stages(self) -> Dict[str, Dict[str, float]]:
+        """Get the metrics of each stage
+
+        Returns:
+            Dict[str, Dict[str, float]]: stage to metric to value
+        """
+        with self._lock:
+            return {stage: dict(values) for stage, values in self._values.items()}
+
+    def report(self) -> Dict[str, Any]:
+        """Get the metrics with their labels and totals over all stages
+
+        Returns:
+            Dict[str, Any]: "labels", "stages" and "totals"
+        """
+        stages = self.stages()
+        totals = {}
+        for values in stages.values():
+            for metric, value in values.items():
+                totals[metric] = totals.get(metric, 0) + value
+        return {"labels": self.labels, "stages": stages, "totals": totals}
+
+    def prometheus_text(self) -> str:
+        """Get the metrics in the Prometheus text exposition format
+
+        Returns:
+            str: one gauge per metric with a sample per stage
+        """
+        stages = self.stages()
+        lines = []
+        for metric, description in METRICS.items():
+            samples = [
+                (stage, values[metric])
+                for stage, values in sorted(stages.items())
+                if metric in values
+            ]
+            if not samples:
+                continue
+            name = PROMETHEUS_PREFIX + metric
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} gauge")
+            for stage, value in samples:
+                labels = ",".join(
+                    f'{key}="{_escape_label(str(label))}"'
+                    for key, label in {**self.labels, "stage": stage}.items()
+                )
+                lines.append(f"{name}{{{labels}}} {value:g}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def write(self, json_path: str, prometheus_path: str) -> None:
+        """Write the metrics as JSON and as a Prometheus textfile
+
+        Args:
+            json_path (str): JSON path
+            prometheus_path (str): Prometheus textfile path
+        """
+        with open(json_path, "w") as json_f:
+            json.dump(self.report(), json_f, indent=2, sort_keys=True)
+        with open(prometheus_path, "w") as prometheus_f:
+            prometheus_f.write(self.prometheus_text())
+        logging.info(f"wrote metrics to {json_path} and {prometheus_path}")
+
+
+class CountedSynapse:
+    """Synapse client that counts the calls of its methods as
+    `synapse_calls` of the active registry
+
+    Args:
+        syn (Synapse): Synapse connection
+    """
+
+    def __init__(self, syn):
+        self._syn = syn
+
+    def __getattr__(self, name: str) -> Any:
+        attribute = getattr(self._syn, name)
+        if not callable(attribute):
+            return attribute
+
+        @functools.wraps(attribute)
+        def counted(*args, **kwargs):
+            add("synapse_calls")
+            return attribute(*args, **kwargs)
+
+        return counted
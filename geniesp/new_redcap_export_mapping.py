@@ -12,7 +12,6 @@
 # git clone https://github.com/cBioPortal/cbioportal.git
 # python runSP.py ERBB2 ../cbioportal/ --staging
 """
-import math
 import os
 import subprocess
 
@@ -22,6 +21,12 @@ import pandas as pd
 
 from genie import process_functions, create_case_lists
 
+from .dates import convert_days, day_units
+from .oncotree import get_oncotree
+from .profiling import StageProfiler, profile_paths
+from .table_cache import get_cache_dir
+from .writers import write_tsv
+
 
 def replace0(x):
     """
@@ -94,16 +99,6 @@ def replacePeriod(x):
     return x.replace(".", "")
 
 
-def change_days_to_months(x):
-    """
-    Function to change date fields to months
-    """
-    if math.isnan(x):
-        return pd.np.nan
-    else:
-        return math.floor(x / 30.4)
-
-
 class SponsoredProjectRunner:
 
     _SPONSORED_PROJECT = ""
@@ -120,13 +115,19 @@ class SponsoredProjectRunner:
     _CASE_LIST_MAF_SAMPLES_TEMPLATE = None
     _CASE_LIST_SYN_ID = None
     _GITHUB_REPO = "https://github.com/Sage-Bionetworks/GENIE-Sponsored-Projects"
+    # Unit of the day columns of the clinical files, by pattern of the
+    # cbio name
+    _PATIENT_DAY_UNITS = {".*INT": "months", "OS_MONTHS": "months"}
+    _SAMPLE_DAY_UNITS = {"SAMPLE_DATE_INT": "months", "AGE_AT_SEQ_REPORT": "months"}
 
-    def __init__(self, syn, cbioPath, staging=False, export=False):
+    def __init__(self, syn, cbioPath, staging=False, export=False, profile=False):
         assert os.path.exists(cbioPath)
         self.syn = syn
         self.cbioPath = cbioPath
         self.staging = staging
         self.export = export
+        self.profile = profile
+        self.profiler = StageProfiler() if profile else None
 
     def createSpecimenDf(self, clinicalDf):
         """
@@ -297,13 +298,32 @@ class SponsoredProjectRunner:
             clinFile.write("#%s\n" % "\t".join(descriptions))
             clinFile.write("#%s\n" % "\t".join(colType))
             clinFile.write("#%s\n" % "\t".join(["1"] * len(labels)))
-            clinFile.write(replace0(clinicalDf.to_csv(index=False, sep="\t")))
+            write_tsv(clinicalDf, clinFile)
         return clin_path
 
+    def _step(self, name, func, inputs=None):
+        """
+        Runs a step of the export, under the profiler if profiling is on
+        """
+        if self.profiler is None:
+            return func()
+        return self.profiler.call(name, func, inputs)
+
     def run(self):
         """
-        This function runs the redcap export to export all files
+        This function runs the redcap export to export all files. With
+        profiling, each step of the export is profiled like a stage of the
+        BPC exports.
         """
+        if self.profiler is None:
+            return self._run_export()
+        try:
+            with self.profiler:
+                return self._run_export()
+        finally:
+            self.profiler.write(**profile_paths(self._SPONSORED_PROJECT))
+
+    def _run_export(self):
         if not os.path.exists(self._SPONSORED_PROJECT):
             os.mkdir(self._SPONSORED_PROJECT)
         else:
@@ -424,14 +444,14 @@ class SponsoredProjectRunner:
 
         # Only patients and samples that exist in the
         # sponsored project uploads are going to be pulled into the SP project
-        finalPatientDf = self.configureClinicalDf(patientDf, redCapToCbioMappingDf)
-        patient_date_col = [
-            col for col in finalPatientDf.columns if col.endswith("INT")
-        ]
-        patient_date_col.append("OS_MONTHS")
+        finalPatientDf = self._step(
+            "patient",
+            lambda: self.configureClinicalDf(patientDf, redCapToCbioMappingDf),
+            inputs={"patient": patientDf},
+        )
         final_patientdf_datesdays = finalPatientDf.copy()
-        finalPatientDf[patient_date_col] = finalPatientDf[patient_date_col].applymap(
-            change_days_to_months
+        finalPatientDf = convert_days(
+            finalPatientDf, day_units(finalPatientDf.columns, self._PATIENT_DAY_UNITS)
         )
         subsetPatientDf = finalPatientDf[
             finalPatientDf["PATIENT_ID"].isin(genie_clinicalDf["PATIENT_ID"])
@@ -447,12 +467,15 @@ class SponsoredProjectRunner:
             subsetPatientDf, redCapToCbioMappingDf, "patient"
         )
 
-        finalSampleDf = self.configureClinicalDf(sampleDf, redCapToCbioMappingDf)
+        finalSampleDf = self._step(
+            "sample",
+            lambda: self.configureClinicalDf(sampleDf, redCapToCbioMappingDf),
+            inputs={"sample": sampleDf},
+        )
 
-        sample_date_cols = ["SAMPLE_DATE_INT", "AGE_AT_SEQ_REPORT"]
         final_sampledf_datesdays = finalSampleDf.copy()
-        finalSampleDf[sample_date_cols] = finalSampleDf[sample_date_cols].applymap(
-            change_days_to_months
+        finalSampleDf = convert_days(
+            finalSampleDf, day_units(finalSampleDf.columns, self._SAMPLE_DAY_UNITS)
         )
         # Fill in ONCOTREE_CODE
         finalSampleDf["ONCOTREE_CODE"] = [
@@ -502,29 +525,9 @@ class SponsoredProjectRunner:
                         )
                     )
 
-        # Hard coded most up to date oncotree version
-        oncotreeLink = self.syn.get("syn13890902").externalURL
-        # Use the old oncotree link for now
-        oncotreeLink = (
-            "http://oncotree.mskcc.org/api/tumorTypes/tree?version=oncotree_2017_06_21"
-        )
-        oncotreeDict = process_functions.get_oncotree_code_mappings(oncotreeLink)
-        mergedClinicalDf["CANCER_TYPE"] = [
-            oncotreeDict[code.upper()].get("CANCER_TYPE", float("nan"))
-            for code in mergedClinicalDf["ONCOTREE_CODE"]
-        ]
-        mergedClinicalDf["CANCER_TYPE_DETAILED"] = [
-            oncotreeDict[code.upper()].get("CANCER_TYPE_DETAILED", float("nan"))
-            for code in mergedClinicalDf["ONCOTREE_CODE"]
-        ]
-        mergedClinicalDf["ONCOTREE_PRIMARY_NODE"] = [
-            oncotreeDict[code.upper()].get("ONCOTREE_PRIMARY_NODE", float("nan"))
-            for code in mergedClinicalDf["ONCOTREE_CODE"]
-        ]
-        mergedClinicalDf["ONCOTREE_SECONDARY_NODE"] = [
-            oncotreeDict[code.upper()].get("ONCOTREE_SECONDARY_NODE", float("nan"))
-            for code in mergedClinicalDf["ONCOTREE_CODE"]
-        ]
+        # Use the old oncotree version for now
+        oncotree = get_oncotree("oncotree_2017_06_21", cache_dir=get_cache_dir())
+        mergedClinicalDf = oncotree.enrich(mergedClinicalDf)
 
         mergedClinicalDf.to_csv(
             "%s/data_clinical.txt" % self._SPONSORED_PROJECT, index=False, sep="\t"
@@ -564,7 +567,11 @@ class SponsoredProjectRunner:
             labeledDf.redcap_repeat_instrument == "Treatment Information Detailed"
         )
         treatmentDf = treatmentDf[treatmentRows]
-        finalTimelineDf = self.makeTimeLineDf(treatmentDf, final_patientdf_datesdays)
+        finalTimelineDf = self._step(
+            "timeline",
+            lambda: self.makeTimeLineDf(treatmentDf, final_patientdf_datesdays),
+            inputs={"treatment": treatmentDf},
+        )
         finalTimelineDf.PATIENT_ID = finalTimelineDf.apply(
             lambda x: process_functions.checkGenieId(x["PATIENT_ID"], x["CENTER"]),
             axis=1,
@@ -580,7 +587,11 @@ class SponsoredProjectRunner:
             )
 
         # METASTATIC DIAGNOSIS (append to timeline)
-        metaDiagnosisDf = self.createMetaDiagnosisDf(finalTimelineDf)
+        metaDiagnosisDf = self._step(
+            "metastatic_diagnosis",
+            lambda: self.createMetaDiagnosisDf(finalTimelineDf),
+            inputs={"timeline": finalTimelineDf},
+        )
         # Maintain ordering of timeline
         ordering = finalTimelineDf.columns.tolist()
         # Two extra timeline columns from specimen file
@@ -588,8 +599,12 @@ class SponsoredProjectRunner:
         finalTimelineDf = finalTimelineDf.append(metaDiagnosisDf, sort=False)
 
         # Create specimen file to append to timeline file too
-        specimenDf = self.createSpecimenDf(
-            final_sampledf_datesdays, final_patientdf_datesdays
+        specimenDf = self._step(
+            "specimen",
+            lambda: self.createSpecimenDf(
+                final_sampledf_datesdays, final_patientdf_datesdays
+            ),
+            inputs={"sample": final_sampledf_datesdays},
         )
         specimenDf = specimenDf[
             specimenDf["SAMPLE_ID"].isin(genie_clinicalDf["SAMPLE_ID"])
@@ -598,17 +613,15 @@ class SponsoredProjectRunner:
         finalTimelineDf = finalTimelineDf.append(specimenDf, sort=False)
         # No need to convert timeline dates to months
         # finalTimelineDf[dates] = \
-        #     finalTimelineDf[dates].applymap(change_days_to_months)
+        #     days_to(finalTimelineDf[dates], "months")
         finalTimelineDf = finalTimelineDf[ordering]
         finalTimelineDf = finalTimelineDf[
             finalTimelineDf["PATIENT_ID"].isin(genie_clinicalDf["PATIENT_ID"])
         ]
         finalTimelineDf["AGENT"][finalTimelineDf["AGENT"].isnull()] = "Unknown"
-        timelineText = finalTimelineDf.to_csv(index=False, sep="\t")
-        timelineText = replace0(timelineText)
         timeline_path = "%s/data_timeline.txt" % self._SPONSORED_PROJECT
         with open(timeline_path, "w") as timelineFile:
-            timelineFile.write(timelineText)
+            write_tsv(finalTimelineDf, timelineFile)
         if not self.staging:
             fileEnt = File(timeline_path, parent=self._SP_SYN_ID)
             self.syn.store(fileEnt, used=labelledEnt.id, executed=self._GITHUB_REPO)
@@ -621,255 +634,290 @@ class SponsoredProjectRunner:
         centerMafFileViewSynId = databaseToSynIdMappingDf["Id"][
             databaseToSynIdMappingDf["Database"] == "centerMafView"
         ][0]
-        centerMafSynIds = self.syn.tableQuery(
-            "select id from {} where name like '%mutation%'".format(
-                centerMafFileViewSynId
-            )
-        )
-        centerMafSynIdsDf = centerMafSynIds.asDataFrame()
-        # This value must be set outside here because the first maf file might
-        # Not be part of the centers
-        index = 0
-        mafpath = "{}/data_mutations_extended.txt".format(self._SPONSORED_PROJECT)
-        for mafSynId in centerMafSynIdsDf.id:
-            mafEnt = self.syn.get(mafSynId, downloadFile=False)
-            mafcenter = mafEnt.name.split("_")[3]
-            if mafcenter in finalSampleDf["CENTER"].tolist():
-                mafEnt = self.syn.get(mafSynId)
-                print("running", mafEnt.name)
-                with open(mafEnt.path, "r") as mafFile:
-                    header = mafFile.readline()
-                    headers = header.replace("\n", "").split("\t")
-                    if index == 0:
-                        with open(mafpath, "w") as f:
-                            f.write(header)
-                    index += 1
-                    for row in mafFile:
-                        rowArray = row.replace("\n", "").split("\t")
-                        center = rowArray[headers.index("Center")]
-                        newMergedRow = configureMafRow(
-                            rowArray, headers, finalSampleDf["SAMPLE_ID"]
-                        )
-                        if newMergedRow is not None:
-                            with open(mafpath, "a") as f:
-                                f.write(newMergedRow)
-        # No longer need to pulling from non genie db
-        fileEnt = File(mafpath, parent=self._SP_SYN_ID)
-        if not self.staging:
-            self.syn.store(
-                fileEnt, used=centerMafSynIdsDf.id.tolist(), executed=self._GITHUB_REPO
-            )
 
-        CNA_PATH = "%s/data_CNA.txt" % self._SPONSORED_PROJECT
-        CNA_CENTER_PATH = self._SPONSORED_PROJECT + "/data_CNA_%s.txt"
-        centerCNASynIds = self.syn.tableQuery(
-            "select id from {} where name like 'data_CNA%'".format(
-                centerMafFileViewSynId
-            )
-        )
-        centerCNASynIdsDf = centerCNASynIds.asDataFrame()
-        # Grab all unique symbols and form cnaTemplate
-        allSymbols = set()
-
-        for cnaSynId in centerCNASynIdsDf.id:
-            cnaEnt = self.syn.get(cnaSynId)
-            with open(cnaEnt.path, "r") as cnaFile:
-                # Read first line first to get all the samples
-                cnaFile.readline()
-                # Get all hugo symbols
-                allSymbols = allSymbols.union(
-                    set(line.split("\t")[0] for line in cnaFile)
+        def write_maf():
+            centerMafSynIds = self.syn.tableQuery(
+                "select id from {} where name like '%mutation%'".format(
+                    centerMafFileViewSynId
                 )
-        cnaTemplate = pd.DataFrame({"Hugo_Symbol": list(allSymbols)})
-        cnaTemplate.sort_values("Hugo_Symbol", inplace=True)
-        cnaTemplate.to_csv(CNA_PATH, sep="\t", index=False)
-
-        withMergedHugoSymbol = pd.Series("Hugo_Symbol")
-        withMergedHugoSymbol = withMergedHugoSymbol.append(
-            pd.Series(finalSampleDf["SAMPLE_ID"])
-        )
-        cnaSamples = []
-
-        for cnaSynId in centerCNASynIdsDf.id:
-            cnaEnt = self.syn.get(cnaSynId)
-            center = cnaEnt.name.replace("data_CNA_", "").replace(".txt", "")
-            print(cnaEnt.path)
-            # if center in CENTER_MAPPING_DF.center.tolist():
-            centerCNA = pd.read_csv(cnaEnt.path, sep="\t")
-            merged = cnaTemplate.merge(centerCNA, on="Hugo_Symbol", how="outer")
-            merged.sort_values("Hugo_Symbol", inplace=True)
-
-            # This is to remove more samples for the final cna file
-            merged = merged[merged.columns[merged.columns.isin(withMergedHugoSymbol)]]
-
-            cnaText = process_functions.removePandasDfFloat(merged)
-            # Must do this replace twice because \t\t\t ->
-            # \tNA\t\t -> \tNA\tNA\t
-            cnaText = (
-                cnaText.replace("\t\t", "\tNA\t")
-                .replace("\t\t", "\tNA\t")
-                .replace("\t\n", "\tNA\n")
             )
+            centerMafSynIdsDf = centerMafSynIds.asDataFrame()
+            # This value must be set outside here because the first maf file might
+            # Not be part of the centers
+            index = 0
+            mafpath = "{}/data_mutations_extended.txt".format(self._SPONSORED_PROJECT)
+            for mafSynId in centerMafSynIdsDf.id:
+                mafEnt = self.syn.get(mafSynId, downloadFile=False)
+                mafcenter = mafEnt.name.split("_")[3]
+                if mafcenter in finalSampleDf["CENTER"].tolist():
+                    mafEnt = self.syn.get(mafSynId)
+                    print("running", mafEnt.name)
+                    with open(mafEnt.path, "r") as mafFile:
+                        header = mafFile.readline()
+                        headers = header.replace("\n", "").split("\t")
+                        if index == 0:
+                            with open(mafpath, "w") as f:
+                                f.write(header)
+                        index += 1
+                        for row in mafFile:
+                            rowArray = row.replace("\n", "").split("\t")
+                            newMergedRow = configureMafRow(
+                                rowArray, headers, finalSampleDf["SAMPLE_ID"]
+                            )
+                            if newMergedRow is not None:
+                                with open(mafpath, "a") as f:
+                                    f.write(newMergedRow)
+            # No longer need to pulling from non genie db
+            fileEnt = File(mafpath, parent=self._SP_SYN_ID)
+            if not self.staging:
+                self.syn.store(
+                    fileEnt,
+                    used=centerMafSynIdsDf.id.tolist(),
+                    executed=self._GITHUB_REPO,
+                )
 
-            with open(CNA_CENTER_PATH % center, "w") as cnaFile:
-                cnaFile.write(cnaText)
-            cnaSamples.extend(merged.columns[1:].tolist())
-
-            # Join CNA file
-            joinCommand = ["join", CNA_PATH, CNA_CENTER_PATH % center]
-            output = subprocess.check_output(joinCommand)
-            with open(CNA_PATH, "w") as cnaFile:
-                cnaFile.write(output.decode("utf-8").replace(" ", "\t"))
+        self._step("maf", write_maf)
 
-        fileEnt = File(CNA_PATH, parent=self._SP_SYN_ID)
-        if not self.staging:
-            self.syn.store(
-                fileEnt, used=centerCNASynIdsDf.id.tolist(), executed=self._GITHUB_REPO
+        def write_cna():
+            CNA_PATH = "%s/data_CNA.txt" % self._SPONSORED_PROJECT
+            CNA_CENTER_PATH = self._SPONSORED_PROJECT + "/data_CNA_%s.txt"
+            centerCNASynIds = self.syn.tableQuery(
+                "select id from {} where name like 'data_CNA%'".format(
+                    centerMafFileViewSynId
+                )
             )
+            centerCNASynIdsDf = centerCNASynIds.asDataFrame()
+            # Grab all unique symbols and form cnaTemplate
+            allSymbols = set()
+
+            for cnaSynId in centerCNASynIdsDf.id:
+                cnaEnt = self.syn.get(cnaSynId)
+                with open(cnaEnt.path, "r") as cnaFile:
+                    # Read first line first to get all the samples
+                    cnaFile.readline()
+                    # Get all hugo symbols
+                    allSymbols = allSymbols.union(
+                        set(line.split("\t")[0] for line in cnaFile)
+                    )
+            cnaTemplate = pd.DataFrame({"Hugo_Symbol": list(allSymbols)})
+            cnaTemplate.sort_values("Hugo_Symbol", inplace=True)
+            cnaTemplate.to_csv(CNA_PATH, sep="\t", index=False)
 
-        self.createGeneMatrixDf(finalSampleDf, cnaSamples, labelledEnt)
-
-        fusion = self.syn.tableQuery(
-            "SELECT * FROM syn7893268 where "
-            "TUMOR_SAMPLE_BARCODE in ('{}')".format(
-                "','".join(finalSampleDf["SAMPLE_ID"])
+            withMergedHugoSymbol = pd.Series("Hugo_Symbol")
+            withMergedHugoSymbol = withMergedHugoSymbol.append(
+                pd.Series(finalSampleDf["SAMPLE_ID"])
             )
-        )
-        fusions_df = fusion.asDataFrame()
-
-        if not fusions_df.empty:
-            fusions_df = fusions_df.rename(
-                columns={
-                    "HUGO_SYMBOL": "Hugo_Symbol",
-                    "ENTREZ_GENE_ID": "Entrez_Gene_Id",
-                    "CENTER": "Center",
-                    "TUMOR_SAMPLE_BARCODE": "Tumor_Sample_Barcode",
-                    "FUSION": "Fusion",
-                    "DNA_SUPPORT": "DNA_support",
-                    "RNA_SUPPORT": "RNA_support",
-                    "METHOD": "Method",
-                    "FRAME": "Frame",
-                    "COMMENTS": "Comments",
-                }
-            )
-            fusions_df.Entrez_Gene_Id[fusions_df.Entrez_Gene_Id == 0] = pd.np.nan
-            fusionText = fusions_df.to_csv(sep="\t", index=False)
-            fusionText = replace0(fusionText)
-            fusion_path = "%s/data_fusions.txt" % self._SPONSORED_PROJECT
-            with open(fusion_path, "w") as fusionFile:
-                fusionFile.write(fusionText)
-            fileEnt = File(fusion_path, parent=self._SP_SYN_ID)
-            if not self.staging:
-                self.syn.store(fileEnt, used=fusion.tableId, executed=self._GITHUB_REPO)
+            cnaSamples = []
+
+            for cnaSynId in centerCNASynIdsDf.id:
+                cnaEnt = self.syn.get(cnaSynId)
+                center = cnaEnt.name.replace("data_CNA_", "").replace(".txt", "")
+                print(cnaEnt.path)
+                # if center in CENTER_MAPPING_DF.center.tolist():
+                centerCNA = pd.read_csv(cnaEnt.path, sep="\t")
+                merged = cnaTemplate.merge(centerCNA, on="Hugo_Symbol", how="outer")
+                merged.sort_values("Hugo_Symbol", inplace=True)
+
+                # This is to remove more samples for the final cna file
+                merged = merged[
+                    merged.columns[merged.columns.isin(withMergedHugoSymbol)]
+                ]
 
-        seg = self.syn.tableQuery(
-            "SELECT ID, CHROM, LOCSTART, LOCEND, NUMMARK, SEGMEAN "
-            "FROM syn7893341 where ID in ('{}')".format(
-                "','".join(finalSampleDf["SAMPLE_ID"])
-            )
-        )
-        seg_df = seg.asDataFrame()
-        if not seg_df.empty:
-            seg_df.rename(
-                columns={
-                    "CHROM": "chrom",
-                    "LOCSTART": "loc.start",
-                    "LOCEND": "loc.end",
-                    "NUMMARK": "num.mark",
-                    "SEGMEAN": "seg.mean",
-                },
-                inplace=True,
-            )
-            segText = replace0(seg_df.to_csv(sep="\t", index=False))
-            segpath = "{}/genie_{}_data_cna_hg19.seg".format(
-                self._SPONSORED_PROJECT, self._SPONSORED_PROJECT.lower()
-            )
-            with open(segpath, "w") as segFile:
-                segFile.write(segText)
-            fileEnt = File(segpath, parent=self._SP_SYN_ID)
-            if not self.staging:
-                self.syn.store(fileEnt, used=seg.tableId, executed=self._GITHUB_REPO)
+                cnaText = process_functions.removePandasDfFloat(merged)
+                # Must do this replace twice because \t\t\t ->
+                # \tNA\t\t -> \tNA\tNA\t
+                cnaText = (
+                    cnaText.replace("\t\t", "\tNA\t")
+                    .replace("\t\t", "\tNA\t")
+                    .replace("\t\n", "\tNA\n")
+                )
 
-        # Create case lists
-        if not os.path.exists(self._CASE_LIST_PATH):
-            os.mkdir(self._CASE_LIST_PATH)
-        else:
-            caselists = os.listdir(self._CASE_LIST_PATH)
-            for caselist in caselists:
-                os.remove(os.path.join(self._CASE_LIST_PATH, caselist))
-
-        # Write out cases sequenced so people can tell
-        # which samples were sequenced
-        create_case_lists.main(
-            "%s/data_clinical.txt" % self._SPONSORED_PROJECT,
-            "%s/data_gene_matrix.txt" % self._SPONSORED_PROJECT,
-            self._CASE_LIST_PATH,
-            "genie_{}".format(self._SPONSORED_PROJECT.lower()),
-        )
+                with open(CNA_CENTER_PATH % center, "w") as cnaFile:
+                    cnaFile.write(cnaText)
+                cnaSamples.extend(merged.columns[1:].tolist())
 
-        caseListFiles = os.listdir(self._CASE_LIST_PATH)
-        for casePath in caseListFiles:
-            casePath = os.path.join(self._CASE_LIST_PATH, casePath)
-            fileEnt = File(casePath, parent=self._CASE_LIST_SYN_ID)
+                # Join CNA file
+                joinCommand = ["join", CNA_PATH, CNA_CENTER_PATH % center]
+                output = subprocess.check_output(joinCommand)
+                with open(CNA_PATH, "w") as cnaFile:
+                    cnaFile.write(output.decode("utf-8").replace(" ", "\t"))
+
+            fileEnt = File(CNA_PATH, parent=self._SP_SYN_ID)
             if not self.staging:
                 self.syn.store(
                     fileEnt,
-                    used=[patientEnt.id, sampleEnt.id],
+                    used=centerCNASynIdsDf.id.tolist(),
                     executed=self._GITHUB_REPO,
                 )
+            return cnaSamples
 
-        seq_assays = "','".join(set(finalSampleDf["SEQ_ASSAY_ID"]))
-        bed = self.syn.tableQuery(
-            "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn8457748 where "
-            "SEQ_ASSAY_ID in ('{}') and "
-            "Feature_Type = 'exon' and "
-            "Hugo_Symbol is not null and "
-            "includeInPanel is true".format(seq_assays)
-        )
-        beddf = bed.asDataFrame()
-        bed = self.syn.tableQuery(
-            "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn11516678 where "
-            "SEQ_ASSAY_ID in ('{}') and "
-            "Feature_Type = 'exon' and "
-            "Hugo_Symbol is not null and "
-            "includeInPanel is true".format(seq_assays)
+        cnaSamples = self._step("cna", write_cna)
+
+        self._step(
+            "gene_matrix",
+            lambda: self.createGeneMatrixDf(finalSampleDf, cnaSamples, labelledEnt),
         )
-        non_genie_beddf = bed.asDataFrame()
-        beddf = beddf.append(non_genie_beddf)
-        seq_assay_groups = beddf.groupby("SEQ_ASSAY_ID")
-        for seq_assay_id, seqdf in seq_assay_groups:
-            unique_genes = seqdf.Hugo_Symbol.unique()
-            gene_panel_text = (
-                "stable_id: {seq_assay_id}\n"
-                "description: {seq_assay_id}, "
-                "Number of Genes - {num_genes}\n"
-                "gene_list:\t{genelist}".format(
-                    seq_assay_id=seq_assay_id,
-                    num_genes=len(unique_genes),
-                    genelist="\t".join(unique_genes),
+
+        def write_fusions():
+            fusion = self.syn.tableQuery(
+                "SELECT * FROM syn7893268 where "
+                "TUMOR_SAMPLE_BARCODE in ('{}')".format(
+                    "','".join(finalSampleDf["SAMPLE_ID"])
                 )
             )
-            gene_panel_name = "data_gene_panel_" + seq_assay_id + ".txt"
-            gene_panel_path = os.path.join(self._SPONSORED_PROJECT, gene_panel_name)
-            with open(gene_panel_path, "w+") as f:
-                f.write(gene_panel_text)
-            fileEnt = File(gene_panel_path, parent=self._SP_SYN_ID)
-            if not self.staging:
-                self.syn.store(fileEnt, executed=self._GITHUB_REPO)
+            fusions_df = fusion.asDataFrame()
+
+            if not fusions_df.empty:
+                fusions_df = fusions_df.rename(
+                    columns={
+                        "HUGO_SYMBOL": "Hugo_Symbol",
+                        "ENTREZ_GENE_ID": "Entrez_Gene_Id",
+                        "CENTER": "Center",
+                        "TUMOR_SAMPLE_BARCODE": "Tumor_Sample_Barcode",
+                        "FUSION": "Fusion",
+                        "DNA_SUPPORT": "DNA_support",
+                        "RNA_SUPPORT": "RNA_support",
+                        "METHOD": "Method",
+                        "FRAME": "Frame",
+                        "COMMENTS": "Comments",
+                    }
+                )
+                fusions_df.Entrez_Gene_Id[fusions_df.Entrez_Gene_Id == 0] = pd.np.nan
+                fusionText = fusions_df.to_csv(sep="\t", index=False)
+                fusionText = replace0(fusionText)
+                fusion_path = "%s/data_fusions.txt" % self._SPONSORED_PROJECT
+                with open(fusion_path, "w") as fusionFile:
+                    fusionFile.write(fusionText)
+                fileEnt = File(fusion_path, parent=self._SP_SYN_ID)
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt, used=fusion.tableId, executed=self._GITHUB_REPO
+                    )
 
-        # Make sure to re download all the metadata files again
-        self.reviseMetadataFiles()
+        self._step("fusions", write_fusions)
 
-        cmd = [
-            "python",
-            os.path.join(
-                self.cbioPath, "core/src/main/scripts/importer/validateData.py"
-            ),
-            "-s",
-            self._SPONSORED_PROJECT,
-            "-n",
-        ]
-        subprocess.call(cmd)
+        def write_seg():
+            seg = self.syn.tableQuery(
+                "SELECT ID, CHROM, LOCSTART, LOCEND, NUMMARK, SEGMEAN "
+                "FROM syn7893341 where ID in ('{}')".format(
+                    "','".join(finalSampleDf["SAMPLE_ID"])
+                )
+            )
+            seg_df = seg.asDataFrame()
+            if not seg_df.empty:
+                seg_df.rename(
+                    columns={
+                        "CHROM": "chrom",
+                        "LOCSTART": "loc.start",
+                        "LOCEND": "loc.end",
+                        "NUMMARK": "num.mark",
+                        "SEGMEAN": "seg.mean",
+                    },
+                    inplace=True,
+                )
+                segText = replace0(seg_df.to_csv(sep="\t", index=False))
+                segpath = "{}/genie_{}_data_cna_hg19.seg".format(
+                    self._SPONSORED_PROJECT, self._SPONSORED_PROJECT.lower()
+                )
+                with open(segpath, "w") as segFile:
+                    segFile.write(segText)
+                fileEnt = File(segpath, parent=self._SP_SYN_ID)
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt, used=seg.tableId, executed=self._GITHUB_REPO
+                    )
+
+        self._step("seg", write_seg)
+
+        def write_case_lists():
+            # Create case lists
+            if not os.path.exists(self._CASE_LIST_PATH):
+                os.mkdir(self._CASE_LIST_PATH)
+            else:
+                caselists = os.listdir(self._CASE_LIST_PATH)
+                for caselist in caselists:
+                    os.remove(os.path.join(self._CASE_LIST_PATH, caselist))
+
+            # Write out cases sequenced so people can tell
+            # which samples were sequenced
+            create_case_lists.main(
+                "%s/data_clinical.txt" % self._SPONSORED_PROJECT,
+                "%s/data_gene_matrix.txt" % self._SPONSORED_PROJECT,
+                self._CASE_LIST_PATH,
+                "genie_{}".format(self._SPONSORED_PROJECT.lower()),
+            )
+
+            caseListFiles = os.listdir(self._CASE_LIST_PATH)
+            for casePath in caseListFiles:
+                casePath = os.path.join(self._CASE_LIST_PATH, casePath)
+                fileEnt = File(casePath, parent=self._CASE_LIST_SYN_ID)
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt,
+                        used=[patientEnt.id, sampleEnt.id],
+                        executed=self._GITHUB_REPO,
+                    )
+
+        self._step("case_lists", write_case_lists)
+
+        def write_gene_panels():
+            seq_assays = "','".join(set(finalSampleDf["SEQ_ASSAY_ID"]))
+            bed = self.syn.tableQuery(
+                "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn8457748 where "
+                "SEQ_ASSAY_ID in ('{}') and "
+                "Feature_Type = 'exon' and "
+                "Hugo_Symbol is not null and "
+                "includeInPanel is true".format(seq_assays)
+            )
+            beddf = bed.asDataFrame()
+            bed = self.syn.tableQuery(
+                "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn11516678 where "
+                "SEQ_ASSAY_ID in ('{}') and "
+                "Feature_Type = 'exon' and "
+                "Hugo_Symbol is not null and "
+                "includeInPanel is true".format(seq_assays)
+            )
+            non_genie_beddf = bed.asDataFrame()
+            beddf = beddf.append(non_genie_beddf)
+            seq_assay_groups = beddf.groupby("SEQ_ASSAY_ID")
+            for seq_assay_id, seqdf in seq_assay_groups:
+                unique_genes = seqdf.Hugo_Symbol.unique()
+                gene_panel_text = (
+                    "stable_id: {seq_assay_id}\n"
+                    "description: {seq_assay_id}, "
+                    "Number of Genes - {num_genes}\n"
+                    "gene_list:\t{genelist}".format(
+                        seq_assay_id=seq_assay_id,
+                        num_genes=len(unique_genes),
+                        genelist="\t".join(unique_genes),
+                    )
+                )
+                gene_panel_name = "data_gene_panel_" + seq_assay_id + ".txt"
+                gene_panel_path = os.path.join(self._SPONSORED_PROJECT, gene_panel_name)
+                with open(gene_panel_path, "w+") as f:
+                    f.write(gene_panel_text)
+                fileEnt = File(gene_panel_path, parent=self._SP_SYN_ID)
+                if not self.staging:
+                    self.syn.store(fileEnt, executed=self._GITHUB_REPO)
+
+        self._step("gene_panels", write_gene_panels)
+
+        def validate():
+            # Make sure to re download all the metadata files again
+            self.reviseMetadataFiles()
+
+            cmd = [
+                "python",
+                os.path.join(
+                    self.cbioPath, "core/src/main/scripts/importer/validateData.py"
+                ),
+                "-s",
+                self._SPONSORED_PROJECT,
+                "-n",
+            ]
+            subprocess.call(cmd)
+
+        self._step("validate", validate)
 
         # if self.export and self._SPONSORED_PROJECT == "AKT1":
         #   #AKT1 only
@@ -0,0 +1,155 @@
+"""Oncotree snapshots
+
+An oncotree version doesn't change once it's released, so the tree of a
+version is downloaded once, saved as a local snapshot if a cache directory
+is configured and turned into a lookup table of the cancer types and nodes
+of each oncotree code. In offline mode, the tree is only read from the
+snapshot. Trees are shared by all exports in a process.
+"""
+import json
+import logging
+import os
+import tempfile
+import threading
+from typing import Dict
+
+from genie import process_functions
+import pandas as pd
+
+# Oncotree version used by the BPC exports
+DEFAULT_VERSION = "oncotree_2018_06_01"
+ONCOTREE_URL = "http://oncotree.mskcc.org/api/tumorTypes/tree?version={version}"
+# Columns filled from the oncotree code of a sample
+ONCOTREE_COLUMNS = [
+    "CANCER_TYPE",
+    "CANCER_TYPE_DETAILED",
+    "ONCOTREE_PRIMARY_NODE",
+    "ONCOTREE_SECONDARY_NODE",
+]
+
+# version -> Oncotree shared by all exports in the process
+_registry = {}
+_registry_lock = threading.Lock()
+
+
+class Oncotree:
+    """Cancer types and nodes of the codes of an oncotree version
+
+    Args:
+        version (str): oncotree version, for example oncotree_2018_06_01
+        mappings (Dict[str, Dict[str, str]]): upper case oncotree code to
+            the ONCOTREE_COLUMNS values of the code
+    """
+
+    def __init__(self, version: str, mappings: Dict[str, Dict[str, str]]):
+        self.version = version
+        self.mappings = mappings
+        self.table = pd.DataFrame.from_dict(
+            mappings, orient="index", columns=ONCOTREE_COLUMNS
+        )
+
+    def enrich(
+        self, df: pd.DataFrame, code_column: str = "ONCOTREE_CODE"
+    ) -> pd.DataFrame:
+        """Fill the cancer type and oncotree node columns of samples
+
+        Args:
+            df (pd.DataFrame): samples
+            code_column (str, optional): column with the oncotree code of a
+                sample, in any case. Defaults to "ONCOTREE_CODE".
+
+        Raises:
+            ValueError: samples have codes that aren't in the oncotree
+
+        Returns:
+            pd.DataFrame: samples with ONCOTREE_COLUMNS
+        """
+        codes = df[code_column].str.upper()
+        unknown = ~codes.isin(self.table.index)
+        if unknown.any():
+            raise ValueError(
+                f"{code_column} has codes that aren't in {self.version}: "
+                f"{sorted(df[code_column][unknown].astype(str).unique())}"
+            )
+        looked_up = self.table.reindex(codes.to_numpy())
+        df = df.copy()
+        for column in ONCOTREE_COLUMNS:
+            df[column] = looked_up[column].to_numpy()
+        return df
+
+
+def _snapshot_path(cache_dir: str, version: str) -> str:
+    return os.path.join(cache_dir, "oncotree", f"{version}.json")
+
+
+def _save_snapshot(path: str, mappings: Dict[str, Dict[str, str]]) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as snapshot_f:
+            json.dump(mappings, snapshot_f, sort_keys=True)
+        os.replace(temp_path, path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def load_oncotree(
+    version: str = DEFAULT_VERSION, cache_dir: str = None, offline: bool = False
+) -> Oncotree:
+    """Load an oncotree version from its snapshot or download it
+
+    Args:
+        version (str, optional): oncotree version. Defaults to DEFAULT_VERSION.
+        cache_dir (str, optional): directory of the oncotree snapshots.
+            Defaults to None, which doesn't save the downloaded tree.
+        offline (bool, optional): Whether to only read the snapshot.
+            Defaults to False.
+
+    Raises:
+        ValueError: there's no snapshot of the version in offline mode
+
+    Returns:
+        Oncotree: oncotree
+    """
+    path = None if cache_dir is None else _snapshot_path(cache_dir, version)
+    if path is not None and os.path.exists(path):
+        with open(path) as snapshot_f:
+            return Oncotree(version, json.load(snapshot_f))
+    if offline:
+        if cache_dir is None:
+            raise ValueError("offline mode needs a cache directory")
+        raise ValueError(
+            f"no snapshot of {version} in {cache_dir}, "
+            "run once without offline mode to save one"
+        )
+    logging.info(f"downloading {version}...")
+    mappings = process_functions.get_oncotree_code_mappings(
+        ONCOTREE_URL.format(version=version)
+    )
+    if path is not None:
+        _save_snapshot(path, mappings)
+    return Oncotree(version, mappings)
+
+
+def get_oncotree(
+    version: str = DEFAULT_VERSION, cache_dir: str = None, offline: bool = False
+) -> Oncotree:
+    """Get an oncotree version, loaded once per process. See `load_oncotree`.
+
+    Args:
+        version (str, optional): oncotree version. Defaults to DEFAULT_VERSION.
+        cache_dir (str, optional): directory of the oncotree snapshots.
+            Defaults to None.
+        offline (bool, optional): Whether to only read the snapshot.
+            Defaults to False.
+
+    Returns:
+        Oncotree: oncotree
+    """
+    with _registry_lock:
+        oncotree = _registry.get(version)
+        if oncotree is None:
+            oncotree = load_oncotree(version, cache_dir=cache_dir, offline=offline)
+            _registry[version] = oncotree
+        return oncotree
@@ -0,0 +1,339 @@
+"""Per-stage CPU and memory profiles of an export
+
+With profiling on, each export stage runs under cProfile while a sampler
+thread records the traced Python memory (tracemalloc), the resident set size
+of the process and the call stack of the thread of each running stage. The
+report has, for each stage, its wall time, the CPU time of the thread that
+ran it, the functions it spent the most time in, its peak memory and the
+rows of the data frames it reads and returns. The sampled stacks are
+written in the collapsed format of flamegraph.pl and speedscope, one
+"stage;frame;...;frame count" line per distinct stack.
+
+Stages that run in parallel share the process, so the memory peaks of a
+stage are the peaks of the process while it ran.
+"""
+from collections import Counter
+import cProfile
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import pandas as pd
+
+# Seconds between memory and stack samples
+SAMPLE_SECONDS = 0.05
+# Functions listed per stage in the report
+TOP_FUNCTIONS = 25
+
+# Profilers that need tracemalloc, which is process-wide, and whether
+# tracemalloc was started for them
+_tracing_users = 0
+_started_tracing = False
+_tracing_lock = threading.Lock()
+
+
+def _start_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        if _tracing_users == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _started_tracing = True
+        _tracing_users += 1
+
+
+def _stop_tracing() -> None:
+    global _tracing_users, _started_tracing
+    with _tracing_lock:
+        _tracing_users -= 1
+        if _tracing_users == 0 and _started_tracing:
+            tracemalloc.stop()
+            _started_tracing = False
+
+
+def _traced_peak() -> int:
+    """Peak traced memory since the last call, or the current traced memory
+    where the peak can't be reset"""
+    if not tracemalloc.is_tracing():
+        return 0
+    if hasattr(tracemalloc, "reset_peak"):
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.reset_peak()
+        return peak
+    return tracemalloc.get_traced_memory()[0]
+
+
+def rss_bytes() -> Optional[int]:
+    """Resident set size of the process, None where /proc isn't available"""
+    try:
+        with open("/proc/self/statm") as statm_f:
+            return int(statm_f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+def count_rows(value: Any) -> Optional[int]:
+    """Rows of a data frame, or of the data frames in a dict, list or tuple
+
+    Args:
+        value (Any): stage input or output
+
+    Returns:
+        Optional[int]: number of rows, None if there are no data frames
+    """
+    if isinstance(value, pd.DataFrame):
+        return len(value)
+    if isinstance(value, dict):
+        items = value.values()
+    elif isinstance(value, (list, tuple)):
+        items = value
+    else:
+        return None
+    rows = [len(item) for item in items if isinstance(item, pd.DataFrame)]
+    return sum(rows) if rows else None
+
+
+def _frame_name(frame) -> str:
+    return f"{frame.f_globals.get('__name__', '?')}.{frame.f_code.co_name}"
+
+
+class StageProfile:
+    """Profile of one run of a stage
+
+    Args:
+        name (str): stage name
+        rows_in (int, optional): rows of the stage inputs. Defaults to None.
+    """
+
+    def __init__(self, name: str, rows_in: int = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.wall_seconds = None
+        # CPU time of the thread that ran the stage
+        self.cpu_seconds = None
+        self.stats = None
+        self.traced_start = tracemalloc.get_traced_memory()[0]
+        self.peak_traced_bytes = 0
+        self.peak_rss_bytes = None
+        # stack of frame names, from the stage function down -> samples
+        self.stacks = Counter()
+
+    def observe(self, traced_peak: int, rss: Optional[int], frame=None) -> None:
+        """Record a sample of the process memory and the stage's stack"""
+        self.peak_traced_bytes = max(
+            self.peak_traced_bytes, traced_peak - self.traced_start
+        )
+        if rss is not None:
+            self.peak_rss_bytes = max(self.peak_rss_bytes or 0, rss)
+        stack = []
+        while frame is not None and frame.f_code is not _CALL_CODE:
+            stack.append(_frame_name(frame))
+            frame = frame.f_back
+        if frame is not None and stack:
+            self.stacks[tuple(reversed(stack))] += 1
+
+    def top_functions(self, limit: int = TOP_FUNCTIONS) -> list:
+        """Functions the stage spent the most time in, excluding the time
+        spent in the functions they called"""
+        if self.stats is None:
+            return []
+        rows = sorted(
+            self.stats.stats.items(), key=lambda item: item[1][2], reverse=True
+        )
+        functions = []
+        for (file_name, line, function), (_, calls, total, cumulative, _) in rows[
+            :limit
+        ]:
+            functions.append(
+                {
+                    "function": function,
+                    "file": file_name,
+                    "line": line,
+                    "calls": calls,
+                    "total_seconds": round(total, 6),
+                    "cumulative_seconds": round(cumulative, 6),
+                }
+            )
+        return functions
+
+    def report(self, top_functions: int = TOP_FUNCTIONS) -> Dict[str, Any]:
+        return {
+            "wall_seconds": round(self.wall_seconds, 6),
+            "cpu_seconds": round(self.cpu_seconds, 6),
+            "peak_traced_bytes": self.peak_traced_bytes,
+            "peak_rss_bytes": self.peak_rss_bytes,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "top_functions": self.top_functions(top_functions),
+        }
+
+
+class StageProfiler:
+    """Profiles export stages, see the module documentation. Use it as a
+    context manager, or call `start` and `stop`, around the stages.
+
+    Args:
+        sample_seconds (float, optional): seconds between samples.
+            Defaults to SAMPLE_SECONDS.
+        top_functions (int, optional): functions listed per stage.
+            Defaults to TOP_FUNCTIONS.
+    """
+
+    def __init__(
+        self, sample_seconds: float = SAMPLE_SECONDS, top_functions: int = TOP_FUNCTIONS
+    ):
+        self.sample_seconds = sample_seconds
+        self.top_functions = top_functions
+        # stage name -> StageProfile of the stages that finished
+        self.stages = {}
+        # thread id -> StageProfile of the stages that are running
+        self._running = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = None
+
+    def start(self) -> None:
+        """Start tracing memory and sampling"""
+        if self._sampler is not None:
+            return
+        _start_tracing()
+        self._stop.clear()
+        self._sampler = threading.Thread(
+            target=self._sample_until_stopped, name="stage-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self) -> None:
+        """Stop sampling and tracing memory"""
+        if self._sampler is None:
+            return
+        self._stop.set()
+        self._sampler.join()
+        self._sampler = None
+        _stop_tracing()
+
+    def __enter__(self) -> "StageProfiler":
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _sample_until_stopped(self) -> None:
+        while not self._stop.wait(self.sample_seconds):
+            with self._lock:
+                self._sample(stacks=True)
+
+    def _sample(self, stacks: bool = False) -> None:
+        """Attribute a sample to the running stages, with the lock held"""
+        traced_peak = _traced_peak()
+        rss = rss_bytes()
+        frames = sys._current_frames() if stacks and self._running else {}
+        for thread_id, stage in self._running.items():
+            stage.observe(traced_peak, rss, frames.get(thread_id))
+
+    def call(
+        self, name: str, func: Callable[[], Any], inputs: Dict[str, Any] = None
+    ) -> Any:
+        """Run a stage under the profiler
+
+        Args:
+            name (str): stage name
+            func (Callable[[], Any]): runs the stage
+            inputs (Dict[str, Any], optional): stage inputs, to count their
+                rows. Defaults to None.
+
+        Returns:
+            Any: output of the stage
+        """
+        rows_in = [count_rows(value) for value in (inputs or {}).values()]
+        rows_in = [rows for rows in rows_in if rows is not None]
+        stage = StageProfile(name, sum(rows_in) if rows_in else None)
+        thread_id = threading.get_ident()
+        with self._lock:
+            # Peaks until now belong to the stages that were running
+            self._sample()
+            self._running[thread_id] = stage
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Only one cProfile can be active at a time in Python 3.12+
+            profile = None
+        start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            result = func()
+            stage.rows_out = count_rows(result)
+            return result
+        finally:
+            stage.cpu_seconds = time.thread_time() - cpu_start
+            stage.wall_seconds = time.perf_counter() - start
+            if profile is not None:
+                profile.disable()
+                try:
+                    stage.stats = pstats.Stats(profile)
+                except TypeError:
+                    # Nothing was profiled
+                    pass
+            with self._lock:
+                self._sample()
+                del self._running[thread_id]
+                self.stages[name] = stage
+
+    def report(self) -> Dict[str, Any]:
+        """Get the report of the stages that finished
+
+        Returns:
+            Dict[str, Any]: "stages": stage name to its report
+        """
+        return {
+            "sample_seconds": self.sample_seconds,
+            "stages": {
+                name: stage.report(self.top_functions)
+                for name, stage in self.stages.items()
+            },
+        }
+
+    def collapsed_stacks(self) -> Iterable[str]:
+        """Sampled stacks of the stages in collapsed format"""
+        for name, stage in self.stages.items():
+            for stack, samples in sorted(stage.stacks.items()):
+                yield f"{';'.join((name,) + stack)} {samples}\n"
+
+    def write(self, report_path: str, stacks_path: str) -> None:
+        """Write the report as JSON and the sampled stacks in collapsed format
+
+        Args:
+            report_path (str): JSON report path
+            stacks_path (str): collapsed stacks path
+        """
+        with open(report_path, "w") as report_f:
+            json.dump(self.report(), report_f, indent=2)
+        with open(stacks_path, "w") as stacks_f:
+            stacks_f.writelines(self.collapsed_stacks())
+        logging.info(f"wrote profile to {report_path} and {stacks_path}")
+
+
+_CALL_CODE = StageProfiler.call.__code__
+
+
+def profile_paths(prefix: str) -> Dict[str, str]:
+    """Paths of the profile files of an export
+
+    Args:
+        prefix (str): cohort, the files are written next to its folder
+
+    Returns:
+        Dict[str, str]: "report_path" and "stacks_path"
+    """
+    return {
+        "report_path": f"{prefix}_profile.json",
+        "stacks_path": f"{prefix}_profile.collapsed",
+    }
@@ -0,0 +1,181 @@
+"""BPC retraction tables
+
+The sample, patient and at-release retraction tables are small and hold the
+retractions of all cohorts. They are queried concurrently, once per version
+of the tables, and filtered per cohort locally, so that exports of several
+cohorts don't query them again. The version of a table is the etag of its
+entity, which Synapse changes when the table's rows change.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import threading
+from typing import Dict, FrozenSet
+
+import pandas as pd
+from synapseclient import Synapse
+
+# ((Synapse ID, etag) of the sample, patient and at-release tables)
+# -> RetractionTables
+_registry = {}
+_registry_lock = threading.Lock()
+# Cohort flags that mark a retraction, as read from a boolean column
+_TRUE_VALUES = ["true", "1", "1.0"]
+
+
+class RetractionTables:
+    """Retracted samples and patients of all BPC cohorts
+
+    Args:
+        syn (Synapse): Synapse connection
+        sample_synid (str): sample retraction table, with a SAMPLE_ID column
+            and a boolean column per cohort
+        patient_synid (str): patient retraction table, with a record_id
+            column and a boolean column per cohort
+        release_synid (str): retraction at release table, with patient_id
+            and cohort columns
+        versions (Dict[str, str], optional): Synapse ID to the etag of the
+            table's entity. Defaults to None, which uses the etags of the
+            query results.
+    """
+
+    def __init__(
+        self,
+        syn: Synapse,
+        sample_synid: str,
+        patient_synid: str,
+        release_synid: str,
+        versions: Dict[str, str] = None,
+    ):
+        self.sample_synid = sample_synid
+        self.patient_synid = patient_synid
+        self.release_synid = release_synid
+        synids = [sample_synid, patient_synid, release_synid]
+        with ThreadPoolExecutor(max_workers=len(synids)) as executor:
+            results = list(
+                executor.map(
+                    lambda synid: syn.tableQuery(f"select * from {synid}"), synids
+                )
+            )
+        self.sampledf, self.patientdf, self.releasedf = [
+            result.asDataFrame() for result in results
+        ]
+        # Synapse ID -> etag of the table
+        self.versions = versions or {
+            synid: getattr(result, "etag", None)
+            for synid, result in zip(synids, results)
+        }
+        self._lock = threading.Lock()
+        # cohort -> (retracted samples, retracted patients)
+        self._cohorts = {}
+
+    def _flagged(self, df: pd.DataFrame, synid: str, cohort: str) -> pd.Series:
+        if cohort not in df.columns:
+            raise ValueError(f"{synid} has no column for cohort {cohort}")
+        # Flags are booleans or, depending on the client, their string
+        # values; astype(bool) would make the string "false" a retraction
+        return df[cohort].astype(str).str.strip().str.lower().isin(_TRUE_VALUES)
+
+    def _resolve(self, cohort: str):
+        with self._lock:
+            if cohort not in self._cohorts:
+                samples = self.sampledf.loc[
+                    self._flagged(self.sampledf, self.sample_synid, cohort),
+                    "SAMPLE_ID",
+                ]
+                patients = self.patientdf.loc[
+                    self._flagged(self.patientdf, self.patient_synid, cohort),
+                    "record_id",
+                ]
+                at_release = self.releasedf.loc[
+                    self.releasedf["cohort"].fillna("").str.startswith(cohort),
+                    "patient_id",
+                ]
+                self._cohorts[cohort] = (
+                    frozenset(samples),
+                    frozenset(patients) | frozenset(at_release),
+                )
+            return self._cohorts[cohort]
+
+    def retracted_samples(self, cohort: str) -> FrozenSet[str]:
+        """Samples retracted from a cohort
+
+        Args:
+            cohort (str): sponsored project
+
+        Returns:
+            FrozenSet[str]: sample IDs
+        """
+        return self._resolve(cohort)[0]
+
+    def retracted_patients(self, cohort: str) -> FrozenSet[str]:
+        """Patients retracted from a cohort, by the patient retraction table
+        or at release
+
+        Args:
+            cohort (str): sponsored project
+
+        Returns:
+            FrozenSet[str]: patient IDs
+        """
+        return self._resolve(cohort)[1]
+
+    def apply(self, df: pd.DataFrame, cohort: str) -> pd.DataFrame:
+        """Remove retracted samples and patients
+
+        Args:
+            df (pd.DataFrame): data with SAMPLE_ID and PATIENT_ID columns
+            cohort (str): sponsored project
+
+        Returns:
+            pd.DataFrame: data without retracted samples and patients
+        """
+        samples, patients = self._resolve(cohort)
+        retracted = df["SAMPLE_ID"].isin(samples) | df["PATIENT_ID"].isin(patients)
+        logging.info(f"{cohort}: retracting {retracted.sum()} samples")
+        return df[~retracted]
+
+
+def get_table_versions(syn: Synapse, synids: list) -> Dict[str, str]:
+    """Get the etags of tables without querying them
+
+    Args:
+        syn (Synapse): Synapse connection
+        synids (list): table Synapse IDs
+
+    Returns:
+        Dict[str, str]: Synapse ID to etag
+    """
+    with ThreadPoolExecutor(max_workers=len(synids)) as executor:
+        entities = list(
+            executor.map(lambda synid: syn.get(synid, downloadFile=False), synids)
+        )
+    return {synid: entity.etag for synid, entity in zip(synids, entities)}
+
+
+def get_retraction_tables(
+    syn: Synapse, sample_synid: str, patient_synid: str, release_synid: str
+) -> RetractionTables:
+    """Get the retraction tables, queried once per process and version of
+    the tables
+
+    Args:
+        syn (Synapse): Synapse connection
+        sample_synid (str): sample retraction table
+        patient_synid (str): patient retraction table
+        release_synid (str): retraction at release table
+
+    Returns:
+        RetractionTables: retraction tables
+    """
+    synids = [sample_synid, patient_synid, release_synid]
+    versions = get_table_versions(syn, synids)
+    key = tuple((synid, versions[synid]) for synid in synids)
+    with _registry_lock:
+        tables = _registry.get(key)
+        if tables is None:
+            tables = RetractionTables(syn, *synids, versions=versions)
+            # Earlier versions of the same tables won't be used again
+            for stale in [k for k in _registry if [s for s, _ in k] == synids]:
+                del _registry[stale]
+            _registry[key] = tables
+        return tables
@@ -0,0 +1,40 @@
+"""Inputs shared by the exports of all cohorts in a process
+
+A batch export runs several cohorts in one process. Inputs that are the
+same for every cohort, such as the mapping table or the assay information,
+are retrieved by the first cohort that needs them and reused by the others.
+"""
+import threading
+from typing import Any, Callable, Hashable
+
+# key -> shared value
+_values = {}
+# key -> lock held while the value is retrieved
+_locks = {}
+_lock = threading.Lock()
+
+
+def get_shared(key: Hashable, retrieve: Callable[[], Any]) -> Any:
+    """Get a value shared by all cohorts, retrieving it the first time.
+    Cohorts asking for a value that is being retrieved wait for it.
+
+    Args:
+        key (Hashable): identifies the value, for example a Synapse ID
+        retrieve (Callable[[], Any]): retrieves the value
+
+    Returns:
+        Any: shared value, which must not be modified
+    """
+    with _lock:
+        key_lock = _locks.setdefault(key, threading.Lock())
+    with key_lock:
+        if key not in _values:
+            _values[key] = retrieve()
+        return _values[key]
+
+
+def clear() -> None:
+    """Forget all shared values"""
+    with _lock:
+        _values.clear()
+        _locks.clear()
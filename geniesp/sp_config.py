@@ -14,6 +14,7 @@ import synapseclient
 
 from . import new_redcap_export_mapping
 from . import sp_redcap_export_mapping
+from .dates import days_since
 
 
 class Akt1(sp_redcap_export_mapping.SponsoredProjectRunner):
@@ -535,30 +536,22 @@ class Erbb2(sp_redcap_export_mapping.SponsoredProjectRunner):
         )
         assert len(lengths) == 1, "Lengths must all be the same"
 
+        # Therapy dates are days since the metastatic diagnosis, missing
+        # for patients without one
+        start_days = days_since(
+            redCapExportDf[START_DATE], redCapExportDf["date_first_met_int"]
+        )
+        stop_days = days_since(
+            redCapExportDf[STOP_DATE], redCapExportDf["date_first_met_int"]
+        )
         total = pd.DataFrame()
         for i in range(len(redCapExportDf)):
             timelineDF = pd.DataFrame()
             timelineDF["PATIENT_ID"] = [
                 redCapExportDf["record_id_patient_id"][i]
             ] * len(START_DATE)
-            if not pd.isnull(redCapExportDf.iloc[i]["date_first_met_int"]):
-                timelineDF["START_DATE"] = [
-                    start
-                    if pd.isnull(start)
-                    else int(start) - int(redCapExportDf.iloc[i]["date_first_met_int"])
-                    for start in redCapExportDf.iloc[i][START_DATE].reset_index(
-                        drop=True
-                    )
-                ]
-                timelineDF["STOP_DATE"] = [
-                    end
-                    if pd.isnull(end)
-                    else int(end) - int(redCapExportDf.iloc[i]["date_first_met_int"])
-                    for end in redCapExportDf.iloc[i][STOP_DATE].reset_index(drop=True)
-                ]
-            else:
-                timelineDF["START_DATE"] = pd.np.nan
-                timelineDF["STOP_DATE"] = pd.np.nan
+            timelineDF["START_DATE"] = start_days.iloc[i].reset_index(drop=True)
+            timelineDF["STOP_DATE"] = stop_days.iloc[i].reset_index(drop=True)
             timelineDF["EVENT_TYPE"] = EVENT_TYPE
             timelineDF["TREATMENT_TYPE"] = TREATMENT_TYPE
             timelineDF["SUBTYPE"] = SUBTYPE
@@ -12,7 +12,6 @@ USAGE:
 git clone https://github.com/cBioPortal/cbioportal.git
 python runSP.py ERBB2 ../cbioportal/ --staging
 """
-import math
 import os
 import random
 import re
@@ -26,6 +25,12 @@ import synapseutils as synu
 
 from genie import create_case_lists, process_functions, process_mutation
 
+from .dates import days_to
+from .oncotree import get_oncotree
+from .profiling import StageProfiler, profile_paths
+from .table_cache import get_cache_dir
+from .writers import write_tsv
+
 GENIE_PROCESSING_URL = "https://github.com/Sage-Bionetworks/GENIE-Sponsored-Projects"
 
 
@@ -115,16 +120,6 @@ def removeNull(x):
         return "DEFINITELYNOTINHERE"
 
 
-def changeToDate(x):
-    """
-    Function to change date fields to months
-    """
-    if math.isnan(x):
-        return pd.np.nan
-    else:
-        return math.floor(x / 30.4)
-
-
 def configureTimeLineDf(timeline):
     """
     Configures timeline df by fixing START_DATE and STOP_DATE
@@ -167,12 +162,14 @@ class SponsoredProjectRunner(object):
     _SP_REDCAP_EXPORTS_SYNID = None
     _NUM_SAMPLE_COLS = None
 
-    def __init__(self, syn, cbioPath, staging=False, export=False):
+    def __init__(self, syn, cbioPath, staging=False, export=False, profile=False):
         assert os.path.exists(cbioPath)
         self.syn = syn
         self.cbioPath = cbioPath
         self.staging = staging
         self.export = export
+        self.profile = profile
+        self.profiler = StageProfiler() if profile else None
 
     def createTemporaryGenieId(self, x, tempIdMapping, patientIdCol):
         """
@@ -349,7 +346,28 @@ class SponsoredProjectRunner(object):
                     ifcollision="overwrite.local",
                 )
 
+    def _step(self, name, func, inputs=None):
+        """
+        Runs a step of the export, under the profiler if profiling is on
+        """
+        if self.profiler is None:
+            return func()
+        return self.profiler.call(name, func, inputs)
+
     def run(self):
+        """
+        Runs the export. With profiling, each step of the export is profiled
+        like a stage of the BPC exports.
+        """
+        if self.profiler is None:
+            return self._run_export()
+        try:
+            with self.profiler:
+                return self._run_export()
+        finally:
+            self.profiler.write(**profile_paths(self._SPONSORED_PROJECT))
+
+    def _run_export(self):
         if not os.path.exists(self._SPONSORED_PROJECT):
             os.mkdir(self._SPONSORED_PROJECT)
         else:
@@ -388,12 +406,18 @@ class SponsoredProjectRunner(object):
             lambda x: x.upper()
         )
 
-        sponsoredProject_mapped_df, temporaryIds = self.createNullPatients(
-            sponsoredProject_mapped_df, tempIdMappingDf
+        sponsoredProject_mapped_df, temporaryIds = self._step(
+            "null_patients",
+            lambda: self.createNullPatients(
+                sponsoredProject_mapped_df, tempIdMappingDf
+            ),
+            inputs={"mapped": sponsoredProject_mapped_df},
         )
         # Timeline must be days so the conversion to months is done after
-        timelineDf, removeCols = self.makeTimeLineDf(
-            sponsoredProject_mapped_df, therapyRange=26
+        timelineDf, removeCols = self._step(
+            "timeline",
+            lambda: self.makeTimeLineDf(sponsoredProject_mapped_df, therapyRange=26),
+            inputs={"mapped": sponsoredProject_mapped_df},
         )
         final_timeline = configureTimeLineDf(timelineDf)
 
@@ -402,9 +426,9 @@ class SponsoredProjectRunner(object):
 
         sponsoredProject_mapped_df = self.addOSMonths(sponsoredProject_mapped_df)
         # The conversion is done after
-        sponsoredProject_mapped_df[self._DATES] = sponsoredProject_mapped_df[
-            self._DATES
-        ].applymap(changeToDate)
+        sponsoredProject_mapped_df[self._DATES] = days_to(
+            sponsoredProject_mapped_df[self._DATES], "months"
+        )
         sponsoredProject_mapped_df["SEQ_ASSAY_ID"] = ""
 
         # Pull down sponsoredProject REDCap to cbio mapping
@@ -423,8 +447,12 @@ class SponsoredProjectRunner(object):
         sampleCols = mapping["cbio"][mapping["sampleType"] == "SAMPLE"].tolist()
         sampleCols.append("PATIENT_ID")
 
-        finalClinical, clinicaldf = self.createClinicalFile(
-            sponsoredProject_mapped_df, removeCols, mapping
+        finalClinical, clinicaldf = self._step(
+            "clinical",
+            lambda: self.createClinicalFile(
+                sponsoredProject_mapped_df, removeCols, mapping
+            ),
+            inputs={"mapped": sponsoredProject_mapped_df},
         )
         forSpecialTable = finalClinical.copy()
 
@@ -436,7 +464,11 @@ class SponsoredProjectRunner(object):
         patientFileDf = finalClinical.copy()
 
         finalClinical = getTimelineSpecimen
-        specimen = self.getSpecimen(getTimelineSpecimen)
+        specimen = self._step(
+            "specimen",
+            lambda: self.getSpecimen(getTimelineSpecimen),
+            inputs={"clinical": getTimelineSpecimen},
+        )
 
         if finalClinical.get("RECORD_ID") is not None:
             del finalClinical["RECORD_ID"]
@@ -481,12 +513,10 @@ class SponsoredProjectRunner(object):
         colOrder.extend(["SAMPLE_ID", "SAMPLE_NOTES"])
         final_timeline = final_timeline.append(specimen)
         final_timeline = final_timeline[colOrder]
-        timelineText = final_timeline.to_csv(index=False, sep="\t")
-        timelineText = replace0(timelineText)
         with open(
             "%s/data_timeline.txt" % self._SPONSORED_PROJECT, "w"
         ) as timelineFile:
-            timelineFile.write(timelineText)
+            write_tsv(final_timeline, timelineFile)
         fileEnt = File(
             "%s/data_timeline.txt" % self._SPONSORED_PROJECT, parent=self._SP_SYN_ID
         )
@@ -531,12 +561,8 @@ class SponsoredProjectRunner(object):
             patientFile.write("#%s\n" % "\t".join(patientDesc))
             patientFile.write("#%s\n" % "\t".join(patientType))
             patientFile.write("#%s\n" % "\t".join(["1"] * len(patientLabels)))
-            patientFile.write(
-                replace0(
-                    patientFileDf[patientCols]
-                    .drop_duplicates("PATIENT_ID")
-                    .to_csv(index=False, sep="\t")
-                )
+            write_tsv(
+                patientFileDf[patientCols].drop_duplicates("PATIENT_ID"), patientFile
             )
 
         # Create sampleIds
@@ -564,30 +590,11 @@ class SponsoredProjectRunner(object):
             sampleFile.write("#%s\n" % "\t".join(sampleDesc))
             sampleFile.write("#%s\n" % "\t".join(sampleType))
             sampleFile.write("#%s\n" % "\t".join(["1"] * len(sampleLabels)))
-            sampleFile.write(replace0(samples.to_csv(index=False, sep="\t")))
+            write_tsv(samples, sampleFile)
 
-        oncotreeLink = self.syn.get("syn13890902").externalURL
-        # Use the old oncotree link for now
-        oncotreeLink = (
-            "http://oncotree.mskcc.org/api/tumorTypes/tree?version=oncotree_2017_06_21"
-        )
-        oncotreeDict = process_functions.get_oncotree_code_mappings(oncotreeLink)
-        finalClinical["CANCER_TYPE"] = [
-            oncotreeDict[code.upper()].get("CANCER_TYPE", float("nan"))
-            for code in finalClinical["ONCOTREE_CODE"]
-        ]
-        finalClinical["CANCER_TYPE_DETAILED"] = [
-            oncotreeDict[code.upper()].get("CANCER_TYPE_DETAILED", float("nan"))
-            for code in finalClinical["ONCOTREE_CODE"]
-        ]
-        finalClinical["ONCOTREE_PRIMARY_NODE"] = [
-            oncotreeDict[code.upper()].get("ONCOTREE_PRIMARY_NODE", float("nan"))
-            for code in finalClinical["ONCOTREE_CODE"]
-        ]
-        finalClinical["ONCOTREE_SECONDARY_NODE"] = [
-            oncotreeDict[code.upper()].get("ONCOTREE_SECONDARY_NODE", float("nan"))
-            for code in finalClinical["ONCOTREE_CODE"]
-        ]
+        # Use the old oncotree version for now
+        oncotree = get_oncotree("oncotree_2017_06_21", cache_dir=get_cache_dir())
+        finalClinical = oncotree.enrich(finalClinical)
         finalClinical.to_csv(
             "%s/data_clinical.txt" % self._SPONSORED_PROJECT, index=False, sep="\t"
         )
@@ -623,289 +630,323 @@ class SponsoredProjectRunner(object):
         centerMafFileViewSynId = databaseToSynIdMappingDf["Id"][
             databaseToSynIdMappingDf["Database"] == "centerMafView"
         ][0]
-        centerMafSynIds = self.syn.tableQuery(
-            "select id from {} where name like '%mutation%'".format(
-                centerMafFileViewSynId
-            )
-        )
-        centerMafSynIdsDf = centerMafSynIds.asDataFrame()
-        # This value must be set outside here because the first maf file might
-        # Not be part of the centers
-        index = 0
-        mafpath = "%s/data_mutations_extended.txt" % self._SPONSORED_PROJECT
-        for mafSynId in centerMafSynIdsDf.id:
-            mafEnt = self.syn.get(mafSynId)
-            print(mafEnt.path)
-            mafcenter = mafEnt.path.split("_")[3]
-            if mafcenter in finalClinical["CENTER"].tolist():
-                print("running")
-                with open(mafEnt.path, "r") as mafFile:
-                    header = mafFile.readline()
-                    headers = header.replace("\n", "").split("\t")
-                    if index == 0:
-                        with open(mafpath, "w") as f:
-                            f.write(header)
-                    index += 1
-                    for row in mafFile:
-                        rowArray = row.replace("\n", "").split("\t")
-                        center = rowArray[headers.index("Center")]
-                        newMergedRow = configureMafRow(
-                            rowArray, headers, finalClinical["SAMPLE_ID"]
-                        )
-                        if newMergedRow is not None:
-                            with open(mafpath, "a") as f:
-                                f.write(newMergedRow)
-
-        mutations_nonGENIEdb = self.syn.tableQuery("SELECT * FROM %s" % mafSPSynId)
-        mutations_nonGENIEdbdf = mutations_nonGENIEdb.asDataFrame()
-        # ##SUBSETTING GENOMIC DATA
-        fillna_cols = ["n_alt_count", "t_alt_count", "t_ref_count", "n_ref_count"]
-        mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
-            fillna_cols
-        ].fillna("")
-        mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
-            fillna_cols
-        ].applymap(str)
-        mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
-            fillna_cols
-        ].applymap(replacePeriod)
-        mutations_nonGENIEdbdf["Validation_Status"] = ""
-        # The "temp" is to specify the 'self'
-        mutations_nonGENIEdbdf = process_mutation.format_maf(
-            mutations_nonGENIEdbdf, "temp"
-        )
-        sp_maf_path = "{}/data_mutations_extended.txt".format(self._SPONSORED_PROJECT)
-        with open(sp_maf_path, "a") as mutFile:
-            subset_mut = mutations_nonGENIEdbdf.Tumor_Sample_Barcode.isin(
-                finalClinical["SAMPLE_ID"]
-            )
-            mutText = mutations_nonGENIEdbdf[subset_mut].to_csv(
-                sep="\t", index=False, header=None
-            )
-            mutText = replace0(mutText)
-            mutFile.write(mutText)
-        fileEnt = File(sp_maf_path, parent=self._SP_SYN_ID)
-        if not self.staging:
-            self.syn.store(
-                fileEnt,
-                used=centerMafSynIdsDf.id.tolist(),
-                executed=GENIE_PROCESSING_URL,
-            )
 
-        CNA_PATH = "%s/data_CNA.txt" % self._SPONSORED_PROJECT
-        CNA_CENTER_PATH = self._SPONSORED_PROJECT + "/data_CNA_%s.txt"
-        centerCNASynIds = self.syn.tableQuery(
-            "select id from {} where name like 'data_CNA%'".format(
-                centerMafFileViewSynId
-            )
-        )
-        centerCNASynIdsDf = centerCNASynIds.asDataFrame()
-        # Grab all unique symbols and form cnaTemplate
-        allSymbols = set()
-
-        for cnaSynId in centerCNASynIdsDf.id:
-            cnaEnt = self.syn.get(cnaSynId)
-            with open(cnaEnt.path, "r") as cnaFile:
-                # Read first line first to get all the samples
-                samples = cnaFile.readline()
-                # Get all hugo symbols
-                allSymbols = allSymbols.union(
-                    set(line.split("\t")[0] for line in cnaFile)
+        def write_maf():
+            centerMafSynIds = self.syn.tableQuery(
+                "select id from {} where name like '%mutation%'".format(
+                    centerMafFileViewSynId
                 )
-        cnaTemplate = pd.DataFrame({"Hugo_Symbol": list(allSymbols)})
-        cnaTemplate.sort_values("Hugo_Symbol", inplace=True)
-        cnaTemplate.to_csv(CNA_PATH, sep="\t", index=False)
-
-        withMergedHugoSymbol = pd.Series("Hugo_Symbol")
-        withMergedHugoSymbol = withMergedHugoSymbol.append(
-            pd.Series(finalClinical["SAMPLE_ID"])
-        )
-
-        cnaSamples = []
-
-        for cnaSynId in centerCNASynIdsDf.id:
-            cnaEnt = self.syn.get(cnaSynId)
-            center = cnaEnt.name.replace("data_CNA_", "").replace(".txt", "")
-            print(cnaEnt.path)
-            # if center in CENTER_MAPPING_DF.center.tolist():
-            centerCNA = pd.read_csv(cnaEnt.path, sep="\t")
-            merged = cnaTemplate.merge(centerCNA, on="Hugo_Symbol", how="outer")
-            merged.sort_values("Hugo_Symbol", inplace=True)
-
-            # This is to remove more samples for the final cna file
-            merged = merged[merged.columns[merged.columns.isin(withMergedHugoSymbol)]]
-
-            cnaText = removePandasDfFloat(merged)
-            cnaText = (
-                cnaText.replace("\t\t", "\tNA\t")
-                .replace("\t\t", "\tNA\t")
-                .replace("\t\n", "\tNA\n")
-            )
-
-            with open(CNA_CENTER_PATH % center, "w") as cnaFile:
-                cnaFile.write(cnaText)
-            cnaSamples.extend(merged.columns[1:].tolist())
-
-            # Join CNA file
-            joinCommand = ["join", CNA_PATH, CNA_CENTER_PATH % center]
-            output = subprocess.check_output(joinCommand)
-            with open(CNA_PATH, "w") as cnaFile:
-                cnaFile.write(output.decode("utf-8").replace(" ", "\t"))
-
-        fileEnt = File(CNA_PATH, parent=self._SP_SYN_ID)
-        if not self.staging:
-            self.syn.store(
-                fileEnt,
-                used=centerCNASynIdsDf.id.tolist(),
-                executed=GENIE_PROCESSING_URL,
             )
-
-        self.createGeneMatrixDf(finalClinical, cnaSamples, sponsoredProject_mapped_ent)
-
-        fusion = self.syn.tableQuery(
-            "SELECT * FROM syn7893268 where "
-            "TUMOR_SAMPLE_BARCODE in ('{}')".format(
-                "','".join(finalClinical["SAMPLE_ID"])
+            centerMafSynIdsDf = centerMafSynIds.asDataFrame()
+            # This value must be set outside here because the first maf file might
+            # Not be part of the centers
+            index = 0
+            mafpath = "%s/data_mutations_extended.txt" % self._SPONSORED_PROJECT
+            for mafSynId in centerMafSynIdsDf.id:
+                mafEnt = self.syn.get(mafSynId)
+                print(mafEnt.path)
+                mafcenter = mafEnt.path.split("_")[3]
+                if mafcenter in finalClinical["CENTER"].tolist():
+                    print("running")
+                    with open(mafEnt.path, "r") as mafFile:
+                        header = mafFile.readline()
+                        headers = header.replace("\n", "").split("\t")
+                        if index == 0:
+                            with open(mafpath, "w") as f:
+                                f.write(header)
+                        index += 1
+                        for row in mafFile:
+                            rowArray = row.replace("\n", "").split("\t")
+                            newMergedRow = configureMafRow(
+                                rowArray, headers, finalClinical["SAMPLE_ID"]
+                            )
+                            if newMergedRow is not None:
+                                with open(mafpath, "a") as f:
+                                    f.write(newMergedRow)
+
+            mutations_nonGENIEdb = self.syn.tableQuery("SELECT * FROM %s" % mafSPSynId)
+            mutations_nonGENIEdbdf = mutations_nonGENIEdb.asDataFrame()
+            # ##SUBSETTING GENOMIC DATA
+            fillna_cols = ["n_alt_count", "t_alt_count", "t_ref_count", "n_ref_count"]
+            mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
+                fillna_cols
+            ].fillna("")
+            mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
+                fillna_cols
+            ].applymap(str)
+            mutations_nonGENIEdbdf[fillna_cols] = mutations_nonGENIEdbdf[
+                fillna_cols
+            ].applymap(replacePeriod)
+            mutations_nonGENIEdbdf["Validation_Status"] = ""
+            # The "temp" is to specify the 'self'
+            mutations_nonGENIEdbdf = process_mutation.format_maf(
+                mutations_nonGENIEdbdf, "temp"
             )
-        )
-        fusions_df = fusion.asDataFrame()
-
-        if not fusions_df.empty:
-            fusions_df = fusions_df.rename(
-                columns={
-                    "HUGO_SYMBOL": "Hugo_Symbol",
-                    "ENTREZ_GENE_ID": "Entrez_Gene_Id",
-                    "CENTER": "Center",
-                    "TUMOR_SAMPLE_BARCODE": "Tumor_Sample_Barcode",
-                    "FUSION": "Fusion",
-                    "DNA_SUPPORT": "DNA_support",
-                    "RNA_SUPPORT": "RNA_support",
-                    "METHOD": "Method",
-                    "FRAME": "Frame",
-                    "COMMENTS": "Comments",
-                }
-            )
-            fusions_df.Entrez_Gene_Id[fusions_df.Entrez_Gene_Id == 0] = pd.np.nan
-            fusionText = fusions_df.to_csv(sep="\t", index=False)
-            fusionText = replace0(fusionText)
-            with open(
-                "%s/data_fusions.txt" % self._SPONSORED_PROJECT, "w"
-            ) as fusionFile:
-                fusionFile.write(fusionText)
-            fileEnt = File(
-                "%s/data_fusions.txt" % self._SPONSORED_PROJECT, parent=self._SP_SYN_ID
+            sp_maf_path = "{}/data_mutations_extended.txt".format(
+                self._SPONSORED_PROJECT
             )
+            with open(sp_maf_path, "a") as mutFile:
+                subset_mut = mutations_nonGENIEdbdf.Tumor_Sample_Barcode.isin(
+                    finalClinical["SAMPLE_ID"]
+                )
+                mutText = mutations_nonGENIEdbdf[subset_mut].to_csv(
+                    sep="\t", index=False, header=None
+                )
+                mutText = replace0(mutText)
+                mutFile.write(mutText)
+            fileEnt = File(sp_maf_path, parent=self._SP_SYN_ID)
             if not self.staging:
                 self.syn.store(
-                    fileEnt, used="syn7893268", executed=GENIE_PROCESSING_URL
+                    fileEnt,
+                    used=centerMafSynIdsDf.id.tolist(),
+                    executed=GENIE_PROCESSING_URL,
                 )
 
-        seg = self.syn.tableQuery(
-            "SELECT ID, CHROM, LOCSTART, LOCEND, NUMMARK, SEGMEAN FROM "
-            "syn7893341 where ID in ('{}')".format(
-                "','".join(finalClinical["SAMPLE_ID"])
-            )
-        )
-        seg_df = seg.asDataFrame()
-        if not seg_df.empty:
-            seg_df.rename(
-                columns={
-                    "CHROM": "chrom",
-                    "LOCSTART": "loc.start",
-                    "LOCEND": "loc.end",
-                    "NUMMARK": "num.mark",
-                    "SEGMEAN": "seg.mean",
-                },
-                inplace=True,
+        self._step("maf", write_maf)
+
+        def write_cna():
+            CNA_PATH = "%s/data_CNA.txt" % self._SPONSORED_PROJECT
+            CNA_CENTER_PATH = self._SPONSORED_PROJECT + "/data_CNA_%s.txt"
+            centerCNASynIds = self.syn.tableQuery(
+                "select id from {} where name like 'data_CNA%'".format(
+                    centerMafFileViewSynId
+                )
             )
-            segText = replace0(seg_df.to_csv(sep="\t", index=False))
-            segpath = "{}/genie_{}_data_cna_hg19.seg".format(
-                self._SPONSORED_PROJECT, self._SPONSORED_PROJECT.lower()
+            centerCNASynIdsDf = centerCNASynIds.asDataFrame()
+            # Grab all unique symbols and form cnaTemplate
+            allSymbols = set()
+
+            for cnaSynId in centerCNASynIdsDf.id:
+                cnaEnt = self.syn.get(cnaSynId)
+                with open(cnaEnt.path, "r") as cnaFile:
+                    # Read first line first to get all the samples
+                    cnaFile.readline()
+                    # Get all hugo symbols
+                    allSymbols = allSymbols.union(
+                        set(line.split("\t")[0] for line in cnaFile)
+                    )
+            cnaTemplate = pd.DataFrame({"Hugo_Symbol": list(allSymbols)})
+            cnaTemplate.sort_values("Hugo_Symbol", inplace=True)
+            cnaTemplate.to_csv(CNA_PATH, sep="\t", index=False)
+
+            withMergedHugoSymbol = pd.Series("Hugo_Symbol")
+            withMergedHugoSymbol = withMergedHugoSymbol.append(
+                pd.Series(finalClinical["SAMPLE_ID"])
             )
-            with open(segpath, "w") as segFile:
-                segFile.write(segText)
-            fileEnt = File(segpath, parent=self._SP_SYN_ID)
-            if not self.staging:
-                self.syn.store(fileEnt, used=seg.tableId, executed=GENIE_PROCESSING_URL)
 
-        # Create case lists
-        if not os.path.exists(self._CASE_LIST_PATH):
-            os.mkdir(self._CASE_LIST_PATH)
-        else:
-            caselists = os.listdir(self._CASE_LIST_PATH)
-            for caselist in caselists:
-                os.remove(os.path.join(self._CASE_LIST_PATH, caselist))
-
-        # Write out cases sequenced so people can tell
-        # which samples were sequenced
-        create_case_lists.main(
-            "%s/data_clinical.txt" % self._SPONSORED_PROJECT,
-            "%s/data_gene_matrix.txt" % self._SPONSORED_PROJECT,
-            self._CASE_LIST_PATH,
-            "genie_{}".format(self._SPONSORED_PROJECT.lower()),
-        )
+            cnaSamples = []
+
+            for cnaSynId in centerCNASynIdsDf.id:
+                cnaEnt = self.syn.get(cnaSynId)
+                center = cnaEnt.name.replace("data_CNA_", "").replace(".txt", "")
+                print(cnaEnt.path)
+                # if center in CENTER_MAPPING_DF.center.tolist():
+                centerCNA = pd.read_csv(cnaEnt.path, sep="\t")
+                merged = cnaTemplate.merge(centerCNA, on="Hugo_Symbol", how="outer")
+                merged.sort_values("Hugo_Symbol", inplace=True)
+
+                # This is to remove more samples for the final cna file
+                merged = merged[
+                    merged.columns[merged.columns.isin(withMergedHugoSymbol)]
+                ]
+
+                cnaText = removePandasDfFloat(merged)
+                cnaText = (
+                    cnaText.replace("\t\t", "\tNA\t")
+                    .replace("\t\t", "\tNA\t")
+                    .replace("\t\n", "\tNA\n")
+                )
+
+                with open(CNA_CENTER_PATH % center, "w") as cnaFile:
+                    cnaFile.write(cnaText)
+                cnaSamples.extend(merged.columns[1:].tolist())
 
-        caseListFiles = os.listdir(self._CASE_LIST_PATH)
-        for casePath in caseListFiles:
-            casePath = os.path.join(self._CASE_LIST_PATH, casePath)
-            fileEnt = File(casePath, parent=self._CASE_LIST_SYN_ID)
+                # Join CNA file
+                joinCommand = ["join", CNA_PATH, CNA_CENTER_PATH % center]
+                output = subprocess.check_output(joinCommand)
+                with open(CNA_PATH, "w") as cnaFile:
+                    cnaFile.write(output.decode("utf-8").replace(" ", "\t"))
+
+            fileEnt = File(CNA_PATH, parent=self._SP_SYN_ID)
             if not self.staging:
                 self.syn.store(
                     fileEnt,
-                    used=[sample_ent.id, patient_ent.id],
+                    used=centerCNASynIdsDf.id.tolist(),
                     executed=GENIE_PROCESSING_URL,
                 )
+            return cnaSamples
 
-        seq_assays = "','".join(set(finalClinical["SEQ_ASSAY_ID"]))
-        bed = self.syn.tableQuery(
-            "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn8457748 where "
-            "SEQ_ASSAY_ID in ('{}') and "
-            "Feature_Type = 'exon' and "
-            "Hugo_Symbol is not null and "
-            "includeInPanel is true".format(seq_assays)
-        )
-        beddf = bed.asDataFrame()
-        bed = self.syn.tableQuery(
-            "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn11516678 where "
-            "SEQ_ASSAY_ID in ('{}') and "
-            "Feature_Type = 'exon' and "
-            "Hugo_Symbol is not null and "
-            "includeInPanel is true".format(seq_assays)
+        cnaSamples = self._step("cna", write_cna)
+
+        self._step(
+            "gene_matrix",
+            lambda: self.createGeneMatrixDf(
+                finalClinical, cnaSamples, sponsoredProject_mapped_ent
+            ),
         )
-        non_genie_beddf = bed.asDataFrame()
-        beddf = beddf.append(non_genie_beddf)
-        seq_assay_groups = beddf.groupby("SEQ_ASSAY_ID")
-        for seq_assay_id, seqdf in seq_assay_groups:
-            unique_genes = seqdf.Hugo_Symbol.unique()
-            gene_panel_text = (
-                "stable_id: {seq_assay_id}\n"
-                "description: {seq_assay_id}, "
-                "Number of Genes - {num_genes}\n"
-                "gene_list:\t{genelist}".format(
-                    seq_assay_id=seq_assay_id,
-                    num_genes=len(unique_genes),
-                    genelist="\t".join(unique_genes),
+
+        def write_fusions():
+            fusion = self.syn.tableQuery(
+                "SELECT * FROM syn7893268 where "
+                "TUMOR_SAMPLE_BARCODE in ('{}')".format(
+                    "','".join(finalClinical["SAMPLE_ID"])
                 )
             )
-            gene_panel_name = "data_gene_panel_" + seq_assay_id + ".txt"
-            gene_panel_path = os.path.join(self._SPONSORED_PROJECT, gene_panel_name)
-            with open(gene_panel_path, "w+") as f:
-                f.write(gene_panel_text)
-            fileEnt = File(gene_panel_path, parent=self._SP_SYN_ID)
-            if not self.staging:
-                self.syn.store(fileEnt, executed=GENIE_PROCESSING_URL)
+            fusions_df = fusion.asDataFrame()
+
+            if not fusions_df.empty:
+                fusions_df = fusions_df.rename(
+                    columns={
+                        "HUGO_SYMBOL": "Hugo_Symbol",
+                        "ENTREZ_GENE_ID": "Entrez_Gene_Id",
+                        "CENTER": "Center",
+                        "TUMOR_SAMPLE_BARCODE": "Tumor_Sample_Barcode",
+                        "FUSION": "Fusion",
+                        "DNA_SUPPORT": "DNA_support",
+                        "RNA_SUPPORT": "RNA_support",
+                        "METHOD": "Method",
+                        "FRAME": "Frame",
+                        "COMMENTS": "Comments",
+                    }
+                )
+                fusions_df.Entrez_Gene_Id[fusions_df.Entrez_Gene_Id == 0] = pd.np.nan
+                fusionText = fusions_df.to_csv(sep="\t", index=False)
+                fusionText = replace0(fusionText)
+                with open(
+                    "%s/data_fusions.txt" % self._SPONSORED_PROJECT, "w"
+                ) as fusionFile:
+                    fusionFile.write(fusionText)
+                fileEnt = File(
+                    "%s/data_fusions.txt" % self._SPONSORED_PROJECT,
+                    parent=self._SP_SYN_ID,
+                )
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt, used="syn7893268", executed=GENIE_PROCESSING_URL
+                    )
+
+        self._step("fusions", write_fusions)
+
+        def write_seg():
+            seg = self.syn.tableQuery(
+                "SELECT ID, CHROM, LOCSTART, LOCEND, NUMMARK, SEGMEAN FROM "
+                "syn7893341 where ID in ('{}')".format(
+                    "','".join(finalClinical["SAMPLE_ID"])
+                )
+            )
+            seg_df = seg.asDataFrame()
+            if not seg_df.empty:
+                seg_df.rename(
+                    columns={
+                        "CHROM": "chrom",
+                        "LOCSTART": "loc.start",
+                        "LOCEND": "loc.end",
+                        "NUMMARK": "num.mark",
+                        "SEGMEAN": "seg.mean",
+                    },
+                    inplace=True,
+                )
+                segText = replace0(seg_df.to_csv(sep="\t", index=False))
+                segpath = "{}/genie_{}_data_cna_hg19.seg".format(
+                    self._SPONSORED_PROJECT, self._SPONSORED_PROJECT.lower()
+                )
+                with open(segpath, "w") as segFile:
+                    segFile.write(segText)
+                fileEnt = File(segpath, parent=self._SP_SYN_ID)
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt, used=seg.tableId, executed=GENIE_PROCESSING_URL
+                    )
+
+        self._step("seg", write_seg)
+
+        def write_case_lists():
+            # Create case lists
+            if not os.path.exists(self._CASE_LIST_PATH):
+                os.mkdir(self._CASE_LIST_PATH)
+            else:
+                caselists = os.listdir(self._CASE_LIST_PATH)
+                for caselist in caselists:
+                    os.remove(os.path.join(self._CASE_LIST_PATH, caselist))
+
+            # Write out cases sequenced so people can tell
+            # which samples were sequenced
+            create_case_lists.main(
+                "%s/data_clinical.txt" % self._SPONSORED_PROJECT,
+                "%s/data_gene_matrix.txt" % self._SPONSORED_PROJECT,
+                self._CASE_LIST_PATH,
+                "genie_{}".format(self._SPONSORED_PROJECT.lower()),
+            )
 
-        # Make sure to re download all the metadata files again
-        self.reviseMetadataFiles()
-        cmd = [
-            os.path.join(
-                self.cbioPath, "core/src/main/scripts/importer/validateData.py"
-            ),
-            "-s",
-            self._SPONSORED_PROJECT,
-            "-n",
-        ]
-        subprocess.call(cmd)
+            caseListFiles = os.listdir(self._CASE_LIST_PATH)
+            for casePath in caseListFiles:
+                casePath = os.path.join(self._CASE_LIST_PATH, casePath)
+                fileEnt = File(casePath, parent=self._CASE_LIST_SYN_ID)
+                if not self.staging:
+                    self.syn.store(
+                        fileEnt,
+                        used=[sample_ent.id, patient_ent.id],
+                        executed=GENIE_PROCESSING_URL,
+                    )
+
+        self._step("case_lists", write_case_lists)
+
+        def write_gene_panels():
+            seq_assays = "','".join(set(finalClinical["SEQ_ASSAY_ID"]))
+            bed = self.syn.tableQuery(
+                "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn8457748 where "
+                "SEQ_ASSAY_ID in ('{}') and "
+                "Feature_Type = 'exon' and "
+                "Hugo_Symbol is not null and "
+                "includeInPanel is true".format(seq_assays)
+            )
+            beddf = bed.asDataFrame()
+            bed = self.syn.tableQuery(
+                "SELECT Hugo_Symbol, SEQ_ASSAY_ID FROM syn11516678 where "
+                "SEQ_ASSAY_ID in ('{}') and "
+                "Feature_Type = 'exon' and "
+                "Hugo_Symbol is not null and "
+                "includeInPanel is true".format(seq_assays)
+            )
+            non_genie_beddf = bed.asDataFrame()
+            beddf = beddf.append(non_genie_beddf)
+            seq_assay_groups = beddf.groupby("SEQ_ASSAY_ID")
+            for seq_assay_id, seqdf in seq_assay_groups:
+                unique_genes = seqdf.Hugo_Symbol.unique()
+                gene_panel_text = (
+                    "stable_id: {seq_assay_id}\n"
+                    "description: {seq_assay_id}, "
+                    "Number of Genes - {num_genes}\n"
+                    "gene_list:\t{genelist}".format(
+                        seq_assay_id=seq_assay_id,
+                        num_genes=len(unique_genes),
+                        genelist="\t".join(unique_genes),
+                    )
+                )
+                gene_panel_name = "data_gene_panel_" + seq_assay_id + ".txt"
+                gene_panel_path = os.path.join(self._SPONSORED_PROJECT, gene_panel_name)
+                with open(gene_panel_path, "w+") as f:
+                    f.write(gene_panel_text)
+                fileEnt = File(gene_panel_path, parent=self._SP_SYN_ID)
+                if not self.staging:
+                    self.syn.store(fileEnt, executed=GENIE_PROCESSING_URL)
+
+        self._step("gene_panels", write_gene_panels)
+
+        def validate():
+            # Make sure to re download all the metadata files again
+            self.reviseMetadataFiles()
+            cmd = [
+                os.path.join(
+                    self.cbioPath, "core/src/main/scripts/importer/validateData.py"
+                ),
+                "-s",
+                self._SPONSORED_PROJECT,
+                "-n",
+            ]
+            subprocess.call(cmd)
+
+        self._step("validate", validate)
 
         if self.export:
             # AKT1 only
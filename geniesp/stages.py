@@ -0,0 +1,264 @@
+"""Declarative export stages and a scheduler that runs them as a DAG"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from functools import partial
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Sequence, Set, Union
+
+from .manifest import ExportManifest
+from .profiling import StageProfiler
+
+if TYPE_CHECKING:
+    from .metrics import MetricsRegistry
+
+_local = threading.local()
+
+
+def current_stage() -> str:
+    """Name of the stage running in the current thread, if any"""
+    return getattr(_local, "stage", None)
+
+
+def _as_arguments(inputs: Union[Sequence[str], Dict[str, str]]) -> Dict[str, str]:
+    """Normalize stage inputs to a mapping of argument name to stage name"""
+    if isinstance(inputs, dict):
+        return dict(inputs)
+    return {name: name for name in inputs}
+
+
+class Stage:
+    """A named step of an export. The stage's output is the return value of
+    `func` and is available to other stages under the stage name.
+
+    Args:
+        name (str): unique stage name
+        func (Callable[..., Any]): called with the outputs of `inputs`
+            and `optional_inputs` as keyword arguments
+        inputs (Union[Sequence[str], Dict[str, str]], optional): stages whose
+            outputs are passed to `func`, either as stage names that are also
+            the argument names or as a mapping of argument name to stage name
+        optional_inputs (Union[Sequence[str], Dict[str, str]], optional): like
+            `inputs`, but for stages that might not be part of the export.
+            None is passed for stages that aren't.
+        after (Sequence[str], optional): stages that must finish first, but
+            whose outputs aren't needed
+        outputs (Sequence[str], optional): glob patterns of the files the stage
+            writes. Only stages with outputs are recorded in the manifest
+            and can be skipped when resuming.
+        fingerprint (Callable[[], Dict[str, Any]], optional): returns external
+            inputs of the stage that aren't stage outputs, for example
+            versions of files it downloads
+        restore (Callable[..., Any], optional): called with the same arguments
+            as `func` to recreate the stage output when the stage is skipped.
+            None is used as the output if not set.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[..., Any],
+        inputs: Union[Sequence[str], Dict[str, str]] = (),
+        optional_inputs: Union[Sequence[str], Dict[str, str]] = (),
+        after: Sequence[str] = (),
+        outputs: Sequence[str] = (),
+        fingerprint: Callable[[], Dict[str, Any]] = None,
+        restore: Callable[..., Any] = None,
+    ):
+        self.name = name
+        self.func = func
+        self.inputs = _as_arguments(inputs)
+        self.optional_inputs = _as_arguments(optional_inputs)
+        self.after = list(after)
+        self.outputs = list(outputs)
+        self.fingerprint = fingerprint
+        self.restore = restore
+
+    def __repr__(self) -> str:
+        return f"Stage({self.name})"
+
+
+class StageScheduler:
+    """Runs stages as soon as the stages they depend on have finished,
+    on a pool of `jobs` threads, and records each stage's wall time.
+    With one job, stages run one at a time in declaration order.
+
+    Args:
+        stages (List[Stage]): stages of the export
+        jobs (int, optional): number of stages to run in parallel. Defaults to 1.
+        manifest (ExportManifest, optional): manifest to record stage outputs
+            in and to skip up to date stages with. Defaults to None.
+        profiler (StageProfiler, optional): profiler to run the stages under.
+            Defaults to None.
+        metrics (MetricsRegistry, optional): registry that stages count their
+            metrics to and that gets their wall time. Defaults to None.
+
+    Raises:
+        ValueError: Stage names must be unique
+        ValueError: Stages can only depend on declared stages
+        ValueError: Stage dependencies can't contain cycles
+    """
+
+    def __init__(
+        self,
+        stages: List[Stage],
+        jobs: int = 1,
+        manifest: ExportManifest = None,
+        profiler: StageProfiler = None,
+        metrics: "MetricsRegistry" = None,
+    ):
+        self.stages = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"duplicated stage: {stage.name}")
+            self.stages[stage.name] = stage
+        self.jobs = max(jobs, 1)
+        self.manifest = manifest
+        self.profiler = profiler
+        self.metrics = metrics
+        # stage name -> seconds
+        self.timings = {}
+        # stages skipped because their outputs were up to date
+        self.skipped = []
+        self._dependencies = {}
+        for stage in stages:
+            required = set(stage.inputs.values()) | set(stage.after)
+            unknown = required - set(self.stages)
+            if unknown:
+                raise ValueError(
+                    f"stage {stage.name} depends on unknown stages: {sorted(unknown)}"
+                )
+            self._dependencies[stage.name] = required | {
+                name for name in stage.optional_inputs.values() if name in self.stages
+            }
+        self._check_acyclic()
+
+    def _check_acyclic(self) -> None:
+        visiting = set()
+        visited = set()
+
+        def visit(name: str) -> None:
+            if name in visited:
+                return
+            if name in visiting:
+                raise ValueError(f"stage dependencies contain a cycle at {name}")
+            visiting.add(name)
+            for dependency in self._dependencies[name]:
+                visit(dependency)
+            visiting.remove(name)
+            visited.add(name)
+
+        for name in self.stages:
+            visit(name)
+
+    def ancestors(self, targets: Sequence[str]) -> Set[str]:
+        """Get the stages needed to run the target stages, including
+        the targets themselves.
+
+        Args:
+            targets (Sequence[str]): stage names
+
+        Returns:
+            Set[str]: stage names
+        """
+        needed = set()
+        to_visit = list(targets)
+        while to_visit:
+            name = to_visit.pop()
+            if name not in needed:
+                needed.add(name)
+                to_visit.extend(self._dependencies[name])
+        return needed
+
+    def _run_stage(self, name: str, results: Dict[str, Any]) -> Any:
+        stage = self.stages[name]
+        kwargs = {arg: results[input_name] for arg, input_name in stage.inputs.items()}
+        for arg, input_name in stage.optional_inputs.items():
+            kwargs[arg] = results.get(input_name)
+        logging.info(f"stage {name} started")
+        _local.stage = name
+        start = time.perf_counter()
+        if self.manifest is not None and stage.outputs:
+            run = partial(self._run_recorded_stage, stage, kwargs)
+        else:
+            run = partial(stage.func, **kwargs)
+        if self.profiler is not None:
+            run = partial(self.profiler.call, name, run, kwargs)
+        try:
+            if self.metrics is not None:
+                with self.metrics.activate():
+                    return run()
+            return run()
+        finally:
+            _local.stage = None
+            self.timings[name] = time.perf_counter() - start
+            if self.metrics is not None:
+                self.metrics.add("wall_seconds", self.timings[name], stage=name)
+            logging.info(f"stage {name} finished in {self.timings[name]:.1f}s")
+
+    def _run_recorded_stage(self, stage: Stage, kwargs: Dict[str, Any]) -> Any:
+        fingerprint = self.manifest.fingerprint(
+            kwargs, stage.fingerprint() if stage.fingerprint is not None else None
+        )
+        if self.manifest.is_current(stage.name, fingerprint):
+            logging.info(f"stage {stage.name} is up to date, skipping")
+            self.skipped.append(stage.name)
+            return None if stage.restore is None else stage.restore(**kwargs)
+        result = stage.func(**kwargs)
+        self.manifest.record(stage.name, fingerprint, stage.outputs)
+        return result
+
+    def run(
+        self, targets: Sequence[str] = None, done: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """Run the stages.
+
+        Args:
+            targets (Sequence[str], optional): only run these stages and the
+                stages they depend on. Defaults to None, which runs all stages.
+            done (Dict[str, Any], optional): outputs of stages that already
+                ran, for example in an earlier call. Defaults to None.
+
+        Returns:
+            Dict[str, Any]: stage name to stage output
+        """
+        results = dict(done or {})
+        to_run = set(self.stages) if targets is None else self.ancestors(targets)
+        # Keep declaration order so serial runs are deterministic
+        pending = [name for name in self.stages if name in to_run - set(results)]
+        running = {}
+        error = None
+        with ThreadPoolExecutor(max_workers=self.jobs) as executor:
+            while pending or running:
+                if error is None:
+                    ready = [
+                        name
+                        for name in pending
+                        if self._dependencies[name] <= set(results)
+                    ]
+                    for name in ready[: self.jobs - len(running)]:
+                        pending.remove(name)
+                        running[executor.submit(self._run_stage, name, results)] = name
+                if not running:
+                    if error is None and pending:
+                        raise ValueError(f"stages can't be scheduled: {pending}")
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    try:
+                        results[name] = future.result()
+                    except Exception as err:
+                        logging.error(f"stage {name} failed")
+                        if error is None:
+                            error = err
+        if error is not None:
+            raise error
+        return results
+
+    def log_timings(self) -> None:
+        """Log the wall time of each stage, slowest first"""
+        for name, seconds in sorted(
+            self.timings.items(), key=lambda item: item[1], reverse=True
+        ):
+            logging.info(f"{name}: {seconds:.1f}s")
@@ -0,0 +1,202 @@
+"""Local columnar cache of versioned derived variable tables
+
+Derived variable CSVs are converted to Parquet or Feather the first time a
+Synapse ID and version is read. Later reads, from any cohort or run, load
+typed columns from the cache instead of re-inferring CSV types.
+Requires pyarrow (`pip install geniesp[cache]`).
+"""
+import logging
+import os
+import tempfile
+from typing import Callable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+# Environment variable used to configure the cache root when
+# it isn't passed in explicitly
+CACHE_DIR_ENV = "GENIESP_CACHE_DIR"
+
+_FILE_FORMATS = ["parquet", "feather"]
+
+
+def get_cache_dir(cache_dir: str = None) -> str:
+    """Get the cache root, falling back to the GENIESP_CACHE_DIR
+    environment variable.
+
+    Args:
+        cache_dir (str, optional): cache root. Defaults to None.
+
+    Returns:
+        str: cache root or None if caching isn't configured
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get(CACHE_DIR_ENV)
+    return cache_dir
+
+
+class ColumnarTableCache:
+    """Versioned columnar cache of CSV tables with size-based LRU eviction.
+    Recency is tracked with file modification times, so the cache can be
+    shared between processes.
+    """
+
+    def __init__(
+        self, cache_dir: str, max_bytes: int = None, file_format: str = "parquet"
+    ):
+        if file_format not in _FILE_FORMATS:
+            raise ValueError(f"file_format must be one of {_FILE_FORMATS}")
+        # Fail early if the optional dependency isn't installed
+        import pyarrow  # noqa: F401
+
+        self.cache_dir = os.path.join(cache_dir, "tables")
+        self.max_bytes = max_bytes
+        self.file_format = file_format
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    def _cache_path(self, synid: str, version: int) -> str:
+        return os.path.join(self.cache_dir, f"{synid}.{version}.{self.file_format}")
+
+    def _write(self, df: pd.DataFrame, cache_path: str) -> None:
+        """Atomically write a data frame to the cache"""
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            if self.file_format == "parquet":
+                df.to_parquet(temp_path, index=False)
+            else:
+                df.reset_index(drop=True).to_feather(temp_path)
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _ensure_cached(
+        self, synid: str, version: int, path: str
+    ) -> Tuple[Optional[str], Optional[pd.DataFrame]]:
+        """Convert the CSV to the columnar format if it isn't cached yet
+
+        Returns:
+            Tuple[Optional[str], Optional[pd.DataFrame]]: path to the cached
+            table or None if it couldn't be cached, and the parsed CSV if it
+            was converted by this call
+        """
+        cache_path = self._cache_path(synid, version)
+        if os.path.exists(cache_path):
+            # Mark as recently used
+            os.utime(cache_path)
+            return cache_path, None
+        logging.info(f"caching {synid}.{version} as {self.file_format}")
+        df = pd.read_csv(path, low_memory=False)
+        try:
+            self._write(df, cache_path)
+        except (ValueError, TypeError) as err:
+            # pyarrow errors subclass ValueError/TypeError, for example
+            # object columns with mixed types
+            logging.warning(f"unable to cache {synid}.{version}: {err}")
+            return None, df
+        self.evict(keep=cache_path)
+        return cache_path, df
+
+    def _cached_columns(self, cache_path: str) -> List[str]:
+        if self.file_format == "parquet":
+            import pyarrow.parquet
+
+            return pyarrow.parquet.read_schema(cache_path).names
+        import pyarrow.ipc
+
+        with pyarrow.ipc.open_file(cache_path) as reader:
+            return reader.schema.names
+
+    def columns(self, synid: str, version: int, path: str) -> List[str]:
+        """Get the column names of a versioned table
+
+        Args:
+            synid (str): Synapse ID of the table
+            version (int): version of the table
+            path (str): local path of the CSV
+
+        Returns:
+            List[str]: column names
+        """
+        cache_path, df = self._ensure_cached(synid, version, path)
+        if df is not None:
+            return df.columns.tolist()
+        return self._cached_columns(cache_path)
+
+    def read_csv(
+        self,
+        synid: str,
+        version: int,
+        path: str,
+        usecols: Union[List[str], Callable[[str], bool]] = None,
+    ) -> pd.DataFrame:
+        """Read a versioned CSV through the cache. The read that converts
+        the CSV projects the parsed CSV instead of reading the cache back.
+
+        Args:
+            synid (str): Synapse ID of the table
+            version (int): version of the table
+            path (str): local path of the CSV
+            usecols (Union[List[str], Callable[[str], bool]], optional): columns
+                to read, as accepted by pd.read_csv. Defaults to None.
+
+        Returns:
+            pd.DataFrame: table data
+        """
+        cache_path, df = self._ensure_cached(synid, version, path)
+        columns = None
+        if usecols is not None:
+            if df is not None:
+                all_columns = df.columns
+            else:
+                all_columns = self._cached_columns(cache_path)
+            if callable(usecols):
+                columns = [col for col in all_columns if usecols(col)]
+            else:
+                usecols = set(usecols)
+                columns = [col for col in all_columns if col in usecols]
+        if df is not None:
+            return df if columns is None else df[columns]
+        if self.file_format == "parquet":
+            df = pd.read_parquet(cache_path, columns=columns)
+        else:
+            df = pd.read_feather(cache_path, columns=columns)
+        # Missing strings are read back as None, CSV parsing gives NaN
+        object_cols = df.columns[df.dtypes == object]
+        df[object_cols] = df[object_cols].where(df[object_cols].notnull(), np.nan)
+        return df
+
+    def size(self) -> int:
+        """Total size of the cached tables in bytes"""
+        return sum(
+            entry.stat().st_size
+            for entry in os.scandir(self.cache_dir)
+            if entry.name.endswith(f".{self.file_format}")
+        )
+
+    def evict(self, keep: str = None) -> None:
+        """Remove least recently used tables until the cache fits
+        into max_bytes.
+
+        Args:
+            keep (str, optional): cached table path to never evict.
+                Defaults to None.
+        """
+        if self.max_bytes is None:
+            return
+        entries = [
+            entry
+            for entry in os.scandir(self.cache_dir)
+            if entry.name.endswith(f".{self.file_format}")
+        ]
+        entries.sort(key=lambda entry: entry.stat().st_mtime)
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if total <= self.max_bytes:
+                break
+            if entry.path == keep:
+                continue
+            total -= entry.stat().st_size
+            logging.info(f"evicting {entry.name} from table cache")
+            os.remove(entry.path)
@@ -0,0 +1,207 @@
+"""Background upload of export files to Synapse"""
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Dict, List
+
+from synapseclient import Activity, File, Synapse
+from synapseclient.core.utils import id_of
+
+from .folder_index import FolderIndex
+from .hashing import md5_file
+
+# Marks the end of the queue for a worker
+_STOP = object()
+
+
+class UploadQueue:
+    """Stores files in Synapse with provenance on background threads, so
+    that exports don't wait for network round-trips. Files must not be
+    modified after they are submitted. A file whose MD5 matches the
+    same-named file already in the destination folder isn't uploaded again,
+    only its provenance is updated.
+
+    Args:
+        syn (Synapse): Synapse connection
+        workers (int, optional): number of upload threads. Defaults to 4.
+        max_pending (int, optional): number of files that can wait for an
+            upload before `submit` blocks. Defaults to 100.
+        retries (int, optional): number of retries of a failed store.
+            Defaults to 3.
+        backoff (float, optional): seconds to wait before the first retry,
+            doubled for every later retry. Defaults to 2.
+        force (bool, optional): Whether to upload files that are unchanged.
+            Defaults to False.
+    """
+
+    def __init__(
+        self,
+        syn: Synapse,
+        workers: int = 4,
+        max_pending: int = 100,
+        retries: int = 3,
+        backoff: float = 2,
+        force: bool = False,
+    ):
+        self.syn = syn
+        self.workers = max(workers, 1)
+        self.retries = retries
+        self.backoff = backoff
+        self.force = force
+        self.files = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.unchanged_files = 0
+        self.unchanged_bytes = 0
+        # paths of files that couldn't be stored
+        self.failed = []
+        self._errors = []
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._threads = []
+        # folder ID -> index of files in the destination folder
+        self._indexes = {}
+        self._index_lock = threading.Lock()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(
+                    target=self._work, name=f"upload-{index}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(
+        self, path: str, parent, used: List = None, executed: str = None
+    ) -> None:
+        """Queue a file to be stored. Blocks if too many files are waiting.
+
+        Args:
+            path (str): local file path
+            parent (synapseclient.Folder): Synapse folder to store the file in
+            used (List, optional): Synapse IDs used to create the file.
+                Defaults to None.
+            executed (str, optional): code that created the file. Defaults to None.
+        """
+        self._start()
+        self._queue.put((path, parent, used, executed))
+
+    def _work(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                if item is _STOP:
+                    return
+                self._store(*item)
+            finally:
+                self._queue.task_done()
+
+    def _get_index(self, parent_id: str) -> FolderIndex:
+        """Get the index of a destination folder, listing each folder once"""
+        with self._index_lock:
+            index = self._indexes.get(parent_id)
+            if index is None:
+                index = FolderIndex(self.syn, parent_id)
+                self._indexes[parent_id] = index
+            return index
+
+    def _store_or_skip(self, path: str, parent, used: List, executed: str) -> bool:
+        """Store a file unless it's unchanged
+
+        Returns:
+            bool: True if the file was stored
+        """
+        name = os.path.basename(path)
+        index = None
+        if not self.force:
+            index = self._get_index(id_of(parent))
+            existing_md5 = index.md5(name)
+            if existing_md5 is not None and existing_md5 == md5_file(path):
+                logging.info(f"{path} is unchanged, not uploading")
+                if used or executed:
+                    self.syn.setProvenance(
+                        index.synid(name), Activity(used=used, executed=executed)
+                    )
+                return False
+        entity = self.syn.store(
+            File(path, parent=parent), used=used, executed=executed
+        )
+        if index is not None:
+            index.update(name, entity)
+        return True
+
+    def _store(self, path: str, parent, used: List, executed: str) -> None:
+        size = os.path.getsize(path)
+        start = time.perf_counter()
+        for attempt in range(self.retries + 1):
+            try:
+                stored = self._store_or_skip(path, parent, used, executed)
+                break
+            except Exception as err:
+                if attempt == self.retries:
+                    logging.error(f"unable to upload {path}: {err}")
+                    with self._lock:
+                        self.failed.append(path)
+                        self._errors.append(err)
+                    return
+                delay = self.backoff * 2**attempt
+                logging.warning(f"upload of {path} failed, retrying in {delay}s: {err}")
+                time.sleep(delay)
+        with self._lock:
+            if stored:
+                self.files += 1
+                self.bytes += size
+            else:
+                self.unchanged_files += 1
+                self.unchanged_bytes += size
+            self.seconds += time.perf_counter() - start
+
+    def barrier(self) -> None:
+        """Wait for all submitted files to be stored
+
+        Raises:
+            Exception: the error of the first file that couldn't be stored
+        """
+        self._queue.join()
+        if self._errors:
+            raise self._errors[0]
+
+    def close(self) -> None:
+        """Wait for all submitted files, stop the workers and log a summary.
+        Upload errors aren't raised, see `barrier`."""
+        self._queue.join()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for _ in threads:
+            self._queue.put(_STOP)
+        for thread in threads:
+            thread.join()
+        self.log_summary()
+
+    @property
+    def summary(self) -> Dict:
+        """Number of files, bytes and seconds spent uploading"""
+        return {
+            "files": self.files,
+            "bytes": self.bytes,
+            "unchanged_files": self.unchanged_files,
+            "unchanged_bytes": self.unchanged_bytes,
+            "seconds": round(self.seconds, 3),
+            "failed": len(self.failed),
+        }
+
+    def log_summary(self) -> None:
+        """Log the upload summary"""
+        summary = self.summary
+        logging.info(
+            f"uploaded {summary['files']} files, {summary['bytes'] / 1024**2:.1f} MiB "
+            f"in {summary['seconds']:.1f}s of upload time, "
+            f"skipped {summary['unchanged_files']} unchanged files "
+            f"({summary['unchanged_bytes'] / 1024**2:.1f} MiB), "
+            f"{summary['failed']} failed"
+        )
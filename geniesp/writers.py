@@ -0,0 +1,195 @@
+"""Streaming TSV writer for export files
+
+Export files used to be rendered to one string with `DataFrame.to_csv` and
+then passed through `removeStringFloat`, which removes the ".0" that pandas
+writes at the end of integer-valued floats. The writer here formats each
+column once, according to a plan chosen from its dtype, and writes the rows
+in chunks, so the output is the same as `removePandasDfFloat` without a
+copy of the whole file in memory:
+
+* float columns that only hold integers below 1e16 are written through the
+  nullable Int64 dtype
+* other float columns are rendered the way pandas renders them and
+  the ".0" suffix is removed from each field
+* object and extension columns are rendered with `str` and, like any
+  field in the rendered text, lose a ".0" at the end of the field, or
+  before a tab or newline inside a quoted field
+* integer, boolean and datetime columns can't end in ".0" and are written
+  as is
+
+A single column frame is rendered by chunks and the ".0" are removed from
+the text, because the csv module quotes a lone empty field, which a field
+that was ".0" isn't in the text of `removePandasDfFloat`.
+"""
+import os
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from . import metrics
+from .hashing import HashingWriter
+
+# Rows rendered at a time
+CHUNK_ROWS = 50000
+# Integer-valued floats at or above this are written in scientific notation
+# by pandas, so they don't end in ".0"
+MAX_INT_FLOAT = 1e16
+
+
+def _int_valued(values: np.ndarray) -> np.ndarray:
+    """Which floats are written as integers once their ".0" is removed"""
+    with np.errstate(invalid="ignore"):
+        return (np.abs(values) < MAX_INT_FLOAT) & (values == np.floor(values))
+
+
+def _strip_text(text: str) -> str:
+    """`removeStringFloat` of a field as the csv module writes it"""
+    if "\t" in text or "\n" in text or '"' in text:
+        return text.replace(".0\t", "\t").replace(".0\n", "\n")
+    return text[:-2] if text.endswith(".0") else text
+
+
+def _text_changes(values: pd.Series) -> Optional[Dict[str, str]]:
+    """Strings of a column that `removeStringFloat` changes, or None if the
+    column doesn't only hold strings. Columns usually repeat few strings,
+    so each distinct string is only checked once."""
+    if pd.api.types.infer_dtype(values, skipna=True) not in ["string", "empty"]:
+        return None
+    changes = {}
+    for text in pd.unique(values.dropna()):
+        stripped = _strip_text(text)
+        if stripped != text:
+            changes[text] = stripped
+    return changes
+
+
+def plan_column(values: pd.Series) -> str:
+    """Choose how a column is formatted
+
+    Args:
+        values (pd.Series): column
+
+    Returns:
+        str: "int", "float", "text" or "raw"
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype):
+        if dtype.kind == "f":
+            array = values.to_numpy()
+            present = array[~np.isnan(array)]
+            return "int" if _int_valued(present).all() else "float"
+        if dtype.kind in "iubmM":
+            return "raw"
+    return "raw" if _text_changes(values) == {} else "text"
+
+
+def format_column(values: pd.Series, plan: str) -> pd.Series:
+    """Format a column so that pandas writes it without float suffixes
+
+    Args:
+        values (pd.Series): column
+        plan (str): see `plan_column`
+
+    Returns:
+        pd.Series: column to write
+    """
+    if plan in ["int", "float"]:
+        array = values.to_numpy()
+        missing = np.isnan(array)
+        if plan == "int":
+            text = np.empty(len(array), dtype=object)
+            integral = ~missing
+        else:
+            # pandas writes floats with numpy's str
+            text = array.astype(str).astype(object)
+            integral = _int_valued(array) & ~missing
+        text[integral] = array[integral].astype(np.int64).astype(str)
+        text[(array == 0) & np.signbit(array)] = "-0"
+        text[missing] = np.nan
+        return pd.Series(text, index=values.index)
+    if plan == "text":
+        values = values.astype(object)
+        changes = _text_changes(values)
+        if changes is None:
+            return values.map(
+                lambda value: _strip_text(str(value)), na_action="ignore"
+            )
+        if changes:
+            return values.replace(changes)
+    return values
+
+
+def write_tsv(
+    df: pd.DataFrame,
+    file_f,
+    comments: Optional[List[List[str]]] = None,
+    header: bool = True,
+    chunk_rows: int = CHUNK_ROWS,
+) -> None:
+    """Write a data frame as tab separated text, without the ".0" of
+    integer-valued floats. The output is the same as the text of
+    `removePandasDfFloat`.
+
+    Args:
+        df (pd.DataFrame): data
+        file_f: text file to write to, for example a HashingWriter
+        comments (List[List[str]], optional): cBioPortal header lines
+            written before the column header, each prefixed with "#".
+            Defaults to None.
+        header (bool, optional): Whether to write the column header.
+            Defaults to True.
+        chunk_rows (int, optional): number of rows rendered at a time.
+            Defaults to CHUNK_ROWS.
+    """
+    for comment in comments or []:
+        file_f.write("#{}\n".format("\t".join(comment)))
+    plans = [plan_column(df.iloc[:, index]) for index in range(df.shape[1])]
+    names = False
+    if header:
+        names = [_strip_text(str(name)) for name in df.columns]
+    for start in range(0, max(len(df), 1), chunk_rows):
+        chunk = df.iloc[start : start + chunk_rows]
+        if len(plans) < 2:
+            text = chunk.to_csv(sep="\t", index=False, header=header and start == 0)
+            file_f.write(text.replace(".0\t", "\t").replace(".0\n", "\n"))
+            continue
+        formatted = pd.DataFrame(
+            {
+                index: format_column(chunk.iloc[:, index], plan)
+                for index, plan in enumerate(plans)
+            },
+            index=chunk.index,
+        )
+        file_f.write(
+            formatted.to_csv(
+                sep="\t", index=False, header=names if start == 0 else False
+            )
+        )
+
+
+def write_tsv_file(
+    df: pd.DataFrame,
+    path: str,
+    comments: Optional[List[List[str]]] = None,
+    header: bool = True,
+) -> str:
+    """Write a data frame to a TSV file, see `write_tsv`. The rows and bytes
+    written are counted in the active metrics registry.
+
+    Args:
+        df (pd.DataFrame): data
+        path (str): file path
+        comments (List[List[str]], optional): cBioPortal header lines.
+            Defaults to None.
+        header (bool, optional): Whether to write the column header.
+            Defaults to True.
+
+    Returns:
+        str: md5 hex digest of the file
+    """
+    with HashingWriter(path) as file_f:
+        write_tsv(df, file_f, comments=comments, header=header)
+    metrics.add("rows_written", len(df))
+    metrics.add("bytes_written", os.path.getsize(path))
+    return file_f.md5
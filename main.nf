@@ -7,6 +7,7 @@ Run cBioPortal Export
 process cBioPortalExport {
    container "$params.geniesp_docker"
    secret 'SYNAPSE_AUTH_TOKEN'
+   publishDir "$params.metrics_dir", mode: 'copy', pattern: '*_metrics.*'
 
    input:
    val cohort
@@ -16,6 +17,7 @@ process cBioPortalExport {
 
    output:
    stdout
+   path "*_metrics.{json,prom}", emit: metrics
 
    script:
    if (production && use_grs) {
@@ -55,9 +57,11 @@ workflow {
    params.production = false
    params.use_grs = false
 
-   // Check if cohort is part of allowed cohort list
+   // Check if cohorts are part of allowed cohort list
+   // ALL or a comma separated list of cohorts are exported in one container
    def allowed_cohorts = ["BLADDER", "BrCa", "CRC", "ESOPHAGO", "MELANOMA", "NSCLC", "OVARIAN", "PANC", "Prostate", "RENAL"]
-   if (!allowed_cohorts.contains(params.cohort)) {exit 1, 'Invalid cohort name'}
+   def cohorts = params.cohort == 'ALL' ? allowed_cohorts : params.cohort.tokenize(',')*.trim()
+   if (!allowed_cohorts.containsAll(cohorts)) {exit 1, 'Invalid cohort name'}
 
    ch_cohort = Channel.value(params.cohort)
    ch_release = Channel.value(params.release)
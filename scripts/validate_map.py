@@ -19,6 +19,8 @@ from synapseclient.core.exceptions import (
 )
 import yaml
 
+from geniesp.table_cache import ColumnarTableCache, get_cache_dir
+
 
 def get_sor_column_name(
     syn: Synapse, synid_table_rel: str, cohort: str, release: str
@@ -103,13 +105,22 @@ def check_code_name_absent(
     # only examine released codes
     df = df[df[cohort]]
 
+    cache_dir = get_cache_dir(config.get("cache_dir"))
+    table_cache = None if cache_dir is None else ColumnarTableCache(cache_dir)
+
     for row in res:
 
         synapse_id = row[0]
         dataset = row[1]
 
-        data = pd.read_csv(syn.get(synapse_id)["path"], low_memory=False)
-        code_data = data.columns
+        entity = syn.get(synapse_id)
+        if table_cache is None:
+            data = pd.read_csv(entity["path"], low_memory=False)
+            code_data = data.columns
+        else:
+            code_data = table_cache.columns(
+                synapse_id, entity["versionNumber"], entity["path"]
+            )
 
         # get codes associated with the dataset and of types derived or curated
         code_map = list(
@@ -443,6 +454,13 @@ def build_parser(cohorts: List, releases: List):
         default="error",
         help="Set logging output level " "(default: %(default)s)",
     )
+    parser.add_argument(
+        "--cache_dir",
+        metavar="CACHE_DIR",
+        type=str,
+        help="Directory of the local columnar cache of derived variable tables "
+        "(default: $GENIESP_CACHE_DIR, no caching if unset)",
+    )
     return parser
 
 
@@ -529,6 +547,7 @@ def main():
     if not isinstance(numeric_level, int):
         raise ValueError("Invalid log level: %s" % args.log)
     logging.basicConfig(level=numeric_level)
+    config["cache_dir"] = args.cache_dir
 
     res = validate_map(
         args.synapse_id, args.file, syn, config, args.version, args.cohort, args.release
@@ -0,0 +1,100 @@
+"""Test batch export of several cohorts"""
+import argparse
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from geniesp import batch
+from geniesp.__main__ import BPC_COHORTS, BPC_MAPPING, parse_cohorts, runner_kwargs
+from geniesp.stages import Stage, StageScheduler
+
+
+class FakeRunner:
+    _MG_RELEASE_SYNID = "syn1"
+
+    def __init__(self, cohort, fail_stage=None):
+        self._SPONSORED_PROJECT = cohort
+        self.fail_stage = fail_stage
+        self.ran = []
+        self.finished = False
+
+    def _stage(self, name):
+        def run(**kwargs):
+            if name == self.fail_stage:
+                raise ValueError(f"{name} failed")
+            self.ran.append(name)
+            return pd.Series([f"{self._SPONSORED_PROJECT}-S1"])
+
+        return run
+
+    def start_export(self):
+        return StageScheduler(
+            [
+                Stage("sample_ids", self._stage("sample_ids")),
+                Stage("maf", self._stage("maf"), inputs=["sample_ids"]),
+                Stage("validation", self._stage("validation"), after=["maf"]),
+            ]
+        )
+
+    def finish_export(self, scheduler):
+        self.finished = True
+
+
+def test_that_run_cohorts_continues_after_failed_cohort():
+    runners = [
+        FakeRunner("A"),
+        FakeRunner("B", fail_stage="maf"),
+        FakeRunner("C", fail_stage="sample_ids"),
+        FakeRunner("D"),
+    ]
+    with mock.patch.object(batch, "fan_out_genomic_files") as fan_out:
+        summary = batch.run_cohorts(runners, cohort_jobs=2)
+    assert {cohort: result["status"] for cohort, result in summary.items()} == {
+        "A": "succeeded",
+        "B": "failed",
+        "C": "failed",
+        "D": "succeeded",
+    }
+    assert "maf failed" in summary["B"]["error"]
+    assert runners[0].ran == ["sample_ids", "maf", "validation"]
+    assert runners[1].ran == ["sample_ids"]
+    assert all(runner.finished for runner in runners)
+    # Cohorts without a sample list aren't part of the fan-out
+    fan_out_runners, keep_samples = fan_out.call_args.args
+    assert [runner._SPONSORED_PROJECT for runner in fan_out_runners] == [
+        "A",
+        "B",
+        "D",
+    ]
+    assert keep_samples["A"].tolist() == ["A-S1"]
+
+
+def test_that_run_cohorts_continues_if_fan_out_fails():
+    runners = [FakeRunner("A"), FakeRunner("B")]
+    with mock.patch.object(
+        batch, "fan_out_genomic_files", side_effect=ConnectionError("reset")
+    ):
+        summary = batch.run_cohorts(runners)
+    assert all(result["status"] == "succeeded" for result in summary.values())
+    assert runners[1].ran == ["sample_ids", "maf", "validation"]
+
+
+def test_that_parse_cohorts_accepts_all_and_lists():
+    assert parse_cohorts("ALL") == BPC_COHORTS
+    assert parse_cohorts("NSCLC, CRC") == ["NSCLC", "CRC"]
+    with pytest.raises(argparse.ArgumentTypeError, match="LUNG"):
+        parse_cohorts("NSCLC,LUNG")
+
+
+def test_that_runner_kwargs_keep_the_options_of_each_runner():
+    options = {"release": "1.1", "upload": True, "profile": True, "staging": False}
+    assert runner_kwargs(BPC_MAPPING["AKT1"], options) == {
+        "profile": True,
+        "staging": False,
+    }
+    assert runner_kwargs(BPC_MAPPING["CRC"], options) == {
+        "release": "1.1",
+        "upload": True,
+        "profile": True,
+    }
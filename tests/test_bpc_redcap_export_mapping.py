@@ -1,11 +1,19 @@
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 import logging
+import threading
+import time
 import pytest
 from unittest import mock
 
 import pandas as pd
 import synapseclient
+from genie import process_functions
 
 from geniesp import bpc_redcap_export_mapping as bpc_export
+from geniesp import shared
+from geniesp.manifest import ExportManifest
+from geniesp.stages import Stage, StageScheduler
 
 LOGGER = logging.getLogger(__name__)
 
@@ -51,6 +59,23 @@ def test_get_mapping_data_calls_dd_if_use_grs_is_false(mock_syn):
         mock_get.assert_called_with("synDD")
 
 
+def test_that_read_drug_dictionary_only_keeps_drug_variables(tmp_path):
+    path = tmp_path / "dd.csv"
+    path.write_text(
+        '"Variable / Field Name","Form Name",'
+        '"Choices, Calculations, OR Slider Labels"\n'
+        "record_id,curation,\n"
+        'drugs_drug_1,drugs,"1, Aspirin | 2, Ibuprofen"\n'
+        'drugs_drug_oth1,drugs,"3, Tylenol"\n'
+    )
+    mapping = bpc_export.read_drug_dictionary(str(path))
+    assert mapping.columns.tolist() == bpc_export.DRUG_DICTIONARY_COLUMNS
+    assert mapping["Variable / Field Name"].tolist() == [
+        "drugs_drug_1",
+        "drugs_drug_oth1",
+    ]
+
+
 @pytest.mark.parametrize(
     "input_mapping, var_names, output_mapping",
     [
@@ -164,3 +189,460 @@ def test_that_check_oncotree_codes_gives_no_warning_when_all_codes_valid(caplog)
         "There are invalid values in ONCOTREE_CODE column in the clinical df"
         not in caplog.text
     )
+
+
+class _TestRunner(bpc_export.BpcProjectRunner):
+    _SPONSORED_PROJECT = "TEST"
+
+
+@pytest.fixture
+def runner_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "TEST").mkdir()
+    (tmp_path / "cbioportal").mkdir()
+    return tmp_path
+
+
+def _get_timeline(offset):
+    def get_timeline(df_map, df_file):
+        return {
+            "df": pd.DataFrame(
+                {
+                    "PATIENT_ID": [f"GENIE-{i}" for i in range(50)],
+                    "START_DATE": [float(i + offset) for i in range(50)],
+                }
+            ),
+            "used": ["syn1.1"],
+        }
+
+    return get_timeline
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_that_timeline_stages_output_is_independent_of_jobs(
+    mock_syn, runner_dir, jobs
+):
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium", jobs=jobs)
+    stages = [
+        Stage(
+            f"timeline_{i}",
+            partial(
+                runner.create_and_write_timeline,
+                f"TIMELINE-{i}",
+                _get_timeline(i),
+                f"data_timeline_{i}.txt",
+                df_map=None,
+                df_file=None,
+            ),
+        )
+        for i in range(6)
+    ]
+    results = StageScheduler(stages, jobs=jobs).run()
+    for i in range(6):
+        path = results[f"timeline_{i}"]
+        assert path == f"TEST/data_timeline_{i}.txt"
+        expected = process_functions.removePandasDfFloat(
+            _get_timeline(i)(None, None)["df"]
+        )
+        with open(path) as timeline_f:
+            assert timeline_f.read() == expected
+
+
+def test_that_dropped_timeline_rows_are_counted_in_metrics(mock_syn, runner_dir):
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    runner.__dict__["genie_clinicaldf"] = pd.DataFrame({"PATIENT_ID": ["P1", "P2"]})
+    timelinedf = pd.DataFrame(
+        {"PATIENT_ID": ["P1", "P2", "P3"], "START_DATE": [1.0, None, 3.0]}
+    )
+    stages = [
+        Stage(
+            "timeline",
+            lambda: bpc_export.drop_null_start_dates(runner.filter_df(timelinedf)),
+        )
+    ]
+    results = StageScheduler(stages, metrics=runner.metrics).run()
+    assert results["timeline"]["PATIENT_ID"].tolist() == ["P1"]
+    timeline_metrics = runner.metrics.stages()["timeline"]
+    assert timeline_metrics["rows_dropped_filter"] == 1
+    assert timeline_metrics["rows_dropped_null_start"] == 1
+
+
+def test_that_get_stages_leaves_out_skipped_stages(mock_syn, runner_dir):
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    runner._skip_stages = ["timeline_treatment_rt", "timeline_labtest"]
+    stages = {stage.name: stage for stage in runner.get_stages()}
+    assert "timeline_treatment_rt" not in stages
+    assert "timeline_labtest" not in stages
+    assert "timeline_performance" in stages
+    assert set(stages["validation"].after) == set(stages) - {"validation"}
+    # The stage graph must be valid without the skipped stages
+    StageScheduler(list(stages.values()))
+
+
+def test_that_genomic_stages_only_wait_for_the_sample_list(mock_syn, runner_dir):
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    scheduler = StageScheduler(runner.get_stages())
+    for name in ["maf", "cna", "seg", "sv", "gene_panels"]:
+        assert not any(
+            dependency.startswith(("timeline", "survival", "patient"))
+            for dependency in scheduler.ancestors([name])
+        )
+
+
+class _OtherTestRunner(bpc_export.BpcProjectRunner):
+    _SPONSORED_PROJECT = "OTHER"
+
+
+def test_that_fanned_out_genomic_files_are_reused(mock_syn, runner_dir):
+    (runner_dir / "OTHER").mkdir()
+    release_files = {
+        "data_mutations_extended.txt": "Tumor_Sample_Barcode\tt_depth\n"
+        "S1\t10\nS2\t.\nS3\t30\n",
+        "data_CNA.txt": "Hugo_Symbol\tS1\tS2\tS3\nTP53\t1\t\t-2\n",
+        "data_cna_hg19.seg": "ID\tchrom\tseg.mean\nS1\t1\t0.5\nS3\t2\t-0.1\n",
+        "data_sv.txt": "Sample_Id\tSite1_Hugo_Symbol\nS2\tALK\n",
+    }
+    for file_name, content in release_files.items():
+        (runner_dir / file_name).write_text(content)
+    mock_syn.get.side_effect = lambda synid, followLink: mock.Mock(
+        path=str(runner_dir / synid)
+    )
+    runners = [
+        _TestRunner(mock_syn, "cbioportal", release="1.1-consortium"),
+        _OtherTestRunner(mock_syn, "cbioportal", release="1.1-consortium"),
+    ]
+    keep_samples = {"TEST": pd.Series(["S1", "S2"]), "OTHER": pd.Series(["S3"])}
+    with mock.patch.object(
+        bpc_export.BpcProjectRunner,
+        "get_mg_synid",
+        side_effect=lambda folder, file_name: file_name,
+    ):
+        stats = bpc_export.fan_out_genomic_files(runners, keep_samples)
+        assert stats["data_mutations_extended.txt"] == {"TEST": 2, "OTHER": 1}
+        assert stats["data_CNA.txt"]["OTHER"] == ["Hugo_Symbol", "S3"]
+        assert mock_syn.get.call_count == 4
+
+        mock_syn.get.reset_mock()
+        runners[0].create_and_write_maf(keep_samples["TEST"])
+        cna = runners[1].create_and_write_cna(keep_samples["OTHER"])
+        runners[1].create_and_write_seg(keep_samples["OTHER"])
+        mock_syn.get.assert_not_called()
+        assert cna["cna_samples"] == ["Hugo_Symbol", "S3"]
+        assert (runner_dir / "TEST" / "data_mutations_extended.txt").read_text() == (
+            "Tumor_Sample_Barcode\tt_depth\tValidation_Status\nS1\t10\t\nS2\t\t\n"
+        )
+        assert (runner_dir / "OTHER" / "data_cna_hg19.seg").read_text() == (
+            "ID\tchrom\tseg.mean\nS3\t2\t-0.1\n"
+        )
+
+        # Files are subset again for a different sample list
+        runners[0].create_and_write_maf(pd.Series(["S3"]))
+        mock_syn.get.assert_called_once()
+
+
+def test_that_genomic_rows_and_bytes_are_counted_in_metrics(mock_syn, runner_dir):
+    (runner_dir / "OTHER").mkdir()
+    maf_text = "Tumor_Sample_Barcode\tt_depth\nS1\t10\nS2\t.\nS3\t30\n"
+    (runner_dir / "data_mutations_extended.txt").write_text(maf_text)
+    (runner_dir / "data_CNA.txt").write_text(
+        "Hugo_Symbol\tS1\tS2\tS3\nTP53\t1\t\t-2\nKRAS\t0\t1\t\n"
+    )
+    mock_syn.get.side_effect = lambda synid, followLink: mock.Mock(
+        path=str(runner_dir / synid)
+    )
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    other = _OtherTestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    other._fanned_out["data_mutations_extended.txt"] = (frozenset(["S3"]), 1)
+    (runner_dir / "OTHER" / "data_mutations_extended.txt").write_text(
+        "Tumor_Sample_Barcode\tt_depth\tValidation_Status\nS3\t30\t\n"
+    )
+    stages = [
+        Stage("maf", lambda: runner.create_and_write_maf(["S1", "S2"])),
+        Stage("cna", lambda: runner.create_and_write_cna(["S1"])),
+    ]
+    with mock.patch.object(
+        bpc_export.BpcProjectRunner,
+        "get_mg_synid",
+        side_effect=lambda folder, file_name: file_name,
+    ):
+        StageScheduler(stages, metrics=runner.metrics).run()
+        StageScheduler(
+            [Stage("maf", lambda: other.create_and_write_maf(["S3"]))],
+            metrics=other.metrics,
+        ).run()
+    maf_metrics = runner.metrics.stages()["maf"]
+    assert maf_metrics["rows_written"] == 2
+    assert maf_metrics["bytes_written"] == len(
+        (runner_dir / "TEST" / "data_mutations_extended.txt").read_bytes()
+    )
+    assert runner.metrics.stages()["cna"]["rows_written"] == 2
+    other_metrics = other.metrics.stages()["maf"]
+    assert other_metrics["rows_written"] == 1
+    assert other_metrics["bytes_written"] == len(
+        (runner_dir / "OTHER" / "data_mutations_extended.txt").read_bytes()
+    )
+
+
+def test_that_maf_without_kept_rows_is_not_written(mock_syn, runner_dir):
+    (runner_dir / "data_mutations_extended.txt").write_text(
+        "Tumor_Sample_Barcode\tt_depth\nS1\t10\n"
+    )
+    mock_syn.get.side_effect = lambda synid, followLink: mock.Mock(
+        path=str(runner_dir / synid)
+    )
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium", upload=True)
+    runner.__dict__["upload_queue"] = mock.Mock()
+    with mock.patch.object(
+        bpc_export.BpcProjectRunner,
+        "get_mg_synid",
+        side_effect=lambda folder, file_name: file_name,
+    ):
+        StageScheduler(
+            [Stage("maf", lambda: runner.create_and_write_maf(["S9"]))],
+            metrics=runner.metrics,
+        ).run()
+    assert not (runner_dir / "TEST" / "data_mutations_extended.txt").exists()
+    assert runner.metrics.stages()["maf"]["rows_written"] == 0
+    assert "bytes_written" not in runner.metrics.stages()["maf"]
+    runner.upload_queue.submit.assert_not_called()
+
+
+def test_that_mapping_table_is_queried_once_for_all_cohorts(mock_syn):
+    shared.clear()
+    mock_syn.tableQuery.return_value.asDataFrame.return_value = pd.DataFrame(
+        {
+            "code": ["a", "b", "c"],
+            "NSCLC": [True, False, None],
+            "CRC": [True, True, False],
+        }
+    )
+    nsclcdf = bpc_export.get_bpc_to_cbio_mapping_df(mock_syn, "NSCLC", "synMAP")
+    crcdf = bpc_export.get_bpc_to_cbio_mapping_df(mock_syn, "CRC", "synMAP")
+    assert nsclcdf["code"].tolist() == ["a"]
+    assert crcdf["code"].tolist() == ["a", "b"]
+    mock_syn.tableQuery.assert_called_once()
+    shared.clear()
+
+
+def test_that_drug_mapping_and_regimens_are_created_once(mock_syn, runner_dir):
+    shared.clear()
+    dd_path = runner_dir / "dd.csv"
+    dd_path.write_text(
+        '"Variable / Field Name","Choices, Calculations, OR Slider Labels"\n'
+        'drugs_drug_1,"C1, Aspirin | C2, Ibuprofen"\n'
+    )
+    mock_syn.get.return_value = mock.Mock(
+        id="synGRS", versionNumber=3, path=str(dd_path)
+    )
+    runners = [
+        runner_class(mock_syn, "cbioportal", release="1.1-consortium", use_grs=True)
+        for runner_class in [_TestRunner, _OtherTestRunner]
+    ]
+    regimen_infodf = pd.DataFrame({"code": ["os_g_status"], "id": ["synREG"]})
+    with mock.patch.object(
+        bpc_export, "read_drug_dictionary", wraps=bpc_export.read_drug_dictionary
+    ) as read_dictionary, mock.patch.object(
+        bpc_export,
+        "create_regimens",
+        return_value={"df": None, "used_entities": []},
+    ) as create_regimens:
+        for runner in runners:
+            assert runner.get_drug_mapping() == {"Aspirin": "C1", "Ibuprofen": "C2"}
+            first = runner.get_regimens(regimen_infodf)
+            assert runner.get_regimens(regimen_infodf.copy()) is first
+        read_dictionary.assert_called_once()
+        assert create_regimens.call_count == 2
+    shared.clear()
+
+
+def test_that_parallel_stages_create_regimens_once(mock_syn, runner_dir):
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    regimen_infodf = pd.DataFrame({"code": ["os_g_status"], "id": ["synREG"]})
+    started = threading.Event()
+
+    def slow_create_regimens(*args, **kwargs):
+        started.set()
+        time.sleep(0.05)
+        return {"df": None, "used_entities": []}
+
+    with mock.patch.object(
+        runner, "get_drug_mapping", return_value={}
+    ), mock.patch.object(
+        bpc_export, "create_regimens", side_effect=slow_create_regimens
+    ) as create_regimens:
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            first = executor.submit(runner.get_regimens, regimen_infodf)
+            started.wait()
+            second = executor.submit(runner.get_regimens, regimen_infodf.copy())
+            assert first.result() is second.result()
+        create_regimens.assert_called_once()
+
+
+def _regimen_infodf():
+    infodf = pd.DataFrame(
+        {
+            "code": ["os_g_status", "tt_os_g_mos"],
+            "id": "synREG",
+            "cbio": ["OS_{regimen_abbr}_STATUS", "OS_{regimen_abbr}_MONTHS"],
+            "labels": ["Status {regimen}", "Months {regimen}"],
+            "description": ["Status on {regimen}", "Months on {regimen}"],
+            "priority": ["0", "1"],
+        }
+    )
+    infodf.index = infodf["code"]
+    return infodf
+
+
+def test_that_create_regimens_pivots_regimen_variables(mock_syn):
+    regimendf = pd.DataFrame(
+        {
+            "record_id": ["P2", "P1", "P2", "P1", "P3"],
+            "redcap_ca_index": ["Yes", "Yes", "Yes", "No", "Yes"],
+            "regimen_drugs": ["B, A", "A", "A", "A", "Other"],
+            "regimen_number": [1, 2, 3, 1, 1],
+            "os_g_status": [1, 0, 1, 1, 0],
+            "tt_os_g_mos": [10.0, 2.5, 4.0, 1.0, 3.0],
+        }
+    )
+    dataset_cache = mock.Mock()
+    dataset_cache.get.return_value = (regimendf, None)
+    regimens = bpc_export.create_regimens(
+        mock_syn,
+        _regimen_infodf(),
+        mapping={"A": "C1", "B": "C2"},
+        top_x_regimens=5,
+        dataset_cache=dataset_cache,
+    )
+    expected = pd.DataFrame(
+        {
+            "PATIENT_ID": ["P1", "P2"],
+            "OS_C1_STATUS": [0, 1],
+            "OS_C1_MONTHS": [2.5, 4.0],
+            "OS_C2_C1_STATUS": [float("nan"), 1.0],
+            "OS_C2_C1_MONTHS": [float("nan"), 10.0],
+        }
+    )
+    pd.testing.assert_frame_equal(regimens["df"], expected)
+    assert regimens["info"]["cbio"].tolist() == expected.columns[1:].tolist()
+    assert regimens["info"]["labels"].tolist() == [
+        "Status A",
+        "Months A",
+        "Status B, A",
+        "Months B, A",
+    ]
+    assert regimens["info"]["priority"].tolist() == [0, 1, 0, 1]
+    assert regimens["used"] == "synREG"
+
+
+def test_that_reused_regimens_are_recorded_in_the_manifest(mock_syn, runner_dir):
+    pd.DataFrame(
+        {
+            "cohort_internal": "TEST",
+            "record_id": ["P1", "P2"],
+            "redcap_ca_index": "Yes",
+            "regimen_drugs": ["A", "A"],
+            "regimen_number": 1,
+            "os_g_status": [1, 0],
+            "tt_os_g_mos": [2.5, 4.0],
+        }
+    ).to_csv(runner_dir / "regimens.csv", index=False)
+    mock_syn.get.return_value = mock.Mock(
+        versionNumber=2, path=str(runner_dir / "regimens.csv")
+    )
+    runner = _TestRunner(mock_syn, "cbioportal", release="1.1-consortium")
+    output = runner_dir / "TEST" / "data_clinical_supp_survival_treatment.txt"
+
+    def write_survival_treatment(survival_info):
+        runner.get_regimens(_regimen_infodf())
+        output.write_text("PATIENT_ID\n")
+
+    stages = [
+        Stage("survival", lambda: runner.get_regimens(_regimen_infodf())),
+        Stage(
+            "survival_treatment",
+            write_survival_treatment,
+            inputs={"survival_info": "survival"},
+            outputs=[str(output)],
+        ),
+    ]
+    manifest = ExportManifest(
+        str(runner_dir / "manifest.json"),
+        context={},
+        get_used=runner.dataset_cache.used_entities,
+    )
+    with mock.patch.object(runner, "get_drug_mapping", return_value={"A": "C1"}):
+        StageScheduler(stages, manifest=manifest).run()
+    assert manifest.stages["survival_treatment"]["used"] == ["synREG.2"]
+
+
+def test_that_create_regimens_scales_to_many_regimens(mock_syn):
+    drugs = [f"Drug{i}" for i in range(30)]
+    regimen_names = [f"{first}, {second}" for first in drugs for second in drugs[:10]]
+    regimendf = pd.DataFrame(
+        {
+            "record_id": [f"P{i % 500}" for i in range(len(regimen_names) * 3)],
+            "redcap_ca_index": "Yes",
+            "regimen_drugs": regimen_names * 3,
+            "regimen_number": 1,
+            "os_g_status": 1,
+            "tt_os_g_mos": 1.0,
+        }
+    )
+    dataset_cache = mock.Mock()
+    dataset_cache.get.return_value = (regimendf, None)
+    regimens = bpc_export.create_regimens(
+        mock_syn,
+        _regimen_infodf(),
+        mapping={drug: f"C{i}" for i, drug in enumerate(drugs)},
+        top_x_regimens=250,
+        dataset_cache=dataset_cache,
+    )
+    assert regimens["df"].shape == (500, 1 + 250 * 2)
+    assert regimens["df"]["PATIENT_ID"].is_unique
+    assert len(regimens["info"]) == 250 * 2
+
+
+def test_that_stack_drug_columns_matches_drug_numbers():
+    regimendf = pd.DataFrame(
+        {
+            "record_id": ["P1", "P2"],
+            "regimen_drugs": ["A, B", "C"],
+            # Columns out of order, and no stop date for the second drug
+            "drugs_startdt_int_2": [20.0, None],
+            "drugs_drug_1": ["A", "C"],
+            "drugs_drug_2": ["B", None],
+            "drugs_startdt_int_1": [10.0, 30.0],
+            "drugs_enddt_int_1": [15, 35],
+            "drugs_ct_yn": ["No", "Yes"],
+        }
+    )
+    wildcard_infodf = pd.DataFrame(
+        {
+            "code": ["drugs_drug_*", "drugs_startdt_int_*", "drugs_enddt_int_*"],
+            "cbio": ["AGENT", "START_DATE", "STOP_DATE"],
+        }
+    )
+    stacked = bpc_export.stack_drug_columns(
+        regimendf, wildcard_infodf, id_vars=["record_id", "regimen_drugs"]
+    )
+    expected = pd.DataFrame(
+        {
+            "record_id": ["P1", "P2", "P1", "P2"],
+            "regimen_drugs": ["A, B", "C", "A, B", "C"],
+            "AGENT": ["A", "C", "B", None],
+            "START_DATE": [10.0, 30.0, 20.0, None],
+            "STOP_DATE": [15.0, 35.0, None, None],
+        }
+    )
+    pd.testing.assert_frame_equal(stacked, expected)
+
+
+def test_that_clean_agents_shortens_agents():
+    agents = pd.Series(
+        ["Carboplatin", "Drug A, Drug B (trial)", "Drug C, Drug D", " Nivo (Opdivo)"],
+        index=[3, 1, 2, 0],
+    )
+    expected = pd.Series(
+        ["Carboplatin", "Drug A, Drug B", "Drug C", "Nivo"], index=[3, 1, 2, 0]
+    )
+    pd.testing.assert_series_equal(bpc_export.clean_agents(agents), expected)
@@ -0,0 +1,143 @@
+from unittest import mock
+
+import pandas as pd
+import pytest
+import synapseclient
+
+from geniesp import bpc_redcap_export_mapping as bpc_export
+from geniesp.dataset_cache import (
+    ColumnProjection,
+    DerivedDatasetCache,
+    plan_dataset_columns,
+)
+from geniesp.stages import Stage, StageScheduler
+
+
+@pytest.fixture
+def derived_csv(tmp_path):
+    path = tmp_path / "cancer_level_dataset.csv"
+    pd.DataFrame(
+        {
+            "record_id": ["GENIE-A-1", "GENIE-A-2", "GENIE-B-1"],
+            "cohort_internal": ["NSCLC", "NSCLC", "CRC"],
+            "ca_type": ["Lung", "Lung", "Colon"],
+            "redcap_ca_index": ["Yes", "No", "Yes"],
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def mock_syn(derived_csv):
+    syn = mock.Mock(spec=synapseclient.Synapse)
+    syn.get.return_value = mock.Mock(path=derived_csv, versionNumber=3)
+    yield syn
+
+
+def test_that_dataset_cache_parses_each_dataset_once(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    with mock.patch.object(pd, "read_csv", wraps=pd.read_csv) as patch_read:
+        first, used = cache.get("syn1")
+        second, _ = cache.get("syn1")
+        patch_read.assert_called_once()
+    mock_syn.get.assert_called_once_with("syn1")
+    assert used == "syn1.3"
+    assert first is second
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_that_get_version_does_not_download(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    assert cache.get_version("syn1") == 3
+    assert cache.get_version("syn1") == 3
+    mock_syn.get.assert_called_once_with("syn1", downloadFile=False)
+    cache.get("syn1")
+    assert cache.get_version("syn1") == 3
+    assert mock_syn.get.call_args_list[-1] == mock.call("syn1")
+
+
+def test_that_dataset_cache_filters_to_cohort(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    tabledf, _ = cache.get("syn1")
+    assert tabledf["record_id"].tolist() == ["GENIE-A-1", "GENIE-A-2"]
+
+
+def test_that_get_file_data_uses_dataset_cache(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    mappingdf = pd.DataFrame(
+        {
+            "code": ["ca_type", "redcap_ca_index"],
+            "sampleType": ["PATIENT", "PATIENT"],
+            "dataset": ["Cancer-level dataset", "Cancer-level dataset"],
+            "id": ["syn1", "syn1"],
+        }
+    )
+    for _ in range(2):
+        data = bpc_export.get_file_data(
+            mock_syn, mappingdf, "PATIENT", cohort="NSCLC", dataset_cache=cache
+        )
+    assert data["used"] == ["syn1.3"]
+    assert data["df"].columns.tolist() == ["ca_type", "redcap_ca_index", "record_id"]
+    assert cache.stats == {"hits": 1, "misses": 1}
+
+
+def test_that_column_projection_matches_wildcard_codes():
+    projection = ColumnProjection.from_codes(["drugs_drug_*", "record_id"])
+    assert projection("drugs_drug_1")
+    assert projection("record_id")
+    assert not projection("drugs_drug_oth1")
+    assert not projection("ca_type")
+
+
+def test_that_plan_dataset_columns_unions_codes_across_sample_types():
+    mappingdf = pd.DataFrame(
+        {
+            "code": ["ca_type", "drugs_drug_*", "ca_stage"],
+            "sampleType": ["PATIENT", "TIMELINE-TREATMENT", "TIMELINE-DX"],
+            "dataset": [
+                "Cancer-level dataset",
+                "Regimen-level dataset",
+                "Cancer-level dataset",
+            ],
+        }
+    )
+    data_tablesdf = pd.DataFrame(
+        {
+            "id": ["syn1", "syn2"],
+            "dataset": ["Cancer-level dataset", "Regimen-level dataset"],
+        }
+    )
+    plan = plan_dataset_columns(
+        mappingdf,
+        data_tablesdf,
+        extra_columns={"Cancer-level dataset": ["dob_ca_dx_days"]},
+    )
+    assert {"ca_type", "ca_stage", "dob_ca_dx_days", "record_id"} <= plan["syn1"].names
+    assert "drugs_drug_[\\d]" in plan["syn2"].patterns
+    assert "ca_type" not in plan["syn2"].names
+
+
+def test_that_dataset_cache_reads_planned_columns(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    cache.set_projections({"syn1": ColumnProjection(["record_id"])})
+    tabledf, _ = cache.get("syn1", columns=ColumnProjection(["record_id"]))
+    assert tabledf.columns.tolist() == ["record_id", "cohort_internal"]
+
+
+def test_that_dataset_cache_rereads_unplanned_columns(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    cache.set_projections({"syn1": ColumnProjection(["record_id"])})
+    cache.get("syn1", columns=ColumnProjection(["record_id"]))
+    tabledf, _ = cache.get("syn1", columns=ColumnProjection(["ca_type"]))
+    assert "ca_type" in tabledf.columns
+    assert cache.stats == {"hits": 0, "misses": 2}
+
+
+def test_that_dataset_cache_tracks_datasets_read_by_stage(mock_syn):
+    cache = DerivedDatasetCache(mock_syn, "NSCLC")
+    StageScheduler(
+        [Stage("timeline_dx", lambda: cache.get("syn1")), Stage("other", lambda: None)],
+        jobs=2,
+    ).run()
+    assert cache.used_entities("timeline_dx") == ["syn1.3"]
+    assert cache.used_entities("other") == []
@@ -0,0 +1,59 @@
+"""Test day conversions"""
+import math
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from geniesp.dates import convert_days, day_units, days_since, days_to
+
+
+def _floor_days(days, days_per_unit):
+    return float("nan") if math.isnan(days) else math.floor(days / days_per_unit)
+
+
+@pytest.mark.parametrize("unit,days_per_unit", [("months", 30.4), ("years", 365.25)])
+def test_that_days_to_matches_per_element_conversion(unit, days_per_unit):
+    days = pd.DataFrame(
+        {
+            "A": [0.0, 30.3, 30.4, -1.0, np.nan, 36524.0],
+            "B": [1, 365, 366, 12000, -400, 7],
+        }
+    )
+    expected = days.applymap(lambda value: _floor_days(value, days_per_unit))
+    converted = days_to(days, unit)
+    pd.testing.assert_frame_equal(converted, expected)
+    assert converted["B"].dtype == np.int64
+
+
+def test_that_day_units_resolves_patterns():
+    units = day_units(
+        ["PATIENT_ID", "BIRTH_INT", "DEATH_INT", "OS_MONTHS", "BIRTH_INT"],
+        {".*INT": "months", "OS_MONTHS": "years"},
+    )
+    assert units == {"BIRTH_INT": "months", "DEATH_INT": "months", "OS_MONTHS": "years"}
+
+
+def test_that_day_units_raises_for_unknown_unit():
+    with pytest.raises(ValueError, match=r"\['weeks'\]"):
+        day_units(["A"], {"A": "weeks"})
+
+
+def test_that_convert_days_skips_missing_columns():
+    df = pd.DataFrame({"A": [61.0, np.nan], "B": [731, 365], "C": ["x", "y"]})
+    converted = convert_days(df, {"A": "months", "B": "years", "D": "years"})
+    assert converted["A"].tolist()[0] == 2
+    assert np.isnan(converted["A"][1])
+    assert converted["B"].tolist() == [2, 0]
+    assert converted["C"].tolist() == ["x", "y"]
+    assert df["B"].tolist() == [731, 365]
+
+
+def test_that_days_since_keeps_missing_days():
+    days = pd.DataFrame({"start": [10.0, np.nan, 5.0], "stop": [20.0, 3.0, 8.0]})
+    origin = pd.Series([4.0, 1.0, np.nan])
+    since = days_since(days, origin)
+    assert since["start"].tolist()[:1] == [6.0]
+    assert since["stop"].tolist()[:2] == [16.0, 2.0]
+    assert since.iloc[2].isna().all()
+    assert np.isnan(since["start"][1])
@@ -0,0 +1,75 @@
+"""Test folder index"""
+from unittest import mock
+
+import pytest
+
+from geniesp import folder_index
+from geniesp.folder_index import FolderIndex, get_folder_index
+
+CHILDREN = [
+    {"name": "data_mutations_extended.txt", "id": "syn1", "versionNumber": 3},
+    {"name": "data_CNA.txt", "id": "syn2", "versionNumber": 1},
+]
+
+
+@pytest.fixture
+def mock_syn():
+    syn = mock.create_autospec(folder_index.Synapse)
+    syn.getChildren.side_effect = lambda folder_id: iter(CHILDREN)
+    syn.get.return_value = mock.Mock(etag="etag1", md5="abc")
+    return syn
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    folder_index._registry.clear()
+    yield
+    folder_index._registry.clear()
+
+
+def test_that_folder_index_lists_folder_once(mock_syn):
+    index = FolderIndex(mock_syn, "syn100")
+    assert index.synid("data_CNA.txt") == "syn2"
+    assert index.version("data_mutations_extended.txt") == "syn1.3"
+    assert index.version("data_sv.txt") is None
+    mock_syn.getChildren.assert_called_once_with("syn100")
+
+
+def test_that_folder_index_raises_for_unknown_file(mock_syn):
+    index = FolderIndex(mock_syn, "syn100")
+    with pytest.raises(ValueError, match="file 'data_sv.txt' not found in syn100"):
+        index.synid("data_sv.txt")
+
+
+def test_that_folder_index_gets_md5_once(mock_syn):
+    index = FolderIndex(mock_syn, "syn100")
+    assert index.md5("data_CNA.txt") == "abc"
+    assert index.md5("data_CNA.txt") == "abc"
+    assert index.md5("data_sv.txt") is None
+    mock_syn.get.assert_called_once_with("syn2", downloadFile=False, followLink=True)
+
+
+def test_that_folder_index_is_shared(mock_syn):
+    first = get_folder_index(mock_syn, "syn100")
+    second = get_folder_index(mock_syn, "syn100")
+    assert first is second
+    mock_syn.getChildren.assert_called_once()
+
+
+def test_that_folder_index_is_persisted_per_etag(mock_syn, tmp_path):
+    FolderIndex(mock_syn, "syn100", cache_dir=str(tmp_path))
+    index = FolderIndex(mock_syn, "syn100", cache_dir=str(tmp_path))
+    assert index.synid("data_CNA.txt") == "syn2"
+    mock_syn.getChildren.assert_called_once()
+
+    mock_syn.get.return_value = mock.Mock(etag="etag2")
+    FolderIndex(mock_syn, "syn100", cache_dir=str(tmp_path))
+    assert mock_syn.getChildren.call_count == 2
+
+
+def test_that_folder_index_records_stored_files(mock_syn):
+    index = FolderIndex(mock_syn, "syn100")
+    index.update("data_sv.txt", mock.Mock(id="syn3", versionNumber=2, md5="def"))
+    assert index.version("data_sv.txt") == "syn3.2"
+    assert index.md5("data_sv.txt") == "def"
+    mock_syn.get.assert_not_called()
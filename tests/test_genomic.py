@@ -0,0 +1,315 @@
+"""Test streaming subsets of genomic release files"""
+import os
+from unittest import mock
+
+import pandas as pd
+import pytest
+from genie import process_functions
+
+from geniesp import genomic
+from geniesp.genomic import (
+    MafSubsetter,
+    SampleRangeIndex,
+    fan_out_cna,
+    fan_out_maf,
+    fan_out_rows,
+    get_sample_index,
+    line_ranges,
+    subset_cna,
+    subset_maf,
+    subset_rows,
+)
+
+MAF = (
+    "Hugo_Symbol\tStart_Position\tTumor_Sample_Barcode\tt_depth\tt_alt_count\t"
+    "n_depth\tgnomAD_AF\tValidation_Status\tHGVSp\n"
+    "TP53\t100\tS1\t.\t5\t20\t0.001\tValid\tp.R273H\n"
+    "KRAS\t200\tS2\t30\t.\t\t\tValid\tNA\n"
+    "EGFR\t300\tS1\t40\t10\t.\t1e-05\t\tp.L858R\n"
+    "BRAF\t400\tS3\t50\t12\t25\t0.5\tUnknown\tp.V600E\n"
+    "ALK\t500\tS1\tNA\t7\t15\t\tValid\tN/A\n"
+)
+
+
+def pandas_subset(maf_path, keep_samples):
+    """Subset the MAF the way create_and_write_maf used to"""
+    mafdf = pd.read_table(maf_path, low_memory=False)
+    mafdf = mafdf[mafdf["Tumor_Sample_Barcode"].isin(keep_samples)].copy()
+    for col in ["t_depth", "t_alt_count", "n_depth"]:
+        mafdf.loc[mafdf[col] == ".", col] = ""
+    mafdf["Validation_Status"] = ""
+    return process_functions.removePandasDfFloat(mafdf)
+
+
+@pytest.fixture
+def maf_path(tmp_path):
+    path = tmp_path / "data_mutations_extended.txt"
+    path.write_text(MAF)
+    return str(path)
+
+
+@pytest.mark.parametrize("keep_samples", [["S1"], ["S1", "S2", "S3"], ["S2"]])
+def test_that_subset_maf_matches_pandas_output(maf_path, tmp_path, keep_samples):
+    out_path = tmp_path / "subset.txt"
+    n_rows = subset_maf(maf_path, str(out_path), pd.Series(keep_samples))
+    assert out_path.read_text() == pandas_subset(maf_path, keep_samples)
+    assert n_rows == len(out_path.read_text().splitlines()) - 1
+
+
+# Long floats and TRUE/FALSE columns, which the pandas path writes differently
+MAF_TEXT_VALUES = (
+    "Hugo_Symbol\tTumor_Sample_Barcode\tt_depth\tgnomAD_AF\tIN_PANEL\t"
+    "Validation_Status\n"
+    "TP53\tS1\t.\t0.0006369616873214543\tTRUE\tValid\n"
+    "KRAS\tS2\t30\t0.1234567890123456789\tFALSE\tValid\n"
+    "EGFR\tS1\t40.0\t2.5\tTRUE\t\n"
+)
+
+
+def pandas_subset_text(maf_path, keep_samples):
+    mafdf = pd.read_table(maf_path, low_memory=False)
+    mafdf = mafdf[mafdf["Tumor_Sample_Barcode"].isin(keep_samples)].copy()
+    mafdf.loc[mafdf["t_depth"] == ".", "t_depth"] = ""
+    mafdf["Validation_Status"] = ""
+    return process_functions.removePandasDfFloat(mafdf)
+
+
+def test_that_subset_maf_keeps_boolean_text(tmp_path):
+    maf_path = tmp_path / "data_mutations_extended.txt"
+    maf_path.write_text(MAF_TEXT_VALUES)
+    out_path = tmp_path / "subset.txt"
+    subset_maf(str(maf_path), str(out_path), ["S1", "S2"])
+    assert out_path.read_text() == (
+        "Hugo_Symbol\tTumor_Sample_Barcode\tt_depth\tgnomAD_AF\tIN_PANEL\t"
+        "Validation_Status\n"
+        "TP53\tS1\t\t0.0006369616873214543\tTRUE\t\n"
+        "KRAS\tS2\t30\t0.12345678901234568\tFALSE\t\n"
+        "EGFR\tS1\t40\t2.5\tTRUE\t\n"
+    )
+    # The pandas path rounds off the floats and respells the booleans, the
+    # other fields are the same
+    expected = pandas_subset_text(str(maf_path), ["S1", "S2"])
+    assert "0.0006369616873214\tTrue" in expected
+    for line, pandas_line in zip(
+        out_path.read_text().splitlines(), expected.splitlines()
+    ):
+        fields, pandas_fields = line.split("\t"), pandas_line.split("\t")
+        assert fields[:3] + fields[5:] == pandas_fields[:3] + pandas_fields[5:]
+
+
+# Quoted fields and floats with trailing zeros or exponents
+MAF_QUOTED_VALUES = (
+    'Hugo_Symbol\t"Tumor_Sample_Barcode"\tt_depth\tgnomAD_AF\t'
+    "Validation_Status\tHGVSp\tComment\n"
+    '"TP53"\t"S1"\t"."\t1.50\tValid\t"p.""R273H"""\tx"y\n'
+    'KRAS\tS2\t30\t1E-5\t\t"NA"\t"a\tb"\n'
+    'EGFR\tS1\t40\t.5\tValid\tp.L858R\t""\n'
+    "BRAF\tS3\t50\t2.500\tValid\tp.V600E\tz\n"
+)
+
+
+@pytest.mark.parametrize("keep_samples", [["S1"], ["S1", "S2"]])
+def test_that_subset_maf_matches_pandas_output_for_quoted_fields(
+    tmp_path, keep_samples
+):
+    maf_path = tmp_path / "data_mutations_extended.txt"
+    maf_path.write_text(MAF_QUOTED_VALUES)
+    out_path = tmp_path / "subset.txt"
+    subset_maf(str(maf_path), str(out_path), keep_samples)
+    assert out_path.read_text() == pandas_subset_text(str(maf_path), keep_samples)
+
+
+def test_that_subset_maf_doesnt_write_empty_subsets(maf_path, tmp_path):
+    out_path = tmp_path / "subset.txt"
+    assert subset_maf(maf_path, str(out_path), ["S9"]) == 0
+    assert not out_path.exists()
+
+
+def test_that_maf_subsetter_adds_validation_status():
+    subsetter = MafSubsetter(b"Tumor_Sample_Barcode\tt_depth\n", ["S1"])
+    assert subsetter.header == b"Tumor_Sample_Barcode\tt_depth\tValidation_Status\n"
+    assert list(subsetter.subset([b"S1\t.\n", b"S2\t3\n"])) == [b"S1\t\t\n"]
+
+
+def test_that_maf_subsetter_requires_sample_column():
+    with pytest.raises(ValueError, match="Tumor_Sample_Barcode"):
+        MafSubsetter(b"Hugo_Symbol\tt_depth\n", ["S1"])
+
+
+@pytest.mark.parametrize("chunk_bytes", [1, 40, 1000])
+def test_that_line_ranges_cover_file_at_line_boundaries(maf_path, chunk_bytes):
+    with open(maf_path, "rb") as maf_f:
+        maf_f.readline()
+        data_start = maf_f.tell()
+        content = maf_f.read()
+    ranges = line_ranges(maf_path, data_start, chunk_bytes)
+    assert ranges[0][0] == data_start
+    assert ranges[-1][1] == data_start + len(content)
+    for (_, end), (start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+        assert content[end - data_start - 1 : end - data_start] == b"\n"
+
+
+def test_that_parallel_subset_maf_matches_serial_output(maf_path, tmp_path):
+    serial_path = tmp_path / "serial.txt"
+    parallel_path = tmp_path / "parallel.txt"
+    subset_maf(maf_path, str(serial_path), ["S1", "S2"])
+    n_rows = subset_maf(
+        maf_path, str(parallel_path), ["S1", "S2"], workers=2, chunk_bytes=40
+    )
+    assert n_rows == 4
+    assert parallel_path.read_bytes() == serial_path.read_bytes()
+
+
+CNA = (
+    "Hugo_Symbol\tS1\tS2\tS3\n"
+    "TP53\t-2\t\t1\n"
+    '"KRAS"\t\t\t\n'
+    "EGFR\t0.50\t2\tNA\n"
+    "\t1\t-1.5\t0\n"
+)
+
+
+def pandas_subset_cna(cna_path, keep_samples):
+    """Subset the CNA file the way create_and_write_cna used to"""
+    cnadf = pd.read_table(cna_path, low_memory=False)
+    keep_cols = ["Hugo_Symbol"]
+    keep_cols.extend(cnadf.columns[cnadf.columns.isin(keep_samples)].tolist())
+    cna_text = process_functions.removePandasDfFloat(cnadf[keep_cols])
+    return (
+        cna_text.replace("\t\t", "\tNA\t")
+        .replace("\t\t", "\tNA\t")
+        .replace("\t\n", "\tNA\n")
+    )
+
+
+@pytest.mark.parametrize("keep_samples", [["S1", "S2"], ["S3", "S1"], ["S2"], []])
+def test_that_subset_cna_matches_pandas_output(tmp_path, keep_samples):
+    cna_path = tmp_path / "data_CNA.txt"
+    cna_path.write_text(CNA)
+    out_path = tmp_path / "subset.txt"
+    columns = subset_cna(str(cna_path), str(out_path), keep_samples)
+    assert out_path.read_text() == pandas_subset_cna(str(cna_path), keep_samples)
+    assert columns == out_path.read_text().splitlines()[0].split("\t")
+
+
+SEG = (
+    "ID\tchrom\tloc.start\tloc.end\tnum.mark\tseg.mean\n"
+    "S1\t1\t100\t200\t5\t0.1\n"
+    "S1\t2\t100\t200\t\t-0.5\n"
+    "S2\t1\t100\t200\t3\t1.2\n"
+    "S3\tX\t100\t200\t4\tNA\n"
+    "S1\t3\t300\t400\t2\t0.2\n"
+)
+
+
+def pandas_subset_seg(seg_path, keep_samples):
+    """Subset the SEG file the way create_and_write_seg used to"""
+    segdf = pd.read_table(seg_path, low_memory=False)
+    segdf = segdf[segdf["ID"].isin(keep_samples)]
+    return process_functions.removePandasDfFloat(segdf)
+
+
+@pytest.fixture
+def seg_path(tmp_path):
+    path = tmp_path / "data_cna_hg19.seg"
+    path.write_text(SEG)
+    return str(path)
+
+
+@pytest.mark.parametrize("indexed", [False, True])
+@pytest.mark.parametrize("keep_samples", [["S1"], ["S1", "S3"], ["S9"]])
+def test_that_subset_rows_matches_pandas_output(
+    seg_path, tmp_path, keep_samples, indexed
+):
+    out_path = tmp_path / "subset.seg"
+    index = SampleRangeIndex.build(seg_path, "ID") if indexed else None
+    subset_rows(seg_path, str(out_path), "ID", keep_samples, index=index)
+    assert out_path.read_text() == pandas_subset_seg(seg_path, keep_samples)
+
+
+def test_that_subset_rows_and_cna_keep_long_floats(tmp_path):
+    seg_path = tmp_path / "data_cna_hg19.seg"
+    seg_path.write_text("ID\tseg.mean\nS1\t0.0006369616873214543\nS2\t1.0\n")
+    subset_rows(str(seg_path), str(tmp_path / "subset.seg"), "ID", ["S1", "S2"])
+    assert (tmp_path / "subset.seg").read_text() == (
+        "ID\tseg.mean\nS1\t0.0006369616873214543\nS2\t1\n"
+    )
+    cna_path = tmp_path / "data_CNA.txt"
+    cna_path.write_text("Hugo_Symbol\tS1\tS2\nTP53\t0.0006369616873214543\t\n")
+    subset_cna(str(cna_path), str(tmp_path / "subset.txt"), ["S1", "S2"])
+    assert (tmp_path / "subset.txt").read_text() == (
+        "Hugo_Symbol\tS1\tS2\nTP53\t0.0006369616873214543\tNA\n"
+    )
+
+
+def test_that_sample_range_index_merges_consecutive_rows(seg_path):
+    index = SampleRangeIndex.build(seg_path, "ID")
+    header_bytes = len(SEG.splitlines(keepends=True)[0])
+    assert len(index.ranges["S1"]) == 2
+    assert index.ranges["S1"][0][0] == header_bytes
+    assert index.ranges_of([b"S1", b"S2"]) == [
+        (header_bytes, index.ranges["S2"][0][1]),
+        tuple(index.ranges["S1"][1]),
+    ]
+
+
+def test_that_indexed_subset_maf_matches_scan(maf_path, tmp_path):
+    index = SampleRangeIndex.build(maf_path, "Tumor_Sample_Barcode")
+    subset_maf(maf_path, str(tmp_path / "scan.txt"), ["S1", "S3"])
+    subset_maf(maf_path, str(tmp_path / "indexed.txt"), ["S1", "S3"], index=index)
+    assert (tmp_path / "indexed.txt").read_bytes() == (
+        tmp_path / "scan.txt"
+    ).read_bytes()
+
+
+def test_that_sample_index_is_built_once(seg_path, tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    with mock.patch.object(
+        SampleRangeIndex, "build", wraps=SampleRangeIndex.build
+    ) as build:
+        first = get_sample_index(seg_path, "ID", "syn1.1.abc", cache_dir)
+        genomic._indexes.clear()
+        second = get_sample_index(seg_path, "ID", "syn1.1.abc", cache_dir)
+    build.assert_called_once()
+    assert second.ranges == first.ranges
+    assert os.path.exists(os.path.join(cache_dir, "genomic", "syn1.1.abc.ID.json"))
+
+
+def test_that_fan_out_matches_subsets_of_each_cohort(maf_path, seg_path, tmp_path):
+    cohort_samples = {"A": ["S1"], "B": ["S1", "S2"], "C": ["S9"]}
+    maf_paths = {cohort: str(tmp_path / f"{cohort}.maf") for cohort in cohort_samples}
+    seg_paths = {cohort: str(tmp_path / f"{cohort}.seg") for cohort in cohort_samples}
+    assert fan_out_maf(maf_path, cohort_samples, maf_paths) == {"A": 3, "B": 4, "C": 0}
+    assert fan_out_rows(seg_path, "ID", cohort_samples, seg_paths) == {
+        "A": 3,
+        "B": 4,
+        "C": 0,
+    }
+    assert not os.path.exists(maf_paths["C"])
+    for cohort, samples in cohort_samples.items():
+        if samples != ["S9"]:
+            subset_maf(maf_path, str(tmp_path / "single.maf"), samples)
+            assert (tmp_path / "single.maf").read_bytes() == open(
+                maf_paths[cohort], "rb"
+            ).read()
+        subset_rows(seg_path, str(tmp_path / "single.seg"), "ID", samples)
+        assert (tmp_path / "single.seg").read_bytes() == open(
+            seg_paths[cohort], "rb"
+        ).read()
+
+
+def test_that_fan_out_cna_matches_subsets_of_each_cohort(tmp_path):
+    cna_path = tmp_path / "data_CNA.txt"
+    cna_path.write_text(CNA)
+    cohort_samples = {"A": ["S3", "S1"], "B": ["S2"], "C": []}
+    out_paths = {cohort: str(tmp_path / f"{cohort}.txt") for cohort in cohort_samples}
+    columns = fan_out_cna(str(cna_path), cohort_samples, out_paths)
+    assert columns == {
+        "A": ["Hugo_Symbol", "S1", "S3"],
+        "B": ["Hugo_Symbol", "S2"],
+        "C": ["Hugo_Symbol"],
+    }
+    for cohort, samples in cohort_samples.items():
+        with open(out_paths[cohort]) as out_f:
+            assert out_f.read() == pandas_subset_cna(str(cna_path), samples)
@@ -0,0 +1,34 @@
+import hashlib
+import os
+
+from geniesp.hashing import HashingWriter, md5_file
+
+
+def test_that_hashing_writer_hashes_written_content(tmp_path):
+    path = str(tmp_path / "data.txt")
+    with HashingWriter(path) as file_f:
+        file_f.write("a\tb\n")
+        file_f.write("1\t2\n")
+    with open(path, "rb") as file_f:
+        content = file_f.read()
+    assert content == b"a\tb\n1\t2\n"
+    assert md5_file(path) == hashlib.md5(content).hexdigest()
+
+
+def test_that_hashing_writer_appends(tmp_path):
+    path = str(tmp_path / "data.txt")
+    with HashingWriter(path) as file_f:
+        file_f.write("a\n")
+    with HashingWriter(path, mode="a") as file_f:
+        file_f.write("b\n")
+    assert file_f.md5 == hashlib.md5(b"a\nb\n").hexdigest()
+
+
+def test_that_md5_file_rereads_modified_files(tmp_path):
+    path = str(tmp_path / "data.txt")
+    with HashingWriter(path) as file_f:
+        file_f.write("a\n")
+    with open(path, "w") as file_f:
+        file_f.write("changed\n")
+    os.utime(path, ns=(0, 0))
+    assert md5_file(path) == hashlib.md5(b"changed\n").hexdigest()
@@ -0,0 +1,137 @@
+import json
+
+import pandas as pd
+import pytest
+
+from geniesp import bpc_redcap_export_mapping as bpc_export
+from geniesp.manifest import ExportManifest, hash_value
+from geniesp.stages import Stage, StageScheduler
+
+
+@pytest.fixture
+def versions():
+    return {"syn1": 3}
+
+
+def _manifest(path, versions, resume=False, context=None):
+    return ExportManifest(
+        str(path),
+        context=context or {"git_sha": "abc"},
+        resume=resume,
+        get_version=versions.get,
+        get_used=lambda stage: [f"syn1.{versions['syn1']}"],
+    )
+
+
+def _write_stage(output_path, calls):
+    def write(value):
+        calls.append(value)
+        output_path.write_text(f"value\t{value}\n")
+        return str(output_path)
+
+    return Stage("write", write, inputs=["value"], outputs=[str(output_path)])
+
+
+def _run(tmp_path, versions, value=1, resume=True, context=None):
+    calls = []
+    stages = [
+        Stage("value", lambda: value),
+        _write_stage(tmp_path / "out.txt", calls),
+    ]
+    scheduler = StageScheduler(
+        stages,
+        manifest=_manifest(
+            tmp_path / "manifest.json", versions, resume=resume, context=context
+        ),
+    )
+    scheduler.run()
+    return calls, scheduler
+
+
+def test_that_manifest_records_inputs_and_outputs(tmp_path, versions):
+    _run(tmp_path, versions, resume=False)
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    entry = manifest["stages"]["write"]
+    assert entry["used"] == ["syn1.3"]
+    assert entry["fingerprint"]["git_sha"] == "abc"
+    assert entry["fingerprint"]["inputs"] == {"value": hash_value(1)}
+    assert list(entry["outputs"]) == [str(tmp_path / "out.txt")]
+
+
+def test_that_up_to_date_stages_are_skipped_when_resuming(tmp_path, versions):
+    _run(tmp_path, versions, resume=False)
+    calls, scheduler = _run(tmp_path, versions)
+    assert calls == []
+    assert scheduler.skipped == ["write"]
+    # The entry is carried over to the new manifest
+    manifest = json.loads((tmp_path / "manifest.json").read_text())
+    assert "write" in manifest["stages"]
+
+
+def test_that_stages_always_run_without_resume(tmp_path, versions):
+    _run(tmp_path, versions, resume=False)
+    calls, _ = _run(tmp_path, versions, resume=False)
+    assert calls == [1]
+
+
+@pytest.mark.parametrize(
+    "change",
+    ["input", "context", "version", "modified_output", "missing_output"],
+)
+def test_that_stages_rerun_when_their_inputs_change(tmp_path, versions, change):
+    _run(tmp_path, versions, resume=False)
+    kwargs = {}
+    if change == "input":
+        kwargs["value"] = 2
+    elif change == "context":
+        kwargs["context"] = {"git_sha": "def"}
+    elif change == "version":
+        versions["syn1"] = 4
+    elif change == "modified_output":
+        (tmp_path / "out.txt").write_text("edited\n")
+    else:
+        (tmp_path / "out.txt").unlink()
+    calls, scheduler = _run(tmp_path, versions, **kwargs)
+    assert len(calls) == 1
+    assert scheduler.skipped == []
+
+
+def test_that_skipped_stages_are_restored(tmp_path, versions):
+    manifest_path = tmp_path / "manifest.json"
+    output_path = tmp_path / "out.txt"
+
+    def stages():
+        return [
+            Stage(
+                "write",
+                lambda: output_path.write_text("a\tb\n") and "written",
+                outputs=[str(output_path)],
+                restore=lambda: "restored",
+            ),
+            Stage("read", lambda write: write, inputs=["write"]),
+        ]
+
+    StageScheduler(stages(), manifest=_manifest(manifest_path, versions)).run()
+    results = StageScheduler(
+        stages(), manifest=_manifest(manifest_path, versions, resume=True)
+    ).run()
+    assert results["read"] == "restored"
+
+
+def test_that_hash_value_depends_on_data_frame_content():
+    df = pd.DataFrame({"a": [1, 2], "b": ["x", None]})
+    assert hash_value(df) == hash_value(df.copy())
+    assert hash_value(df) != hash_value(df.assign(a=[1, 3]))
+    assert hash_value(df) != hash_value(df.rename(columns={"b": "c"}))
+
+
+def test_that_create_release_folders_keeps_files_when_not_cleaning(
+    tmp_path, monkeypatch
+):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "TEST").mkdir()
+    (tmp_path / "TEST" / "data_CNA.txt").write_text("Hugo_Symbol\n")
+    bpc_export.create_release_folders("TEST", clean=False)
+    assert (tmp_path / "TEST" / "data_CNA.txt").exists()
+    bpc_export.create_release_folders("TEST")
+    assert not (tmp_path / "TEST" / "data_CNA.txt").exists()
@@ -0,0 +1,80 @@
+"""Test run metrics"""
+import json
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from geniesp import metrics
+from geniesp.metrics import CountedSynapse, MetricsRegistry
+from geniesp.stages import Stage, StageScheduler
+from geniesp.writers import write_tsv_file
+
+
+def test_that_stages_count_to_their_registry(tmp_path):
+    registry = MetricsRegistry(labels={"cohort": "TEST"})
+
+    def write():
+        metrics.add("rows_dropped_filter", 2)
+        write_tsv_file(pd.DataFrame({"A": [1, 2, 3]}), str(tmp_path / "a.txt"))
+
+    stages = [Stage("write", write), Stage("noop", lambda: None)]
+    StageScheduler(stages, metrics=registry).run()
+    stages = registry.stages()
+    assert stages["write"]["rows_dropped_filter"] == 2
+    assert stages["write"]["rows_written"] == 3
+    assert stages["write"]["bytes_written"] == len("A\n1\n2\n3\n")
+    assert stages["write"]["wall_seconds"] >= 0
+    assert list(stages["noop"]) == ["wall_seconds"]
+
+
+def test_that_add_without_active_registry_does_nothing():
+    registry = MetricsRegistry()
+    metrics.add("rows_read", 10)
+    with registry.activate():
+        metrics.add("rows_read", 5)
+    metrics.add("rows_read", 10)
+    assert registry.stages() == {metrics.NO_STAGE: {"rows_read": 5}}
+
+
+def test_that_registry_raises_for_unknown_metric():
+    with pytest.raises(ValueError, match="unknown metric: rows"):
+        MetricsRegistry().add("rows")
+
+
+def test_that_metrics_are_written_as_json_and_prometheus_text(tmp_path):
+    registry = MetricsRegistry(labels={"cohort": "TEST", "release": "1.1"})
+    registry.add("rows_read", 10, stage="sample")
+    registry.add("rows_read", 5, stage="patient")
+    registry.add("wall_seconds", 1.5, stage="sample")
+    json_path = tmp_path / "TEST_metrics.json"
+    prometheus_path = tmp_path / "TEST_metrics.prom"
+    registry.write(str(json_path), str(prometheus_path))
+
+    report = json.loads(json_path.read_text())
+    assert report["labels"] == {"cohort": "TEST", "release": "1.1"}
+    assert report["totals"] == {"rows_read": 15, "wall_seconds": 1.5}
+    assert report["stages"]["patient"] == {"rows_read": 5}
+    assert prometheus_path.read_text() == (
+        "# HELP geniesp_stage_wall_seconds Wall time of the stage in seconds\n"
+        "# TYPE geniesp_stage_wall_seconds gauge\n"
+        'geniesp_stage_wall_seconds{cohort="TEST",release="1.1",stage="sample"} 1.5\n'
+        "# HELP geniesp_stage_rows_read Rows of derived variable datasets read\n"
+        "# TYPE geniesp_stage_rows_read gauge\n"
+        'geniesp_stage_rows_read{cohort="TEST",release="1.1",stage="patient"} 5\n'
+        'geniesp_stage_rows_read{cohort="TEST",release="1.1",stage="sample"} 10\n'
+    )
+
+
+def test_that_counted_synapse_counts_calls():
+    syn = mock.Mock()
+    syn.get.return_value = "entity"
+    syn.credentials = "token"
+    counted = CountedSynapse(syn)
+    registry = MetricsRegistry()
+    with registry.activate():
+        assert counted.get("syn1", followLink=True) == "entity"
+        counted.store("file")
+        assert counted.credentials == "token"
+    syn.get.assert_called_once_with("syn1", followLink=True)
+    assert registry.stages()[metrics.NO_STAGE]["synapse_calls"] == 2
@@ -0,0 +1,84 @@
+"""Test oncotree snapshots"""
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from geniesp import oncotree
+from geniesp.oncotree import Oncotree, get_oncotree, load_oncotree
+
+MAPPINGS = {
+    "LUAD": {
+        "CANCER_TYPE": "Non-Small Cell Lung Cancer",
+        "CANCER_TYPE_DETAILED": "Lung Adenocarcinoma",
+        "ONCOTREE_PRIMARY_NODE": "LUNG",
+        "ONCOTREE_SECONDARY_NODE": "NSCLC",
+    },
+    "LUNG": {
+        "CANCER_TYPE": "Non-Small Cell Lung Cancer",
+        "CANCER_TYPE_DETAILED": "Lung",
+        "ONCOTREE_PRIMARY_NODE": "LUNG",
+    },
+}
+
+
+@pytest.fixture
+def mock_mappings():
+    with mock.patch.object(
+        oncotree.process_functions,
+        "get_oncotree_code_mappings",
+        return_value=MAPPINGS,
+    ) as patch_get:
+        yield patch_get
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    oncotree._registry.clear()
+    yield
+    oncotree._registry.clear()
+
+
+def test_that_enrich_maps_codes_in_any_case():
+    df = pd.DataFrame(
+        {"SAMPLE_ID": ["S1", "S2", "S3"], "ONCOTREE_CODE": ["luad", "LUNG", "LUAD"]}
+    )
+    enriched = Oncotree("v1", MAPPINGS).enrich(df)
+    assert enriched["CANCER_TYPE_DETAILED"].tolist() == [
+        "Lung Adenocarcinoma",
+        "Lung",
+        "Lung Adenocarcinoma",
+    ]
+    assert enriched["ONCOTREE_SECONDARY_NODE"].tolist()[::2] == ["NSCLC", "NSCLC"]
+    assert np.isnan(enriched["ONCOTREE_SECONDARY_NODE"][1])
+    assert "CANCER_TYPE" not in df
+
+
+def test_that_enrich_raises_for_unknown_codes():
+    df = pd.DataFrame({"ONCOTREE_CODE": ["LUAD", "FOO"]})
+    with pytest.raises(ValueError, match=r"aren't in v1: \['FOO'\]"):
+        Oncotree("v1", MAPPINGS).enrich(df)
+
+
+def test_that_load_oncotree_saves_and_reuses_snapshot(mock_mappings, tmp_path):
+    first = load_oncotree("v1", cache_dir=str(tmp_path))
+    assert (tmp_path / "oncotree" / "v1.json").exists()
+    second = load_oncotree("v1", cache_dir=str(tmp_path), offline=True)
+    assert second.mappings == first.mappings == MAPPINGS
+    mock_mappings.assert_called_once_with(
+        "http://oncotree.mskcc.org/api/tumorTypes/tree?version=v1"
+    )
+
+
+def test_that_load_oncotree_offline_raises_without_snapshot(mock_mappings, tmp_path):
+    with pytest.raises(ValueError, match="no snapshot of v1"):
+        load_oncotree("v1", cache_dir=str(tmp_path), offline=True)
+    with pytest.raises(ValueError, match="offline mode needs a cache directory"):
+        load_oncotree("v1", offline=True)
+    mock_mappings.assert_not_called()
+
+
+def test_that_oncotree_is_shared(mock_mappings):
+    assert get_oncotree("v1") is get_oncotree("v1")
+    mock_mappings.assert_called_once()
@@ -0,0 +1,88 @@
+"""Test stage profiles"""
+import json
+import time
+
+import pandas as pd
+import pytest
+
+from geniesp import sp_redcap_export_mapping
+from geniesp.profiling import StageProfiler, count_rows
+from geniesp.stages import Stage, StageScheduler
+
+
+def _busy_subset(df: pd.DataFrame) -> pd.DataFrame:
+    # Run for a few samples so that the stage's stack is sampled
+    end = time.perf_counter() + 0.1
+    while time.perf_counter() < end:
+        sum(range(1000))
+    return df[df["A"] > 1]
+
+
+def test_that_count_rows_counts_data_frames():
+    df = pd.DataFrame({"A": [1, 2, 3]})
+    assert count_rows(df) == 3
+    assert count_rows({"df": df, "used": ["syn1"]}) == 3
+    assert count_rows([df, df]) == 6
+    assert count_rows(["a", "b"]) is None
+    assert count_rows(None) is None
+
+
+def test_that_scheduler_profiles_each_stage(tmp_path):
+    df = pd.DataFrame({"A": [1, 2, 3]})
+    stages = [
+        Stage("data", lambda: df),
+        Stage("subset", _busy_subset, inputs={"df": "data"}),
+    ]
+    with StageProfiler(sample_seconds=0.01) as profiler:
+        results = StageScheduler(stages, profiler=profiler).run()
+    assert len(results["subset"]) == 2
+
+    report = profiler.report()
+    subset = report["stages"]["subset"]
+    assert (subset["rows_in"], subset["rows_out"]) == (3, 2)
+    assert report["stages"]["data"]["rows_in"] is None
+    assert subset["wall_seconds"] >= 0.1
+    assert subset["cpu_seconds"] > 0
+    assert subset["peak_traced_bytes"] >= 0
+    assert "_busy_subset" in [row["function"] for row in subset["top_functions"]]
+
+    report_path = tmp_path / "TEST_profile.json"
+    stacks_path = tmp_path / "TEST_profile.collapsed"
+    profiler.write(str(report_path), str(stacks_path))
+    assert json.loads(report_path.read_text()) == json.loads(json.dumps(report))
+    lines = stacks_path.read_text().splitlines()
+    assert lines
+    for line in lines:
+        stack, samples = line.rsplit(" ", 1)
+        assert stack.startswith("subset;") or stack.startswith("data;")
+        assert int(samples) > 0
+    assert any("test_profiling._busy_subset" in line for line in lines)
+
+
+def test_that_cpu_seconds_exclude_waiting():
+    with StageProfiler() as profiler:
+        profiler.call("wait", lambda: time.sleep(0.2))
+    wait = profiler.report()["stages"]["wait"]
+    assert wait["wall_seconds"] >= 0.2
+    assert wait["cpu_seconds"] < 0.1
+
+
+class _FailingRunner(sp_redcap_export_mapping.SponsoredProjectRunner):
+    _SPONSORED_PROJECT = "TEST"
+
+    def _run_export(self):
+        df = pd.DataFrame({"A": [1, 2, 3]})
+        self._step("clinical", lambda: _busy_subset(df), inputs={"df": df})
+        self._step("maf", lambda: None)
+        raise ValueError("export failed")
+
+
+def test_that_legacy_runner_profiles_each_step_of_failed_run(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    runner = _FailingRunner(None, str(tmp_path), staging=True, profile=True)
+    with pytest.raises(ValueError, match="export failed"):
+        runner.run()
+    report = json.loads((tmp_path / "TEST_profile.json").read_text())
+    assert list(report["stages"]) == ["clinical", "maf"]
+    assert report["stages"]["clinical"]["rows_out"] == 2
+    assert (tmp_path / "TEST_profile.collapsed").exists()
@@ -0,0 +1,90 @@
+"""Test retraction tables"""
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from geniesp import retraction
+from geniesp.retraction import RetractionTables, get_retraction_tables
+
+TABLES = {
+    "synS": pd.DataFrame(
+        {
+            "SAMPLE_ID": ["S1", "S2", "S3"],
+            "NSCLC": [True, False, None],
+            "CRC": [False, True, True],
+        }
+    ),
+    "synP": pd.DataFrame(
+        {"record_id": ["P1", "P2"], "NSCLC": [True, None], "CRC": [False, True]}
+    ),
+    "synR": pd.DataFrame(
+        {"patient_id": ["P3", "P4"], "cohort": ["NSCLC2", "CRC"]}
+    ),
+}
+
+
+@pytest.fixture
+def mock_syn():
+    syn = mock.create_autospec(retraction.Synapse)
+    syn.tableQuery.side_effect = lambda query: mock.Mock(
+        asDataFrame=mock.Mock(return_value=TABLES[query.split()[-1]]), etag="e1"
+    )
+    syn.get.side_effect = lambda synid, downloadFile: mock.Mock(etag="v1")
+    return syn
+
+
+@pytest.fixture(autouse=True)
+def clear_registry():
+    retraction._registry.clear()
+    yield
+    retraction._registry.clear()
+
+
+def test_that_retraction_tables_resolve_cohorts(mock_syn):
+    tables = RetractionTables(mock_syn, "synS", "synP", "synR")
+    assert tables.retracted_samples("NSCLC") == frozenset(["S1"])
+    assert tables.retracted_patients("NSCLC") == frozenset(["P1", "P3"])
+    assert tables.retracted_samples("CRC") == frozenset(["S2", "S3"])
+    assert tables.retracted_patients("CRC") == frozenset(["P2", "P4"])
+    assert tables.versions == {"synS": "e1", "synP": "e1", "synR": "e1"}
+    assert mock_syn.tableQuery.call_count == 3
+
+
+def test_that_retraction_tables_raise_for_unknown_cohort(mock_syn):
+    tables = RetractionTables(mock_syn, "synS", "synP", "synR")
+    with pytest.raises(ValueError, match="synS has no column for cohort BrCa"):
+        tables.retracted_samples("BrCa")
+
+
+def test_that_retraction_tables_remove_samples_and_patients(mock_syn):
+    tables = RetractionTables(mock_syn, "synS", "synP", "synR")
+    clinicaldf = pd.DataFrame(
+        {
+            "SAMPLE_ID": ["S1", "S4", "S5", "S6"],
+            "PATIENT_ID": ["P5", "P1", "P3", "P6"],
+        }
+    )
+    keepdf = tables.apply(clinicaldf, "NSCLC")
+    assert keepdf["SAMPLE_ID"].tolist() == ["S6"]
+
+
+def test_that_string_false_flags_are_not_retractions(mock_syn, monkeypatch):
+    flags = TABLES["synS"].assign(NSCLC=["false", "true", "False"])
+    monkeypatch.setitem(TABLES, "synS", flags)
+    tables = RetractionTables(mock_syn, "synS", "synP", "synR")
+    assert tables.retracted_samples("NSCLC") == frozenset(["S2"])
+
+
+def test_that_retraction_tables_are_queried_once_per_version(mock_syn):
+    first = get_retraction_tables(mock_syn, "synS", "synP", "synR")
+    second = get_retraction_tables(mock_syn, "synS", "synP", "synR")
+    assert first is second
+    assert first.versions == {"synS": "v1", "synP": "v1", "synR": "v1"}
+    assert mock_syn.tableQuery.call_count == 3
+    mock_syn.get.side_effect = lambda synid, downloadFile: mock.Mock(etag="v2")
+    third = get_retraction_tables(mock_syn, "synS", "synP", "synR")
+    assert third is not first
+    assert third.versions["synS"] == "v2"
+    assert mock_syn.tableQuery.call_count == 6
+    assert len(retraction._registry) == 1
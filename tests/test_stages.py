@@ -0,0 +1,127 @@
+import threading
+
+import pytest
+
+from geniesp.stages import Stage, StageScheduler
+
+
+def test_that_stages_get_the_outputs_of_their_inputs():
+    stages = [
+        Stage("a", lambda: 1),
+        Stage("b", lambda a: a + 1, inputs=["a"]),
+        Stage(
+            "c",
+            lambda first, second: first + second,
+            inputs={"first": "a", "second": "b"},
+        ),
+    ]
+    results = StageScheduler(stages).run()
+    assert results == {"a": 1, "b": 2, "c": 3}
+
+
+def test_that_missing_optional_inputs_are_none():
+    stages = [Stage("b", lambda a: a, optional_inputs=["a"])]
+    assert StageScheduler(stages).run() == {"b": None}
+
+
+def test_that_stages_with_inputs_are_timed_under_their_own_name():
+    stages = [
+        Stage("a", lambda: 1),
+        Stage("b", lambda a, c: a, inputs=["a"], optional_inputs=["c"]),
+    ]
+    scheduler = StageScheduler(stages)
+    scheduler.run()
+    assert set(scheduler.timings) == {"a", "b"}
+
+
+def test_that_serial_runs_follow_declaration_order():
+    order = []
+    stages = [
+        Stage(name, lambda name=name: order.append(name))
+        for name in ["c", "a", "b"]
+    ]
+    StageScheduler(stages, jobs=1).run()
+    assert order == ["c", "a", "b"]
+
+
+def test_that_ready_stages_run_in_parallel():
+    # Both stages wait for each other, so this only finishes
+    # if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    stages = [
+        Stage("a", barrier.wait),
+        Stage("b", barrier.wait),
+        Stage("c", lambda: None, after=["a", "b"]),
+    ]
+    scheduler = StageScheduler(stages, jobs=2)
+    scheduler.run()
+    assert set(scheduler.timings) == {"a", "b", "c"}
+
+
+def test_that_stages_run_after_their_dependencies():
+    finished = set()
+
+    def stage(name, dependencies):
+        def func():
+            assert dependencies <= finished
+            finished.add(name)
+
+        return Stage(name, func, after=dependencies)
+
+    stages = [
+        stage("mapping", set()),
+        stage("sample", {"mapping"}),
+        stage("timeline", {"mapping"}),
+        stage("maf", {"sample"}),
+        stage("validation", {"maf", "timeline"}),
+    ]
+    StageScheduler(stages, jobs=4).run()
+    assert finished == {"mapping", "sample", "timeline", "maf", "validation"}
+
+
+def test_that_targets_only_run_needed_stages():
+    stages = [
+        Stage("a", lambda: 1),
+        Stage("b", lambda a: a + 1, inputs=["a"]),
+        Stage("c", lambda: 3),
+    ]
+    assert StageScheduler(stages).run(targets=["b"]) == {"a": 1, "b": 2}
+
+
+def test_that_done_stages_are_not_rerun():
+    stages = [
+        Stage("a", lambda: pytest.fail("a already ran")),
+        Stage("b", lambda a: a + 1, inputs=["a"]),
+    ]
+    assert StageScheduler(stages).run(done={"a": 1}) == {"a": 1, "b": 2}
+
+
+def test_that_stage_errors_are_raised_and_stop_scheduling():
+    ran = []
+
+    def fail():
+        raise RuntimeError("failed")
+
+    stages = [
+        Stage("a", fail),
+        Stage("b", lambda: ran.append("b"), after=["a"]),
+    ]
+    with pytest.raises(RuntimeError, match="failed"):
+        StageScheduler(stages, jobs=2).run()
+    assert ran == []
+
+
+@pytest.mark.parametrize(
+    "stages, error",
+    [
+        ([Stage("a", None), Stage("a", None)], "duplicated stage"),
+        ([Stage("a", None, inputs=["b"])], "unknown stages"),
+        (
+            [Stage("a", None, after=["b"]), Stage("b", None, after=["a"])],
+            "cycle",
+        ),
+    ],
+)
+def test_that_invalid_stage_graphs_are_rejected(stages, error):
+    with pytest.raises(ValueError, match=error):
+        StageScheduler(stages)
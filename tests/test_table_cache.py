@@ -0,0 +1,75 @@
+import os
+from unittest import mock
+
+import pandas as pd
+import pytest
+
+from geniesp.table_cache import ColumnarTableCache
+
+pytest.importorskip("pyarrow")
+
+
+@pytest.fixture
+def derived_csv(tmp_path):
+    path = tmp_path / "derived.csv"
+    pd.DataFrame(
+        {
+            "record_id": ["GENIE-A-1", "GENIE-A-2", "GENIE-B-1"],
+            "cohort_internal": ["NSCLC", "NSCLC", "CRC"],
+            "ca_type": ["Lung", None, "Colon"],
+            "dob_ca_dx_days": [20000, None, 18000],
+        }
+    ).to_csv(path, index=False)
+    return str(path)
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "feather"])
+def test_that_table_cache_reads_same_data_as_csv(tmp_path, derived_csv, file_format):
+    cache = ColumnarTableCache(str(tmp_path / "cache"), file_format=file_format)
+    expected = pd.read_csv(derived_csv, low_memory=False)
+    # First read converts, second read comes from the cache
+    pd.testing.assert_frame_equal(cache.read_csv("syn1", 2, derived_csv), expected)
+    pd.testing.assert_frame_equal(cache.read_csv("syn1", 2, derived_csv), expected)
+    assert os.path.exists(
+        os.path.join(str(tmp_path / "cache"), "tables", f"syn1.2.{file_format}")
+    )
+
+
+def test_that_table_cache_is_shared_between_instances(tmp_path, derived_csv):
+    ColumnarTableCache(str(tmp_path)).read_csv("syn1", 2, derived_csv)
+    with mock.patch.object(pd, "read_csv") as patch_read:
+        df = ColumnarTableCache(str(tmp_path)).read_csv(
+            "syn1", 2, derived_csv, usecols=lambda col: col.startswith("dob")
+        )
+        patch_read.assert_not_called()
+    assert df.columns.tolist() == ["dob_ca_dx_days"]
+
+
+def test_that_converting_read_parses_the_csv_once(tmp_path, derived_csv):
+    cache = ColumnarTableCache(str(tmp_path))
+    with mock.patch.object(
+        pd, "read_csv", wraps=pd.read_csv
+    ) as patch_read, mock.patch.object(pd, "read_parquet") as patch_parquet:
+        df = cache.read_csv("syn1", 2, derived_csv, usecols=["record_id", "ca_type"])
+    patch_read.assert_called_once()
+    patch_parquet.assert_not_called()
+    assert df.columns.tolist() == ["record_id", "ca_type"]
+    assert cache.read_csv("syn1", 2, derived_csv).columns.tolist() == [
+        "record_id",
+        "cohort_internal",
+        "ca_type",
+        "dob_ca_dx_days",
+    ]
+
+
+def test_that_table_cache_evicts_least_recently_used(tmp_path, derived_csv):
+    cache = ColumnarTableCache(str(tmp_path))
+    cache.read_csv("syn1", 1, derived_csv)
+    one_table = cache.size()
+    cache.max_bytes = one_table * 2
+    cache.read_csv("syn1", 2, derived_csv)
+    os.utime(cache._cache_path("syn1", 1), (0, 0))
+    cache.read_csv("syn1", 3, derived_csv)
+    assert not os.path.exists(cache._cache_path("syn1", 1))
+    assert os.path.exists(cache._cache_path("syn1", 2))
+    assert os.path.exists(cache._cache_path("syn1", 3))
@@ -0,0 +1,102 @@
+from unittest import mock
+
+import pytest
+import synapseclient
+
+from geniesp.upload import UploadQueue
+
+
+@pytest.fixture
+def mock_syn():
+    syn = mock.Mock(spec=synapseclient.Synapse)
+    syn.getChildren.return_value = []
+    yield syn
+
+
+REPO = "https://github.com/Sage-Bionetworks/GENIE-Sponsored-Projects"
+
+
+@pytest.fixture
+def export_files(tmp_path):
+    paths = []
+    for i in range(5):
+        path = tmp_path / f"data_{i}.txt"
+        path.write_text("a" * (i + 1))
+        paths.append(str(path))
+    return paths
+
+
+def test_that_upload_queue_stores_files_with_provenance(mock_syn, export_files):
+    upload_queue = UploadQueue(mock_syn, workers=3, max_pending=2)
+    for path in export_files:
+        upload_queue.submit(path, parent="syn123", used=["syn1"], executed=REPO)
+    upload_queue.barrier()
+    upload_queue.close()
+    assert mock_syn.store.call_count == 5
+    stored = sorted(call.args[0].path for call in mock_syn.store.call_args_list)
+    assert stored == sorted(export_files)
+    for call in mock_syn.store.call_args_list:
+        assert call.args[0].parentId == "syn123"
+        assert call.kwargs == {"used": ["syn1"], "executed": REPO}
+    assert upload_queue.summary["files"] == 5
+    assert upload_queue.summary["bytes"] == 15
+    assert upload_queue.summary["failed"] == 0
+
+
+def test_that_upload_queue_retries_failed_stores(mock_syn, export_files):
+    mock_syn.store.side_effect = [
+        ConnectionError("reset"),
+        ConnectionError("reset"),
+        mock.Mock(id="syn9", versionNumber=1, md5="0" * 32),
+    ]
+    upload_queue = UploadQueue(mock_syn, retries=2, backoff=0)
+    upload_queue.submit(export_files[0], parent="syn123")
+    upload_queue.barrier()
+    upload_queue.close()
+    assert mock_syn.store.call_count == 3
+    assert upload_queue.failed == []
+
+
+def test_that_upload_queue_barrier_raises_upload_errors(mock_syn, export_files):
+    mock_syn.store.side_effect = ConnectionError("reset")
+    upload_queue = UploadQueue(mock_syn, retries=1, backoff=0)
+    upload_queue.submit(export_files[0], parent="syn123")
+    with pytest.raises(ConnectionError):
+        upload_queue.barrier()
+    upload_queue.close()
+    assert upload_queue.failed == [export_files[0]]
+    assert mock_syn.store.call_count == 2
+
+
+def test_that_upload_queue_skips_unchanged_files(mock_syn, export_files):
+    mock_syn.getChildren.return_value = [{"name": "data_0.txt", "id": "syn9"}]
+    # md5 of "a"
+    mock_syn.get.return_value = mock.Mock(md5="0cc175b9c0f1b6a831c399e269772661")
+    upload_queue = UploadQueue(mock_syn, backoff=0)
+    for path in export_files[:2]:
+        upload_queue.submit(path, parent="syn123", used=["syn1"], executed=REPO)
+    upload_queue.close()
+    mock_syn.getChildren.assert_called_once_with("syn123")
+    mock_syn.setProvenance.assert_called_once()
+    assert mock_syn.setProvenance.call_args.args[0] == "syn9"
+    assert mock_syn.store.call_count == 1
+    assert mock_syn.store.call_args.args[0].path == export_files[1]
+    assert upload_queue.summary["unchanged_files"] == 1
+
+
+def test_that_upload_queue_uploads_changed_files(mock_syn, export_files):
+    mock_syn.getChildren.return_value = [{"name": "data_0.txt", "id": "syn9"}]
+    mock_syn.get.return_value = mock.Mock(md5="0" * 32)
+    upload_queue = UploadQueue(mock_syn, backoff=0)
+    upload_queue.submit(export_files[0], parent="syn123")
+    upload_queue.close()
+    mock_syn.store.assert_called_once()
+    mock_syn.setProvenance.assert_not_called()
+
+
+def test_that_forced_upload_queue_uploads_unchanged_files(mock_syn, export_files):
+    upload_queue = UploadQueue(mock_syn, force=True)
+    upload_queue.submit(export_files[0], parent="syn123")
+    upload_queue.close()
+    mock_syn.getChildren.assert_not_called()
+    mock_syn.store.assert_called_once()
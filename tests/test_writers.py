@@ -0,0 +1,79 @@
+import hashlib
+import io
+
+from genie import process_functions
+import numpy as np
+import pandas as pd
+import pytest
+
+from geniesp.writers import plan_column, write_tsv, write_tsv_file
+
+
+def _frame():
+    return pd.DataFrame(
+        {
+            "PATIENT_ID": ["P-1", "P-2", None, "P-4", "P-5"],
+            "START_DATE": [1.0, np.nan, -3.0, 0.0, 120.0],
+            "RESULT": [2.5, 10.0, -0.0, np.nan, 1e16],
+            "AGE": [40, 50, 60, 70, 80],
+            "NOTE": ["v2.0", 'say "1.0"', "a.0\tb", np.nan, 3.0],
+            "FLAG": [True, False, True, False, True],
+            "score.0": [np.nan] * 5,
+        }
+    )
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 2, 100])
+def test_that_write_tsv_matches_remove_pandas_df_float(chunk_rows):
+    df = _frame()
+    out = io.StringIO()
+    write_tsv(df, out, chunk_rows=chunk_rows)
+    assert out.getvalue() == process_functions.removePandasDfFloat(df)
+
+
+def test_that_write_tsv_writes_without_header():
+    df = _frame()
+    out = io.StringIO()
+    write_tsv(df, out, header=False, chunk_rows=2)
+    assert out.getvalue() == process_functions.removePandasDfFloat(df, header=False)
+
+
+@pytest.mark.parametrize(
+    "values",
+    [["1.0", ".0", "", None], [1.0, np.nan, 2.0], []],
+    ids=["text", "float", "empty"],
+)
+def test_that_write_tsv_matches_single_column_frames(values):
+    df = pd.DataFrame({"A": values})
+    out = io.StringIO()
+    write_tsv(df, out, chunk_rows=2)
+    assert out.getvalue() == process_functions.removePandasDfFloat(df)
+
+
+def test_that_write_tsv_writes_cbioportal_header_lines():
+    df = pd.DataFrame({"A": [1.0], "B": ["x"]})
+    out = io.StringIO()
+    write_tsv(df, out, comments=[["a", "b"], ["STRING", "NUMBER"]])
+    assert out.getvalue() == "#a\tb\n#STRING\tNUMBER\nA\tB\n1\tx\n"
+
+
+@pytest.mark.parametrize(
+    "values,plan",
+    [
+        (pd.Series([1.0, np.nan]), "int"),
+        (pd.Series([1.0, 1.5]), "float"),
+        (pd.Series([1, 2]), "raw"),
+        (pd.Series(["a", "b"]), "raw"),
+        (pd.Series(["a", "b.0"]), "text"),
+        (pd.Series([1, "a"]), "text"),
+    ],
+)
+def test_that_plan_column_chooses_column_format(values, plan):
+    assert plan_column(values) == plan
+
+
+def test_that_write_tsv_file_returns_md5(tmp_path):
+    path = str(tmp_path / "data.txt")
+    md5 = write_tsv_file(_frame(), path)
+    with open(path, "rb") as file_f:
+        assert md5 == hashlib.md5(file_f.read()).hexdigest()